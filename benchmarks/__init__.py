@@ -0,0 +1,4 @@
+"""
+Benchmarks offline del descargador de YouTube
+Extractor falso, servidor de medios sintéticos y scripts de medición
+"""
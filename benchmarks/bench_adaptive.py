@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Control adaptativo de la concurrencia frente a límites fijos
+Descarga videos por fragmentos del servidor local de medios mientras su enlace y su límite de conexiones cambian
+
+Uso:
+    python -m benchmarks.bench_adaptive --phase-seconds 40 --workers 16
+
+Cada política descarga con `--workers` hilos (como un scheduler pool:N) videos
+de `--size` bytes en fragmentos de `--fragment-size` pedidos con Range, con
+los reintentos de yt-dlp ante un 429 (esperar Retry-After). Las fijas usan N
+jobs a la vez con F fragmentos cada uno; la adaptativa, ControlAdaptativo
+alimentado igual que en el motor: un progress hook por job y el resultado
+de cada petición. No necesita yt-dlp.
+"""
+
+import argparse
+import itertools
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.common import comparar, guardar_resultados
+from benchmarks.media_server import MediaConfig, MediaServer
+from youtube_engine.concurrency import ConcurrenciaFija, ControlAdaptativo
+
+MB = 1024 * 1024
+
+# (nombre, enlace compartido en bytes/seg, conexiones a partir de las que el origen responde 429)
+FASES = (
+    ("8MB/s, 12 conns", 8 * MB, 12),
+    ("4MB/s, 6 conns", 4 * MB, 6),
+    ("16MB/s, 24 conns", 16 * MB, 24),
+)
+
+
+def descargar_fragmento(url: str, inicio: int, fin: int, control, progreso, parar: threading.Event) -> int:
+    """Un fragmento con Range, reintentando los 429 tras Retry-After; devuelve los 429 recibidos"""
+    throttled = 0
+    while not parar.is_set():
+        peticion = urllib.request.Request(url, headers={'Range': f'bytes={inicio}-{fin}'})
+        try:
+            with urllib.request.urlopen(peticion, timeout=30) as respuesta:
+                control.respuesta(None)
+                while True:
+                    trozo = respuesta.read(64 * 1024)
+                    if not trozo:
+                        return throttled
+                    progreso(len(trozo))
+        except urllib.error.HTTPError as e:
+            control.respuesta(e.code)
+            if e.code != 429:
+                raise
+            throttled += 1
+            parar.wait(float(e.headers.get('Retry-After') or 1))
+        except OSError:
+            control.respuesta(0)
+            raise
+    return throttled
+
+
+def descargar_video(base_url: str, job_id: str, control, args, parar: threading.Event) -> int:
+    """Descarga un video como lo haría un job: plaza, fragmentos concurrentes y progress hook"""
+    if not control.adquirir(job_id, parar.is_set):
+        return 0
+    try:
+        # Lo que yt-dlp leería de ydl.params al empezar el archivo
+        params = {'concurrent_fragment_downloads': args.fragments}
+        control.unir(job_id, params)
+        hook = control.medidor(job_id) if control.adaptativo else None
+        lock = threading.Lock()
+        descargado = [0, time.monotonic()]
+
+        def progreso(n: int):
+            with lock:
+                descargado[0] += n
+                if hook is not None:
+                    hook({'status': 'downloading', 'downloaded_bytes': descargado[0],
+                          'speed': descargado[0] / max(time.monotonic() - descargado[1], 1e-3)})
+
+        url = f"{base_url}/media/{job_id}/18"
+        rangos = [(inicio, min(inicio + args.fragment_size, args.size) - 1)
+                  for inicio in range(0, args.size, args.fragment_size)]
+        with ThreadPoolExecutor(params['concurrent_fragment_downloads']) as pool:
+            throttled = sum(pool.map(lambda r: descargar_fragmento(url, *r, control, progreso, parar), rangos))
+        if hook is not None and not parar.is_set():
+            hook({'status': 'finished', 'downloaded_bytes': descargado[0]})
+        return throttled
+    finally:
+        control.liberar(job_id)
+
+
+def simular(nombre: str, control, workers: int, args) -> Dict[str, Any]:
+    """Corre las FASES con una política y devuelve caudal, 429 y videos por fase"""
+    config = MediaConfig(size=args.size, bandwidth=args.connection_bandwidth,
+                         throttle_cooldown=args.throttle_cooldown, seed=None)
+    parar = threading.Event()
+    completados = [0]
+    ids = itertools.count()
+    limites: List[Tuple[float, int, int]] = []
+
+    with MediaServer(config) as servidor:
+        def worker():
+            while not parar.is_set():
+                try:
+                    descargar_video(servidor.base_url, f"v{next(ids):06d}", control, args, parar)
+                except Exception:
+                    continue
+                if not parar.is_set():
+                    completados[0] += 1
+
+        _, config.link_bandwidth, config.max_connections = FASES[0]
+        hilos = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+        for hilo in hilos:
+            hilo.start()
+
+        fases = {}
+        inicio = time.monotonic()
+        for fase, enlace, conexiones in FASES:
+            config.link_bandwidth, config.max_connections = enlace, conexiones
+            bytes_antes, throttled_antes, videos_antes = servidor.bytes_served, servidor.throttled, completados[0]
+            fin = time.monotonic() + args.phase_seconds
+            while time.monotonic() < fin:
+                time.sleep(0.5)
+                if control.adaptativo:
+                    limites.append((round(time.monotonic() - inicio, 1), control.limite, control.fragmentos()))
+            fases[fase] = {
+                "mb_per_s": round((servidor.bytes_served - bytes_antes) / args.phase_seconds / MB, 2),
+                "link_utilization": round((servidor.bytes_served - bytes_antes) / args.phase_seconds / enlace, 3),
+                "throttled": servidor.throttled - throttled_antes,
+                "videos": completados[0] - videos_antes,
+            }
+            print(f"   {nombre:<22} {fase:<18} {fases[fase]['mb_per_s']:>6} MB/s "
+                  f"({fases[fase]['link_utilization']:.0%} del enlace)  429: {fases[fase]['throttled']:<5} "
+                  f"videos: {fases[fase]['videos']}")
+        parar.set()
+        control.cerrar()
+        for hilo in hilos:
+            hilo.join(timeout=5)
+
+    total = sum(fase["mb_per_s"] for fase in fases.values()) / len(fases)
+    resultado: Dict[str, Any] = {"phases": fases, "mean_mb_per_s": round(total, 2),
+                                 "throttled": sum(fase["throttled"] for fase in fases.values())}
+    if control.adaptativo:
+        resultado["limit_timeline"] = limites[::max(1, int(args.phase_seconds // 5))]
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Control adaptativo de la concurrencia frente a límites fijos")
+    parser.add_argument('--phase-seconds', type=float, default=40.0)
+    parser.add_argument('--workers', type=int, default=16, help="Hilos de descarga (como pool:N)")
+    parser.add_argument('--size', type=int, default=2 * MB, help="Bytes por video")
+    parser.add_argument('--fragment-size', type=int, default=512 * 1024)
+    parser.add_argument('--fragments', type=int, default=4, help="Fragmentos a la vez de las políticas fijas")
+    parser.add_argument('--connection-bandwidth', type=float, default=1 * MB, help="Bytes/seg por conexión")
+    parser.add_argument('--throttle-cooldown', type=float, default=2.0)
+    parser.add_argument('--interval', type=float, default=1.0, help="Intervalo del control adaptativo")
+    parser.add_argument('--out', default=None)
+    parser.add_argument('--compare', default=None)
+    args = parser.parse_args()
+
+    politicas = [
+        ("fixed 2 jobs x 2 frags", 2, 2),
+        ("fixed 4 jobs x 4 frags", 4, 4),
+        ("fixed 16 jobs x 4 frags", 16, 4),
+    ]
+    resultados: Dict[str, Any] = {}
+    print(f"▶️  {len(FASES)} fases de {args.phase_seconds:.0f}s, {args.connection_bandwidth / MB:.1f} MB/s por conexión")
+    for nombre, jobs, fragmentos in politicas:
+        resultados[nombre] = simular(nombre, ConcurrenciaFija(), jobs, argparse.Namespace(**{**vars(args),
+                                                                                             'fragments': fragmentos}))
+    control = ControlAdaptativo(1, 32, intervalo=args.interval)
+    resultados["adaptive"] = simular("adaptive", control, args.workers, args)
+
+    ruta = guardar_resultados("adaptive", vars(args), resultados, args.out)
+    print(f"\n💾 Resultados guardados en {ruta}")
+    if args.compare:
+        comparar(resultados, args.compare)
+
+
+if __name__ == "__main__":
+    main()
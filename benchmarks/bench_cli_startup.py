@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Arranque de la CLI: coste de importación y llamadas repetidas con y sin servidor en el socket Unix
+Cada llamada es un proceso nuevo, como cuando un script invoca la CLI una vez por URL
+
+Uso:
+    python -m benchmarks.bench_cli_startup --calls 10 --size 65536
+"""
+
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import youtube_client
+from benchmarks.common import RAIZ, comparar, guardar_resultados, resumen_latencias
+from benchmarks.drivers import entorno_offline
+from benchmarks.media_server import MediaConfig, MediaServer
+
+CLI = str(RAIZ / "youtube_downloader.py")
+
+
+def cronometrar(comando: List[str], env: Dict[str, str], cwd: str) -> float:
+    inicio = time.perf_counter()
+    resultado = subprocess.run(comando, env=env, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    duracion = time.perf_counter() - inicio
+    if resultado.returncode != 0:
+        raise RuntimeError(f"{' '.join(comando)} terminó con {resultado.returncode}: "
+                           f"{resultado.stderr.decode(errors='replace')[-500:]}")
+    return duracion
+
+
+def medir_importaciones(calls: int, env: Dict[str, str], cwd: str) -> Dict[str, Any]:
+    """Tiempo de `import` de cada módulo en un intérprete nuevo, descontando el intérprete vacío"""
+    modulos = {"interpreter": "pass", "yt_dlp": "import yt_dlp",
+               "youtube_downloader": "import youtube_downloader",
+               "youtube_http_server": "import youtube_http_server"}
+    resultados = {}
+    for nombre, codigo in modulos.items():
+        resultados[nombre] = resumen_latencias(
+            [cronometrar([sys.executable, "-c", codigo], env, cwd) for _ in range(calls)])
+        print(f"▶️  {nombre}: p50={resultados[nombre]['p50_ms']}ms")
+    return resultados
+
+
+def esperar_daemon(ruta: Path, proceso: subprocess.Popen, timeout: float = 30.0):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"El servidor terminó con {proceso.returncode}")
+        if youtube_client.conectar(str(ruta)) is not None:
+            return
+        time.sleep(0.1)
+    raise TimeoutError(f"Nadie responde en {ruta} tras {timeout}s")
+
+
+def ejecutar(args) -> Dict[str, Any]:
+    with MediaServer(MediaConfig(size=args.size)) as media, tempfile.TemporaryDirectory() as cwd:
+        env = entorno_offline(media.base_url, args.size)
+        importaciones = medir_importaciones(args.calls, env, cwd)
+
+        # Sin servidor: cada llamada importa yt-dlp y carga los extractores
+        local = [cronometrar([sys.executable, "-m", "benchmarks.offline_server", "cli", "--no-daemon",
+                              "--no-progress", f"https://www.youtube.com/watch?v=local-{i:04d}"], env, cwd)
+                 for i in range(args.calls)]
+        local = resumen_latencias(local)
+        print(f"▶️  CLI en su proceso: p50={local['p50_ms']}ms p99={local['p99_ms']}ms")
+
+        # Con servidor: la CLI solo habla HTTP por el socket
+        socket_unix = Path(cwd) / "youtube-downloader.sock"
+        daemon = subprocess.Popen([sys.executable, "-m", "benchmarks.offline_server", "http",
+                                   "--serving", "production", "--workers", "1", "--unix-socket", str(socket_unix)],
+                                  env=env, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            esperar_daemon(socket_unix, daemon)
+            cliente = [cronometrar([sys.executable, CLI, "--socket", str(socket_unix), "--no-progress",
+                                    f"https://www.youtube.com/watch?v=daemon-{i:04d}"], env, cwd)
+                       for i in range(args.calls)]
+        finally:
+            daemon.terminate()
+            daemon.wait(30)
+        cliente = resumen_latencias(cliente)
+        print(f"▶️  CLI con servidor en el socket: p50={cliente['p50_ms']}ms p99={cliente['p99_ms']}ms")
+
+    aceleracion = round(local["p50_ms"] / cliente["p50_ms"], 2) if cliente["p50_ms"] else None
+    print(f"   📈 cada llamada x{aceleracion} más rápida con el servidor")
+    return {"imports": importaciones, "cli_local": local, "cli_daemon": cliente, "daemon_speedup": aceleracion}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arranque de la CLI con y sin servidor en el socket Unix")
+    parser.add_argument('--calls', type=int, default=10, help="Llamadas a la CLI por modo")
+    parser.add_argument('--size', type=int, default=64 * 1024)
+    parser.add_argument('--out', default=None)
+    parser.add_argument('--compare', default=None)
+    args = parser.parse_args()
+
+    resultados = ejecutar(args)
+    ruta = guardar_resultados("cli_startup", vars(args), resultados, args.out)
+    print(f"\n💾 Resultados guardados en {ruta}")
+    if args.compare:
+        comparar(resultados, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Coste por petición de los extractores de yt-dlp según el perfil de YOUTUBE_EXTRACTORS
+Cada perfil se mide en un intérprete nuevo: YoutubeDL nuevo y búsqueda del extractor de la URL
+
+Uso:
+    python -m benchmarks.bench_extractors --requests 200
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from typing import Any, Dict
+
+from benchmarks.common import RAIZ, comparar, guardar_resultados
+
+URLS = ("https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+        "https://www.youtube.com/playlist?list=PLrAXtmErZgOeiKm4sgNOknGvNjby9efdf",
+        "https://youtu.be/dQw4w9WgXcQ?list=PLrAXtmErZgOeiKm4sgNOknGvNjby9efdf")
+
+
+def rss_mb() -> float:
+    # ru_maxrss está en KB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def medir_perfil(perfil: str, peticiones: int) -> Dict[str, Any]:
+    """Lo que hace el motor en cada petición antes de tocar la red: crear YoutubeDL y elegir extractor"""
+    inicial = rss_mb()
+    from youtube_engine.engine import opciones_extractores
+    from youtube_engine.ytdlp import YoutubeDL
+    opciones = {**opciones_extractores(perfil), 'quiet': True, 'no_warnings': True}
+
+    def peticion(url: str) -> str:
+        with YoutubeDL(opciones) as ydl:
+            # Igual que extract_info: el primer extractor que acepta la URL
+            return next(clave for clave, ie in ydl._ies.items() if ie.suitable(url))
+
+    inicio = time.perf_counter()
+    elegidos = [peticion(url) for url in URLS]
+    primera = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for i in range(peticiones):
+        peticion(URLS[i % len(URLS)])
+    media = (time.perf_counter() - inicio) / peticiones
+    with YoutubeDL(opciones) as ydl:
+        registrados = len(ydl._ies)
+    return {"extractors": registrados, "chosen": elegidos, "first_ms": round(primera * 1000, 2),
+            "per_request_ms": round(media * 1000, 3), "rss_start_mb": round(inicial, 1),
+            "rss_peak_mb": round(rss_mb(), 1)}
+
+
+def ejecutar(args) -> Dict[str, Any]:
+    resultados: Dict[str, Any] = {}
+    for perfil in ('all', 'youtube'):
+        salida = subprocess.run([sys.executable, "-m", "benchmarks.bench_extractors", "--worker", perfil,
+                                 "--requests", str(args.requests)],
+                                cwd=RAIZ, capture_output=True, text=True, check=True).stdout
+        resultados[perfil] = json.loads(salida.strip().splitlines()[-1])
+        datos = resultados[perfil]
+        print(f"▶️  {perfil}: {datos['extractors']} extractores, primera={datos['first_ms']}ms "
+              f"por petición={datos['per_request_ms']}ms RSS pico={datos['rss_peak_mb']}MB")
+
+    if resultados['youtube']['chosen'] != resultados['all']['chosen']:
+        print(f"⚠️ Extractores distintos: {resultados['all']['chosen']} / {resultados['youtube']['chosen']}")
+    resultados["per_request_speedup"] = round(
+        resultados['all']['per_request_ms'] / resultados['youtube']['per_request_ms'], 1)
+    resultados["rss_saved_mb"] = round(resultados['all']['rss_peak_mb'] - resultados['youtube']['rss_peak_mb'], 1)
+    print(f"   📈 x{resultados['per_request_speedup']} por petición, {resultados['rss_saved_mb']} MB menos de RSS")
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extractores de yt-dlp: perfil youtube frente a todos")
+    parser.add_argument('--requests', type=int, default=200, help="Peticiones por perfil")
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--out', default=None)
+    parser.add_argument('--compare', default=None)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(medir_perfil(args.worker, args.requests)))
+        return
+
+    resultados = ejecutar(args)
+    ruta = guardar_resultados("extractors", vars(args), resultados, args.out)
+    print(f"\n💾 Resultados guardados en {ruta}")
+    if args.compare:
+        comparar(resultados, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Memoria por job y coste de las vistas de estado con tablas grandes de jobs
+Compara el dict original de cada job con el JobRecord compacto del store en memoria
+
+Uso:
+    python -m benchmarks.bench_job_memory --jobs 200000
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict
+
+from benchmarks.common import comparar, guardar_resultados
+from youtube_engine.jobs import JobRecord, nuevo_job, vista_estado, vista_resumen
+from youtube_engine.store import MemoryJobStore
+from youtube_profiling import FASES
+
+
+def job_terminado(i: int) -> dict:
+    """Un job completado tal y como queda tras ejecutarse en el motor"""
+    job = nuevo_job(f"https://www.youtube.com/watch?v=mem-{i:07d}", False)
+    inicio = datetime.fromisoformat(job['created_at'])
+    job.update(status='completed', title=f"Video sintético mem-{i:07d}", owner=4242,
+               started_at=(inicio + timedelta(seconds=1)).isoformat(),
+               completed_at=(inicio + timedelta(seconds=9)).isoformat(), downloaded_videos=1,
+               phase_timings={fase: 0.123 * n for n, fase in enumerate(FASES)})
+    return job
+
+
+def bytes_por_job(n: int, construir: Callable[[dict], Any]) -> float:
+    """Memoria que queda retenida por job al guardar `construir(job)` de `n` jobs nuevos"""
+    gc.collect()
+    tracemalloc.start()
+    antes = tracemalloc.get_traced_memory()[0]
+    tabla = [construir(job_terminado(i)) for i in range(n)]
+    gc.collect()
+    despues = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del tabla
+    return round((despues - antes) / n, 1)
+
+
+def cronometrar(funcion: Callable[[], Any], repeticiones: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones
+
+
+def ejecutar(args) -> Dict[str, Any]:
+    memoria = {
+        "dict": bytes_por_job(args.jobs, lambda job: job),
+        "record": bytes_por_job(args.jobs, JobRecord),
+        "record_with_status_view": bytes_por_job(args.jobs, lambda job: _con_vista(JobRecord(job))),
+    }
+    print(f"▶️  bytes por job: dict={memoria['dict']} JobRecord={memoria['record']} "
+          f"JobRecord+vista={memoria['record_with_status_view']}")
+
+    store = MemoryJobStore()
+    ids = []
+    for i in range(args.jobs):
+        job = job_terminado(i)
+        store.crear(job)
+        ids.append(job['job_id'])
+    ids = ids[:args.status_calls]
+
+    # Vista de estado: reconstruida en cada llamada (antes) o guardada hasta que el job cambia
+    estado_dict = cronometrar(lambda: [vista_estado(store.obtener(job_id)) for job_id in ids], 1)
+    estado_fria = cronometrar(lambda: [store.vista(job_id) for job_id in ids], 1)
+    estado_caliente = cronometrar(lambda: [store.vista(job_id) for job_id in ids], args.repeat)
+    listado_dict = cronometrar(lambda: [vista_resumen(job) for job in store.listar()], 1)
+    listado_frio = cronometrar(store.resumenes, 1)
+    listado_caliente = cronometrar(store.resumenes, args.repeat)
+
+    def us(segundos, n):
+        return round(segundos / n * 1e6, 3)
+
+    tiempos = {
+        "status_rebuilt_us": us(estado_dict, len(ids)),
+        "status_cold_us": us(estado_fria, len(ids)),
+        "status_cached_us": us(estado_caliente, len(ids)),
+        "list_rebuilt_ms": round(listado_dict * 1000, 2),
+        "list_cold_ms": round(listado_frio * 1000, 2),
+        "list_cached_ms": round(listado_caliente * 1000, 2),
+    }
+    print(f"▶️  status por job: reconstruido={tiempos['status_rebuilt_us']}µs "
+          f"primera vez={tiempos['status_cold_us']}µs en caché={tiempos['status_cached_us']}µs")
+    print(f"▶️  listado de {args.jobs} jobs: reconstruido={tiempos['list_rebuilt_ms']}ms "
+          f"primera vez={tiempos['list_cold_ms']}ms en caché={tiempos['list_cached_ms']}ms")
+    ahorro = round(1 - memoria['record'] / memoria['dict'], 3) if memoria['dict'] else None
+    print(f"   📉 {ahorro * 100:.1f}% menos memoria por job sin vistas en caché")
+    return {"bytes_per_job": memoria, "timings": tiempos, "memory_saving": ahorro}
+
+
+def _con_vista(registro: JobRecord) -> JobRecord:
+    registro.vista_estado()
+    return registro
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria por job y coste de las vistas de estado")
+    parser.add_argument('--jobs', type=int, default=200_000)
+    parser.add_argument('--status-calls', type=int, default=50_000, help="Jobs consultados por ronda de status")
+    parser.add_argument('--repeat', type=int, default=3, help="Rondas con las vistas ya en caché")
+    parser.add_argument('--out', default=None)
+    parser.add_argument('--compare', default=None)
+    args = parser.parse_args()
+
+    resultados = ejecutar(args)
+    ruta = guardar_resultados("job_memory", vars(args), resultados, args.out)
+    print(f"\n💾 Resultados guardados en {ruta}")
+    if args.compare:
+        comparar(resultados, args.compare)
+
+
+if __name__ == "__main__":
+    main()
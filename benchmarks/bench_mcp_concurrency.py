@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Latencia de get_download_status mientras hay extracciones de metadatos en curso
+Con herramientas bloqueantes el status hace cola tras cada extracción; con el servidor asíncrono no
+
+Uso:
+    python -m benchmarks.bench_mcp_concurrency --metadata-concurrency 8 --extract-latency 1.0 --duration 10
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List
+
+from benchmarks.common import MemorySampler, comparar, guardar_resultados, resumen_latencias
+from benchmarks.drivers import McpDriver, entorno_offline
+from benchmarks.media_server import MediaConfig, MediaServer
+
+
+async def sondear_status(driver: McpDriver, job_ids: List[str], fin: float, intervalo: float) -> Dict[str, Any]:
+    """Llama a get_download_status en bucle hasta `fin` y mide cada llamada"""
+    latencias, errores, n = [], 0, 0
+    while time.monotonic() < fin:
+        inicio = time.perf_counter()
+        _, error = await driver.status(job_ids[n % len(job_ids)])
+        latencias.append(time.perf_counter() - inicio)
+        errores += bool(error)
+        n += 1
+        if intervalo:
+            await asyncio.sleep(intervalo)
+    return {"errors": errores, **resumen_latencias(latencias)}
+
+
+async def oleadas_metadatos(driver: McpDriver, concurrencia: int, fin: float) -> Dict[str, Any]:
+    """Lanza `concurrencia` get_video_metadata a la vez, una oleada tras otra"""
+    oleadas, errores, n = [], 0, 0
+    while time.monotonic() < fin:
+        inicio = time.perf_counter()
+        respuestas = await asyncio.gather(*(
+            driver.metadata(f"https://www.youtube.com/watch?v=conc-{n + i:06d}") for i in range(concurrencia)))
+        oleadas.append(time.perf_counter() - inicio)
+        errores += sum(1 for _, error in respuestas if error)
+        n += concurrencia
+    return {"calls": n, "errors": errores, "wave": resumen_latencias(oleadas)}
+
+
+async def ejecutar(args) -> Dict[str, Any]:
+    with MediaServer(MediaConfig(size=args.size)) as media:
+        env = entorno_offline(media.base_url, args.size, args.extract_latency)
+        async with McpDriver(env) as driver:
+            with MemorySampler(driver.pid) as memoria:
+                # Unos jobs terminados sobre los que preguntar; la extracción
+                # del extractor falso también tarda extract_latency
+                job_ids = []
+                for i in range(args.jobs):
+                    datos, error = await driver.download_video(f"https://www.youtube.com/watch?v=seed-{i:04d}")
+                    if error:
+                        raise RuntimeError(f"No se pudo crear el job de prueba: {error}")
+                    job_ids.append(datos["job_id"])
+
+                fin = time.monotonic() + args.duration
+                reposo = await sondear_status(driver, job_ids, fin, args.interval)
+                print(f"▶️  status en reposo: p50={reposo['p50_ms']}ms p99={reposo['p99_ms']}ms")
+
+                fin = time.monotonic() + args.duration
+                carga, metadatos = await asyncio.gather(
+                    sondear_status(driver, job_ids, fin, args.interval),
+                    oleadas_metadatos(driver, args.metadata_concurrency, fin))
+                print(f"▶️  status con {args.metadata_concurrency} extracciones en curso: "
+                      f"p50={carga['p50_ms']}ms p99={carga['p99_ms']}ms")
+                print(f"   🎞️  oleada de metadatos: p50={metadatos['wave']['p50_ms']}ms "
+                      f"(una extracción tarda {args.extract_latency * 1000:.0f}ms)")
+
+    ralentizacion = round(carga["p99_ms"] / reposo["p99_ms"], 2) if reposo["p99_ms"] and carga["p99_ms"] else None
+    # Si las extracciones se serializaran, cada oleada duraría concurrencia x latencia
+    paralelismo = round(args.metadata_concurrency * args.extract_latency * 1000 / metadatos["wave"]["p50_ms"], 2) \
+        if metadatos["wave"]["p50_ms"] else None
+    print(f"   📈 p99 de status x{ralentizacion} bajo carga; paralelismo efectivo de metadatos {paralelismo}")
+    return {
+        "status_idle": reposo,
+        "status_under_metadata_load": carga,
+        "metadata": metadatos,
+        "status_p99_slowdown": ralentizacion,
+        "metadata_parallelism": paralelismo,
+        "memory": memoria.resumen(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrencia de herramientas del servidor MCP")
+    parser.add_argument('--metadata-concurrency', type=int, default=8)
+    parser.add_argument('--extract-latency', type=float, default=1.0, help="Segundos por extracción falsa")
+    parser.add_argument('--duration', type=float, default=10.0, help="Segundos por fase")
+    parser.add_argument('--interval', type=float, default=0.01, help="Pausa entre llamadas de status (s)")
+    parser.add_argument('--jobs', type=int, default=4, help="Jobs sobre los que preguntar el estado")
+    parser.add_argument('--size', type=int, default=64 * 1024)
+    parser.add_argument('--out', default=None)
+    parser.add_argument('--compare', default=None)
+    args = parser.parse_args()
+
+    resultados = asyncio.run(ejecutar(args))
+    ruta = guardar_resultados("mcp_concurrency", vars(args), resultados, args.out)
+    print(f"\n💾 Resultados guardados en {ruta}")
+    if args.compare:
+        comparar(resultados, args.compare)
+
+
+if __name__ == "__main__":
+    main()
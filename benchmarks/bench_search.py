@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Latencia del índice de búsqueda con muchos videos descargados
+Carga metadatos sintéticos en el índice FTS5 y mide consultas de texto, con filtros y sin texto
+
+Uso:
+    python -m benchmarks.bench_search --videos 1000000 --repeat 50
+"""
+
+import argparse
+import itertools
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from benchmarks.common import comparar, guardar_resultados, resumen_latencias
+from youtube_engine.search import IndiceBusqueda, validar_busqueda
+
+# Vocabulario con frecuencias de Zipf, como el texto real: unas pocas palabras muy comunes (las
+# primeras, que hacen de "de", "la"...), los TEMAS algo por detrás y decenas de miles de palabras raras
+TEMAS = ("lofi", "música", "directo", "tutorial", "python", "receta", "guitarra", "concierto", "noticias",
+         "partido", "resumen", "entrevista", "documental", "viaje", "cocina", "ciencia", "historia",
+         "juego", "análisis", "podcast", "piano", "jazz", "rock", "clase", "examen", "física")
+SILABAS = ("ba", "ce", "di", "fo", "gu", "la", "me", "ni", "po", "ru", "sa", "te", "vi", "zo", "tra", "pre")
+RARAS = [a + b + c + d for a in SILABAS for b in SILABAS for c in SILABAS for d in SILABAS[:8]]
+PALABRAS = tuple(RARAS[:50] + list(TEMAS) + RARAS[50:])
+PESOS = list(itertools.accumulate(1 / rango for rango in range(1, len(PALABRAS) + 1)))
+
+CONSULTAS = [
+    {"consulta": "lofi"},
+    {"consulta": "guitarra concierto"},
+    {"consulta": "pyth"},
+    {"consulta": "bacedifo"},
+    {"consulta": "piano vimesa"},
+    {"consulta": "receta", "orden": "date"},
+    {"consulta": "jazz", "duracion_min": 600},
+    {"consulta": "historia", "desde": "2020-01-01", "hasta": "2021-12-31"},
+    {"consulta": "lofi", "uploader": "canal-00042"},
+    {"uploader": "canal-00042"},
+    {},
+]
+
+
+def video_sintetico(i: int, azar: random.Random) -> dict:
+    titulo = " ".join(azar.choices(PALABRAS, cum_weights=PESOS, k=6))
+    return {
+        'video_id': f"vid{i:08d}",
+        'title': f"{titulo.capitalize()} #{i}",
+        'uploader': f"canal-{i % 5000:05d}",
+        'channel_id': f"UC{i % 5000:022d}",
+        'description': " ".join(azar.choices(PALABRAS, cum_weights=PESOS, k=40)),
+        'upload_date': f"{azar.randint(2010, 2024)}{azar.randint(1, 12):02d}{azar.randint(1, 28):02d}",
+        'duration': azar.randint(30, 7200),
+        'view_count': azar.randint(0, 10_000_000),
+        'webpage_url': f"https://www.youtube.com/watch?v=vid{i:08d}",
+    }
+
+
+def cargar(indice: IndiceBusqueda, videos: int, lote: int = 10_000) -> float:
+    azar = random.Random(42)
+    inicio = time.perf_counter()
+    for desde in range(0, videos, lote):
+        indice.indexar([video_sintetico(i, azar) for i in range(desde, min(desde + lote, videos))],
+                       job_id=f"job-{desde}")
+    indice.optimizar()
+    return time.perf_counter() - inicio
+
+
+def ejecutar(args) -> Dict[str, Any]:
+    resultados: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as carpeta:
+        indice = IndiceBusqueda(Path(carpeta) / "search.sqlite3")
+        segundos = cargar(indice, args.videos)
+        resultados["load_seconds"] = round(segundos, 2)
+        resultados["load_videos_per_s"] = round(args.videos / segundos)
+        print(f"▶️  {args.videos} videos indexados en {segundos:.1f}s")
+
+        consultas: Dict[str, Any] = {}
+        for consulta in CONSULTAS:
+            parametros = validar_busqueda(**{clave: valor for clave, valor in {
+                'consulta': consulta.get('consulta'), 'uploader': consulta.get('uploader'),
+                'desde': consulta.get('desde'), 'hasta': consulta.get('hasta'),
+                'duracion_min': consulta.get('duracion_min'), 'orden': consulta.get('orden')}.items()})
+            nombre = " ".join(f"{clave}={valor}" for clave, valor in consulta.items()) or "sin filtros"
+            indice.buscar(**parametros)
+            tiempos: List[float] = []
+            for _ in range(args.repeat):
+                inicio = time.perf_counter()
+                indice.buscar(**parametros)
+                tiempos.append(time.perf_counter() - inicio)
+            consultas[nombre] = resumen_latencias(tiempos)
+            print(f"   {nombre}: p50={consultas[nombre]['p50_ms']}ms p99={consultas[nombre]['p99_ms']}ms")
+        resultados["queries"] = consultas
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de /search con muchos videos indexados")
+    parser.add_argument('--videos', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=50, help="Repeticiones de cada consulta")
+    parser.add_argument('--out', default=None)
+    parser.add_argument('--compare', default=None)
+    args = parser.parse_args()
+
+    resultados = ejecutar(args)
+    ruta = guardar_resultados("search", vars(args), resultados, args.out)
+    print(f"\n💾 Resultados guardados en {ruta}")
+    if args.compare:
+        comparar(resultados, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Coste de codificar /status y /downloads con tablas grandes de jobs
+Compara jsonify sobre dicts nuevos con el JSON por job en caché, con json y con orjson
+
+Uso:
+    python -m benchmarks.bench_serialization --jobs 10000 --repeat 20
+"""
+
+import argparse
+import tempfile
+import time
+from typing import Any, Callable, Dict
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from benchmarks.bench_job_memory import job_terminado
+from benchmarks.common import comparar, guardar_resultados
+from youtube_engine import DownloadEngine, MemoryJobStore, ThreadScheduler, serializer
+
+
+def cronometrar(funcion: Callable[[], Any], repeticiones: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones
+
+
+def crear_motor(jobs: int, carpeta: str) -> DownloadEngine:
+    motor = DownloadEngine(store=MemoryJobStore(), scheduler=ThreadScheduler(), carpeta=carpeta)
+    for i in range(jobs):
+        motor.store.crear(job_terminado(i))
+    return motor
+
+
+def medir(motor: DownloadEngine, repeticiones: int) -> Dict[str, float]:
+    ids = [job['job_id'] for job in motor.store.listar()]
+    frio = cronometrar(motor.listado_json, 1)
+    caliente = cronometrar(motor.listado_json, repeticiones)
+    estado_frio = cronometrar(lambda: [motor.estado_json(job_id) for job_id in ids], 1) / len(ids)
+    estado = cronometrar(lambda: [motor.estado_json(job_id) for job_id in ids], repeticiones) / len(ids)
+    return {"list_cold_ms": round(frio * 1000, 3), "list_cached_ms": round(caliente * 1000, 3),
+            "status_cold_us": round(estado_frio * 1e6, 3), "status_cached_us": round(estado * 1e6, 3)}
+
+
+def ejecutar(args) -> Dict[str, Any]:
+    jsonify = DefaultJSONProvider(Flask("bench")).dumps
+    resultados: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as carpeta:
+        # Antes: cada petición rehace los dicts y jsonify los codifica (claves ordenadas, ASCII)
+        motor = crear_motor(args.jobs, carpeta)
+        ids = [job['job_id'] for job in motor.store.listar()]
+        lista = cronometrar(lambda: jsonify(motor.listado()), args.repeat)
+        estado = cronometrar(lambda: [jsonify(motor.estado(job_id)) for job_id in ids], 1) / len(ids)
+        resultados["jsonify"] = {"list_ms": round(lista * 1000, 3), "status_us": round(estado * 1e6, 3)}
+        print(f"▶️  jsonify: listado={resultados['jsonify']['list_ms']}ms status={resultados['jsonify']['status_us']}µs")
+
+        for nombre in args.backends.split(','):
+            try:
+                serializer.SERIALIZER = serializer.crear_serializer(nombre)
+            except ImportError:
+                print(f"⚠️ {nombre} no está instalado")
+                continue
+            resultados[nombre] = medir(crear_motor(args.jobs, carpeta), args.repeat)
+            print(f"▶️  {nombre}: listado primera vez={resultados[nombre]['list_cold_ms']}ms "
+                  f"en caché={resultados[nombre]['list_cached_ms']}ms "
+                  f"status primera vez={resultados[nombre]['status_cold_us']}µs "
+                  f"en caché={resultados[nombre]['status_cached_us']}µs")
+
+    mejor = min((datos["list_cached_ms"] for nombre, datos in resultados.items() if nombre != "jsonify"),
+                default=None)
+    if mejor:
+        resultados["list_speedup"] = round(resultados["jsonify"]["list_ms"] / mejor, 1)
+        print(f"   📈 listado x{resultados['list_speedup']} más rápido con el JSON en caché")
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serialización de /status y /downloads")
+    parser.add_argument('--jobs', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=20, help="Listados por medición")
+    parser.add_argument('--backends', default='json,orjson')
+    parser.add_argument('--out', default=None)
+    parser.add_argument('--compare', default=None)
+    args = parser.parse_args()
+
+    resultados = ejecutar(args)
+    ruta = guardar_resultados("serialization", vars(args), resultados, args.out)
+    print(f"\n💾 Resultados guardados en {ruta}")
+    if args.compare:
+        comparar(resultados, args.compare)
+
+
+if __name__ == "__main__":
+    main()
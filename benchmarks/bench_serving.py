@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Compara el servidor de desarrollo con el modo de producción
+Misma carga en lazo abierto contra app.run(debug=True) y contra youtube_serving
+
+Uso:
+    python -m benchmarks.bench_serving --sweep 20,50,100,200 --workers 4 --threads 8
+"""
+
+import argparse
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+from benchmarks.common import MemorySampler, comparar, guardar_resultados
+from benchmarks.drivers import HttpDriver, entorno_offline
+from benchmarks.load_test import MEZCLA_POR_DEFECTO, Carga, encontrar_rodilla, lazo_abierto, parsear_mezcla
+from benchmarks.media_server import MediaConfig, MediaServer
+
+
+def comando(modo: str, args) -> list:
+    base = [sys.executable, "-m", "benchmarks.offline_server", "http", "--port", "{port}", "--serving", modo]
+    if modo == "production":
+        base += ["--workers", str(args.workers), "--threads", str(args.threads)]
+    return base
+
+
+async def ejecutar(args) -> Dict[str, Any]:
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(args.max_inflight))
+    mezcla = parsear_mezcla(args.mix)
+    resultados: Dict[str, Any] = {}
+    with MediaServer(MediaConfig(size=args.size)) as media:
+        env = entorno_offline(media.base_url, args.size)
+        for modo in ("dev", "production"):
+            async with HttpDriver(env, command=comando(modo, args)) as driver:
+                with MemorySampler(driver.pid) as memoria:
+                    pasos = []
+                    for tasa in args.sweep:
+                        carga = Carga(driver, mezcla, args.seed, 3)
+                        resultado = await lazo_abierto(carga, tasa, args.duration, args.max_inflight)
+                        pasos.append({"rate": tasa, "result": resultado})
+                        print(f"▶️  {modo} {tasa}/s: {resultado['throughput']} req/s, "
+                              f"p50={resultado['latency']['p50_ms']}ms p99={resultado['latency']['p99_ms']}ms, "
+                              f"errores={resultado['error_rate']}")
+                rodilla = encontrar_rodilla(pasos, args.slo_p99_ms, args.max_error_rate)
+                print(f"   📈 {modo}: rodilla de saturación en {rodilla['knee_rate']} req/s")
+                # Con gunicorn la memoria medida es la del master; los workers son procesos hijos
+                resultados[modo] = {"open_loop": pasos, **rodilla, "memory": memoria.resumen()}
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de desarrollo frente a modo producción")
+    parser.add_argument('--sweep', type=lambda s: [float(x) for x in s.split(",")], default=[20, 50, 100, 200])
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--mix', default=MEZCLA_POR_DEFECTO)
+    parser.add_argument('--size', type=int, default=128 * 1024)
+    parser.add_argument('--max-inflight', type=int, default=256)
+    parser.add_argument('--slo-p99-ms', type=float, default=1000.0)
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', default=None)
+    parser.add_argument('--compare', default=None)
+    args = parser.parse_args()
+
+    resultados = asyncio.run(ejecutar(args))
+    ruta = guardar_resultados("serving", vars(args), resultados, args.out)
+    print(f"\n💾 Resultados guardados en {ruta}")
+    if args.compare:
+        comparar(resultados, args.compare)
+
+
+if __name__ == "__main__":
+    main()
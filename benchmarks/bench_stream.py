@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Tiempo hasta el primer byte de /stream frente a descargar el video y después pedirlo
+También mide la memoria del servidor mientras un cliente lento lee un video grande
+
+Uso:
+    python -m benchmarks.bench_stream --size 33554432 --bandwidth 8388608 --slow-rate 1048576
+"""
+
+import argparse
+import subprocess
+import tempfile
+import time
+import urllib.request
+from typing import Any, Dict
+
+from benchmarks.common import (MemorySampler, comparar, esperar_puerto, guardar_resultados, http_json,
+                               puerto_libre)
+from benchmarks.drivers import entorno_offline
+from benchmarks.mcp_stdio import comando_servidor_offline
+from benchmarks.media_server import MediaConfig, MediaServer
+
+BLOQUE = 64 * 1024
+
+
+def descargar_y_pedir(base: str, video: str) -> Dict[str, float]:
+    """Flujo anterior: crear el job, esperar a que termine y solo entonces hay bytes"""
+    inicio = time.perf_counter()
+    _, job = http_json("POST", f"{base}/download_video", {"url": f"https://www.youtube.com/watch?v={video}"})
+    while True:
+        _, estado = http_json("GET", f"{base}/status/{job['job_id']}")
+        if estado['status'] in ('completed', 'failed', 'cancelled'):
+            break
+        time.sleep(0.05)
+    total = time.perf_counter() - inicio
+    return {"first_byte_s": round(total, 3), "total_s": round(total, 3)}
+
+
+def leer_stream(base: str, video: str, ritmo: float = 0.0) -> Dict[str, float]:
+    """Lee /stream/<video> entero; con `ritmo` (bytes/seg) simula un cliente lento"""
+    inicio = time.perf_counter()
+    primer_byte = None
+    leidos = 0
+    with urllib.request.urlopen(f"{base}/stream/{video}", timeout=60) as respuesta:
+        while True:
+            bloque = respuesta.read(BLOQUE)
+            if not bloque:
+                break
+            if primer_byte is None:
+                primer_byte = time.perf_counter() - inicio
+            leidos += len(bloque)
+            if ritmo:
+                # Sin leer del socket el servidor no puede enviar más
+                espera = leidos / ritmo - (time.perf_counter() - inicio)
+                if espera > 0:
+                    time.sleep(espera)
+    return {"first_byte_s": round(primer_byte or 0, 3), "total_s": round(time.perf_counter() - inicio, 3),
+            "bytes": leidos}
+
+
+def ejecutar(args) -> Dict[str, Any]:
+    resultados: Dict[str, Any] = {}
+    with MediaServer(MediaConfig(size=args.size, bandwidth=args.bandwidth)) as media, \
+            tempfile.TemporaryDirectory() as cwd:
+        env = entorno_offline(media.base_url, args.size)
+        puerto = puerto_libre()
+        servidor = subprocess.Popen(comando_servidor_offline("http", "--port", str(puerto)), cwd=cwd, env=env,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        base = f"http://127.0.0.1:{puerto}"
+        try:
+            esperar_puerto("127.0.0.1", puerto)
+            resultados["download_then_fetch"] = descargar_y_pedir(base, "bench-desc-0001")
+            print(f"▶️  descargar y pedir: primer byte a los {resultados['download_then_fetch']['first_byte_s']}s")
+            resultados["stream"] = leer_stream(base, "bench-stream-001")
+            print(f"▶️  /stream: primer byte a los {resultados['stream']['first_byte_s']}s, "
+                  f"completo en {resultados['stream']['total_s']}s")
+
+            # Cliente lento: el servidor solo debe retener unos bloques, no el video
+            with MemorySampler(servidor.pid, 0.1) as memoria:
+                resultados["slow_client"] = leer_stream(base, "bench-lento-001", args.slow_rate)
+            resultados["slow_client"].update(memoria.resumen())
+            crecimiento = (memoria.pico - (memoria.inicial or 0)) / (1024 * 1024)
+            resultados["slow_client"]["rss_growth_mb"] = round(crecimiento, 2)
+            print(f"▶️  cliente lento a {args.slow_rate / 1e6:.1f} MB/s: {resultados['slow_client']['total_s']}s, "
+                  f"RSS del servidor +{crecimiento:.2f} MB para un video de "
+                  f"{resultados['slow_client']['bytes'] / 1e6:.0f} MB")
+        finally:
+            servidor.terminate()
+            servidor.wait(30)
+
+    if resultados["stream"]["first_byte_s"]:
+        resultados["first_byte_speedup"] = round(
+            resultados["download_then_fetch"]["first_byte_s"] / resultados["stream"]["first_byte_s"], 1)
+        print(f"   📈 primer byte x{resultados['first_byte_speedup']} antes con /stream")
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming de /stream frente a descargar y pedir")
+    parser.add_argument('--size', type=int, default=32 * 1024 * 1024,
+                        help="Tamaño base del extractor falso (el formato de 720p es la mitad)")
+    parser.add_argument('--bandwidth', type=float, default=8 * 1024 * 1024, help="Bytes/seg del servidor de medios")
+    parser.add_argument('--slow-rate', type=float, default=1024 * 1024, help="Bytes/seg que lee el cliente lento")
+    parser.add_argument('--out', default=None)
+    parser.add_argument('--compare', default=None)
+    args = parser.parse_args()
+
+    resultados = ejecutar(args)
+    ruta = guardar_resultados("stream", vars(args), resultados, args.out)
+    print(f"\n💾 Resultados guardados en {ruta}")
+    if args.compare:
+        comparar(resultados, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Utilidades compartidas por los benchmarks
+Percentiles, memoria de procesos, clientes HTTP y resultados en JSON
+"""
+
+import json
+import math
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+RAIZ = Path(__file__).resolve().parent.parent
+RESULTADOS = Path(__file__).resolve().parent / "results"
+
+
+def percentil(valores: List[float], p: float) -> Optional[float]:
+    """Percentil por rango más cercano; None si no hay datos"""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    indice = max(math.ceil(p / 100 * len(ordenados)) - 1, 0)
+    return ordenados[indice]
+
+
+def resumen_latencias(segundos: Iterable[float]) -> Dict[str, Optional[float]]:
+    """p50/p90/p99/media/máximo en milisegundos"""
+    valores = list(segundos)
+    if not valores:
+        return {"count": 0, "p50_ms": None, "p90_ms": None, "p99_ms": None, "mean_ms": None, "max_ms": None}
+
+    def ms(v):
+        return round(v * 1000, 3)
+
+    return {
+        "count": len(valores),
+        "p50_ms": ms(percentil(valores, 50)),
+        "p90_ms": ms(percentil(valores, 90)),
+        "p99_ms": ms(percentil(valores, 99)),
+        "mean_ms": ms(sum(valores) / len(valores)),
+        "max_ms": ms(max(valores)),
+    }
+
+
+def leer_rss(pid: int) -> Tuple[Optional[int], Optional[int]]:
+    """(RSS actual, pico de RSS) en bytes leídos de /proc; None fuera de Linux"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            campos = dict(linea.split(":", 1) for linea in f if ":" in linea)
+        return (int(campos["VmRSS"].split()[0]) * 1024, int(campos["VmHWM"].split()[0]) * 1024)
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+class MemorySampler:
+    """Muestrea el RSS de un proceso en segundo plano y guarda el pico"""
+
+    def __init__(self, pid: int, intervalo: float = 0.2):
+        self.pid = pid
+        self.intervalo = intervalo
+        self.pico = 0
+        self.inicial, _ = leer_rss(pid)
+        self.final = None
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._bucle, daemon=True)
+
+    def _bucle(self):
+        while not self._parar.is_set():
+            rss, hwm = leer_rss(self.pid)
+            if rss is not None:
+                self.pico = max(self.pico, rss, hwm or 0)
+                self.final = rss
+            self._parar.wait(self.intervalo)
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._hilo.join()
+
+    def resumen(self) -> Dict[str, Optional[float]]:
+        def mb(v):
+            return round(v / (1024 * 1024), 2) if v else None
+        return {"rss_start_mb": mb(self.inicial), "rss_end_mb": mb(self.final), "rss_peak_mb": mb(self.pico)}
+
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def esperar_puerto(host: str, port: int, timeout: float = 30.0):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"{host}:{port} no respondió en {timeout}s")
+
+
+def http_json(method: str, url: str, body: Optional[Dict[str, Any]] = None,
+              timeout: float = 30.0) -> Tuple[int, Any]:
+    """Petición HTTP con cuerpo y respuesta JSON usando solo la biblioteca estándar"""
+    data = json.dumps(body).encode() if body is not None else None
+    peticion = urllib.request.Request(url, data=data, method=method,
+                                      headers={"Content-Type": "application/json"} if data else {})
+    try:
+        with urllib.request.urlopen(peticion, timeout=timeout) as respuesta:
+            contenido = respuesta.read()
+            codigo = respuesta.status
+    except urllib.error.HTTPError as e:
+        contenido = e.read()
+        codigo = e.code
+    try:
+        return codigo, json.loads(contenido) if contenido else None
+    except ValueError:
+        return codigo, contenido.decode(errors="replace")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def guardar_resultados(nombre: str, parametros: Dict[str, Any], resultados: Dict[str, Any],
+                       salida: Optional[Path] = None) -> Path:
+    """Escribe un JSON con metadatos del entorno para poder comparar ejecuciones"""
+    salida = Path(salida) if salida else RESULTADOS
+    salida.mkdir(parents=True, exist_ok=True)
+    marca = datetime.now().strftime("%Y%m%d-%H%M%S")
+    ruta = salida / f"{nombre}-{marca}.json"
+    documento = {
+        "benchmark": nombre,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "params": parametros,
+        "results": resultados,
+    }
+    ruta.write_text(json.dumps(documento, indent=2, ensure_ascii=False), encoding="utf-8")
+    return ruta
+
+
+def _aplanar(datos: Any, prefijo: str = "") -> Dict[str, float]:
+    planos = {}
+    if isinstance(datos, dict):
+        for clave, valor in datos.items():
+            planos.update(_aplanar(valor, f"{prefijo}.{clave}" if prefijo else str(clave)))
+    elif isinstance(datos, (int, float)) and not isinstance(datos, bool):
+        planos[prefijo] = float(datos)
+    return planos
+
+
+def comparar(actual: Dict[str, Any], anterior_path: Path):
+    """Imprime las diferencias numéricas respecto a un resultado anterior"""
+    anterior = json.loads(Path(anterior_path).read_text(encoding="utf-8"))
+    nuevos = _aplanar(actual)
+    viejos = _aplanar(anterior.get("results", {}))
+    print(f"\n📊 Comparación con {anterior_path} ({anterior.get('git_commit')})")
+    for clave in sorted(set(nuevos) & set(viejos)):
+        antes, ahora = viejos[clave], nuevos[clave]
+        cambio = f"{(ahora - antes) / antes * 100:+.1f}%" if antes else "n/a"
+        print(f"   {clave:<50} {antes:>12.3f} → {ahora:>12.3f}  ({cambio})")
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Drivers asíncronos para hablar con los servidores del descargador
+Misma interfaz para el servidor HTTP y el servidor MCP, lanzados offline en subproceso
+"""
+
+import asyncio
+import os
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks import fake_extractor
+from benchmarks.common import RAIZ, esperar_puerto, http_json, puerto_libre
+from benchmarks.mcp_stdio import McpError, McpStdioClient, comando_servidor_offline
+
+ESTADOS_FINALES = {"completed", "failed", "cancelled"}
+
+
+def entorno_offline(media_url: str, size: int, extract_latency: float = 0.0,
+                    extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Variables de entorno para un servidor con el extractor falso"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(RAIZ), env.get("PYTHONPATH")]))
+    env[fake_extractor.ENV_MEDIA_URL] = media_url
+    env[fake_extractor.ENV_MEDIA_SIZE] = str(size)
+    env[fake_extractor.ENV_EXTRACT_LATENCY] = str(extract_latency)
+    env.update(extra or {})
+    return env
+
+
+class Driver:
+    """Interfaz común; cada llamada devuelve (datos, error)"""
+
+    name = "base"
+    pid: Optional[int] = None
+
+    async def start(self):
+        raise NotImplementedError
+
+    async def close(self):
+        raise NotImplementedError
+
+    async def download_video(self, url: str, quality: str = "720p") -> Tuple[Any, Optional[str]]:
+        raise NotImplementedError
+
+    async def download_playlist(self, url: str, quality: str = "720p") -> Tuple[Any, Optional[str]]:
+        raise NotImplementedError
+
+    async def status(self, job_id: str) -> Tuple[Any, Optional[str]]:
+        raise NotImplementedError
+
+    async def list_downloads(self) -> Tuple[Any, Optional[str]]:
+        raise NotImplementedError
+
+    async def metadata(self, url: str) -> Tuple[Any, Optional[str]]:
+        raise NotImplementedError
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+class HttpDriver(Driver):
+    """Servidor HTTP en subproceso; las peticiones van por hilos del executor del loop"""
+
+    name = "http"
+
+    def __init__(self, env: Dict[str, str], command: Optional[List[str]] = None,
+                 base_url: Optional[str] = None, workdir: Optional[str] = None):
+        self.env = env
+        self.port = puerto_libre()
+        self.command = command or comando_servidor_offline("http", "--port", str(self.port))
+        self.base_url = base_url or f"http://127.0.0.1:{self.port}"
+        self.workdir = workdir
+        self._tmp = None
+        self.process: Optional[subprocess.Popen] = None
+
+    async def start(self):
+        if self.workdir is None:
+            self._tmp = tempfile.TemporaryDirectory(prefix="yt-bench-")
+            self.workdir = self._tmp.name
+        self.process = subprocess.Popen([c.replace("{port}", str(self.port)) for c in self.command],
+                                        cwd=self.workdir, env=self.env,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.pid = self.process.pid
+        await asyncio.to_thread(esperar_puerto, "127.0.0.1", self.port)
+        return self
+
+    async def close(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                await asyncio.to_thread(self.process.wait, 30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self._tmp:
+            self._tmp.cleanup()
+
+    async def _llamar(self, method: str, path: str, body: Optional[Dict[str, Any]] = None):
+        try:
+            codigo, datos = await asyncio.to_thread(http_json, method, self.base_url + path, body)
+        except OSError as e:
+            return None, f"{type(e).__name__}: {e}"
+        if codigo >= 400 or (isinstance(datos, dict) and "error" in datos):
+            return datos, (datos.get("error") if isinstance(datos, dict) else None) or f"HTTP {codigo}"
+        return datos, None
+
+    async def download_video(self, url, quality="720p"):
+        return await self._llamar("POST", "/download_video", {"url": url, "quality": quality})
+
+    async def download_playlist(self, url, quality="720p"):
+        return await self._llamar("POST", "/download_playlist", {"url": url, "quality": quality})
+
+    async def status(self, job_id):
+        return await self._llamar("GET", f"/status/{job_id}")
+
+    async def list_downloads(self):
+        return await self._llamar("GET", "/downloads")
+
+    async def metadata(self, url):
+        return await self._llamar("POST", "/metadata", {"url": url})
+
+
+class McpDriver(Driver):
+    """Servidor MCP en subproceso hablando JSON-RPC por stdio"""
+
+    name = "mcp"
+
+    def __init__(self, env: Dict[str, str], command: Optional[List[str]] = None,
+                 workdir: Optional[str] = None):
+        self.env = env
+        self.command = command or comando_servidor_offline("mcp")
+        self.workdir = workdir
+        self._tmp = None
+        self.client: Optional[McpStdioClient] = None
+
+    async def start(self):
+        if self.workdir is None:
+            self._tmp = tempfile.TemporaryDirectory(prefix="yt-bench-")
+            self.workdir = self._tmp.name
+        self.client = McpStdioClient(self.command, cwd=self.workdir, env=self.env)
+        await self.client.start()
+        self.pid = self.client.pid
+        return self
+
+    async def close(self):
+        if self.client:
+            await self.client.close()
+        if self._tmp:
+            self._tmp.cleanup()
+
+    async def _tool(self, name: str, arguments: Optional[Dict[str, Any]] = None):
+        try:
+            datos = await self.client.call_tool(name, arguments)
+        except McpError as e:
+            return None, str(e)
+        if isinstance(datos, dict) and "error" in datos:
+            return datos, datos["error"]
+        return datos, None
+
+    async def download_video(self, url, quality="720p"):
+        return await self._tool("download_video", {"url": url, "quality": quality})
+
+    async def download_playlist(self, url, quality="720p"):
+        return await self._tool("download_playlist", {"url": url, "quality": quality})
+
+    async def status(self, job_id):
+        return await self._tool("get_download_status", {"job_id": job_id})
+
+    async def list_downloads(self):
+        return await self._tool("list_downloads")
+
+    async def metadata(self, url):
+        return await self._tool("get_video_metadata", {"url": url})
+
+
+def crear_driver(target: str, env: Dict[str, str], workdir: Optional[str] = None) -> Driver:
+    if target == "http":
+        return HttpDriver(env, workdir=workdir)
+    if target == "mcp":
+        return McpDriver(env, workdir=workdir)
+    raise ValueError(f"Destino desconocido: {target}")
+
+
+def carpeta_descargas(driver: Driver) -> Path:
+    return Path(driver.workdir) / "download"
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Extractor falso de yt-dlp para los benchmarks
+Devuelve info dicts y playlists sintéticos cuyos formatos apuntan al servidor de medios local
+"""
+
+import os
+import re
+import time
+
+from yt_dlp import YoutubeDL
+from yt_dlp.extractor.common import InfoExtractor
+
+# Variables de entorno que usan los lanzadores en subproceso
+ENV_MEDIA_URL = "BENCH_MEDIA_URL"
+ENV_MEDIA_SIZE = "BENCH_MEDIA_SIZE"
+ENV_EXTRACT_LATENCY = "BENCH_EXTRACT_LATENCY"
+
+PLAYLIST_POR_DEFECTO = 3
+
+
+class FakeYoutubeIE(InfoExtractor):
+    """Imita a YoutubeIE/YoutubeTabIE sin tocar la red de YouTube.
+
+    - watch?v=<id> y youtu.be/<id> devuelven un video con formatos 18/22/137/140
+    - playlist?list=<id>-<n> devuelve una playlist de n videos (3 si no se indica)
+    """
+
+    IE_NAME = 'Youtube'
+    _VALID_URL = (r'https?://(?:(?:www|m)\.)?(?:youtube\.com/(?:watch\?(?P<query>.+)|playlist\?list=(?P<lista>[\w-]+))'
+                  r'|youtu\.be/(?P<corto>[\w-]+))')
+
+    def __init__(self, downloader=None, media_url=None, size=None, extract_latency=None):
+        super().__init__(downloader)
+        self.media_url = (media_url or os.environ.get(ENV_MEDIA_URL, "http://127.0.0.1:8765")).rstrip('/')
+        self.size = int(size if size is not None else os.environ.get(ENV_MEDIA_SIZE, 2 * 1024 * 1024))
+        self.extract_latency = float(extract_latency if extract_latency is not None
+                                     else os.environ.get(ENV_EXTRACT_LATENCY, 0))
+
+    @classmethod
+    def ie_key(cls):
+        return 'Youtube'
+
+    def _real_extract(self, url):
+        if self.extract_latency:
+            time.sleep(self.extract_latency)
+
+        m = self._match_valid_url(url)
+        lista = m.group('lista')
+        video_id = m.group('corto')
+        if m.group('query'):
+            parametros = dict(re.findall(r'(\w+)=([\w-]+)', m.group('query')))
+            video_id = parametros.get('v')
+            if parametros.get('list') and not self.get_param('noplaylist'):
+                lista = parametros['list']
+
+        if lista:
+            return self._playlist(lista)
+        return self._video(video_id)
+
+    def _playlist(self, lista):
+        cantidad = PLAYLIST_POR_DEFECTO
+        sufijo = re.search(r'-(\d+)$', lista)
+        if sufijo:
+            cantidad = int(sufijo.group(1))
+        entries = [self.url_result(f'https://www.youtube.com/watch?v={lista}-{i:04d}', FakeYoutubeIE)
+                   for i in range(1, cantidad + 1)]
+        return self.playlist_result(entries, lista, f'Playlist sintética {lista}',
+                                    playlist_count=cantidad, uploader='Canal Benchmark')
+
+    def _video(self, video_id):
+        base = f'{self.media_url}/media/{video_id}'
+
+        def formato(format_id, fraccion, **extra):
+            size = max(int(self.size * fraccion), 1)
+            return {'format_id': format_id, 'url': f'{base}/{format_id}?size={size}',
+                    'filesize': size, 'protocol': 'http', **extra}
+
+        return {
+            'id': video_id,
+            'title': f'Video sintético {video_id}',
+            'uploader': 'Canal Benchmark',
+            'channel': 'Canal Benchmark',
+            'uploader_id': '@benchmark',
+            'description': 'Video generado para benchmarks offline. ' * 4,
+            'upload_date': '20240101',
+            'duration': 213,
+            'view_count': 1000,
+            'webpage_url': f'https://www.youtube.com/watch?v={video_id}',
+            'thumbnail': f'{self.media_url}/thumb/{video_id}.jpg?size=20000',
+            'thumbnails': [{'id': '0', 'url': f'{self.media_url}/thumb/{video_id}.jpg?size=20000'}],
+            'subtitles': {'es': [{'ext': 'vtt', 'url': f'{self.media_url}/subs/{video_id}.vtt?size=2000'}]},
+            'formats': [
+                formato('18', 0.25, ext='mp4', width=640, height=360, vcodec='avc1.42001E',
+                        acodec='mp4a.40.2', tbr=500),
+                formato('22', 0.5, ext='mp4', width=1280, height=720, vcodec='avc1.64001F',
+                        acodec='mp4a.40.2', tbr=1500),
+                formato('137', 1.0, ext='mp4', width=1920, height=1080, vcodec='avc1.640028',
+                        acodec='none', tbr=4000),
+                formato('140', 0.125, ext='m4a', vcodec='none', acodec='mp4a.40.2', abr=128, tbr=128),
+            ],
+        }
+
+
+class FakeYoutubeDL(YoutubeDL):
+    """YoutubeDL que solo conoce el extractor falso"""
+
+    def __init__(self, params=None, auto_init=True):
+        super().__init__(params, auto_init=False)
+        self.add_info_extractor(FakeYoutubeIE())
+
+
+def instalar():
+    """Sustituye `YoutubeDL` en la integración del motor con yt-dlp por la versión offline.
+
+    El motor es el único que crea instancias de YoutubeDL, así que la CLI y
+    los dos servidores pasan a usar el extractor falso.
+    """
+    from youtube_engine import ytdlp
+    ytdlp.YoutubeDL = FakeYoutubeDL
+    return ytdlp
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Generador de carga para las APIs HTTP y MCP del descargador
+Reproduce una mezcla configurable de llamadas en lazo abierto (llegadas de Poisson) o cerrado
+
+Uso:
+    python -m benchmarks.load_test --target http --mode open --sweep 5,10,20,40,80 --duration 20
+    python -m benchmarks.load_test --target mcp --mode closed --users 16 --duration 30
+    python -m benchmarks.load_test --mix download=0.1,status=0.6,list=0.2,metadata=0.1
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from benchmarks.common import MemorySampler, comparar, guardar_resultados, resumen_latencias
+from benchmarks.drivers import Driver, crear_driver, entorno_offline
+from benchmarks.media_server import MediaConfig, MediaServer
+
+OPERACIONES = ("download", "playlist", "status", "list", "metadata")
+MEZCLA_POR_DEFECTO = "download=0.15,playlist=0.05,status=0.55,list=0.15,metadata=0.10"
+
+
+def parsear_mezcla(texto: str) -> Dict[str, float]:
+    """'download=0.2,status=0.8' -> pesos normalizados"""
+    mezcla = {}
+    for parte in filter(None, (p.strip() for p in texto.split(","))):
+        nombre, _, peso = parte.partition("=")
+        if nombre not in OPERACIONES:
+            raise ValueError(f"Operación desconocida en la mezcla: {nombre}")
+        mezcla[nombre] = float(peso or 1)
+    total = sum(mezcla.values())
+    if total <= 0:
+        raise ValueError("La mezcla necesita al menos un peso positivo")
+    return {nombre: peso / total for nombre, peso in mezcla.items()}
+
+
+class Carga:
+    """Estado de una ejecución: jobs conocidos y latencias por operación"""
+
+    def __init__(self, driver: Driver, mezcla: Dict[str, float], semilla: Optional[int], playlist_size: int):
+        self.driver = driver
+        self.operaciones = list(mezcla)
+        self.pesos = list(mezcla.values())
+        self.random = random.Random(semilla)
+        self.playlist_size = playlist_size
+        self.prefijo = uuid.uuid4().hex[:8]
+        self.contador = 0
+        self.jobs: List[str] = []
+        self.latencias: Dict[str, List[float]] = {op: [] for op in OPERACIONES}
+        self.errores: Dict[str, int] = {op: 0 for op in OPERACIONES}
+        self.clases_error: Dict[str, int] = {}
+
+    def elegir(self) -> str:
+        return self.random.choices(self.operaciones, self.pesos)[0]
+
+    async def ejecutar(self, operacion: str):
+        self.contador += 1
+        n = self.contador
+        if operacion == "status" and not self.jobs:
+            operacion = "list"
+
+        inicio = time.perf_counter()
+        if operacion == "download":
+            datos, error = await self.driver.download_video(
+                f"https://www.youtube.com/watch?v=load-{self.prefijo}-{n:06d}")
+        elif operacion == "playlist":
+            datos, error = await self.driver.download_playlist(
+                f"https://www.youtube.com/playlist?list=PL{self.prefijo}{n}-{self.playlist_size}")
+        elif operacion == "status":
+            datos, error = await self.driver.status(self.random.choice(self.jobs))
+        elif operacion == "list":
+            datos, error = await self.driver.list_downloads()
+        else:
+            datos, error = await self.driver.metadata(
+                f"https://www.youtube.com/watch?v=meta-{self.prefijo}-{n:06d}")
+        self.latencias[operacion].append(time.perf_counter() - inicio)
+
+        if error:
+            self.errores[operacion] += 1
+            clase = str(error).split(":")[0][:60]
+            self.clases_error[clase] = self.clases_error.get(clase, 0) + 1
+        elif operacion in ("download", "playlist"):
+            self.jobs.append(datos["job_id"])
+
+    def resumen(self, duracion: float, ofrecidas: int, descartadas: int) -> Dict[str, Any]:
+        completadas = sum(len(v) for v in self.latencias.values())
+        errores = sum(self.errores.values())
+        todas = [lat for valores in self.latencias.values() for lat in valores]
+        return {
+            "offered": ofrecidas,
+            "completed": completadas,
+            "dropped": descartadas,
+            "duration_s": round(duracion, 3),
+            "offered_rate": round(ofrecidas / duracion, 3) if duracion else None,
+            "throughput": round(completadas / duracion, 3) if duracion else None,
+            "error_rate": round(errores / completadas, 4) if completadas else None,
+            "latency": resumen_latencias(todas),
+            "operations": {op: {"errors": self.errores[op], **resumen_latencias(self.latencias[op])}
+                           for op in OPERACIONES if self.latencias[op]},
+            "error_classes": dict(self.clases_error),
+        }
+
+
+async def lazo_abierto(carga: Carga, tasa: float, duracion: float, max_en_vuelo: int) -> Dict[str, Any]:
+    """Llegadas de Poisson a `tasa` por segundo, independientes de las respuestas"""
+    pendientes = set()
+    ofrecidas = descartadas = 0
+    inicio = time.monotonic()
+    siguiente = inicio
+    while True:
+        siguiente += carga.random.expovariate(tasa)
+        if siguiente - inicio >= duracion:
+            break
+        await asyncio.sleep(max(siguiente - time.monotonic(), 0))
+        ofrecidas += 1
+        if len(pendientes) >= max_en_vuelo:
+            # El cliente no puede seguir el ritmo: se cuenta como saturación
+            descartadas += 1
+            continue
+        tarea = asyncio.create_task(carga.ejecutar(carga.elegir()))
+        pendientes.add(tarea)
+        tarea.add_done_callback(pendientes.discard)
+    if pendientes:
+        await asyncio.wait(pendientes)
+    return carga.resumen(time.monotonic() - inicio, ofrecidas, descartadas)
+
+
+async def lazo_cerrado(carga: Carga, usuarios: int, duracion: float, pausa: float) -> Dict[str, Any]:
+    """`usuarios` clientes que esperan cada respuesta (más `pausa`) antes de la siguiente"""
+    fin = time.monotonic() + duracion
+    ofrecidas = 0
+
+    async def usuario():
+        nonlocal ofrecidas
+        while time.monotonic() < fin:
+            ofrecidas += 1
+            await carga.ejecutar(carga.elegir())
+            if pausa:
+                await asyncio.sleep(carga.random.expovariate(1 / pausa))
+
+    inicio = time.monotonic()
+    await asyncio.gather(*(usuario() for _ in range(usuarios)))
+    return carga.resumen(time.monotonic() - inicio, ofrecidas, 0)
+
+
+def encontrar_rodilla(pasos: List[Dict[str, Any]], slo_p99_ms: float, max_error_rate: float) -> Dict[str, Any]:
+    """Última tasa sostenible antes de que el throughput deje de seguir a la carga"""
+    sostenible = None
+    for paso in pasos:
+        r = paso["result"]
+        p99 = r["latency"]["p99_ms"] or 0
+        saturado = (r["throughput"] or 0) < 0.9 * paso["rate"] or r["dropped"] > 0 \
+            or p99 > slo_p99_ms or (r["error_rate"] or 0) > max_error_rate
+        paso["saturated"] = saturado
+        if saturado:
+            return {"knee_rate": sostenible, "first_saturated_rate": paso["rate"]}
+        sostenible = paso["rate"]
+    return {"knee_rate": sostenible, "first_saturated_rate": None}
+
+
+async def ejecutar(args) -> Dict[str, Any]:
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(args.max_inflight))
+    mezcla = parsear_mezcla(args.mix)
+    config = MediaConfig(size=args.size, latency=args.latency, bandwidth=args.bandwidth,
+                         error_rate=args.error_rate)
+    resultados: Dict[str, Any] = {}
+
+    with MediaServer(config) as media:
+        env = entorno_offline(media.base_url, args.size, args.extract_latency)
+        objetivos = ["http", "mcp"] if args.target == "both" else [args.target]
+        for target in objetivos:
+            async with crear_driver(target, env) as driver:
+                with MemorySampler(driver.pid) as memoria:
+                    if args.mode == "closed":
+                        carga = Carga(driver, mezcla, args.seed, args.playlist_size)
+                        resultado = await lazo_cerrado(carga, args.users, args.duration, args.think_time)
+                        print(f"▶️  {target} cerrado x{args.users}: {resultado['throughput']} req/s, "
+                              f"p99={resultado['latency']['p99_ms']}ms, errores={resultado['error_rate']}")
+                        resultados[target] = {"closed_loop": resultado}
+                    else:
+                        pasos = []
+                        for tasa in args.sweep or [args.rate]:
+                            carga = Carga(driver, mezcla, args.seed, args.playlist_size)
+                            resultado = await lazo_abierto(carga, tasa, args.duration, args.max_inflight)
+                            pasos.append({"rate": tasa, "result": resultado})
+                            print(f"▶️  {target} abierto {tasa}/s: {resultado['throughput']} req/s, "
+                                  f"p99={resultado['latency']['p99_ms']}ms, errores={resultado['error_rate']}, "
+                                  f"descartadas={resultado['dropped']}")
+                        rodilla = encontrar_rodilla(pasos, args.slo_p99_ms, args.max_error_rate)
+                        print(f"   📈 rodilla de saturación: {rodilla['knee_rate']} req/s")
+                        resultados[target] = {"open_loop": pasos, **rodilla}
+                resultados[target]["memory"] = memoria.resumen()
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generador de carga para el descargador")
+    parser.add_argument('--target', choices=['http', 'mcp', 'both'], default='http')
+    parser.add_argument('--mode', choices=['open', 'closed'], default='open')
+    parser.add_argument('--mix', default=MEZCLA_POR_DEFECTO, help="Pesos por operación")
+    parser.add_argument('--rate', type=float, default=10.0, help="Llegadas por segundo (lazo abierto)")
+    parser.add_argument('--sweep', type=lambda s: [float(x) for x in s.split(",")], default=None,
+                        help="Lista de tasas para buscar la rodilla de saturación")
+    parser.add_argument('--users', type=int, default=8, help="Clientes en lazo cerrado")
+    parser.add_argument('--think-time', type=float, default=0.0, help="Pausa media entre llamadas (s)")
+    parser.add_argument('--duration', type=float, default=15.0, help="Segundos por paso")
+    parser.add_argument('--max-inflight', type=int, default=256)
+    parser.add_argument('--slo-p99-ms', type=float, default=1000.0)
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--playlist-size', type=int, default=3)
+    parser.add_argument('--size', type=int, default=256 * 1024)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--bandwidth', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--extract-latency', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', default=None)
+    parser.add_argument('--compare', default=None)
+    args = parser.parse_args()
+
+    resultados = asyncio.run(ejecutar(args))
+    ruta = guardar_resultados("load", vars(args), resultados, args.out)
+    print(f"\n💾 Resultados guardados en {ruta}")
+    if args.compare:
+        comparar(resultados, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Cliente MCP mínimo por JSON-RPC sobre stdio
+El mismo protocolo que test_mcp_client.py, con handshake y peticiones concurrentes
+"""
+
+import asyncio
+import json
+import sys
+from typing import Any, Dict, List, Optional
+
+PROTOCOL_VERSION = "2025-06-18"
+
+
+class McpError(Exception):
+    """Error devuelto por el servidor MCP"""
+
+
+class McpStdioClient:
+    """Habla JSON-RPC delimitado por líneas con un servidor MCP en subproceso"""
+
+    def __init__(self, command: List[str], cwd: Optional[str] = None, env: Optional[Dict[str, str]] = None):
+        self.command = command
+        self.cwd = cwd
+        self.env = env
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._next_id = 0
+        self._pendientes: Dict[int, asyncio.Future] = {}
+        self._tareas: List[asyncio.Task] = []
+        self.stderr_tail: List[str] = []
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid if self.process else None
+
+    async def start(self):
+        """Inicia el subproceso y completa el handshake de MCP"""
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command, cwd=self.cwd, env=self.env,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=64 * 1024 * 1024,
+        )
+        self._tareas = [asyncio.create_task(self._leer_stdout()),
+                        asyncio.create_task(self._leer_stderr())]
+        await self.request("initialize", {
+            "protocolVersion": PROTOCOL_VERSION,
+            "capabilities": {},
+            "clientInfo": {"name": "youtube-downloader-bench", "version": "1.0.0"},
+        })
+        await self.notify("notifications/initialized")
+        return self
+
+    async def _leer_stdout(self):
+        while True:
+            linea = await self.process.stdout.readline()
+            if not linea:
+                break
+            try:
+                mensaje = json.loads(linea)
+            except ValueError:
+                continue
+            futuro = self._pendientes.pop(mensaje.get("id"), None)
+            if futuro is not None and not futuro.done():
+                futuro.set_result(mensaje)
+        for futuro in self._pendientes.values():
+            if not futuro.done():
+                futuro.set_exception(McpError("El servidor MCP cerró stdout"))
+
+    async def _leer_stderr(self):
+        while True:
+            linea = await self.process.stderr.readline()
+            if not linea:
+                break
+            self.stderr_tail = (self.stderr_tail + [linea.decode(errors="replace").rstrip()])[-50:]
+
+    async def _enviar(self, mensaje: Dict[str, Any]):
+        self.process.stdin.write((json.dumps(mensaje) + "\n").encode())
+        await self.process.stdin.drain()
+
+    async def notify(self, method: str, params: Optional[Dict[str, Any]] = None):
+        mensaje = {"jsonrpc": "2.0", "method": method}
+        if params is not None:
+            mensaje["params"] = params
+        await self._enviar(mensaje)
+
+    async def request(self, method: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        self._next_id += 1
+        request_id = self._next_id
+        futuro = asyncio.get_running_loop().create_future()
+        self._pendientes[request_id] = futuro
+        await self._enviar({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params or {}})
+        respuesta = await futuro
+        if "error" in respuesta:
+            raise McpError(respuesta["error"])
+        return respuesta.get("result")
+
+    async def list_tools(self) -> List[Dict[str, Any]]:
+        return (await self.request("tools/list")).get("tools", [])
+
+    async def call_tool(self, name: str, arguments: Optional[Dict[str, Any]] = None) -> Any:
+        """Llama a una herramienta y devuelve su resultado ya decodificado"""
+        result = await self.request("tools/call", {"name": name, "arguments": arguments or {}})
+        if result.get("isError"):
+            texto = "".join(c.get("text", "") for c in result.get("content", []))
+            raise McpError(texto or "La herramienta devolvió un error")
+        if result.get("structuredContent") is not None:
+            estructurado = result["structuredContent"]
+            # FastMCP envuelve los valores no-dict en {"result": ...}
+            if set(estructurado) == {"result"}:
+                return estructurado["result"]
+            return estructurado
+        texto = "".join(c.get("text", "") for c in result.get("content", []))
+        try:
+            return json.loads(texto)
+        except ValueError:
+            return texto
+
+    async def close(self):
+        if self.process and self.process.returncode is None:
+            self.process.stdin.close()
+            try:
+                await asyncio.wait_for(self.process.wait(), 5)
+            except asyncio.TimeoutError:
+                self.process.terminate()
+                await self.process.wait()
+        for tarea in self._tareas:
+            tarea.cancel()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+def comando_servidor_offline(target: str = "mcp", *extra: str) -> List[str]:
+    """Comando para lanzar un servidor del repo con el extractor falso"""
+    return [sys.executable, "-m", "benchmarks.offline_server", target, *extra]
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Servidor HTTP local de medios sintéticos para los benchmarks
+Sirve bytes de relleno con tamaño, latencia, ancho de banda, tasa de error y límite de conexiones configurables
+"""
+
+import argparse
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+CHUNK = 64 * 1024
+_RELLENO = bytes(range(256)) * (CHUNK // 256)
+_RANGO = re.compile(r'bytes=(\d*)-(\d*)')
+
+
+@dataclass
+class MediaConfig:
+    """Comportamiento del servidor; cada petición puede sobrescribirlo por query string"""
+    size: int = 2 * 1024 * 1024           # bytes por archivo
+    latency: float = 0.0                  # segundos antes de enviar cabeceras
+    bandwidth: float = 0.0                # bytes/seg por conexión (0 = sin límite)
+    error_rate: float = 0.0               # probabilidad de responder 503
+    throttle_rate: float = 0.0            # probabilidad de responder 429
+    link_bandwidth: float = 0.0           # bytes/seg compartidos por todas las conexiones (0 = sin límite)
+    max_connections: int = 0              # conexiones a la vez a partir de las que responde 429 (0 = sin límite)
+    throttle_cooldown: float = 0.0        # segundos que responde 429 a todo tras pasar de max_connections
+    seed: Optional[int] = 1234
+
+
+class MediaServer:
+    """Servidor de medios sintéticos que registra el primer byte servido por video"""
+
+    def __init__(self, config: Optional[MediaConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or MediaConfig()
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self.first_byte: Dict[str, float] = {}
+        self.bytes_served = 0
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.connections = 0
+        self._enlace_libre = 0.0
+        self._bloqueado_hasta = 0.0
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MediaServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="media-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset(self):
+        with self._lock:
+            self.first_byte.clear()
+            self.bytes_served = self.requests = self.errors = self.throttled = 0
+            self._bloqueado_hasta = 0.0
+
+    def _sortear(self, probabilidad: float) -> bool:
+        if probabilidad <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < probabilidad
+
+    def _admitir(self) -> bool:
+        """Ocupa una conexión si no se pasa de max_connections; pasarse bloquea throttle_cooldown segundos"""
+        config = self.config
+        with self._lock:
+            ahora = time.monotonic()
+            if ahora < self._bloqueado_hasta:
+                return False
+            if config.max_connections and self.connections >= config.max_connections:
+                self._bloqueado_hasta = ahora + config.throttle_cooldown
+                return False
+            self.connections += 1
+            return True
+
+    def _soltar(self):
+        with self._lock:
+            self.connections -= 1
+
+    def _esperar_enlace(self, n: int):
+        """Turno en el enlace compartido: las conexiones se reparten link_bandwidth en orden de llegada"""
+        ancho = self.config.link_bandwidth
+        if not ancho:
+            return
+        with self._lock:
+            ahora = time.monotonic()
+            self._enlace_libre = max(self._enlace_libre, ahora) + n / ancho
+            espera = self._enlace_libre - ahora
+        time.sleep(espera)
+
+    def _handler(self):
+        servidor = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_HEAD(self):
+                self._servir(cuerpo=False)
+
+            def do_GET(self):
+                self._servir(cuerpo=True)
+
+            def _servir(self, cuerpo: bool):
+                partes = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(partes.query).items()}
+                config = servidor.config
+                size = int(query.get('size', config.size))
+                latency = float(query.get('latency', config.latency))
+                bandwidth = float(query.get('bandwidth', config.bandwidth))
+                error_rate = float(query.get('error_rate', config.error_rate))
+                throttle_rate = float(query.get('throttle_rate', config.throttle_rate))
+                # /media/<video_id>/<format_id>, /thumb/<video_id>.jpg, /subs/<video_id>.vtt
+                video_id = partes.path.strip('/').split('/')[1] if partes.path.count('/') >= 2 else partes.path
+
+                with servidor._lock:
+                    servidor.requests += 1
+
+                if latency:
+                    time.sleep(latency)
+
+                if servidor._sortear(throttle_rate):
+                    self._error(429)
+                    return
+                if servidor._sortear(error_rate):
+                    self._error(503)
+                    return
+                if not servidor._admitir():
+                    self._error(429)
+                    return
+                self._conectado = True
+                try:
+                    self._enviar(partes, size, bandwidth, video_id, cuerpo)
+                finally:
+                    self._soltar()
+
+            def _soltar(self):
+                # Una vez escrito el último byte el cliente ya no cuenta como conectado,
+                # aunque este hilo aún duerma para respetar el ancho de banda
+                if self._conectado:
+                    self._conectado = False
+                    servidor._soltar()
+
+            def _enviar(self, partes, size: int, bandwidth: float, video_id: str, cuerpo: bool):
+                inicio, fin = 0, size - 1
+                estado = 200
+                rango = _RANGO.match(self.headers.get('Range', ''))
+                if rango and (rango.group(1) or rango.group(2)):
+                    if rango.group(1):
+                        inicio = int(rango.group(1))
+                        fin = min(int(rango.group(2)), size - 1) if rango.group(2) else size - 1
+                    else:
+                        inicio = max(size - int(rango.group(2)), 0)
+                    if inicio >= size:
+                        self.send_response(416)
+                        self.send_header('Content-Range', f'bytes */{size}')
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    estado = 206
+
+                longitud = fin - inicio + 1
+                self.send_response(estado)
+                self.send_header('Content-Type', _tipo(partes.path))
+                self.send_header('Content-Length', str(longitud))
+                self.send_header('Accept-Ranges', 'bytes')
+                if estado == 206:
+                    self.send_header('Content-Range', f'bytes {inicio}-{fin}/{size}')
+                self.end_headers()
+                if not cuerpo:
+                    return
+
+                restante = longitud
+                primero = True
+                try:
+                    while restante > 0:
+                        trozo = _RELLENO[:min(CHUNK, restante)]
+                        servidor._esperar_enlace(len(trozo))
+                        self.wfile.write(trozo)
+                        if primero:
+                            with servidor._lock:
+                                servidor.first_byte.setdefault(video_id, time.monotonic())
+                            primero = False
+                        restante -= len(trozo)
+                        with servidor._lock:
+                            servidor.bytes_served += len(trozo)
+                        if not restante:
+                            self._soltar()
+                        if bandwidth:
+                            time.sleep(len(trozo) / bandwidth)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _error(self, codigo: int):
+                with servidor._lock:
+                    servidor.errors += 1
+                    if codigo == 429:
+                        servidor.throttled += 1
+                self.send_response(codigo)
+                self.send_header('Content-Length', '0')
+                if codigo == 429:
+                    self.send_header('Retry-After', '1')
+                self.end_headers()
+
+        return _Handler
+
+
+def _tipo(path: str) -> str:
+    if path.startswith('/thumb/'):
+        return 'image/jpeg'
+    if path.startswith('/subs/'):
+        return 'text/vtt'
+    if '/140' in path:
+        return 'audio/mp4'
+    return 'video/mp4'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local de medios sintéticos")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--size', type=int, default=MediaConfig.size)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--bandwidth', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--link-bandwidth', type=float, default=0.0)
+    parser.add_argument('--max-connections', type=int, default=0)
+    parser.add_argument('--throttle-cooldown', type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = MediaConfig(size=args.size, latency=args.latency, bandwidth=args.bandwidth,
+                         error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                         link_bandwidth=args.link_bandwidth, max_connections=args.max_connections,
+                         throttle_cooldown=args.throttle_cooldown)
+    servidor = MediaServer(config, port=args.port).start()
+    print(f"📡 Medios sintéticos en {servidor.base_url} (Ctrl+C para detener)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        servidor.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Lanza youtube_http_server.py, youtube_mcp_server.py o la CLI con el extractor falso instalado en el motor
+Uso: python -m benchmarks.offline_server {http,mcp,cli} [--port N] [--serving dev|threaded|production]
+"""
+
+import argparse
+import os
+import runpy
+import sys
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+if str(RAIZ) not in sys.path:
+    sys.path.insert(0, str(RAIZ))
+
+from benchmarks import fake_extractor  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor del descargador con extractor falso")
+    parser.add_argument('target', choices=['http', 'mcp', 'cli'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--serving', choices=['dev', 'threaded', 'production'], default='threaded',
+                        help="dev: app.run(debug=True); threaded: app.run sin debug; production: youtube_serving")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--drain-timeout', type=float, default=None)
+    parser.add_argument('--unix-socket', default=None, help="Con --serving production, escuchar en este socket")
+    args, resto = parser.parse_known_args()
+
+    if args.target == 'cli':
+        # El resto de argumentos son los de youtube_downloader.py
+        fake_extractor.instalar()
+        sys.argv = [str(RAIZ / "youtube_downloader.py"), *resto]
+        runpy.run_module('youtube_downloader', run_name='__main__')
+        return
+    if resto:
+        parser.error(f"argumentos no reconocidos: {' '.join(resto)}")
+
+    if args.target == 'http':
+        fake_extractor.instalar()
+        import youtube_http_server as servidor
+        if args.serving == 'production':
+            import youtube_serving
+            config = youtube_serving.ServingConfig.desde_entorno(
+                host=args.host, port=args.port, workers=args.workers, threads=args.threads,
+                drain_timeout=args.drain_timeout, unix_socket=args.unix_socket)
+            youtube_serving.servir(servidor, config)
+        else:
+            # El reloader relanzaría el proceso sin el extractor falso
+            servidor.app.run(host=args.host, port=args.port, threaded=True,
+                             debug=args.serving == 'dev', use_reloader=False)
+    else:
+        fake_extractor.instalar()
+        import youtube_mcp_server as servidor
+        servidor.mcp.run()
+
+
+if __name__ == "__main__":
+    os.environ.setdefault(fake_extractor.ENV_MEDIA_URL, "http://127.0.0.1:8765")
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark offline reproducible de los servidores HTTP y MCP
+Lanza N descargas concurrentes contra un extractor falso y un servidor de medios local
+
+Uso:
+    python -m benchmarks.run_offline --target both --jobs 50 --size 1048576
+    python -m benchmarks.run_offline --target http --compare benchmarks/results/offline-....json
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+from benchmarks.common import MemorySampler, comparar, guardar_resultados, resumen_latencias
+from benchmarks.drivers import ESTADOS_FINALES, Driver, crear_driver, entorno_offline
+from benchmarks.media_server import MediaConfig, MediaServer
+
+
+async def ejecutar_escenario(driver: Driver, media: MediaServer, args) -> Dict[str, Any]:
+    """Envía todos los jobs a la vez y sondea su estado hasta que terminan"""
+    run_id = uuid.uuid4().hex[:8]
+    media.reset()
+    semaforo = asyncio.Semaphore(args.concurrency)
+    enviados: Dict[str, float] = {}
+    jobs: Dict[str, str] = {}
+    latencias_envio = []
+    errores_envio = []
+
+    async def enviar(video_id: str, url: str, playlist: bool):
+        async with semaforo:
+            enviados[video_id] = time.monotonic()
+            inicio = time.perf_counter()
+            if playlist:
+                datos, error = await driver.download_playlist(url, args.quality)
+            else:
+                datos, error = await driver.download_video(url, args.quality)
+            latencias_envio.append(time.perf_counter() - inicio)
+            if error:
+                errores_envio.append(error)
+            else:
+                jobs[datos["job_id"]] = video_id
+
+    trabajos = [enviar(f"bench-{run_id}-{i:05d}", f"https://www.youtube.com/watch?v=bench-{run_id}-{i:05d}", False)
+                for i in range(args.jobs)]
+    trabajos += [enviar(f"PL{run_id}{i}-{args.playlist_size}",
+                        f"https://www.youtube.com/playlist?list=PL{run_id}{i}-{args.playlist_size}", True)
+                 for i in range(args.playlists)]
+
+    latencias_estado = []
+    finales: Dict[str, str] = {}
+
+    async def consultar(job_id: str):
+        async with semaforo:
+            inicio = time.perf_counter()
+            datos, error = await driver.status(job_id)
+            latencias_estado.append(time.perf_counter() - inicio)
+        if not error and datos.get("status") in ESTADOS_FINALES:
+            finales[job_id] = datos["status"]
+
+    with MemorySampler(driver.pid) as memoria:
+        inicio = time.monotonic()
+        await asyncio.gather(*trabajos)
+        limite = inicio + args.timeout
+        while len(finales) < len(jobs) and time.monotonic() < limite:
+            await asyncio.gather(*(consultar(job_id) for job_id in jobs if job_id not in finales))
+            await asyncio.sleep(args.poll_interval)
+        duracion = time.monotonic() - inicio
+
+    # Primer byte: desde el envío del job hasta que el servidor de medios entrega datos
+    ttfb = [media.first_byte[video_id] - enviados[video_id]
+            for video_id in jobs.values() if video_id in media.first_byte]
+    completados = sum(1 for estado in finales.values() if estado == "completed")
+
+    return {
+        "jobs_submitted": len(trabajos),
+        "jobs_accepted": len(jobs),
+        "jobs_completed": completados,
+        "jobs_failed": sum(1 for estado in finales.values() if estado == "failed"),
+        "jobs_unfinished": len(jobs) - len(finales),
+        "elapsed_s": round(duracion, 3),
+        "jobs_per_sec": round(completados / duracion, 3) if duracion else None,
+        "submit_errors": len(errores_envio),
+        "submit_latency": resumen_latencias(latencias_envio),
+        "status_latency": resumen_latencias(latencias_estado),
+        "time_to_first_byte": resumen_latencias(ttfb),
+        "memory": memoria.resumen(),
+        "media": {"requests": media.requests, "errors": media.errors,
+                  "bytes_served": media.bytes_served},
+    }
+
+
+async def ejecutar(args) -> Dict[str, Any]:
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max(args.concurrency, 8)))
+    config = MediaConfig(size=args.size, latency=args.latency, bandwidth=args.bandwidth,
+                         error_rate=args.error_rate)
+    resultados = {}
+    with MediaServer(config) as media:
+        env = entorno_offline(media.base_url, args.size, args.extract_latency)
+        objetivos = ["http", "mcp"] if args.target == "both" else [args.target]
+        for target in objetivos:
+            print(f"▶️  {target}: {args.jobs} videos + {args.playlists} playlists, concurrencia {args.concurrency}")
+            async with crear_driver(target, env) as driver:
+                resultados[target] = await ejecutar_escenario(driver, media, args)
+            r = resultados[target]
+            print(f"   ✅ {r['jobs_completed']}/{r['jobs_accepted']} jobs en {r['elapsed_s']}s "
+                  f"({r['jobs_per_sec']} jobs/s), status p50={r['status_latency']['p50_ms']}ms "
+                  f"p99={r['status_latency']['p99_ms']}ms, RSS pico={r['memory']['rss_peak_mb']}MB")
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline del descargador")
+    parser.add_argument('--target', choices=['http', 'mcp', 'both'], default='both')
+    parser.add_argument('--jobs', type=int, default=20, help="Videos a enviar")
+    parser.add_argument('--playlists', type=int, default=0, help="Playlists a enviar")
+    parser.add_argument('--playlist-size', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=20, help="Peticiones simultáneas")
+    parser.add_argument('--quality', default='720p')
+    parser.add_argument('--size', type=int, default=1024 * 1024, help="Bytes del formato más grande")
+    parser.add_argument('--latency', type=float, default=0.0, help="Latencia del servidor de medios (s)")
+    parser.add_argument('--bandwidth', type=float, default=0.0, help="Bytes/seg por conexión (0 = sin límite)")
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--extract-latency', type=float, default=0.0, help="Latencia del extractor falso (s)")
+    parser.add_argument('--poll-interval', type=float, default=0.1)
+    parser.add_argument('--timeout', type=float, default=300.0)
+    parser.add_argument('--out', default=None, help="Carpeta de resultados (benchmarks/results)")
+    parser.add_argument('--compare', default=None, help="JSON anterior con el que comparar")
+    args = parser.parse_args()
+
+    resultados = asyncio.run(ejecutar(args))
+    ruta = guardar_resultados("offline", vars(args), resultados, args.out)
+    print(f"\n💾 Resultados guardados en {ruta}")
+    if args.compare:
+        comparar(resultados, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Receptor local de webhooks para probar la entrega sin un endpoint real
+Comprueba la firma HMAC, guarda los lotes recibidos y puede responder con error las primeras peticiones
+
+Uso:
+    YOUTUBE_WEBHOOK_ALLOW_HOSTS=127.0.0.1 YOUTUBE_WEBHOOK_SECRET=s3cr3t \\
+        python -m benchmarks.webhook_receiver --port 8765 --secret s3cr3t --fail-first 2
+
+y pedir un job con "callback_url": "http://127.0.0.1:8765/hook". Cada lote
+aceptado se imprime con sus eventos; al salir, cuántos tenían la firma mal.
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from youtube_engine.webhooks import CABECERA_FIRMA
+
+
+def verificar_firma(secreto: str, cabecera: Optional[str], cuerpo: bytes, tolerancia: float = 300.0) -> bool:
+    """Lo que haría un receptor: t=<unix>,v1=<hex> con HMAC-SHA256 de '<t>.<cuerpo>' y marca reciente"""
+    if not cabecera:
+        return False
+    campos = dict(parte.split('=', 1) for parte in cabecera.split(',') if '=' in parte)
+    try:
+        marca = int(campos['t'])
+    except (KeyError, ValueError):
+        return False
+    if abs(time.time() - marca) > tolerancia:
+        return False
+    esperada = hmac.new(secreto.encode(), b'%d.%s' % (marca, cuerpo), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(esperada, campos.get('v1', ''))
+
+
+class WebhookReceiver:
+    """Servidor que recibe los POST de Webhooks y guarda cada lote.
+
+    Responde `estado_error` a las primeras `fallos` peticiones para forzar
+    reintentos (o, con `cortar`, un 200 que se corta a mitad del cuerpo), y
+    401 si hay `secreto` y la firma no cuadra. Con `redirigir_a` responde
+    302 hacia esa URL a todo. `lotes` guarda los
+    eventos de cada lote aceptado; `peticiones`, todas las recibidas.
+    """
+
+    def __init__(self, secreto: Optional[str] = None, fallos: int = 0, estado_error: int = 503,
+                 redirigir_a: Optional[str] = None, cortar: bool = False, host: str = "127.0.0.1",
+                 port: int = 0):
+        self.secreto = secreto
+        self.fallos = fallos
+        self.estado_error = estado_error
+        self.redirigir_a = redirigir_a
+        self.cortar = cortar
+        self.lotes: List[List[dict]] = []
+        self.peticiones = 0
+        self.rechazadas = 0
+        self.recibido = threading.Condition()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/hook"
+
+    def start(self) -> "WebhookReceiver":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="webhook-receiver", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def eventos(self) -> Dict[str, dict]:
+        """Eventos aceptados por event_id (los repetidos de una reentrega cuentan una vez)"""
+        with self.recibido:
+            return {evento['event_id']: evento for lote in self.lotes for evento in lote}
+
+    def esperar(self, eventos: int, timeout: float = 10.0) -> bool:
+        """Espera a haber aceptado `eventos` eventos distintos"""
+        with self.recibido:
+            return self.recibido.wait_for(
+                lambda: len({e['event_id'] for lote in self.lotes for e in lote}) >= eventos, timeout)
+
+    def _handler(self):
+        receptor = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                cuerpo = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                with receptor.recibido:
+                    receptor.peticiones += 1
+                    fallar = receptor.peticiones <= receptor.fallos
+                if receptor.redirigir_a:
+                    return self._responder(302, {'Location': receptor.redirigir_a})
+                if fallar and receptor.cortar:
+                    return self._cortar()
+                if fallar:
+                    return self._responder(receptor.estado_error)
+                if receptor.secreto and not verificar_firma(receptor.secreto, self.headers.get(CABECERA_FIRMA), cuerpo):
+                    with receptor.recibido:
+                        receptor.rechazadas += 1
+                    return self._responder(401)
+                eventos = json.loads(cuerpo)['events']
+                with receptor.recibido:
+                    receptor.lotes.append(eventos)
+                    receptor.recibido.notify_all()
+                self._responder(204)
+
+            def _cortar(self):
+                # Promete 100 bytes, envía 10 y cierra la conexión
+                self.send_response(200)
+                self.send_header('Content-Length', '100')
+                self.end_headers()
+                self.wfile.write(b'{"ok": tru')
+                self.wfile.flush()
+                self.close_connection = True
+
+            def do_GET(self):
+                # Un cliente que sigue un 302 repite el POST como GET
+                with receptor.recibido:
+                    receptor.peticiones += 1
+                self._responder(405)
+
+            def _responder(self, estado: int, cabeceras: Optional[Dict[str, str]] = None):
+                self.send_response(estado)
+                for nombre, valor in (cabeceras or {}).items():
+                    self.send_header(nombre, valor)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+        return _Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Receptor local de webhooks")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--secret', default=None, help="Secreto de YOUTUBE_WEBHOOK_SECRET para verificar la firma")
+    parser.add_argument('--fail-first', type=int, default=0, help="Peticiones que se responden con error")
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--truncate', action='store_true', help="Los fallos son un 200 cortado a mitad del cuerpo")
+    args = parser.parse_args()
+
+    receptor = WebhookReceiver(args.secret, args.fail_first, args.error_status, cortar=args.truncate,
+                               host=args.host, port=args.port).start()
+    print(f"📬 Esperando webhooks en {receptor.url} (Ctrl+C para salir)")
+    vistos = 0
+    try:
+        while True:
+            with receptor.recibido:
+                receptor.recibido.wait(1.0)
+                nuevos = receptor.lotes[vistos:]
+                vistos = len(receptor.lotes)
+            for lote in nuevos:
+                tipos = ', '.join(f"{evento['type']} {evento['job'].get('job_id', '')}" for evento in lote)
+                print(f"   lote de {len(lote)} evento(s): {tipos}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        receptor.stop()
+        print(f"\n{receptor.peticiones} peticiones, {len(receptor.lotes)} lotes aceptados, "
+              f"{receptor.rechazadas} con firma inválida")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Pruebas del modo por lotes de la CLI (leer_lote, ejecutar_lote y el informe)
+
+Uso:
+    python -m pytest -q test_batch.py
+"""
+
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from youtube_downloader import crear_informe, ejecutar_lote, leer_lote
+from youtube_engine import DownloadStatus
+
+VIDEO = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+OTRO = "https://www.youtube.com/watch?v=9bZkp7q19f0"
+EN_PLAYLIST = "https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PLabcdefghijk"
+PLAYLIST = "https://www.youtube.com/playlist?list=PLabcdefghijk"
+
+
+def test_duplicados_por_id_canonico():
+    lineas = [
+        "# comentario", "", VIDEO,
+        "https://youtu.be/dQw4w9WgXcQ",
+        EN_PLAYLIST,
+        # El mismo video en otro modo es otro elemento
+        '{"url": "https://youtu.be/dQw4w9WgXcQ", "mode": "audio"}',
+        '{"url": "%s", "playlist": true, "quality": "1080p60"}' % EN_PLAYLIST,
+        PLAYLIST,
+    ]
+    elementos, descartes = leer_lote(lineas)
+    assert [(e['canonical_id'], e['mode'], e['is_playlist'], e['quality']) for e in elementos] == [
+        ("video:dQw4w9WgXcQ", "video", False, "720p"),
+        ("video:dQw4w9WgXcQ", "audio", False, "720p"),
+        ("playlist:PLabcdefghijk", "video", True, "1080p"),
+    ]
+    assert descartes['invalid'] == []
+    assert [(d['line'], d['duplicate_of']) for d in descartes['duplicates']] == [
+        (4, VIDEO), (5, VIDEO), (8, EN_PLAYLIST)]
+
+
+def test_playlists_por_defecto():
+    elementos, _ = leer_lote([EN_PLAYLIST, '{"url": "%s", "playlist": false}' % EN_PLAYLIST],
+                             quality="best", playlists=True, idiomas=["es"])
+    assert [(e['is_playlist'], e['quality'], e['languages']) for e in elementos] == [
+        (True, "best", ["es"]), (False, "best", ["es"])]
+
+
+@pytest.mark.parametrize("linea", [
+    "https://vimeo.com/123",
+    "{no es json",
+    '{"quality": "720p"}',
+    '{"url": "%s", "quality": "alta"}' % VIDEO,
+    '{"url": "%s", "mode": "karaoke"}' % VIDEO,
+])
+def test_lineas_no_validas(linea):
+    elementos, descartes = leer_lote(["", linea])
+    assert elementos == [] and descartes['duplicates'] == []
+    assert [descarte['line'] for descarte in descartes['invalid']] == [2]
+    assert descartes['invalid'][0]['error']
+
+
+class Cliente:
+    """Cliente del servidor local de mentira: completa o falla según la URL"""
+
+    def __init__(self, maximo=None):
+        self.interrumpir = threading.Event()
+        self.a_la_vez = self.pico = 0
+        self._lock = threading.Lock()
+        self._todos = threading.Barrier(maximo) if maximo else None
+
+    def descargar(self, url, is_playlist, quality, al_progreso=None, modo="video", idiomas=None):
+        with self._lock:
+            self.a_la_vez += 1
+            self.pico = max(self.pico, self.a_la_vez)
+        if self._todos is not None:
+            # Los primeros `maximo` tienen que estar a la vez en marcha
+            self._todos.wait(10)
+        al_progreso({'current_phase': 'download', 'title': f"Título de {url[-11:]}"})
+        with self._lock:
+            self.a_la_vez -= 1
+        fallido = url == OTRO
+        return {
+            'job_id': f"job-{url[-11:]}", 'title': f"Título de {url[-11:]}",
+            'status': DownloadStatus.FAILED.value if fallido else DownloadStatus.COMPLETED.value,
+            'error_message': "El origen respondió 403" if fallido else None,
+            'total_videos': 1, 'downloaded_videos': 0 if fallido else 1,
+            'files': [] if fallido else [f"/descargas/{url[-11:]}.mp4"],
+        }
+
+
+def test_ejecutar_lote_e_informe(tmp_path):
+    elementos, descartes = leer_lote([VIDEO, OTRO, "https://youtu.be/dQw4w9WgXcQ", "https://vimeo.com/1"])
+    cliente = Cliente(maximo=2)
+    resultados, interrumpido = ejecutar_lote(elementos, tmp_path, jobs=2, mostrar_progreso=False, cliente=cliente)
+    assert not interrumpido and cliente.pico == 2
+    assert [(r['url'], r['status'], r['error'], r['files']) for r in resultados] == [
+        (VIDEO, 'completed', None, ["/descargas/dQw4w9WgXcQ.mp4"]),
+        (OTRO, 'failed', "El origen respondió 403", []),
+    ]
+    assert all(r['title'].startswith("Título de") and r['duration_s'] >= 0 for r in resultados)
+
+    inicio = datetime(2026, 1, 1, 12)
+    informe = crear_informe(elementos, resultados + [None], descartes, tmp_path, 2, inicio,
+                            inicio + timedelta(seconds=1.5), interrumpido)
+    assert informe['totals'] == {'requested': 4, 'unique': 2, 'duplicates': 1, 'invalid': 1, 'completed': 1,
+                                 'failed': 1, 'cancelled': 0, 'interrupted': 0, 'skipped': 0}
+    assert informe['duration_s'] == 1.5 and informe['output_dir'] == str(tmp_path.absolute())
+    assert [item['job_id'] for item in informe['items']] == ["job-dQw4w9WgXcQ", "job-9bZkp7q19f0"]
+
+
+def test_informe_con_elementos_sin_empezar(tmp_path):
+    elementos, descartes = leer_lote([VIDEO, OTRO])
+    ahora = datetime(2026, 1, 1)
+    informe = crear_informe(elementos, [None, None], descartes, tmp_path, 4, ahora, ahora, True)
+    assert informe['interrupted'] and informe['totals']['skipped'] == 2
+    assert [item['status'] for item in informe['items']] == ['skipped', 'skipped'] and informe['bytes'] == 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Pruebas del control adaptativo de la concurrencia (ControlAdaptativo)
+
+Uso:
+    python -m pytest -q test_concurrency.py
+
+Cada prueba llama a ajustar() a mano con el caudal y las respuestas de una
+ventana de un segundo; el hilo del control no llega a decidir nada.
+"""
+
+import threading
+import time
+
+import pytest
+
+from youtube_engine.concurrency import REPROBAR, ControlAdaptativo, crear_control
+
+
+@pytest.fixture
+def control():
+    control = ControlAdaptativo(1, 8, inicial=2, intervalo=3600)
+    yield control
+    control.cerrar()
+
+
+def ocupar(control: ControlAdaptativo, n: int):
+    for i in range(n):
+        assert control.adquirir(f"job{i}")
+
+
+def ventana(control: ControlAdaptativo, caudal: float, throttled: int = 0, errores: int = 0, ok: int = 100):
+    """Cierra una ventana de un segundo con `caudal` bytes y esas respuestas del origen"""
+    with control._condicion:
+        control._bytes = caudal
+        control._respuestas = {'ok': ok, 'throttled': throttled, 'error': errores}
+        control._ventana = time.monotonic() - 1.0
+    return control.ajustar()
+
+
+def test_sube_prueba_y_dobla_el_paso_si_mejora(control):
+    ocupar(control, 2)
+    assert ventana(control, 1000) == ('increase', 'probe') and control.limite == 3
+    assert ventana(control, 1000) == ('hold', 'settling')
+    assert ventana(control, 1200) == ('increase', 'gain') and control.limite == 5
+
+
+def test_deshace_la_subida_que_no_mejora(control):
+    ocupar(control, 2)
+    ventana(control, 1000)
+    ventana(control, 1000)
+    assert ventana(control, 1010) == ('backoff', 'plateau') and control.limite == 2
+    for _ in range(REPROBAR):
+        assert ventana(control, 1010) == ('hold', 'settling')
+    assert ventana(control, 1010) == ('increase', 'probe')
+
+
+@pytest.mark.parametrize("throttled, errores, motivo", [(1, 0, 'throttled'), (0, 10, 'errors')])
+def test_baja_a_la_mitad_ante_429_o_errores(throttled, errores, motivo):
+    control = ControlAdaptativo(1, 8, inicial=8, intervalo=3600)
+    try:
+        ocupar(control, 8)
+        assert ventana(control, 1000, throttled, errores) == ('decrease', motivo) and control.limite == 4
+        # Los jobs admitidos antes de bajar siguen recibiendo 429: no se vuelve a bajar
+        assert ventana(control, 1000, throttled, errores) == ('hold', 'draining') and control.limite == 4
+    finally:
+        control.cerrar()
+
+
+def test_pocos_errores_no_bajan(control):
+    ocupar(control, 2)
+    assert ventana(control, 1000, errores=1, ok=99)[0] == 'increase'
+
+
+def test_no_pasa_del_techo_sin_sondear():
+    control = ControlAdaptativo(1, 16, inicial=8, intervalo=3600)
+    try:
+        ocupar(control, 8)
+        assert ventana(control, 1000, throttled=1)[0] == 'decrease' and control.limite == 4
+        for job_id in ("job4", "job5", "job6", "job7"):
+            control.liberar(job_id)
+        assert ventana(control, 1000) == ('hold', 'settling')
+        caudal = 1000
+        while control.limite < 7:
+            caudal *= 2
+            assert ventana(control, caudal)[0] == 'increase'
+            ventana(control, caudal)
+        # Justo por debajo del techo (8) se queda REPROBAR ventanas y luego lo pasa de uno en uno
+        assert control.limite == 7
+        assert ventana(control, caudal * 2) == ('hold', 'ceiling')
+        for _ in range(REPROBAR):
+            assert ventana(control, caudal * 2) == ('hold', 'settling')
+        assert ventana(control, caudal * 2) == ('increase', 'probe') and control.limite == 8
+        ventana(control, caudal * 4)
+        assert ventana(control, caudal * 8) == ('increase', 'gain') and control.limite == 9
+    finally:
+        control.cerrar()
+
+
+def test_limites(control):
+    assert ventana(control, 0) == ('hold', 'idle')
+    control.limite = control.maximo
+    ocupar(control, 2)
+    assert ventana(control, 1000) == ('hold', 'max') and control.limite == 8
+
+
+def test_fragmentos_repartidos(control):
+    ocupar(control, 2)
+    params = {}
+    control.unir("job0", params)
+    control.limite = 8
+    ventana(control, 0, ok=0)
+    assert params['concurrent_fragment_downloads'] == control.fragmentos() == 4
+
+
+def test_detener_se_consulta_sin_el_lock(control):
+    ocupar(control, 2)
+    libre = []
+
+    def detener():
+        # Otro hilo tiene que poder tomar el lock mientras se consulta
+        hilo = threading.Thread(target=lambda: libre.append(control.describir()))
+        hilo.start()
+        hilo.join(0.5)
+        return True
+
+    assert control.adquirir("job2", detener) is False
+    assert libre and control.describir()['waiting'] == 0
+
+
+def test_plaza_liberada_despierta_al_que_espera(control):
+    ocupar(control, 2)
+    threading.Timer(0.1, control.liberar, ("job0",)).start()
+    inicio = time.monotonic()
+    assert control.adquirir("job2")
+    assert time.monotonic() - inicio < 0.9
+
+
+def test_crear_control():
+    assert not crear_control(None).adaptativo
+    control = crear_control("adaptive:2-6")
+    assert (control.minimo, control.maximo) == (2, 6)
+    with pytest.raises(ValueError):
+        crear_control("adaptive:6-2")
+    with pytest.raises(ValueError):
+        crear_control("aimd")
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la configuración del motor (EngineConfig)
+
+Uso:
+    python -m pytest -q test_engine.py
+"""
+
+from dataclasses import fields
+
+import pytest
+
+from youtube_engine import DownloadEngine, EngineConfig, MemoryJobStore, NullFolderCache, PoolScheduler
+
+
+def test_config_desde_el_entorno(monkeypatch):
+    for campo in fields(EngineConfig):
+        monkeypatch.delenv(f"YOUTUBE_{campo.name.upper()}", raising=False)
+    monkeypatch.setenv("YOUTUBE_INFO_CACHE_TTL", "0")
+    monkeypatch.setenv("YOUTUBE_CACHE_MAX_MB", "")
+    monkeypatch.setenv("YOUTUBE_SPACE_WAIT", "5")
+    monkeypatch.setenv("YOUTUBE_SEARCH_INDEX", "on")
+    config = EngineConfig.desde_entorno(search_index="off", verify=None)
+    assert (config.info_cache_ttl, config.cache_max_mb, config.space_wait) == (0.0, None, 5.0)
+    # Lo que se pasa pisa al entorno, salvo None
+    assert config.search_index == "off" and config.verify is None
+    assert EngineConfig.desde_entorno() == EngineConfig(info_cache_ttl=0.0, space_wait=5.0, search_index="on")
+
+
+def test_el_motor_usa_su_config(tmp_path):
+    config = EngineConfig(space_wait=1.5, search_index="on", extractors="all")
+    motor = DownloadEngine(store=MemoryJobStore(), scheduler=PoolScheduler(1), carpeta=tmp_path,
+                           cache_carpeta=NullFolderCache(), config=config)
+    assert motor.config is config and motor.espera_espacio == 1.5
+    assert motor.busqueda.path == tmp_path / "search.sqlite3"
+    assert motor.verificador is None
+    assert motor.opciones_ydl['allowed_extractors'] == ['default']
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Pruebas del envío de archivos descargados (servir_archivo del servidor HTTP): Range, If-Range, 304 y 416
+
+Uso:
+    python -m pytest -q test_file_serving.py
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip("flask")
+import youtube_http_server as servidor  # noqa: E402
+from werkzeug.wsgi import FileWrapper  # noqa: E402
+
+CONTENIDO = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def video(tmp_path):
+    ruta = tmp_path / "vídeo [abc].mp4"
+    ruta.write_bytes(CONTENIDO)
+    os.utime(ruta, ns=(1_700_000_000_000_000_000, 1_700_000_000_000_000_000))
+    return ruta
+
+
+def etag(ruta) -> str:
+    estado = ruta.stat()
+    return f'"{estado.st_mtime_ns:x}-{estado.st_size:x}"'
+
+
+def servir(ruta, cabeceras=None, metodo="GET", entorno=None):
+    """Respuesta de servir_archivo, su cuerpo leído entero y cuántas veces se llamó a al_cerrar"""
+    cerrados = []
+    with servidor.app.test_request_context(headers=cabeceras or {}, method=metodo, environ_overrides=entorno):
+        respuesta = servidor.servir_archivo(ruta, lambda: cerrados.append(1))
+    cuerpo = b"".join(respuesta.response) if respuesta.direct_passthrough else respuesta.get_data()
+    respuesta.close()
+    return respuesta, cuerpo, len(cerrados)
+
+
+def test_archivo_entero(video):
+    respuesta, cuerpo, cerrados = servir(video)
+    assert respuesta.status_code == 200 and cuerpo == CONTENIDO and cerrados == 1
+    assert respuesta.headers["Content-Length"] == str(len(CONTENIDO))
+    assert respuesta.headers["ETag"] == etag(video)
+    assert respuesta.headers["Accept-Ranges"] == "bytes"
+    assert respuesta.headers["Content-Type"] == "video/mp4"
+    assert respuesta.headers["Content-Disposition"] == "inline; filename*=UTF-8''v%C3%ADdeo%20%5Babc%5D.mp4"
+
+
+@pytest.mark.parametrize("rango, inicio, fin", [
+    ("bytes=0-99", 0, 100),
+    ("bytes=1000-", 1000, len(CONTENIDO)),
+    ("bytes=-256", len(CONTENIDO) - 256, len(CONTENIDO)),
+    # Un final más allá del archivo se recorta
+    ("bytes=10000-999999", 10000, len(CONTENIDO)),
+])
+def test_rango(video, rango, inicio, fin):
+    respuesta, cuerpo, cerrados = servir(video, {"Range": rango})
+    assert respuesta.status_code == 206 and cuerpo == CONTENIDO[inicio:fin] and cerrados == 1
+    assert respuesta.headers["Content-Range"] == f"bytes {inicio}-{fin - 1}/{len(CONTENIDO)}"
+    assert respuesta.headers["Content-Length"] == str(fin - inicio)
+
+
+def test_rango_con_sendfile(video):
+    # Con wsgi.file_wrapper el servidor envía desde la posición del archivo hasta Content-Length
+    respuesta, cuerpo, cerrados = servir(video, {"Range": "bytes=500-599"}, entorno={'wsgi.file_wrapper': FileWrapper})
+    assert respuesta.status_code == 206 and cerrados == 1
+    assert isinstance(respuesta.response, FileWrapper) and cuerpo == CONTENIDO[500:]
+    assert respuesta.headers["Content-Length"] == "100"
+
+
+def test_rango_fuera_del_archivo(video):
+    respuesta, cuerpo, cerrados = servir(video, {"Range": f"bytes={len(CONTENIDO)}-"})
+    assert respuesta.status_code == 416 and cuerpo == b"" and cerrados == 1
+    assert respuesta.headers["Content-Range"] == f"bytes */{len(CONTENIDO)}"
+
+
+def test_varios_rangos_se_sirven_enteros(video):
+    respuesta, cuerpo, _ = servir(video, {"Range": "bytes=0-9,20-29"})
+    assert respuesta.status_code == 200 and cuerpo == CONTENIDO
+    assert "Content-Range" not in respuesta.headers
+
+
+@pytest.mark.parametrize("igual", [True, False])
+def test_if_range(video, igual):
+    cabeceras = {"Range": "bytes=0-9", "If-Range": etag(video) if igual else '"otro-etag"'}
+    respuesta, cuerpo, _ = servir(video, cabeceras)
+    # Si el archivo cambió desde que el cliente guardó la primera parte, se envía entero
+    assert (respuesta.status_code, cuerpo) == ((206, CONTENIDO[:10]) if igual else (200, CONTENIDO))
+
+
+@pytest.mark.parametrize("si_no_coincide", ["{}", "W/{}", '"otro", {}', "*"])
+def test_no_modificado(video, si_no_coincide):
+    respuesta, cuerpo, cerrados = servir(video, {"If-None-Match": si_no_coincide.format(etag(video)),
+                                                 "Range": "bytes=0-9"})
+    assert respuesta.status_code == 304 and cuerpo == b"" and cerrados == 1
+    assert respuesta.headers["ETag"] == etag(video)
+
+
+def test_etag_cambia_con_el_archivo(video):
+    anterior = etag(video)
+    video.write_bytes(CONTENIDO[:-1])
+    respuesta, cuerpo, _ = servir(video, {"If-None-Match": anterior})
+    assert respuesta.status_code == 200 and cuerpo == CONTENIDO[:-1]
+    assert respuesta.headers["ETag"] != anterior
+
+
+def test_head(video):
+    respuesta, _, cerrados = servir(video, {"Range": "bytes=0-9"}, metodo="HEAD")
+    assert respuesta.status_code == 206 and respuesta.headers["Content-Length"] == "10" and cerrados == 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la carpeta de descargas como caché (FolderCache) y de sus retenciones al servir archivos
+
+Uso:
+    python -m pytest -q test_folder_cache.py
+"""
+
+import os
+import time
+
+import pytest
+
+from youtube_engine import (DownloadEngine, DownloadStatus, FolderCache, IndiceBusqueda, MemoryJobStore,
+                            PoolScheduler, Verificador, Volumen, nuevo_job)
+
+
+def retenciones(cache: FolderCache) -> int:
+    return cache._conexion().execute("SELECT COUNT(*) FROM pins").fetchone()[0]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    volumen = Volumen(tmp_path / "download")
+    return FolderCache([volumen], 10 * 1024, tmp_path / "folder_cache.sqlite3")
+
+
+def archivo(cache: FolderCache, nombre: str, tamano: int, antiguedad: float = 0.0):
+    ruta = cache.volumenes[0].ruta / nombre
+    ruta.write_bytes(b"x" * tamano)
+    instante = time.time() - antiguedad
+    os.utime(ruta, (instante, instante))
+    return ruta
+
+
+def test_desalojo_respeta_retenciones(cache):
+    viejo = archivo(cache, "viejo.mp4", 6 * 1024, antiguedad=100)
+    nuevo = archivo(cache, "nuevo.mp4", 6 * 1024)
+    cache.indexar()
+    cache.retener(viejo, "envio")
+    cache.desalojar()
+    assert viejo.exists() and not nuevo.exists()
+
+    cache.soltar("envio")
+    assert retenciones(cache) == 0
+
+
+def test_servir_archivo_suelta_la_retencion(cache, monkeypatch):
+    pytest.importorskip("flask")
+    import youtube_http_server as servidor
+
+    ruta = archivo(cache, "video [abc].mp4", 4096)
+    cache.indexar()
+    motor = DownloadEngine(store=MemoryJobStore(), scheduler=PoolScheduler(1), carpeta=cache.volumenes[0].ruta,
+                           cache_carpeta=cache)
+    job = nuevo_job("https://www.youtube.com/watch?v=abc", False)
+    job.update(status=DownloadStatus.COMPLETED.value, files=[str(ruta.absolute())])
+    motor.store.crear(job)
+    monkeypatch.setattr(servidor, "motor", motor)
+    cliente = servidor.app.test_client()
+
+    with cliente.get(f"/files/{job['job_id']}") as respuesta:
+        assert respuesta.status_code == 200
+        assert retenciones(cache) == 1
+        assert len(respuesta.get_data()) == 4096
+    assert retenciones(cache) == 0
+
+    with cliente.get(f"/files/{job['job_id']}", headers={"Range": "bytes=100-199"}) as respuesta:
+        assert respuesta.status_code == 206 and len(respuesta.get_data()) == 100
+    with cliente.head(f"/files/{job['job_id']}") as respuesta:
+        assert respuesta.status_code == 200
+    etag = respuesta.headers["ETag"]
+    with cliente.get(f"/files/{job['job_id']}", headers={"If-None-Match": etag}) as respuesta:
+        assert respuesta.status_code == 304
+    assert retenciones(cache) == 0
+
+
+def test_desalojo_olvida_los_archivos(cache, tmp_path):
+    verificador = Verificador(tmp_path / "checksums.sqlite3", 1)
+    busqueda = IndiceBusqueda(tmp_path / "search.sqlite3")
+    motor = DownloadEngine(store=MemoryJobStore(), scheduler=PoolScheduler(1), carpeta=cache.volumenes[0].ruta,
+                           cache_carpeta=cache, verificador=verificador, busqueda=busqueda)
+    viejo = str(archivo(cache, "Viejo [abc].mp4", 6 * 1024, antiguedad=100).absolute())
+    nuevo = str(archivo(cache, "Nuevo [def].mp4", 6 * 1024).absolute())
+    cache.indexar()
+    job = nuevo_job("https://www.youtube.com/playlist?list=PL0123456789", True)
+    job.update(status=DownloadStatus.COMPLETED.value, files=[viejo, nuevo],
+               checksums={ruta: verificador.verificar_archivo(ruta) for ruta in (viejo, nuevo)})
+    motor.store.crear(job)
+    busqueda.indexar([{'video_id': video_id, 'title': "Lofi", 'uploader': "Canal", 'channel_id': None,
+                       'description': "", 'upload_date': None, 'duration': None, 'view_count': None,
+                       'webpage_url': None} for video_id in ("abc", "def")], job['job_id'], [viejo, nuevo])
+    try:
+        assert cache.desalojar()[0] == 1
+        estado = motor.obtener(job['job_id'])
+        assert (estado['files'], estado['evicted_files'], list(estado['checksums'])) == ([nuevo], [viejo], [nuevo])
+        assert [video['video_id'] for video in busqueda.buscar("lofi")['results']] == ["def"]
+        resumen = verificador.verificar_todo([nuevo], raices=(str(cache.volumenes[0].ruta.absolute()) + os.sep,))
+        assert (resumen['missing'], resumen['skipped']) == (0, 1)
+    finally:
+        verificador.cerrar()
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
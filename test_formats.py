@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la interpretación de calidades y del plan de formatos (youtube_engine.formats)
+
+Uso:
+    python -m pytest -q test_formats.py
+"""
+
+import pytest
+
+from youtube_engine.formats import altura_maxima, planificar, selector_descarga, validar_calidad
+
+
+def formato(format_id: str, height=None, vcodec="avc1", acodec="mp4a", ext="mp4", **extra) -> dict:
+    return {'format_id': format_id, 'height': height, 'vcodec': vcodec, 'acodec': acodec, 'ext': ext,
+            'protocol': 'https', **extra}
+
+
+def solo_video(format_id: str, height: int, ext: str = "mp4", **extra) -> dict:
+    return formato(format_id, height, acodec="none", ext=ext, **extra)
+
+
+def solo_audio(format_id: str, ext: str = "m4a", **extra) -> dict:
+    return formato(format_id, vcodec="none", ext=ext, **extra)
+
+
+@pytest.mark.parametrize("quality, altura", [
+    ("720p", 720),
+    ("720", 720),
+    ("1080p60", 1080),
+    ("1080i", 1080),
+    (" 480P ", 480),
+    ("4k", 2160),
+    ("UHD", 2160),
+    ("hd", 720),
+    ("best", None),
+    ("max", None),
+])
+def test_altura_maxima(quality, altura):
+    assert altura_maxima(quality) == altura
+
+
+@pytest.mark.parametrize("quality", ["", None, "alta", "72", "0000p", "720x", "1080p6000", "p720"])
+def test_calidad_no_valida(quality):
+    with pytest.raises(ValueError):
+        altura_maxima(quality)
+
+
+@pytest.mark.parametrize("quality, normal", [(None, "720p"), ("", "720p"), ("4k", "2160p"),
+                                             ("1080p60", "1080p"), ("BEST", "best")])
+def test_validar_calidad(quality, normal):
+    assert validar_calidad(quality) == normal
+
+
+def test_selector_sin_plan():
+    assert selector_descarga("720p", False) == "best[height<=720]"
+    assert selector_descarga("best", True) == "bestvideo+bestaudio/best"
+    assert selector_descarga("720p", True).startswith("best[height=720]/bestvideo[height<=720]+bestaudio")
+
+
+INFO = {
+    'duration': 100,
+    'formats': [
+        formato("18", 360, filesize=5_000_000),
+        formato("22", 720, tbr=1000),
+        solo_video("137", 1080, filesize=40_000_000),
+        solo_video("136", 720, filesize=20_000_000),
+        solo_video("248", 1080, ext="webm", filesize=30_000_000),
+        solo_audio("140", abr=128, filesize=1_600_000),
+        solo_audio("251", ext="webm", abr=160, filesize=2_000_000),
+        # Storyboard y HLS: nunca se eligen habiendo formatos directos
+        formato("sb0", None, vcodec="none", acodec="none", ext="mhtml"),
+        dict(formato("96", 1080), protocol="m3u8_native"),
+    ],
+}
+
+
+@pytest.mark.parametrize("quality, mezclar, format_id, premuxed, expected_bytes", [
+    # Un combinado alcanza la mayor altura posible: se usa tal cual
+    ("720p", True, "22", True, 1000 * 100 * 125),
+    ("480p", True, "18", True, 5_000_000),
+    # Nada combinado llega a 1080: mejor video más el audio que encaja con su contenedor
+    ("1080p60", True, "137+140", False, 41_600_000),
+    ("4k", True, "137+140", False, 41_600_000),
+    ("best", True, "137+140", False, 41_600_000),
+    # Sin ffmpeg solo vale un combinado, aunque tenga menos altura
+    ("best", False, "22", True, 12_500_000),
+])
+def test_planificar(quality, mezclar, format_id, premuxed, expected_bytes):
+    plan = planificar(INFO, quality, mezclar)
+    assert (plan.format_id, plan.premuxed, plan.expected_bytes) == (format_id, premuxed, expected_bytes)
+
+
+def test_audio_del_mismo_contenedor():
+    info = {'formats': [solo_video("248", 1080, ext="webm"), solo_audio("140", abr=128),
+                        solo_audio("251", ext="webm", abr=160)]}
+    assert planificar(info, "1080p").format_id == "248+251"
+
+
+@pytest.mark.parametrize("info, quality, mezclar", [
+    ({}, "720p", True),
+    ({'formats': []}, "720p", True),
+    # Solo hay videos más altos que lo pedido
+    ({'formats': [formato("22", 720)]}, "480p", True),
+    # Solo video y sin ffmpeg para unirlo a un audio
+    ({'formats': [solo_video("137", 1080), solo_audio("140")]}, "1080p", False),
+    # Solo video y ningún audio
+    ({'formats': [solo_video("137", 1080)]}, "1080p", True),
+])
+def test_sin_plan(info, quality, mezclar):
+    assert planificar(info, quality, mezclar) is None
+
+
+def test_solo_hls():
+    info = {'formats': [dict(formato("96", 720), protocol="m3u8_native")]}
+    plan = planificar(info, "720p")
+    assert plan.format_id == "96" and plan.height == 720
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
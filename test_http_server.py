@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Pruebas del servidor HTTP: creación del motor y rutas que no descargan nada
+
+Uso:
+    python -m pytest -q test_http_server.py
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("flask")
+import youtube_http_server as servidor  # noqa: E402
+from youtube_engine import DownloadEngine, MemoryJobStore  # noqa: E402
+
+RAIZ = Path(__file__).resolve().parent
+
+
+def test_importar_no_crea_el_motor(tmp_path):
+    # Un proceso aparte: en este el motor puede estar ya creado por otras pruebas
+    codigo = "import youtube_http_server as s; assert s.motor is None; print('ok')"
+    resultado = subprocess.run([sys.executable, "-c", codigo], cwd=tmp_path, capture_output=True, text=True,
+                               env={**os.environ, "PYTHONPATH": str(RAIZ)}, timeout=60)
+    assert resultado.stdout.strip() == "ok", resultado.stderr
+    # Ni la carpeta de descargas ni ningún índice
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_motor_con_la_primera_peticion(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(servidor, "motor", None)
+    respuesta = servidor.app.test_client().get("/")
+    assert respuesta.status_code == 200 and isinstance(servidor.motor, DownloadEngine)
+    assert servidor.drenar(0) == 0
+
+
+def test_configurar_store_crea_el_motor_con_ese_store(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(servidor, "motor", None)
+    servidor.configurar_store(f"sqlite:///{tmp_path / 'jobs.sqlite3'}")
+    assert type(servidor.motor.store).__name__ == "SQLiteJobStore"
+    servidor.configurar_store("memory")
+    assert isinstance(servidor.motor.store, MemoryJobStore)
+
+
+def test_drenar_sin_motor(monkeypatch):
+    monkeypatch.setattr(servidor, "motor", None)
+    assert servidor.drenar(0) == 0 and servidor.motor is None
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
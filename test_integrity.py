@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Pruebas de los checksums que el motor apunta en cada job
+
+Uso:
+    python -m pytest -q test_integrity.py
+"""
+
+import sqlite3
+import time
+from concurrent.futures import Future
+
+import pytest
+
+import youtube_metrics as metricas
+from youtube_engine import MemoryJobStore, nuevo_job
+from youtube_engine.engine import RegistroArchivos
+from youtube_engine.integrity import Verificador, crear_verificador
+
+
+class VerificadorRoto:
+    """Verificador cuyo índice falla: enviar() devuelve un futuro con la excepción"""
+
+    def enviar(self, ruta: str) -> Future:
+        futuro = Future()
+        futuro.set_exception(sqlite3.OperationalError("database is locked"))
+        return futuro
+
+
+@pytest.fixture
+def store():
+    return MemoryJobStore()
+
+
+def registro(store, verificador) -> RegistroArchivos:
+    job = nuevo_job("https://www.youtube.com/watch?v=abc", False)
+    store.crear(job)
+    return RegistroArchivos(store, job['job_id'], verificador=verificador)
+
+
+def test_checksum_de_cada_archivo(tmp_path, store):
+    verificador = Verificador(tmp_path / "checksums.sqlite3")
+    archivos = registro(store, verificador)
+    ruta = tmp_path / "video [abc].mp4"
+    ruta.write_bytes(b"x" * 1000)
+    archivos(str(ruta))
+    deadline = time.monotonic() + 10
+    while not store.obtener(archivos.job_id).get('checksums') and time.monotonic() < deadline:
+        time.sleep(0.01)
+    verificador.cerrar()
+    checksums = store.obtener(archivos.job_id)['checksums']
+    assert checksums[str(ruta.absolute())]['result'] == 'ok'
+
+
+def test_fallo_del_verificador_queda_en_el_job(tmp_path, store):
+    errores = metricas.ERRORS.labels('verify', 'OperationalError').value()
+    archivos = registro(store, VerificadorRoto())
+    ruta = tmp_path / "video [abc].mp4"
+    archivos(str(ruta))
+    checksums = store.obtener(archivos.job_id)['checksums']
+    assert checksums == {str(ruta.absolute()): {'result': 'error', 'error': "database is locked"}}
+    assert metricas.ERRORS.labels('verify', 'OperationalError').value() == errores + 1
+
+
+def test_verificacion_opcional(tmp_path):
+    # Sin YOUTUBE_VERIFY no se hashea nada
+    assert crear_verificador(None, tmp_path) is None
+    assert crear_verificador("off", tmp_path) is None
+    verificador = crear_verificador("threads:2", tmp_path)
+    try:
+        assert isinstance(verificador, Verificador)
+    finally:
+        verificador.cerrar()
+    with pytest.raises(ValueError):
+        crear_verificador("processes", tmp_path)
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Pruebas del registro compacto de jobs (JobRecord) y de las consultas de estado por lotes
+
+Uso:
+    python -m pytest -q test_jobs.py
+"""
+
+import time
+
+import pytest
+
+from youtube_engine import DownloadStatus, nuevo_job
+from youtube_engine.jobs import JobRecord, proyectar, validar_consulta_lote
+from youtube_engine.store import MemoryJobStore, SQLiteJobStore
+
+
+@pytest.fixture(autouse=True)
+def zona_original():
+    yield
+    time.tzset()
+
+
+@pytest.mark.parametrize("fecha", [
+    "2024-03-31T02:30:00.123457",
+    "2024-10-27T02:30:00.999999",
+    "2024-01-01T00:00:00.000001",
+    "2024-06-15T12:00:00",
+    "1969-12-31T23:59:59.500000",
+    "2024-06-15T12:00:00.250000+02:00",
+])
+def test_fechas_ida_y_vuelta(fecha, monkeypatch):
+    # Con cambio de hora: las 02:30 del 31 de marzo no existen en Madrid
+    monkeypatch.setenv("TZ", "Europe/Madrid")
+    time.tzset()
+    job = nuevo_job("https://www.youtube.com/watch?v=abc", False)
+    job.update(created_at=fecha, started_at=fecha, completed_at=fecha)
+    registro = JobRecord(job)
+    assert {clave: registro.como_dict()[clave] for clave in ('created_at', 'started_at', 'completed_at')} == \
+        dict.fromkeys(('created_at', 'started_at', 'completed_at'), fecha)
+
+
+def test_como_dict_igual_que_el_job():
+    job = nuevo_job("https://www.youtube.com/watch?v=abc", False, callback_url="https://example.com/aviso")
+    job.update(status=DownloadStatus.COMPLETED.value, files=["/tmp/video [abc].mp4"])
+    assert JobRecord(job).como_dict() == job
+
+
+@pytest.mark.parametrize("crear", [lambda ruta: MemoryJobStore(), lambda ruta: SQLiteJobStore(ruta / "jobs.sqlite3")],
+                         ids=["memory", "sqlite"])
+def test_vistas_desde_una_version(tmp_path, crear):
+    store = crear(tmp_path)
+    jobs = [nuevo_job(f"https://www.youtube.com/watch?v=abc{i}", False) for i in range(3)]
+    for job in jobs:
+        store.crear(job)
+    ids = [job['job_id'] for job in jobs]
+    version, vistas, faltan = store.vistas(ids + ["no-existe"])
+    assert [vista['job_id'] for vista in vistas] == ids and faltan == ["no-existe"]
+    # Con la versión devuelta solo vuelven los jobs que cambiaron después
+    assert store.vistas(ids, version)[1] == []
+    store.actualizar(ids[1], status=DownloadStatus.RUNNING.value)
+    nueva, vistas, _ = store.vistas(ids, version)
+    assert nueva > version and [(vista['job_id'], vista['status']) for vista in vistas] == [(ids[1], "running")]
+
+
+def test_consulta_lote():
+    assert validar_consulta_lote(["b", "a", "b"], ["status"], 0) == (["b", "a"], ["status"], 0)
+    for consulta in (("a", None, None), (["a"], ["tamano"], None), (["a"], None, -1), (["a"], None, True)):
+        with pytest.raises(ValueError):
+            validar_consulta_lote(*consulta)
+    vista = {'job_id': "a", 'status': "running", 'title': "Video"}
+    assert proyectar(vista, ["status"]) == {'job_id': "a", 'status': "running"}
+    assert proyectar(vista, None) is vista
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
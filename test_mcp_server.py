@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Pruebas de las herramientas del servidor MCP con un cliente en memoria (sin proceso aparte)
+
+Uso:
+    python -m pytest -q test_mcp_server.py
+"""
+
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("fastmcp")
+from fastmcp import Client  # noqa: E402
+
+import youtube_mcp_server as servidor  # noqa: E402
+from youtube_engine import (DownloadEngine, DownloadStatus, LoopJobStore, NullFolderCache,  # noqa: E402
+                            PoolScheduler, nuevo_job)
+
+
+@pytest.fixture
+def motor(tmp_path, monkeypatch):
+    motor = DownloadEngine(store=LoopJobStore(), scheduler=PoolScheduler(1), carpeta=tmp_path,
+                           cache_carpeta=NullFolderCache())
+    monkeypatch.setattr(servidor, "motor", motor)
+    # El ciclo de vida del servidor cierra su executor al terminar cada sesión
+    monkeypatch.setattr(servidor, "executor_metadatos", ThreadPoolExecutor(1))
+    return motor
+
+
+def llamar(herramienta: str, **argumentos):
+    async def _llamar():
+        async with Client(servidor.mcp) as cliente:
+            return await cliente.call_tool(herramienta, argumentos, raise_on_error=False)
+    return asyncio.run(_llamar())
+
+
+def test_estado_con_el_json_en_cache(motor):
+    job = nuevo_job("https://www.youtube.com/watch?v=abc", False)
+    job.update(status=DownloadStatus.COMPLETED.value)
+    motor.store.crear(job)
+    resultado = llamar("get_download_status", job_id=job['job_id'])
+    # Solo el texto ya codificado: FastMCP no vuelve a serializar el estado
+    assert resultado.structured_content is None
+    assert resultado.content[0].text == motor.store.vista_json(job['job_id']).decode()
+    assert json.loads(resultado.content[0].text)['status'] == "completed"
+
+
+def test_estado_de_un_job_que_no_existe(motor):
+    resultado = llamar("get_download_status", job_id="no-existe")
+    assert json.loads(resultado.content[0].text) == {"error": "Job ID no encontrado"}
+
+
+def test_listado(motor):
+    for _ in range(3):
+        motor.store.crear(nuevo_job("https://www.youtube.com/watch?v=abc", False))
+    resultado = llamar("list_downloads")
+    assert resultado.structured_content is None
+    assert json.loads(resultado.content[0].text)['total_jobs'] == 3
+
+
+@pytest.mark.parametrize("herramienta, argumentos", [
+    ("download_video", {"url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ"}),
+    ("download_playlist", {"url": "https://www.youtube.com/playlist?list=PL0123456789"}),
+    ("verify_downloads", {}),
+])
+def test_no_acepta_jobs_al_apagar(motor, herramienta, argumentos):
+    motor.drenando.set()
+    resultado = llamar(herramienta, **argumentos)
+    assert resultado.structured_content == {"error": "El servidor se está apagando"}
+    assert motor.store.resumenes() == []
+
+
+def test_el_motor_se_crea_al_arrancar(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(servidor, "motor", None)
+    monkeypatch.setattr(servidor, "executor_metadatos", ThreadPoolExecutor(1))
+    resultado = llamar("list_downloads")
+    assert json.loads(resultado.content[0].text)['total_jobs'] == 0
+    assert isinstance(servidor.motor, DownloadEngine)
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
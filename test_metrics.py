@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Pruebas del formato de texto de Prometheus de youtube_metrics
+
+Uso:
+    python -m pytest -q test_metrics.py
+"""
+
+import pytest
+
+from youtube_metrics import CallbackGauge, Gauge, Histogram, Registry, _num
+
+
+@pytest.mark.parametrize("valor, texto", [
+    (3, "3"),
+    (3.0, "3"),
+    (0.25, "0.25"),
+    (-2.0, "-2"),
+    (float("inf"), "+Inf"),
+    (float("-inf"), "-Inf"),
+    (float("nan"), "NaN"),
+])
+def test_num(valor, texto):
+    assert _num(valor) == texto
+
+
+def test_exposicion_con_valores_no_finitos():
+    registro = Registry()
+    Gauge("yt_gauge", "Gauge", registry=registro).dec(float("inf"))
+    CallbackGauge("yt_callback", "Callback", ("volume",), registry=registro,
+                  callback=lambda: [(("a",), float("nan")), (("b",), 1.5)])
+    Histogram("yt_latency", "Latencia", registry=registro, buckets=(1.0,)).observe(0.5)
+    lineas = registro.exposition().splitlines()
+    assert "yt_gauge -Inf" in lineas
+    assert 'yt_callback{volume="a"} NaN' in lineas and 'yt_callback{volume="b"} 1.5' in lineas
+    assert 'yt_latency_bucket{le="+Inf"} 1' in lineas
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
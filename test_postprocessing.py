@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la etapa de post-procesado con postprocesadores falsos (no necesitan ffmpeg)
+
+Uso:
+    python -m pytest -q test_postprocessing.py
+"""
+
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from youtube_engine.postprocessing import EtapaPostproceso, PostprocesoJob, crear_postproceso
+
+yt_dlp = pytest.importorskip("yt_dlp")
+from yt_dlp.postprocessor.common import PostProcessor  # noqa: E402
+from yt_dlp.utils import PostProcessingError  # noqa: E402
+
+from youtube_engine import ytdlp  # noqa: E402
+
+
+class MarcarPP(PostProcessor):
+    """Paso falso: añade una línea al archivo y tarda un poco"""
+
+    def run(self, info):
+        time.sleep(0.02)
+        with open(info['filepath'], 'a') as archivo:
+            archivo.write("marcado\n")
+        return [], info
+
+
+class FallarPP(PostProcessor):
+    def run(self, info):
+        raise PostProcessingError("ffmpeg falso falló")
+
+
+def descargado(tmp_path, nombre: str = "video [abc].mp4") -> dict:
+    """Info dict de un archivo recién descargado en la carpeta temporal del job"""
+    temporal = tmp_path / ".partial" / "job"
+    temporal.mkdir(parents=True, exist_ok=True)
+    ruta = temporal / nombre
+    ruta.write_text("datos\n")
+    return {'id': 'abc', 'filepath': str(ruta), '__finaldir': str(tmp_path / "final"), '__files_to_move': {}}
+
+
+@pytest.fixture
+def etapa():
+    etapa = EtapaPostproceso(2, procesos=False)
+    yield etapa
+    etapa.cerrar()
+
+
+def esperar_job(postproceso: PostprocesoJob) -> None:
+    postproceso.cerrar()
+    assert postproceso.terminado.wait(10)
+
+
+def test_etapa_hilos_confirma_y_mide_pasos(tmp_path, etapa):
+    resultado = etapa.enviar("job", {'quiet': True}, descargado(tmp_path), [MarcarPP]).result(10)
+    final = tmp_path / "final" / "video [abc].mp4"
+    assert resultado['files'] == [str(final)]
+    assert final.read_text() == "datos\nmarcado\n"
+    assert set(resultado['steps']) == {'Marcar'} and resultado['steps']['Marcar'] >= 0.02
+    assert resultado['queue_seconds'] >= 0
+    assert etapa.activos() == 0 and etapa.en_cola() == 0
+
+
+def test_postproceso_job_termina_con_todos_sus_archivos(tmp_path, etapa):
+    archivos, finales = [], []
+    postproceso = PostprocesoJob(archivos.append, finales.append)
+    for nombre in ("uno [a].mp4", "dos [b].mp4"):
+        postproceso.agregar(etapa.enviar("job", {'quiet': True}, descargado(tmp_path, nombre), [MarcarPP]))
+    esperar_job(postproceso)
+    assert finales == [None]
+    assert sorted(archivos) == sorted(str(tmp_path / "final" / nombre) for nombre in ("uno [a].mp4", "dos [b].mp4"))
+    tiempos = postproceso.tiempos()
+    assert tiempos['Marcar'] >= 0.04 and 'queue' in tiempos
+
+
+def test_postproceso_job_propaga_el_primer_error(tmp_path, etapa):
+    archivos, finales = [], []
+    postproceso = PostprocesoJob(archivos.append, finales.append)
+    postproceso.agregar(etapa.enviar("job", {'quiet': True}, descargado(tmp_path, "bien [a].mp4"), [MarcarPP]))
+    postproceso.agregar(etapa.enviar("job", {'quiet': True}, descargado(tmp_path, "mal [b].mp4"), [FallarPP]))
+    esperar_job(postproceso)
+    assert len(finales) == 1 and isinstance(finales[0], PostProcessingError)
+    # El archivo que sí se post-procesó queda confirmado y con sus tiempos
+    assert archivos == [str(tmp_path / "final" / "bien [a].mp4")]
+    assert 'Marcar' in postproceso.tiempos()
+
+
+def test_postproceso_job_espera_a_cerrar():
+    finales = []
+    postproceso = PostprocesoJob(lambda ruta: None, finales.append)
+    futuro = Future()
+    postproceso.agregar(futuro)
+    futuro.set_result({'files': [], 'steps': {}, 'queue_seconds': 0.0})
+    assert finales == [] and postproceso.pendientes == 0
+    postproceso.cerrar()
+    assert finales == [None] and postproceso.terminado.is_set()
+
+
+def test_diferir_postproceso_entrega_a_la_etapa(tmp_path, etapa):
+    entregados = []
+    confirmados = []
+    postproceso = PostprocesoJob(confirmados.append, lambda error: None)
+    with ytdlp.YoutubeDL({'quiet': True}) as ydl:
+        ydl.add_post_processor(ytdlp.ConfirmarSalida(confirmados.append), when='post_process')
+
+        def al_postprocesar(info, pasos):
+            entregados.append(pasos)
+            postproceso.agregar(etapa.enviar("job", ytdlp.opciones_postproceso(ydl.params), info, pasos))
+
+        ytdlp.diferir_postproceso(ydl, al_postprocesar)
+        info = descargado(tmp_path)
+        info['__postprocessors'] = [MarcarPP(ydl)]
+        inicio = time.perf_counter()
+        devuelto = ydl.post_process(info['filepath'], info)
+        # La descarga sigue sin esperar al paso
+        assert time.perf_counter() - inicio < 0.02
+        assert devuelto is info
+    esperar_job(postproceso)
+    assert entregados == [[MarcarPP]]
+    final = tmp_path / "final" / "video [abc].mp4"
+    assert confirmados == [str(final)] and final.read_text() == "datos\nmarcado\n"
+
+
+def test_diferir_sin_pasos_confirma_en_el_acto(tmp_path):
+    entregados, confirmados = [], []
+    with ytdlp.YoutubeDL({'quiet': True}) as ydl:
+        ydl.add_post_processor(ytdlp.ConfirmarSalida(confirmados.append), when='post_process')
+        ytdlp.diferir_postproceso(ydl, lambda info, pasos: entregados.append(pasos))
+        info = descargado(tmp_path)
+        ydl.post_process(info['filepath'], info)
+    assert entregados == []
+    assert confirmados == [str(tmp_path / "final" / "video [abc].mp4")]
+
+
+def test_por_defecto_hilos():
+    etapa = crear_postproceso(None)
+    assert etapa is not None and not etapa.procesos
+    assert crear_postproceso("process:2").procesos and crear_postproceso("inline") is None
+
+
+def test_etapa_procesos(tmp_path):
+    etapa = EtapaPostproceso(1, procesos=True)
+    try:
+        resultado = etapa.enviar("job", {'quiet': True}, descargado(tmp_path), [MarcarPP]).result(60)
+    finally:
+        etapa.cerrar()
+    assert resultado['files'] == [str(tmp_path / "final" / "video [abc].mp4")]
+
+
+def test_workers_nunca_con_fork():
+    # El padre tiene hilos a medias: fork copiaría sus locks tomados
+    from youtube_engine.postprocessing import _contexto_workers
+    assert _contexto_workers().get_start_method() in ("forkserver", "spawn")
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Pruebas del acceso al profiler por muestreo (/admin/profile)
+
+Uso:
+    python -m pytest -q test_profiling.py
+"""
+
+import time
+
+import pytest
+
+import youtube_profiling as profiling
+
+
+def test_sin_token_configurado_nadie_esta_autorizado(monkeypatch):
+    monkeypatch.delenv("YOUTUBE_ADMIN_TOKEN", raising=False)
+    assert not profiling.admin_autorizado("")
+    assert not profiling.admin_autorizado(None)
+    assert not profiling.admin_autorizado("cualquiera")
+
+
+def test_token_configurado(monkeypatch):
+    monkeypatch.setenv("YOUTUBE_ADMIN_TOKEN", "t0ken")
+    assert profiling.admin_autorizado("t0ken")
+    assert not profiling.admin_autorizado("t0ke")
+    assert not profiling.admin_autorizado(None)
+
+
+def test_endpoint_de_profiling(monkeypatch):
+    pytest.importorskip("flask")
+    import youtube_http_server as servidor
+
+    cliente = servidor.app.test_client()
+    url = "/admin/profile?seconds=0.05&interval_ms=5"
+    monkeypatch.delenv("YOUTUBE_ADMIN_TOKEN", raising=False)
+    assert cliente.post(url).status_code == 403
+
+    monkeypatch.setenv("YOUTUBE_ADMIN_TOKEN", "t0ken")
+    assert cliente.post(url).status_code == 403
+    assert cliente.post(url, headers={"X-Admin-Token": "otro"}).status_code == 403
+    assert cliente.post(url, headers={"X-Admin-Token": "t0ken"}).status_code == 200
+    for valor in ("nan", "inf", "-inf"):
+        respuesta = cliente.post(f"/admin/profile?seconds=0.05&interval_ms={valor}",
+                                 headers={"X-Admin-Token": "t0ken"})
+        assert respuesta.status_code == 400
+
+
+@pytest.mark.parametrize("segundos, intervalo", [(float("nan"), 0.005), (0.05, float("inf")), (float("-inf"), 0.005)])
+def test_perfilar_no_acepta_infinitos(segundos, intervalo):
+    with pytest.raises(ValueError):
+        profiling.perfilar(segundos, intervalo)
+
+
+def test_intervalo_no_alarga_la_sesion():
+    inicio = time.perf_counter()
+    profiling.perfilar(0.05, 3600)
+    assert time.perf_counter() - inicio < 1.0
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
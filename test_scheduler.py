@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Pruebas de los planificadores de descargas (youtube_engine.scheduler) y del perfil de extractores
+
+Uso:
+    python -m pytest -q test_scheduler.py
+"""
+
+import threading
+
+import pytest
+
+from youtube_engine.engine import opciones_extractores
+from youtube_engine.scheduler import PoolScheduler, ThreadScheduler, crear_scheduler
+
+
+class Jobs:
+    """Jobs que esperan a `soltar` y cuentan cuántos se ejecutan a la vez"""
+
+    def __init__(self):
+        self.soltar = threading.Event()
+        self.empezados = threading.Semaphore(0)
+        self.ejecutados = []
+        self.a_la_vez = self.maximo = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, job_id: str):
+        with self._lock:
+            self.a_la_vez += 1
+            self.maximo = max(self.maximo, self.a_la_vez)
+        self.empezados.release()
+        self.soltar.wait(10)
+        with self._lock:
+            self.a_la_vez -= 1
+            self.ejecutados.append(job_id)
+
+    def esperar_empezados(self, n: int):
+        for _ in range(n):
+            assert self.empezados.acquire(timeout=10)
+
+
+def test_pool_limita_los_jobs_en_ejecucion():
+    scheduler = PoolScheduler(2)
+    jobs = Jobs()
+    try:
+        for i in range(5):
+            scheduler.enviar(f"job-{i}", jobs, f"job-{i}")
+        jobs.esperar_empezados(2)
+        assert (scheduler.activos(), scheduler.en_cola()) == (2, 3)
+        # Un job en cola se retira sin llegar a ejecutarse; uno en marcha no
+        assert scheduler.cancelar("job-4")
+        assert not scheduler.cancelar("job-0")
+        assert not scheduler.cancelar("no-existe")
+        assert scheduler.esperar(0.05) == 4
+        jobs.soltar.set()
+        assert scheduler.esperar(10) == 0
+    finally:
+        jobs.soltar.set()
+        scheduler.cerrar()
+    assert jobs.maximo == 2
+    assert sorted(jobs.ejecutados) == [f"job-{i}" for i in range(4)]
+    assert (scheduler.activos(), scheduler.en_cola()) == (0, 0)
+
+
+def test_hilos_sin_limite():
+    scheduler = ThreadScheduler()
+    jobs = Jobs()
+    try:
+        for i in range(6):
+            scheduler.enviar(f"job-{i}", jobs, f"job-{i}")
+        jobs.esperar_empezados(6)
+        assert (scheduler.activos(), scheduler.en_cola()) == (6, 0)
+        assert not scheduler.cancelar("job-0")
+        assert scheduler.esperar(0.05) == 6
+        jobs.soltar.set()
+        assert scheduler.esperar(10) == 0
+    finally:
+        jobs.soltar.set()
+    assert jobs.maximo == 6 and scheduler.activos() == 0
+
+
+@pytest.mark.parametrize("especificacion, tipo, workers", [
+    (None, ThreadScheduler, None),
+    ("threads", ThreadScheduler, None),
+    ("pool", PoolScheduler, 8),
+    ("pool:3", PoolScheduler, 3),
+    ("pool:0", PoolScheduler, 1),
+])
+def test_crear_scheduler(especificacion, tipo, workers):
+    scheduler = crear_scheduler(especificacion)
+    try:
+        assert type(scheduler) is tipo
+        assert getattr(scheduler, 'max_workers', None) == workers
+    finally:
+        scheduler.cerrar()
+
+
+@pytest.mark.parametrize("especificacion", ["procesos", "pool:x"])
+def test_scheduler_no_valido(especificacion):
+    with pytest.raises(ValueError):
+        crear_scheduler(especificacion)
+
+
+def test_perfil_de_extractores():
+    assert opciones_extractores(None) == {'allowed_extractors': ['youtube.*']}
+    assert opciones_extractores('all') == {'allowed_extractors': ['default']}
+    with pytest.raises(ValueError):
+        opciones_extractores('vimeo')
+
+
+def test_solo_extractores_de_youtube():
+    yt_dlp = pytest.importorskip("yt_dlp")
+    ydl = yt_dlp.YoutubeDL({**opciones_extractores('youtube'), 'quiet': True})
+    try:
+        assert all(clave.startswith('Youtube') for clave in ydl._ies)
+        # Una URL de video sigue resolviéndose con el mismo extractor que con la lista completa
+        assert [clave for clave, ie in ydl._ies.items()
+                if ie.suitable("https://www.youtube.com/watch?v=dQw4w9WgXcQ")] == ['Youtube']
+    finally:
+        ydl.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Pruebas del índice de búsqueda de las descargas (youtube_engine.search)
+
+Uso:
+    python -m pytest -q test_search.py
+"""
+
+import pytest
+
+from youtube_engine.search import IndiceBusqueda, crear_indice_busqueda
+
+
+def video(video_id: str, titulo: str) -> dict:
+    return {'video_id': video_id, 'title': titulo, 'uploader': "Canal", 'channel_id': None,
+            'description': "", 'upload_date': "2024-01-01", 'duration': 60.0, 'view_count': 1,
+            'webpage_url': f"https://www.youtube.com/watch?v={video_id}"}
+
+
+@pytest.fixture
+def indice(tmp_path):
+    return IndiceBusqueda(tmp_path / "search.sqlite3")
+
+
+def test_indice_opcional(tmp_path):
+    assert crear_indice_busqueda(None, tmp_path) is None
+    assert crear_indice_busqueda("off", tmp_path) is None
+    assert crear_indice_busqueda("on", tmp_path).path == tmp_path / "search.sqlite3"
+    assert crear_indice_busqueda(str(tmp_path / "otro.db"), tmp_path).path == tmp_path / "otro.db"
+
+
+def test_no_devuelve_archivos_borrados(tmp_path, indice):
+    mp4, m4a = tmp_path / "Lofi [abc].mp4", tmp_path / "Lofi [abc].m4a"
+    mp4.write_bytes(b"v")
+    m4a.write_bytes(b"a")
+    indice.indexar([video("abc", "Lofi")], "job", [str(mp4), str(m4a)])
+    m4a.unlink()
+    resultado, = indice.buscar("lofi")['results']
+    assert resultado['files'] == [str(mp4)] and resultado['available']
+    mp4.unlink()
+    resultado, = indice.buscar("lofi")['results']
+    assert resultado['files'] == [] and not resultado['available']
+
+
+def test_olvidar_archivos_desalojados(tmp_path, indice):
+    rutas = {video_id: [str(tmp_path / f"{titulo} [{video_id}].mp4"), str(tmp_path / f"{titulo} [{video_id}].srt")]
+             for video_id, titulo in (("abc", "Lofi uno"), ("d-e_f", "Lofi dos"))}
+    for ruta in sum(rutas.values(), []):
+        open(ruta, "w").close()
+    indice.indexar([video("abc", "Lofi uno"), video("d-e_f", "Lofi dos")], "job", sum(rutas.values(), []))
+    # Un video pierde un archivo y el otro todos: ese sale del índice
+    assert indice.olvidar([rutas["abc"][1], *rutas["d-e_f"], str(tmp_path / "sin id.mp4")]) == 1
+    assert indice.total() == 1
+    resultado, = indice.buscar("lofi")['results']
+    assert resultado['video_id'] == "abc" and resultado['files'] == rutas["abc"][:1]
+    assert indice.olvidar([rutas["abc"][1]]) == 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Pruebas de los volúmenes de descarga (youtube_engine.storage)
+
+Uso:
+    python -m pytest -q test_storage.py
+"""
+
+import random
+from collections import Counter
+from datetime import datetime
+
+import pytest
+
+from youtube_engine.storage import (Almacenamiento, Volumen, carpeta_temporal, crear_almacenamiento,
+                                    recorrer_volumenes)
+
+GIB = 1024 ** 3
+
+
+@pytest.fixture
+def libre(monkeypatch):
+    """Bytes libres de cada volumen por nombre de carpeta, sin depender del disco"""
+    espacio = {}
+    monkeypatch.setattr(Volumen, 'libre', lambda self: espacio.get(self.ruta.name, 100 * GIB) - self.reservado)
+    return espacio
+
+
+@pytest.mark.parametrize("esquema, is_playlist, plantilla", [
+    ('flat', False, '%(title)s [%(id)s].%(ext)s'),
+    ('flat', True, '%(playlist_index)s - %(title)s [%(id)s].%(ext)s'),
+    ('id', False, '%(id).2s/%(title)s [%(id)s].%(ext)s'),
+    ('id', True, '%(playlist_id).2s/%(playlist_index)s - %(title)s [%(id)s].%(ext)s'),
+    ('date', False, '2026/03/07/%(title)s [%(id)s].%(ext)s'),
+    ('date', True, '2026/03/07/%(playlist_index)s - %(title)s [%(id)s].%(ext)s'),
+])
+def test_plantilla(tmp_path, esquema, is_playlist, plantilla):
+    almacenamiento = Almacenamiento([Volumen(tmp_path)], esquema)
+    assert almacenamiento.plantilla(is_playlist, datetime(2026, 3, 7, 23, 59)) == plantilla
+
+
+@pytest.mark.parametrize("volumenes, esquema", [([], 'flat'), (None, 'hash')])
+def test_configuracion_no_valida(tmp_path, volumenes, esquema):
+    with pytest.raises(ValueError):
+        Almacenamiento([Volumen(tmp_path)] if volumenes is None else volumenes, esquema)
+
+
+@pytest.mark.parametrize("peso", [0, -1.5])
+def test_peso_no_positivo(tmp_path, peso):
+    with pytest.raises(ValueError):
+        Volumen(tmp_path / "a", peso)
+
+
+def test_reparto_segun_el_peso(tmp_path, libre):
+    grande, pequeno = Volumen(tmp_path / "grande", 3), Volumen(tmp_path / "pequeno", 1)
+    almacenamiento = Almacenamiento([grande, pequeno])
+    almacenamiento._azar = random.Random(1)
+    elegidos = Counter()
+    for _ in range(4000):
+        reserva = almacenamiento.reservar(1024)
+        elegidos[reserva.volumen.ruta.name] += 1
+        reserva.liberar()
+    assert 2.6 < elegidos['grande'] / elegidos['pequeno'] < 3.4
+    assert grande.reservado == pequeno.reservado == 0
+
+
+def test_solo_volumenes_con_sitio(tmp_path, libre):
+    lleno, vacio = Volumen(tmp_path / "lleno", 100), Volumen(tmp_path / "vacio", 1)
+    libre['lleno'] = 5 * GIB
+    almacenamiento = Almacenamiento([lleno, vacio], margen=GIB)
+    # 4.5 GiB dejarían menos del margen en el lleno: van todos al otro pese a su peso
+    for _ in range(20):
+        reserva = almacenamiento.reservar(4 * GIB + GIB // 2)
+        assert reserva.volumen is vacio
+        reserva.liberar()
+    assert lleno.reservado == vacio.reservado == 0
+
+
+def test_sin_sitio_y_liberar(tmp_path, libre):
+    volumen = Volumen(tmp_path / "unico")
+    libre['unico'] = 10 * GIB
+    almacenamiento = Almacenamiento([volumen], margen=GIB)
+    reserva = almacenamiento.reservar(6 * GIB)
+    assert volumen.reservado == 6 * GIB
+    # Lo reservado cuenta como ocupado aunque aún no esté en el disco
+    assert almacenamiento.reservar(6 * GIB) is None
+    reserva.liberar()
+    reserva.liberar()
+    assert volumen.reservado == 0
+    assert almacenamiento.reservar(9 * GIB) is not None
+    assert almacenamiento.reservar(GIB) is None
+
+
+def test_reservar_en_una_carpeta(tmp_path, libre):
+    principal = Volumen(tmp_path / "principal")
+    almacenamiento = Almacenamiento([principal])
+    reserva = almacenamiento.reservar(1024, carpeta=tmp_path / "cli")
+    assert reserva.volumen.ruta == (tmp_path / "cli").absolute()
+    assert almacenamiento.volumen_de(tmp_path / "cli") is reserva.volumen
+    assert almacenamiento.volumen_de(tmp_path / "principal") is principal
+    assert len(almacenamiento.volumenes) == 2 and almacenamiento.principal is principal
+
+
+def test_crear_almacenamiento(tmp_path):
+    almacenamiento = crear_almacenamiento(f"{tmp_path / 'a'}:2.5, {tmp_path / 'b'}", tmp_path / "c", 'id', 1.5)
+    assert [(v.ruta.name, v.peso) for v in almacenamiento.volumenes] == [('a', 2.5), ('b', 1.0)]
+    assert almacenamiento.esquema == 'id' and almacenamiento.margen == 1536 * 1024
+    por_defecto = crear_almacenamiento(None, tmp_path / "c")
+    assert [v.ruta.name for v in por_defecto.volumenes] == ['c']
+    assert por_defecto.esquema == 'flat' and por_defecto.margen == 0
+    with pytest.raises(ValueError):
+        crear_almacenamiento(f"{tmp_path / 'a'}:-1", tmp_path)
+
+
+def test_recorrer_volumenes(tmp_path):
+    volumen = Volumen(tmp_path)
+    (tmp_path / "ab").mkdir()
+    for nombre in ("video [abc].mp4", "ab/otro [abd].webm", "jobs.sqlite3", "jobs.sqlite3-wal", "x.mp4.part"):
+        (tmp_path / nombre).write_bytes(b"x")
+    temporal = carpeta_temporal(volumen, "job-1")
+    temporal.mkdir(parents=True)
+    (temporal / "a medias.mp4").write_bytes(b"x")
+    assert temporal == tmp_path.absolute() / ".partial" / "job-1"
+    rutas = sorted(ruta for ruta, _ in recorrer_volumenes([volumen]))
+    assert rutas == [str(tmp_path.absolute() / "ab" / "otro [abd].webm"),
+                     str(tmp_path.absolute() / "video [abc].mp4")]
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
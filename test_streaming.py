@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Pruebas del envío de videos mientras llegan del origen (youtube_engine.streaming)
+
+Uso:
+    python -m pytest -q test_streaming.py
+"""
+
+import io
+
+import pytest
+
+from youtube_engine import streaming
+from youtube_engine.streaming import TAMANO_BLOQUE, Transmision, cabeceras_respuesta
+
+VIDEO = bytes(range(256)) * (TAMANO_BLOQUE // 64 + 3)
+
+
+class Respuesta(io.BytesIO):
+    """Respuesta del origen que cuenta lo leído y si se ha cerrado"""
+
+    def __init__(self, datos: bytes, cabeceras=None):
+        super().__init__(datos)
+        self.headers = cabeceras or {}
+        self.leido = 0
+
+    def read(self, n=-1):
+        bloque = super().read(n)
+        self.leido += len(bloque)
+        return bloque
+
+
+@pytest.fixture
+def copia(tmp_path):
+    ruta = tmp_path / ".partial" / "stream-1" / "video [abc].mp4"
+    ruta.parent.mkdir(parents=True)
+    return ruta
+
+
+def test_lee_al_ritmo_del_cliente():
+    respuesta = Respuesta(VIDEO)
+    transmision = Transmision("video", respuesta=respuesta, cabeceras={'Content-Length': str(len(VIDEO))})
+    bloques = transmision.bloques()
+    assert len(next(bloques)) == TAMANO_BLOQUE
+    # Solo se ha pedido al origen el bloque que ya tiene el cliente
+    assert respuesta.leido == TAMANO_BLOQUE
+    assert b"".join([VIDEO[:TAMANO_BLOQUE], *bloques]) == VIDEO
+    assert transmision.enviados == len(VIDEO) and respuesta.closed
+
+
+def test_copia_completa_se_confirma(tmp_path, copia):
+    destino = tmp_path / "video [abc].mp4"
+    cerrados = []
+    transmision = Transmision("video", respuesta=Respuesta(VIDEO), cabeceras={'Content-Length': str(len(VIDEO))},
+                              copia=copia, destino=destino, al_cerrar=lambda: cerrados.append(destino.is_file()))
+    assert b"".join(transmision.bloques()) == VIDEO
+    assert destino.read_bytes() == VIDEO
+    assert not copia.parent.exists()
+    # al_cerrar ve ya el archivo confirmado, para registrarlo en la caché
+    assert cerrados == [True]
+
+
+@pytest.mark.parametrize("anunciado", [len(VIDEO) + 1, None])
+def test_copia_incompleta_se_descarta(tmp_path, copia, anunciado):
+    destino = tmp_path / "video [abc].mp4"
+    cabeceras = {'Content-Length': str(anunciado)} if anunciado else {}
+    respuesta = Respuesta(VIDEO, cabeceras)
+    transmision = Transmision("video", respuesta=respuesta, cabeceras=cabeceras, copia=copia, destino=destino)
+    bloques = transmision.bloques()
+    if anunciado is None:
+        # El cliente se va a mitad de video
+        next(bloques)
+        bloques.close()
+    else:
+        # El origen corta antes de los bytes que anunció
+        assert b"".join(bloques) == VIDEO
+    assert not destino.exists()
+    assert not copia.parent.exists()
+    assert respuesta.closed
+
+
+def test_cerrar_sin_recorrer():
+    cerrados = []
+    respuesta = Respuesta(VIDEO)
+    transmision = Transmision("video", respuesta=respuesta, al_cerrar=lambda: cerrados.append(1))
+    transmision.cerrar()
+    transmision.cerrar()
+    assert respuesta.closed and respuesta.leido == 0
+    assert cerrados == [1]
+
+
+def test_cuenta_los_bytes_enviados(monkeypatch):
+    enviados = []
+    monkeypatch.setattr(streaming.metricas.DOWNLOAD_BYTES, 'inc', enviados.append)
+    list(Transmision("video", respuesta=Respuesta(VIDEO)).bloques())
+    assert sum(enviados) == len(VIDEO) and max(enviados) <= TAMANO_BLOQUE
+
+
+@pytest.mark.parametrize("origen, ext, esperadas", [
+    ({'Content-Type': 'video/webm', 'Content-Length': '10', 'Accept-Ranges': 'none', 'Server': 'x'}, 'mp4',
+     {'Content-Type': 'video/webm', 'Content-Length': '10', 'Accept-Ranges': 'none'}),
+    ({'Content-Type': 'application/octet-stream', 'Content-Range': 'bytes 0-9/20'}, 'webm',
+     {'Content-Type': 'video/webm', 'Content-Range': 'bytes 0-9/20', 'Accept-Ranges': 'bytes'}),
+    ({}, 'mp4', {'Content-Type': 'video/mp4', 'Accept-Ranges': 'bytes'}),
+])
+def test_cabeceras_respuesta(origen, ext, esperadas):
+    assert cabeceras_respuesta(Respuesta(b"", origen), {'ext': ext}) == esperadas
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la entrega de webhooks contra el receptor local (benchmarks/webhook_receiver.py)
+
+Uso:
+    python -m pytest -q test_webhooks.py
+"""
+
+import time
+
+import pytest
+
+from benchmarks.webhook_receiver import WebhookReceiver
+from youtube_engine import DownloadStatus, nuevo_job, validar_callback_url
+from youtube_engine import webhooks as modulo
+from youtube_engine.webhooks import Outbox, Webhooks
+
+SECRETO = "s3cr3t"
+
+
+@pytest.fixture(autouse=True)
+def entorno(monkeypatch):
+    # El receptor escucha en 127.0.0.1; los reintentos, sin esperar segundos
+    monkeypatch.setenv("YOUTUBE_WEBHOOK_ALLOW_HOSTS", "127.0.0.1")
+    monkeypatch.setattr(modulo, "ESPERA_BASE", 0.01)
+
+
+def terminado(url: str) -> dict:
+    job = nuevo_job("https://www.youtube.com/watch?v=abc", False, callback_url=url)
+    job.update(status=DownloadStatus.COMPLETED.value)
+    return job
+
+
+def test_lote_firmado(tmp_path):
+    with WebhookReceiver(SECRETO) as receptor:
+        webhooks = Webhooks(Outbox(tmp_path / "webhooks.sqlite3"), SECRETO, ventana=0.2)
+        jobs = [terminado(receptor.url) for _ in range(5)]
+        try:
+            for job in jobs:
+                webhooks.notificar(job)
+            assert receptor.esperar(5)
+        finally:
+            webhooks.cerrar()
+    assert receptor.rechazadas == 0
+    # Los eventos que llegan seguidos salen juntos
+    assert len(receptor.lotes) < 5
+    assert {evento['job']['job_id'] for evento in receptor.eventos().values()} == {job['job_id'] for job in jobs}
+    assert webhooks.outbox.pendientes() == 0
+
+
+def test_firma_incorrecta_se_rechaza_y_reintenta(tmp_path):
+    with WebhookReceiver(SECRETO) as receptor:
+        webhooks = Webhooks(Outbox(tmp_path / "webhooks.sqlite3"), "otro", ventana=0.05)
+        try:
+            webhooks.notificar(terminado(receptor.url))
+            deadline = time.monotonic() + 10
+            while receptor.rechazadas < 2 and time.monotonic() < deadline:
+                time.sleep(0.05)
+        finally:
+            webhooks.cerrar()
+    assert receptor.rechazadas >= 2 and receptor.lotes == []
+
+
+def test_reintento_tras_respuesta_no_2xx(tmp_path):
+    with WebhookReceiver(SECRETO, fallos=2) as receptor:
+        webhooks = Webhooks(Outbox(tmp_path / "webhooks.sqlite3"), SECRETO, ventana=0.05)
+        try:
+            webhooks.notificar(terminado(receptor.url))
+            assert receptor.esperar(1)
+        finally:
+            webhooks.cerrar()
+    assert receptor.peticiones == 3 and len(receptor.lotes) == 1
+
+
+def test_reintento_tras_respuesta_cortada(tmp_path):
+    with WebhookReceiver(SECRETO, fallos=2, cortar=True) as receptor:
+        webhooks = Webhooks(Outbox(tmp_path / "webhooks.sqlite3"), SECRETO, ventana=0.05)
+        try:
+            webhooks.notificar(terminado(receptor.url))
+            assert receptor.esperar(1)
+        finally:
+            webhooks.cerrar()
+    # IncompleteRead cuenta como un intento más, con su espera, no deja el lote reservado
+    assert receptor.peticiones == 3 and len(receptor.lotes) == 1
+    assert webhooks.outbox.pendientes() == 0
+
+
+def test_reanuda_el_outbox_tras_reiniciar(tmp_path):
+    ruta = tmp_path / "webhooks.sqlite3"
+    with WebhookReceiver(SECRETO, fallos=10 ** 6) as caido:
+        antes = Webhooks(Outbox(ruta), SECRETO, ventana=0.05)
+        job = terminado(caido.url)
+        antes.notificar(job)
+        deadline = time.monotonic() + 10
+        while caido.peticiones == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        antes.cerrar()
+        antes._hilo.join(5)
+        assert caido.lotes == [] and Outbox(ruta).pendientes() == 1
+
+        # Otro proceso (el servidor reiniciado) entrega lo pendiente al arrancar
+        caido.fallos = 0
+        despues = Webhooks(Outbox(ruta), SECRETO, ventana=0.05)
+        try:
+            despues.reanudar()
+            assert caido.esperar(1)
+        finally:
+            despues.cerrar()
+    assert list(caido.eventos().values())[0]['job']['job_id'] == job['job_id']
+
+
+def test_redireccion_no_se_sigue(tmp_path):
+    with WebhookReceiver(SECRETO) as interno, WebhookReceiver(SECRETO, redirigir_a=interno.url) as publico:
+        webhooks = Webhooks(Outbox(tmp_path / "webhooks.sqlite3"), SECRETO, ventana=0.05)
+        try:
+            webhooks.notificar(terminado(publico.url))
+            deadline = time.monotonic() + 10
+            while publico.peticiones < 2 and time.monotonic() < deadline:
+                time.sleep(0.05)
+        finally:
+            webhooks.cerrar()
+    # El 302 cuenta como fallo y se reintenta contra el mismo endpoint
+    assert publico.peticiones >= 2 and interno.peticiones == 0
+
+
+@pytest.mark.parametrize("url", [
+    "http://169.254.169.254/latest/meta-data/",
+    "http://10.0.0.5/hook",
+    "http://192.168.1.1/hook",
+    "http://[::1]:8080/hook",
+    "http://localhost/hook",
+])
+def test_callback_url_no_publica(monkeypatch, url):
+    monkeypatch.delenv("YOUTUBE_WEBHOOK_ALLOW_HOSTS")
+    with pytest.raises(ValueError):
+        validar_callback_url(url)
+
+
+def test_callback_url_permitida(monkeypatch):
+    assert validar_callback_url("http://93.184.216.34/hook") == "http://93.184.216.34/hook"
+    monkeypatch.setenv("YOUTUBE_WEBHOOK_ALLOW_HOSTS", "localhost, 10.0.0.0/8")
+    assert validar_callback_url("http://localhost:9000/hook")
+    assert validar_callback_url("http://10.1.2.3/hook")
+    with pytest.raises(ValueError):
+        validar_callback_url("http://192.168.1.1/hook")
+    with pytest.raises(ValueError):
+        validar_callback_url("ftp://example.com/hook")
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Cliente del servidor HTTP por socket Unix
+La CLI entrega las descargas a un servidor ya arrancado y se ahorra cargar yt-dlp en cada llamada
+"""
+
+import http.client
+import json
+import os
+import socket
+import threading
+from pathlib import Path
+from typing import Callable, List, Optional
+
+ESTADOS_FINALES = ('completed', 'failed', 'cancelled')
+
+# En Windows no siempre hay AF_UNIX: ahí la CLI siempre descarga en su propio proceso
+SOCKETS_UNIX = hasattr(socket, 'AF_UNIX')
+
+
+def ruta_socket_por_defecto() -> str:
+    """YOUTUBE_UNIX_SOCKET, o un socket por usuario en XDG_RUNTIME_DIR o en el directorio temporal"""
+    if os.environ.get('YOUTUBE_UNIX_SOCKET'):
+        return os.environ['YOUTUBE_UNIX_SOCKET']
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        return str(Path(os.environ['XDG_RUNTIME_DIR']) / "youtube-downloader.sock")
+    usuario = os.getuid() if hasattr(os, 'getuid') else os.getpid()
+    return str(Path(os.environ.get('TMPDIR', '/tmp')) / f"youtube-downloader-{usuario}.sock")
+
+
+class ConexionUnix(http.client.HTTPConnection):
+    """HTTPConnection que habla con el servidor a través de un socket Unix"""
+
+    def __init__(self, ruta: str, timeout: float = 10.0):
+        super().__init__('localhost', timeout=timeout)
+        self.ruta = ruta
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.ruta)
+
+
+class ErrorServidor(RuntimeError):
+    """El servidor rechazó la petición o dejó de responder"""
+
+
+class ClienteDaemon:
+    """Descargas delegadas en un youtube_http_server que escucha en `ruta`.
+
+    `descargar` crea el job y consulta su estado hasta que termina, con
+    pausas que empiezan en 10 ms (los videos cortos acaban enseguida) y
+    crecen hasta `intervalo` segundos. Si se activa `interrumpir`, cancela
+    los jobs en curso.
+    """
+
+    def __init__(self, ruta: str, intervalo: float = 0.5):
+        self.ruta = ruta
+        self.intervalo = intervalo
+        self.interrumpir = threading.Event()
+        self.servidor: dict = {}
+
+    def _peticion(self, metodo: str, ruta: str, cuerpo: Optional[dict] = None):
+        conexion = ConexionUnix(self.ruta)
+        try:
+            datos = json.dumps(cuerpo).encode('utf-8') if cuerpo is not None else None
+            conexion.request(metodo, ruta, body=datos,
+                             headers={'Content-Type': 'application/json'} if datos else {})
+            respuesta = conexion.getresponse()
+            contenido = respuesta.read()
+        finally:
+            conexion.close()
+        try:
+            return respuesta.status, json.loads(contenido or b'{}')
+        except ValueError:
+            return respuesta.status, {"error": contenido.decode('utf-8', 'replace')[:200]}
+
+    def informacion(self) -> Optional[dict]:
+        """GET / del servidor, o None si no hay nadie escuchando en el socket"""
+        if not SOCKETS_UNIX or not os.path.exists(self.ruta):
+            return None
+        try:
+            status, datos = self._peticion('GET', '/')
+        except OSError:
+            return None
+        return datos if status == 200 else None
+
+    def descargar(self, url: str, is_playlist: bool = False, quality: str = "720p",
+                  al_progreso: Optional[Callable[[dict], None]] = None, modo: str = "video",
+                  idiomas: Optional[List[str]] = None) -> dict:
+        """Descarga en el servidor y devuelve el estado final del job.
+
+        Los errores de conexión no se propagan: devuelven un job fallido con
+        el motivo en error_message, igual que una descarga local que falla.
+        """
+        endpoint = '/download_playlist' if is_playlist else '/download_video'
+        job_id = None
+        try:
+            status, datos = self._peticion('POST', endpoint, {'url': url, 'quality': quality, 'mode': modo,
+                                                              'languages': idiomas})
+            if status != 200:
+                raise ErrorServidor(datos.get('error') or f"HTTP {status}")
+            job_id = datos['job_id']
+
+            cancelado = False
+            pausa = 0.01
+            while True:
+                if self.interrumpir.is_set() and not cancelado:
+                    self._peticion('POST', f'/cancel/{job_id}')
+                    cancelado = True
+                status, estado = self._peticion('GET', f'/status/{job_id}')
+                if status != 200:
+                    raise ErrorServidor(estado.get('error') or f"HTTP {status}")
+                if al_progreso is not None:
+                    al_progreso(estado)
+                if estado['status'] in ESTADOS_FINALES:
+                    return estado
+                self.interrumpir.wait(pausa)
+                pausa = min(pausa * 1.5, self.intervalo)
+        except (OSError, ErrorServidor, http.client.HTTPException) as e:
+            return {
+                'job_id': job_id,
+                'title': url,
+                'status': 'failed',
+                'error_message': f"Servidor en {self.ruta}: {e}",
+                'is_playlist': is_playlist,
+                'total_videos': 0,
+                'downloaded_videos': 0,
+                'phase_timings': None,
+            }
+
+
+def conectar(ruta: Optional[str] = None) -> Optional[ClienteDaemon]:
+    """Cliente del servidor local si hay uno escuchando en `ruta`; si no, None"""
+    cliente = ClienteDaemon(ruta or ruta_socket_por_defecto())
+    informacion = cliente.informacion()
+    if informacion is None:
+        return None
+    cliente.servidor = informacion
+    return cliente
@@ -4,10 +4,35 @@ Descargador de videos de YouTube
 Programa sencillo para descargar videos de YouTube en la carpeta 'download'
 """
 
+import argparse
+import json
 import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
-from yt_dlp import YoutubeDL
+
+from youtube_engine import (MODOS, DownloadStatus, detectar_tipo_url, id_canonico, parsear_idiomas, validar_calidad,
+                            validar_modo, validar_url_youtube)
+
+# Motor de descargas: la CLI ejecuta cada descarga en su propio hilo. Se crea con
+# la primera descarga local, así que en modo cliente no se llega a importar
+motor = None
+_motor_lock = threading.Lock()
+
+# En modo por lotes yt-dlp no escribe en la consola: la salida es la barra de progreso
+OPCIONES_SILENCIOSAS = {'quiet': True, 'no_warnings': True, 'noprogress': True}
+
+def obtener_motor():
+    """Motor de descargas de este proceso, creado la primera vez que hace falta"""
+    global motor
+    with _motor_lock:
+        if motor is None:
+            from youtube_engine import DownloadEngine, MemoryJobStore, ThreadScheduler
+            motor = DownloadEngine(store=MemoryJobStore(), scheduler=ThreadScheduler())
+    return motor
 
 def crear_carpeta_download():
     """Crea la carpeta 'download' si no existe"""
@@ -15,103 +40,467 @@ def crear_carpeta_download():
     download_path.mkdir(exist_ok=True)
     return download_path
 
-def validar_url_youtube(url):
-    """Valida si la URL es de YouTube"""
-    youtube_dominios = ['youtube.com', 'youtu.be', 'm.youtube.com']
-    return any(dominio in url.lower() for dominio in youtube_dominios)
+def mostrar_informacion(info, es_playlist):
+    """Muestra la información del video o playlist antes de descargar"""
+    if es_playlist:
+        # Información de playlist
+        titulo_playlist = info.get('title', 'Playlist sin título')
+        cantidad_videos = info.get('playlist_count', 0)
+        autor = info.get('uploader', 'Autor desconocido')
+        
+        print(f"📁 Playlist: {titulo_playlist}")
+        print(f"👤 Autor: {autor}")
+        print(f"🎬 Cantidad de videos: {cantidad_videos}")
+        
+        # Mostrar primeros videos de la playlist
+        entries = list(info.get('entries') or [])
+        if entries:
+            print("\n📋 Primeros videos en la playlist:")
+            for i, entry in enumerate(entries[:5]):  # Mostrar solo los primeros 5
+                titulo_video = entry.get('title', 'Sin título')
+                duracion = entry.get('duration', 0)
+                if duracion:
+                    minutos = duracion // 60
+                    segundos = duracion % 60
+                    print(f"   {i+1}. {titulo_video} ({minutos}:{segundos:02d})")
+            if len(entries) > 5:
+                print(f"   ... y {len(entries) - 5} videos más")
+    else:
+        # Información de video individual
+        titulo = info.get('title', 'Video sin título')
+        duracion = info.get('duration', 0)
+        autor = info.get('uploader', 'Autor desconocido')
+        
+        print(f"📺 Título: {titulo}")
+        print(f"👤 Autor: {autor}")
+        if duracion:
+            minutos = duracion // 60
+            segundos = duracion % 60
+            print(f"⏱️ Duración: {minutos}:{segundos:02d}")
+    
+    print("\nIniciando descarga...")
+
+def descargar_video(url, carpeta_destino, descargar_playlist=False, quality="720p",
+                    progress_hooks=(), silencioso=False, modo="video", idiomas=None):
+    """Descarga el video o playlist de YouTube a la carpeta especificada; devuelve si se completó"""
+    job = descargar_job(url, carpeta_destino, descargar_playlist, quality, progress_hooks, silencioso, modo, idiomas)
+    return job['status'] == DownloadStatus.COMPLETED
 
-def detectar_tipo_url(url):
-    """Detecta si la URL es un video individual o una playlist"""
-    url_lower = url.lower()
+def descargar_job(url, carpeta_destino, descargar_playlist=False, quality="720p",
+                  progress_hooks=(), silencioso=False, modo="video", idiomas=None):
+    """Como descargar_video, pero devuelve el job terminado.
+    
+    Es la unidad de trabajo del modo interactivo y del modo por lotes: el job
+    trae estado, título, archivos, error y tiempos por fase. Con `silencioso`
+    no escribe nada en la consola. `modo` elige qué se descarga (video,
+    audio, subtitles o thumbnail).
+    """
+    tipo_url = detectar_tipo_url(url)
+    es_playlist = descargar_playlist or tipo_url == 'playlist'
+    
+    if not silencioso:
+        if es_playlist:
+            print(f"Descargando playlist desde: {url}")
+            print("Obteniendo información de la playlist...")
+        else:
+            print(f"Descargando video desde: {url}")
+            print("Obteniendo información del video...")
+    
+    job = obtener_motor().descargar(url, descargar_playlist, quality,
+                                    al_extraer=None if silencioso else lambda info: mostrar_informacion(info, es_playlist),
+                                    progress_hooks=progress_hooks, carpeta=carpeta_destino,
+                                    opciones=OPCIONES_SILENCIOSAS if silencioso else None,
+                                    modo=modo, idiomas=idiomas)
+    
+    if silencioso:
+        return job
     
-    if 'playlist?list=' in url_lower:
-        return 'playlist'
-    elif 'watch?v=' in url_lower and 'list=' in url_lower:
-        return 'video_en_playlist'
+    if job['status'] != DownloadStatus.COMPLETED:
+        print(f"❌ Error durante la descarga: {job.get('error_message') or job['status']}")
+    elif es_playlist:
+        print("✅ Playlist descargada exitosamente!")
     else:
-        return 'video_individual'
+        print("✅ Video descargado exitosamente!")
+    
+    return job
 
-def descargar_video(url, carpeta_destino, descargar_playlist=False):
-    """Descarga el video o playlist de YouTube a la carpeta especificada"""
-    try:
-        # Configuración para yt-dlp
-        if descargar_playlist:
-            ydl_opts = {
-                'outtmpl': str(carpeta_destino / '%(playlist_index)s - %(title)s.%(ext)s'),
-                'format': 'best[height<=720]',  # Descarga en calidad máxima hasta 720p
-                'noplaylist': False,  # Permite descargar playlists
-            }
+# Modo por lotes
+
+def leer_lote(lineas, quality="720p", playlists=False, modo="video", idiomas=None):
+    """Convierte las líneas de entrada en los elementos únicos del lote.
+    
+    Cada línea es una URL o un objeto JSON con `url` y, opcionalmente,
+    `quality`, `playlist`, `mode` y `languages`. Las URLs se deduplican por su
+    ID canónico y su modo, así que youtu.be/X y watch?v=X cuentan como la
+    misma. Devuelve los elementos y las líneas descartadas por no válidas o
+    repetidas.
+    """
+    elementos = []
+    vistos = {}
+    descartes = {'invalid': [], 'duplicates': []}
+    
+    for numero, linea in enumerate(lineas, 1):
+        linea = linea.strip()
+        if not linea or linea.startswith('#'):
+            continue
+        
+        if linea.startswith('{'):
+            try:
+                datos = json.loads(linea)
+            except json.JSONDecodeError as e:
+                descartes['invalid'].append({'line': numero, 'error': f"JSON no válido: {e}"})
+                continue
         else:
-            ydl_opts = {
-                'outtmpl': str(carpeta_destino / '%(title)s.%(ext)s'),
-                'format': 'best[height<=720]',  # Descarga en calidad máxima hasta 720p
-                'noplaylist': True,  # Solo descarga el video, no la playlist completa
-            }
+            datos = {'url': linea}
         
-        with YoutubeDL(ydl_opts) as ydl:
-            tipo_url = detectar_tipo_url(url)
-            
-            if descargar_playlist or tipo_url == 'playlist':
-                print(f"Descargando playlist desde: {url}")
-                print("Obteniendo información de la playlist...")
-            else:
-                print(f"Descargando video desde: {url}")
-                print("Obteniendo información del video...")
-            
-            # Obtener información del video/playlist
-            info = ydl.extract_info(url, download=False)
-            
-            if descargar_playlist or tipo_url == 'playlist':
-                # Información de playlist
-                titulo_playlist = info.get('title', 'Playlist sin título')
-                cantidad_videos = info.get('playlist_count', 0)
-                autor = info.get('uploader', 'Autor desconocido')
-                
-                print(f"📁 Playlist: {titulo_playlist}")
-                print(f"👤 Autor: {autor}")
-                print(f"🎬 Cantidad de videos: {cantidad_videos}")
-                
-                # Mostrar primeros videos de la playlist
-                entries = info.get('entries', [])
-                if entries:
-                    print("\n📋 Primeros videos en la playlist:")
-                    for i, entry in enumerate(entries[:5]):  # Mostrar solo los primeros 5
-                        titulo_video = entry.get('title', 'Sin título')
-                        duracion = entry.get('duration', 0)
-                        if duracion:
-                            minutos = duracion // 60
-                            segundos = duracion % 60
-                            print(f"   {i+1}. {titulo_video} ({minutos}:{segundos:02d})")
-                    if len(entries) > 5:
-                        print(f"   ... y {len(entries) - 5} videos más")
+        url = str(datos.get('url') or '').strip()
+        if not validar_url_youtube(url):
+            descartes['invalid'].append({'line': numero, 'url': url, 'error': "URL no válida de YouTube"})
+            continue
+        try:
+            modo_elemento = validar_modo(datos.get('mode') or modo)
+            calidad = validar_calidad(str(datos.get('quality') or quality))
+        except ValueError as e:
+            descartes['invalid'].append({'line': numero, 'url': url, 'error': str(e)})
+            continue
+        
+        # Las playlists se descargan enteras; un video de una playlist, solo si se pide
+        tipo_url = detectar_tipo_url(url)
+        es_playlist = tipo_url == 'playlist' or (tipo_url == 'video_en_playlist' and bool(datos.get('playlist', playlists)))
+        clave = id_canonico(url, noplaylist=not es_playlist)
+        if (clave, modo_elemento) in vistos:
+            descartes['duplicates'].append({'line': numero, 'url': url, 'duplicate_of': vistos[clave, modo_elemento]})
+            continue
+        vistos[clave, modo_elemento] = url
+        
+        elementos.append({
+            'url': url,
+            'canonical_id': clave,
+            'quality': calidad,
+            'is_playlist': es_playlist,
+            'mode': modo_elemento,
+            'languages': parsear_idiomas(datos.get('languages')) or idiomas,
+        })
+    
+    return elementos, descartes
+
+class BarraProgreso:
+    """Progress hook de un elemento del lote: bytes, velocidad y título"""
+    
+    __slots__ = ('url', 'titulo', 'descargado', 'total', 'acumulado', 'velocidad')
+    
+    def __init__(self, url):
+        self.url = url
+        self.titulo = url
+        self.descargado = 0
+        self.total = 0
+        self.acumulado = 0
+        self.velocidad = 0.0
+    
+    def __call__(self, d):
+        info = d.get('info_dict') or {}
+        if info.get('title'):
+            self.titulo = info['title']
+        if d.get('status') == 'downloading':
+            self.descargado = d.get('downloaded_bytes') or 0
+            self.total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+            self.velocidad = d.get('speed') or 0.0
+        elif d.get('status') == 'finished':
+            # Cada archivo terminado (video, audio, cada video de una playlist) se acumula
+            self.acumulado += d.get('total_bytes') or d.get('downloaded_bytes') or self.descargado
+            self.descargado = self.total = 0
+            self.velocidad = 0.0
+    
+    def desde_estado(self, estado):
+        """Modo cliente: el servidor informa del título, no de los bytes descargados"""
+        if estado.get('current_phase') not in (None, 'extraction'):
+            self.titulo = estado['title']
+    
+    @property
+    def bytes(self):
+        return self.acumulado + self.descargado
+
+def dibujar_barra(fraccion, ancho=20):
+    llenos = int(max(0.0, min(fraccion, 1.0)) * ancho)
+    return '█' * llenos + '░' * (ancho - llenos)
+
+class ProgresoLote:
+    """Una barra por descarga activa y una barra global del lote.
+    
+    En una terminal se redibuja en el sitio varias veces por segundo; si la
+    salida no es una terminal, solo se escribe una línea por elemento terminado.
+    """
+    
+    def __init__(self, total, salida=sys.stderr, activa=True, intervalo=0.2):
+        self.total = total
+        self.salida = salida
+        self.activa = activa
+        self.interactiva = activa and salida.isatty()
+        self.intervalo = intervalo
+        self.barras = {}
+        self.completados = 0
+        self.fallidos = 0
+        self.bytes_terminados = 0
+        self.inicio = time.monotonic()
+        self._lineas = 0
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._hilo = None
+    
+    def __enter__(self):
+        if self.interactiva:
+            self._hilo = threading.Thread(target=self._bucle, daemon=True)
+            self._hilo.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self._parar.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._dibujar()
+    
+    def empezar(self, indice, url):
+        barra = BarraProgreso(url)
+        with self._lock:
+            self.barras[indice] = barra
+        return barra
+    
+    def terminar(self, indice, resultado):
+        with self._lock:
+            barra = self.barras.pop(indice, None)
+            if barra is not None:
+                self.bytes_terminados += barra.bytes
+            if resultado['status'] == DownloadStatus.COMPLETED:
+                self.completados += 1
+                icono = "✅"
             else:
-                # Información de video individual
-                titulo = info.get('title', 'Video sin título')
-                duracion = info.get('duration', 0)
-                autor = info.get('uploader', 'Autor desconocido')
-                
-                print(f"📺 Título: {titulo}")
-                print(f"👤 Autor: {autor}")
-                if duracion:
-                    minutos = duracion // 60
-                    segundos = duracion % 60
-                    print(f"⏱️ Duración: {minutos}:{segundos:02d}")
-            
-            print("\nIniciando descarga...")
-            ydl.download([url])
-            
-            if descargar_playlist or tipo_url == 'playlist':
-                print("✅ Playlist descargada exitosamente!")
+                self.fallidos += 1
+                icono = "⏸️" if resultado['status'] == 'interrupted' else "❌"
+            if self.activa:
+                hechos = self.completados + self.fallidos
+                detalle = f" ({resultado['error']})" if resultado.get('error') else ""
+                self._escribir_por_encima(
+                    f"{icono} [{hechos}/{self.total}] {resultado['title'] or resultado['url']}{detalle}")
+    
+    def _escribir_por_encima(self, texto):
+        """Escribe una línea fija por encima de las barras (que se redibujan después)"""
+        if self.interactiva:
+            self._borrar()
+        print(texto, file=self.salida, flush=True)
+    
+    def _borrar(self):
+        if self._lineas:
+            self.salida.write(f"\x1b[{self._lineas}F\x1b[J")
+            self._lineas = 0
+    
+    def _bucle(self):
+        while not self._parar.wait(self.intervalo):
+            self._dibujar()
+    
+    def _dibujar(self):
+        with self._lock:
+            self._borrar()
+            lineas = []
+            activos = sum(barra.bytes for barra in self.barras.values())
+            velocidad = sum(barra.velocidad for barra in self.barras.values())
+            for barra in self.barras.values():
+                fraccion = barra.descargado / barra.total if barra.total else 0.0
+                lineas.append(f"  {barra.titulo[:40]:<40} {dibujar_barra(fraccion)} {fraccion * 100:5.1f}% "
+                              f"{barra.bytes / 1e6:8.1f} MB {barra.velocidad / 1e6:6.1f} MB/s")
+            hechos = self.completados + self.fallidos
+            total_mb = (self.bytes_terminados + activos) / 1e6
+            lineas.append(f"📦 {hechos}/{self.total} {dibujar_barra(hechos / self.total if self.total else 1.0)} "
+                          f"✅ {self.completados} ❌ {self.fallidos}  {total_mb:.1f} MB  {velocidad / 1e6:.1f} MB/s  "
+                          f"{time.monotonic() - self.inicio:.0f}s")
+            self.salida.write("\n".join(lineas) + "\n")
+            self.salida.flush()
+            self._lineas = len(lineas)
+
+def resultado_elemento(elemento, job, barra, duracion):
+    """Entrada del informe para un elemento del lote"""
+    estado = job['status']
+    if job.get('interrupted') and estado == DownloadStatus.PENDING:
+        estado = 'interrupted'
+    return {
+        **elemento,
+        'status': estado,
+        'job_id': job['job_id'],
+        'title': job['title'],
+        'error': job.get('error_message'),
+        'total_videos': job['total_videos'],
+        'downloaded_videos': job['downloaded_videos'],
+        'bytes': barra.bytes,
+        'duration_s': round(duracion, 3),
+        'phase_timings': job.get('phase_timings'),
+        'files': job.get('files') or [],
+    }
+
+def ejecutar_lote(elementos, carpeta, jobs=4, mostrar_progreso=True, cliente=None):
+    """Descarga los elementos con `jobs` descargas simultáneas.
+    
+    Devuelve un resultado por elemento (None si no llegó a empezar) y si el
+    lote se interrumpió con Ctrl+C; en ese caso las descargas en curso se
+    detienen dejando su .part para continuarlas en la siguiente ejecución.
+    Con `cliente` las descargas las hace el servidor local y, si se
+    interrumpe, se cancelan allí.
+    """
+    resultados = [None] * len(elementos)
+    interrumpido = False
+    
+    with ProgresoLote(len(elementos), activa=mostrar_progreso) as progreso:
+        def procesar(indice, elemento):
+            barra = progreso.empezar(indice, elemento['url'])
+            inicio = time.monotonic()
+            if cliente is not None:
+                job = cliente.descargar(elemento['url'], elemento['is_playlist'], elemento['quality'],
+                                        al_progreso=barra.desde_estado, modo=elemento['mode'],
+                                        idiomas=elemento['languages'])
             else:
-                print("✅ Video descargado exitosamente!")
-            
-    except Exception as e:
-        print(f"❌ Error durante la descarga: {str(e)}")
-        return False
+                job = descargar_job(elemento['url'], carpeta, elemento['is_playlist'], elemento['quality'],
+                                    progress_hooks=[barra], silencioso=True, modo=elemento['mode'],
+                                    idiomas=elemento['languages'])
+            resultados[indice] = resultado_elemento(elemento, job, barra, time.monotonic() - inicio)
+            progreso.terminar(indice, resultados[indice])
+        
+        with ThreadPoolExecutor(max(jobs, 1), thread_name_prefix="yt-lote") as pool:
+            futuros = [pool.submit(procesar, indice, elemento) for indice, elemento in enumerate(elementos)]
+            try:
+                for futuro in futuros:
+                    futuro.result()
+            except KeyboardInterrupt:
+                interrumpido = True
+                if cliente is not None:
+                    cliente.interrumpir.set()
+                else:
+                    obtener_motor().interrumpir.set()
+                for futuro in futuros:
+                    futuro.cancel()
+    
+    return resultados, interrumpido
+
+def crear_informe(elementos, resultados, descartes, carpeta, jobs, inicio, fin, interrumpido):
+    """Informe JSON del lote"""
+    items = [resultado if resultado is not None else {**elemento, 'status': 'skipped'}
+             for elemento, resultado in zip(elementos, resultados)]
+    totales = {
+        'requested': len(elementos) + len(descartes['duplicates']) + len(descartes['invalid']),
+        'unique': len(elementos),
+        'duplicates': len(descartes['duplicates']),
+        'invalid': len(descartes['invalid']),
+    }
+    for estado in ('completed', 'failed', 'cancelled', 'interrupted', 'skipped'):
+        totales[estado] = sum(1 for item in items if item['status'] == estado)
+    return {
+        'started_at': inicio.isoformat(),
+        'finished_at': fin.isoformat(),
+        'duration_s': round((fin - inicio).total_seconds(), 3),
+        'interrupted': interrumpido,
+        'jobs': jobs,
+        'output_dir': str(Path(carpeta).absolute()),
+        'totals': totales,
+        'bytes': sum(item.get('bytes') or 0 for item in items),
+        'items': items,
+        'duplicates': descartes['duplicates'],
+        'invalid': descartes['invalid'],
+    }
+
+def conectar_servidor(args):
+    """Cliente del servidor local si hay uno escuchando en el socket y no se pidió --no-daemon"""
+    if args.no_daemon:
+        return None
+    # Solo el modo no interactivo lo necesita: http.client no se importa al arrancar
+    import youtube_client
+    return youtube_client.conectar(args.socket)
+
+def main_lote(args):
+    """Modo no interactivo: descarga las URLs de los argumentos, de un archivo o de stdin"""
+    if args.urls:
+        lineas = args.urls
+    elif args.batch == '-':
+        lineas = sys.stdin.readlines()
+    else:
+        with open(args.batch, encoding='utf-8') as archivo:
+            lineas = archivo.readlines()
+    
+    elementos, descartes = leer_lote(lineas, args.quality, args.playlists, args.mode, parsear_idiomas(args.languages))
+    cliente = conectar_servidor(args)
+    if cliente is not None:
+        # Los archivos los escribe el servidor, en su propia carpeta de descarga
+        carpeta = Path(cliente.servidor.get('download_folder') or 'download')
+        print(f"⚡ Usando el servidor ya arrancado en {cliente.ruta}", file=sys.stderr)
+    else:
+        carpeta = crear_carpeta_download()
+    print(f"📋 {len(elementos)} URL(s) únicas, {len(descartes['duplicates'])} repetida(s), "
+          f"{len(descartes['invalid'])} no válida(s); {args.jobs} descarga(s) simultánea(s)", file=sys.stderr)
+    
+    inicio = datetime.now()
+    resultados, interrumpido = ejecutar_lote(elementos, carpeta, args.jobs, not args.no_progress, cliente)
+    informe = crear_informe(elementos, resultados, descartes, carpeta, args.jobs, inicio, datetime.now(), interrumpido)
     
-    return True
+    if args.report == '-':
+        json.dump(informe, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+    elif args.report or args.batch:
+        ruta = Path(args.report) if args.report else carpeta / f"informe-lote-{inicio:%Y%m%d-%H%M%S}.json"
+        ruta.write_text(json.dumps(informe, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"📝 Informe guardado en: {ruta}", file=sys.stderr)
+    
+    totales = informe['totals']
+    print(f"🏁 {totales['completed']} completada(s), {totales['failed']} fallida(s) en {informe['duration_s']}s",
+          file=sys.stderr)
+    if interrumpido:
+        if cliente is not None:
+            print(f"⏹️ Lote interrumpido: {totales['cancelled']} descarga(s) cancelada(s) en el servidor",
+                  file=sys.stderr)
+        else:
+            print(f"⏸️ Lote interrumpido: {totales['interrupted']} descarga(s) a medias se continuarán "
+                  f"al repetir el lote", file=sys.stderr)
+        return 130
+    return 0 if totales['completed'] == totales['unique'] else 1
+
+def main_daemon(args):
+    """Arranca el servidor HTTP en el socket Unix para que las siguientes llamadas lo usen"""
+    import youtube_http_server
+    import youtube_serving
+    
+    config = youtube_serving.ServingConfig.desde_entorno(unix_socket=args.socket, workers=1)
+    print(f"🔥 Servidor de descargas en {config.unix_socket}; las próximas llamadas a la CLI lo usarán")
+    print("⏹️ Para detener: Ctrl+C")
+    youtube_serving.servir(youtube_http_server, config)
+    return 0
+
+def parsear_argumentos(argv=None):
+    parser = argparse.ArgumentParser(description="Descargador de videos y playlists de YouTube")
+    parser.add_argument('urls', nargs='*', metavar='URL',
+                        help="Descarga estas URLs sin preguntar (como --batch, sin informe salvo con --report)")
+    parser.add_argument('--batch', metavar='ARCHIVO',
+                        help="Descarga sin preguntar las URLs de ARCHIVO ('-' para stdin): una por línea "
+                             "o JSONL con url, quality, playlist, mode y languages")
+    parser.add_argument('--jobs', '-j', type=int, default=4, help="Descargas simultáneas en modo por lotes")
+    parser.add_argument('--quality', default='720p', type=validar_calidad,
+                        help="Calidad máxima por defecto (p. ej. 480p, 720p, 1080, 4k o best)")
+    parser.add_argument('--mode', choices=MODOS, default='video',
+                        help="Qué descargar: el video, solo el audio, solo los subtítulos o solo la miniatura")
+    parser.add_argument('--languages', metavar='IDIOMAS', default=None,
+                        help="Idiomas de los subtítulos con --mode subtitles, separados por comas (por defecto es,en)")
+    parser.add_argument('--playlists', action='store_true',
+                        help="Para URLs watch?v=...&list=..., descargar la playlist completa")
+    parser.add_argument('--report', metavar='RUTA',
+                        help="Informe JSON del lote ('-' para stdout); por defecto en la carpeta download")
+    parser.add_argument('--no-progress', action='store_true', help="Sin barras de progreso")
+    parser.add_argument('--daemon', action='store_true',
+                        help="Arranca el servidor en el socket Unix (en primer plano) para que las siguientes llamadas lo usen")
+    parser.add_argument('--socket', metavar='RUTA', default=None,
+                        help="Socket Unix del servidor (por defecto YOUTUBE_UNIX_SOCKET o uno por usuario)")
+    parser.add_argument('--no-daemon', action='store_true',
+                        help="Descargar en este proceso aunque haya un servidor escuchando en el socket")
+    args = parser.parse_args(argv)
+    if args.daemon and args.socket is None:
+        import youtube_client
+        args.socket = youtube_client.ruta_socket_por_defecto()
+    return args
 
-def main():
+def main(modo="video", idiomas=None):
     """Función principal del programa"""
     print("=" * 50)
     print("🎬 DESCARGADOR DE VIDEOS Y PLAYLISTS DE YOUTUBE")
@@ -153,11 +542,13 @@ def main():
             print("\n📺 Se detectó un video individual.")
         
         # Intentar descargar el video o playlist
-        if descargar_video(url, carpeta_download, descargar_playlist):
+        job = descargar_job(url, carpeta_download, descargar_playlist, modo=modo, idiomas=idiomas)
+        if job['status'] == DownloadStatus.COMPLETED:
             if descargar_playlist:
                 print(f"📁 Playlist guardada en: {carpeta_download.absolute()}")
             else:
-                print(f"📁 Video guardado en: {carpeta_download.absolute()}")
+                for archivo in job.get('files') or [carpeta_download.absolute()]:
+                    print(f"📁 Video guardado en: {archivo}")
         
         # Preguntar si quiere descargar otro contenido
         continuar = input("\n¿Quieres descargar otro video/playlist? (s/n): ").strip().lower()
@@ -167,8 +558,13 @@ def main():
     print("\n👋 ¡Gracias por usar el descargador!")
 
 if __name__ == "__main__":
+    args = parsear_argumentos()
     try:
-        main()
+        if args.daemon:
+            sys.exit(main_daemon(args))
+        if args.batch or args.urls:
+            sys.exit(main_lote(args))
+        main(args.mode, parsear_idiomas(args.languages))
     except KeyboardInterrupt:
         print("\n\n⏹️ Descarga cancelada por el usuario.")
         sys.exit(0)
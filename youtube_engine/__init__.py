@@ -0,0 +1,48 @@
+"""
+Motor de descargas de YouTube
+Núcleo común de youtube_downloader.py, youtube_http_server.py y youtube_mcp_server.py
+"""
+
+import importlib
+
+# Los nombres se importan de su submódulo la primera vez que se usan (PEP 562):
+# así `from youtube_engine import validar_url_youtube` no arrastra yt-dlp
+_EXPORTACIONES = {
+    "InfoCache": "cache", "NullCache": "cache", "crear_cache": "cache",
+    "ConcurrenciaFija": "concurrency", "ControlAdaptativo": "concurrency", "crear_control": "concurrency",
+    "DownloadEngine": "engine", "EngineConfig": "engine",
+    "FolderCache": "foldercache", "NullFolderCache": "foldercache", "crear_folder_cache": "foldercache",
+    "ESTADOS_FINALES": "jobs", "DownloadStatus": "jobs", "nuevo_job": "jobs", "validar_consulta_lote": "jobs",
+    "vista_estado": "jobs", "vista_resumen": "jobs",
+    "Verificador": "integrity", "crear_verificador": "integrity", "hash_archivo": "integrity",
+    "Almacenamiento": "storage", "SinEspacio": "storage", "Volumen": "storage",
+    "crear_almacenamiento": "storage", "estimar_tamano": "storage",
+    "ErrorOrigen": "streaming", "Transmision": "streaming",
+    "EtapaPostproceso": "postprocessing", "crear_postproceso": "postprocessing",
+    "IndiceBusqueda": "search", "crear_indice_busqueda": "search", "validar_busqueda": "search",
+    "PoolScheduler": "scheduler", "ThreadScheduler": "scheduler", "crear_scheduler": "scheduler",
+    "PlanFormato": "formats", "altura_maxima": "formats", "planificar": "formats",
+    "selector_formato": "formats", "validar_calidad": "formats",
+    "MODOS": "modes", "validar_modo": "modes", "parsear_idiomas": "modes",
+    "Webhooks": "webhooks", "crear_webhooks": "webhooks", "firmar": "webhooks",
+    "validar_callback_url": "webhooks",
+    "LoopJobStore": "store", "MemoryJobStore": "store", "SQLiteJobStore": "store", "crear_store": "store",
+    "detectar_tipo_url": "urls", "es_id_video": "urls", "extraer_id_video": "urls", "id_canonico": "urls",
+    "validar_url_youtube": "urls",
+    "DescargaInterrumpida": "ytdlp",
+}
+
+__all__ = sorted(_EXPORTACIONES)
+
+
+def __getattr__(nombre: str):
+    modulo = _EXPORTACIONES.get(nombre)
+    if modulo is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+    valor = getattr(importlib.import_module(f"{__name__}.{modulo}"), nombre)
+    globals()[nombre] = valor
+    return valor
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
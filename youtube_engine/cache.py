@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Caché de resultados de extracción del motor
+Evita volver a extraer un video que se acaba de consultar o descargar
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import youtube_metrics as metricas
+
+
+class InfoCache:
+    """LRU con caducidad para los info dicts sin procesar de yt-dlp.
+
+    Se guardan los resultados de `extract_info(process=False)`, que todavía no
+    dependen de las opciones de formato, y cada lectura devuelve una copia
+    porque `process_ie_result` modifica el diccionario. Las URLs de los
+    formatos caducan, así que `ttl` debe ser bastante menor que unas horas.
+    El motor usa otra instancia para los planes de formato de cada video.
+    """
+
+    def __init__(self, ttl: float = 600.0, capacidad: int = 512, nombre: str = "info"):
+        self.ttl = ttl
+        self.capacidad = capacidad
+        self.nombre = nombre
+        self._entradas: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave: str) -> Optional[dict]:
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] < time.monotonic():
+                del self._entradas[clave]
+                entrada = None
+            if entrada is not None:
+                self._entradas.move_to_end(clave)
+        metricas.registrar_cache(self.nombre, entrada is not None)
+        return copy.deepcopy(entrada[1]) if entrada is not None else None
+
+    def guardar(self, clave: str, info: dict):
+        with self._lock:
+            self._entradas[clave] = (time.monotonic() + self.ttl, info)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+
+    def invalidar(self, clave: str):
+        with self._lock:
+            self._entradas.pop(clave, None)
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+
+class NullCache:
+    """Caché desactivada: siempre extrae de nuevo"""
+
+    def obtener(self, clave: str) -> Optional[dict]:
+        return None
+
+    def guardar(self, clave: str, info: dict):
+        pass
+
+    def invalidar(self, clave: str):
+        pass
+
+    def __len__(self) -> int:
+        return 0
+
+
+def crear_cache(ttl: Optional[float] = None, capacidad: int = 512, nombre: str = "info"):
+    """`ttl` en segundos; 0 desactiva la caché. `nombre` etiqueta sus aciertos en /metrics"""
+    if ttl is None:
+        ttl = 600.0
+    return InfoCache(ttl, capacidad, nombre) if ttl > 0 else NullCache()
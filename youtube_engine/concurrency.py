@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Control adaptativo de la concurrencia de las descargas
+Un controlador AIMD que ajusta cuántos jobs descargan a la vez y con cuántos fragmentos según el caudal medido
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import youtube_metrics as metricas
+
+# Cada cuánto se mide el caudal y se decide
+INTERVALO_CONTROL = 5.0
+# Fracción de peticiones fallidas (sin contar 429) a partir de la que se baja el límite
+UMBRAL_ERRORES = 0.05
+# Lo que tiene que crecer el caudal tras subir el límite para que la subida cuente
+GANANCIA_MINIMA = 0.05
+# Bajada multiplicativa ante 429 o errores
+FACTOR_BAJADA = 0.5
+# Caída de la velocidad por conexión tras una subida que indica que el enlace se está llenando
+CAIDA_VELOCIDAD = 0.2
+# Ventanas que se mantiene el límite tras una subida que no mejoró el caudal, antes de volver a probar
+REPROBAR = 6
+
+
+class ControlAdaptativo:
+    """Reparte un presupuesto de `limite` conexiones al origen entre los jobs.
+
+    Cada job pide una plaza con `adquirir` antes de empezar y la devuelve con
+    `liberar`; puede haber tantos jobs descargando como conexiones, y cada
+    uno usa `limite // activos` fragmentos a la vez (entre 1 y
+    `max_fragmentos`). yt-dlp lee concurrent_fragment_downloads al empezar
+    cada archivo, así que un cambio llega a los jobs activos en su
+    siguiente archivo o formato.
+
+    Cada `intervalo` segundos un hilo mide los bytes/seg agregados (los
+    suman los progress hooks de `medidor`) y las respuestas del origen
+    (`respuesta`) y decide, en este orden:
+
+    - decrease: hubo algún 429 o más de un 5 % de errores; el límite se
+      reduce a la mitad (sin bajar de `minimo`) y el anterior queda como
+      techo. Los fallos mientras terminan los jobs admitidos antes de la
+      bajada no cuentan
+    - hold: nadie espera plaza ni puede usar más fragmentos, la ventana
+      anterior empezó con un cambio y su medida aún no es fiable, o se ha
+      llegado a `maximo` o justo debajo del techo (ahí se queda REPROBAR
+      ventanas antes de probar a pasarlo)
+    - backoff: la última subida no mejoró el caudal un 5 %; se deshace y el
+      límite se mantiene REPROBAR ventanas antes de volver a probar
+    - increase: el límite sube en uno y, mientras cada subida mejora el
+      caudal sin que caiga la velocidad por conexión (la de cada job según
+      su progress hook, entre sus fragmentos), el paso se dobla como en el
+      slow start de TCP, hasta justo debajo del techo; pasado el techo
+      sube de uno en uno
+    """
+
+    adaptativo = True
+
+    def __init__(self, minimo: int = 1, maximo: int = 32, max_fragmentos: int = 8,
+                 inicial: Optional[int] = None, intervalo: float = INTERVALO_CONTROL):
+        if not 1 <= minimo <= maximo:
+            raise ValueError(f"Límites de concurrencia no válidos: {minimo}-{maximo} (1 <= mínimo <= máximo)")
+        if max_fragmentos < 1:
+            raise ValueError("max_fragmentos debe ser al menos 1")
+        self.minimo = minimo
+        self.maximo = maximo
+        self.max_fragmentos = max_fragmentos
+        self.intervalo = intervalo
+        self.limite = min(max(inicial if inicial is not None else minimo, minimo), maximo)
+        self._condicion = threading.Condition()
+        # job_id -> params de su YoutubeDL (o None hasta que `unir` los da)
+        self._activas: Dict[str, Optional[dict]] = {}
+        self._velocidades: Dict[str, float] = {}
+        self._esperando = 0
+        self._bytes = 0
+        self._respuestas = {'ok': 0, 'throttled': 0, 'error': 0}
+        self._ventana = time.monotonic()
+        self.caudal = 0.0
+        # Caudal antes de la última subida (None si la última decisión no fue una subida) y su tamaño
+        self._base: Optional[float] = None
+        self._velocidad_base = 0.0
+        self._paso = 1
+        # Límite con el que el origen limitó por última vez, y si ya se mantuvo debajo y se puede pasar
+        self._techo: Optional[int] = None
+        self._sondeo = False
+        self._espera = 0
+        self._ultima: Tuple[str, str] = ('hold', 'start')
+        self._parar = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reiniciar)
+
+    def _reiniciar(self):
+        self._condicion = threading.Condition()
+        self._activas = {}
+        self._velocidades = {}
+        self._esperando = 0
+        self._hilo = None
+
+    def fragmentos(self) -> int:
+        """Fragmentos a la vez de cada job con el límite y los jobs activos de ahora"""
+        return max(1, min(self.max_fragmentos, self.limite // max(1, len(self._activas))))
+
+    def adquirir(self, job_id: str, detener: Callable[[], bool] = lambda: False) -> bool:
+        """Espera una plaza para `job_id`; devuelve False si `detener()` se cumple antes.
+
+        `detener` puede leer el store de jobs (SQLite), así que se consulta
+        sin el lock: unir, liberar y los progress hooks no esperan por él.
+        """
+        self.iniciar()
+        with self._condicion:
+            self._esperando += 1
+        try:
+            while True:
+                with self._condicion:
+                    if len(self._activas) < self.limite:
+                        self._activas[job_id] = None
+                        return True
+                    self._condicion.wait(1.0)
+                    if len(self._activas) < self.limite:
+                        continue
+                if detener():
+                    return False
+        finally:
+            with self._condicion:
+                self._esperando -= 1
+
+    def unir(self, job_id: str, params: dict):
+        """Deja que el control fije concurrent_fragment_downloads en los `params` de un YoutubeDL"""
+        with self._condicion:
+            if job_id in self._activas:
+                self._activas[job_id] = params
+                params['concurrent_fragment_downloads'] = self.fragmentos()
+
+    def liberar(self, job_id: str):
+        with self._condicion:
+            if self._activas.pop(job_id, False) is not False:
+                self._velocidades.pop(job_id, None)
+                self._condicion.notify_all()
+
+    def medidor(self, job_id: str) -> "MedidorJob":
+        """Progress hook que suma los bytes de `job_id` al caudal medido"""
+        return MedidorJob(self, job_id)
+
+    def _progreso(self, job_id: str, delta: int, velocidad: Optional[float]):
+        with self._condicion:
+            self._bytes += delta
+            if velocidad is None:
+                self._velocidades.pop(job_id, None)
+            else:
+                self._velocidades[job_id] = velocidad
+
+    def _velocidad_conexion(self) -> float:
+        """Bytes/seg medios por conexión, con la velocidad de los progress hooks y los fragmentos de cada job"""
+        conexiones = sum((self._activas.get(job_id) or {}).get('concurrent_fragment_downloads', 1)
+                         for job_id in self._velocidades)
+        return sum(self._velocidades.values()) / conexiones if conexiones else 0.0
+
+    def respuesta(self, codigo: Optional[int]):
+        """Anota una respuesta del origen: None si fue bien, 429 si limita, otro código (o 0) si falló"""
+        resultado = 'ok' if codigo is None else 'throttled' if codigo == 429 else 'error'
+        metricas.ORIGIN_REQUESTS.labels(resultado).inc()
+        with self._condicion:
+            self._respuestas[resultado] += 1
+
+    def ajustar(self) -> Tuple[str, str]:
+        """Un paso del control: mide la ventana que termina y decide el nuevo límite"""
+        with self._condicion:
+            ahora = time.monotonic()
+            self.caudal = self._bytes / max(ahora - self._ventana, 1e-6)
+            respuestas = self._respuestas
+            total = sum(respuestas.values())
+            self._bytes = 0
+            self._respuestas = {'ok': 0, 'throttled': 0, 'error': 0}
+            self._ventana = ahora
+            velocidad = self._velocidad_conexion()
+            ocupado = self._esperando > 0 or (self._activas and self.fragmentos() < self.max_fragmentos)
+
+            fallos = respuestas['throttled'] or (total and respuestas['error'] / total > UMBRAL_ERRORES)
+            if fallos and (len(self._activas) > self.limite or self._ultima[0] == 'decrease'):
+                # Aún descargan jobs admitidos antes de la última bajada: sus 429 no son nuevos
+                decision = ('hold', 'draining')
+            elif fallos:
+                decision = ('decrease', 'throttled' if respuestas['throttled'] else 'errors')
+                self._techo, self._sondeo = self.limite, False
+                self.limite = max(self.minimo, int(self.limite * FACTOR_BAJADA))
+                self._base, self._paso, self._espera = None, 1, 1
+            elif not ocupado:
+                decision = ('hold', 'idle')
+                self._base, self._paso = None, 1
+            elif self._espera:
+                decision = ('hold', 'settling')
+                self._espera -= 1
+            elif self._base is not None and self.caudal < self._base * (1 + GANANCIA_MINIMA):
+                decision = ('backoff', 'plateau')
+                self.limite = max(self.minimo, self.limite - self._paso)
+                self._base, self._paso, self._espera = None, 1, REPROBAR
+            elif self.limite >= self.maximo:
+                decision = ('hold', 'max')
+                self._base, self._paso = None, 1
+            elif self._techo is not None and self.limite == self._techo - 1 and not self._sondeo:
+                # Justo por debajo de donde el origen empezó a limitar: se queda ahí un rato antes de probar a pasarlo
+                decision = ('hold', 'ceiling')
+                self._base, self._paso, self._sondeo, self._espera = None, 1, True, REPROBAR
+            else:
+                decision = ('increase', 'gain' if self._base is not None else 'probe')
+                # Mientras cada subida mejora el caudal sin que baje la velocidad de cada conexión el
+                # paso se dobla, pero sin pasar del techo de un salto: hasta justo debajo se recupera
+                # deprisa y a partir de ahí se sube de uno en uno
+                paso = 1
+                if self._base is not None and velocidad >= self._velocidad_base * (1 - CAIDA_VELOCIDAD):
+                    paso = self._paso * 2
+                tope = self.maximo
+                if self._techo is not None:
+                    if self.limite < self._techo - 1:
+                        tope = self._techo - 1
+                    else:
+                        paso = 1
+                nuevo = min(self.limite + paso, tope)
+                self._paso, self.limite = nuevo - self.limite, nuevo
+                self._base, self._velocidad_base, self._espera = self.caudal, velocidad, 1
+
+            fragmentos = self.fragmentos()
+            for params in self._activas.values():
+                if params is not None:
+                    params['concurrent_fragment_downloads'] = fragmentos
+            self._ultima = decision
+            self._condicion.notify_all()
+        metricas.CONCURRENCY_DECISIONS.labels(*decision).inc()
+        return decision
+
+    def iniciar(self):
+        """Arranca el hilo que ajusta el límite cada `intervalo` segundos"""
+        with self._condicion:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._parar.clear()
+                self._ventana = time.monotonic()
+                self._hilo = threading.Thread(target=self._bucle, name="yt-concurrencia", daemon=True)
+                self._hilo.start()
+
+    def _bucle(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.ajustar()
+            except Exception as e:
+                metricas.registrar_error('concurrency', e)
+
+    def cerrar(self):
+        self._parar.set()
+
+    def describir(self) -> dict:
+        with self._condicion:
+            return {"adaptive": True, "connections": self.limite, "min": self.minimo, "max": self.maximo,
+                    "fragments": self.fragmentos(), "max_fragments": self.max_fragmentos,
+                    "active": len(self._activas), "waiting": self._esperando,
+                    "throughput_bytes_per_s": round(self.caudal),
+                    "last_decision": {"decision": self._ultima[0], "reason": self._ultima[1]},
+                    "job_speeds": {job_id: round(velocidad) for job_id, velocidad in self._velocidades.items()}}
+
+
+class MedidorJob:
+    """Progress hook de yt-dlp que pasa al control los bytes nuevos y la velocidad de un job"""
+
+    __slots__ = ('control', 'job_id', '_ultimo')
+
+    def __init__(self, control: ControlAdaptativo, job_id: str):
+        self.control = control
+        self.job_id = job_id
+        self._ultimo = 0
+
+    def __call__(self, d: dict):
+        descargado = d.get('downloaded_bytes') or 0
+        delta = descargado - self._ultimo
+        if delta < 0:
+            # Empezó un archivo nuevo (playlist o formatos separados)
+            delta = descargado
+        terminado = d.get('status') == 'finished'
+        self._ultimo = 0 if terminado else descargado
+        self.control._progreso(self.job_id, delta, None if terminado else d.get('speed') or 0.0)
+
+
+class ConcurrenciaFija:
+    """Sin control: cada job descarga en cuanto el scheduler lo ejecuta, con las opciones de yt-dlp tal cual"""
+
+    adaptativo = False
+
+    def adquirir(self, job_id: str, detener: Callable[[], bool] = lambda: False) -> bool:
+        return True
+
+    def unir(self, job_id: str, params: dict):
+        pass
+
+    def liberar(self, job_id: str):
+        pass
+
+    def respuesta(self, codigo: Optional[int]):
+        pass
+
+    def iniciar(self):
+        pass
+
+    def cerrar(self):
+        pass
+
+    def describir(self) -> Optional[dict]:
+        return None
+
+
+def crear_control(especificacion: Optional[str], intervalo: float = INTERVALO_CONTROL):
+    """Control de concurrencia según `especificacion` (YOUTUBE_CONCURRENCY).
+
+    - None, '' o 'fixed': ConcurrenciaFija
+    - 'adaptive': ControlAdaptativo entre 1 y 32 conexiones
+    - 'adaptive:MAX' o 'adaptive:MIN-MAX': con esos límites
+    """
+    if not especificacion or especificacion == 'fixed':
+        return ConcurrenciaFija()
+    tipo, _, limites = especificacion.partition(':')
+    if tipo != 'adaptive':
+        raise ValueError(f"Control de concurrencia desconocido: {especificacion} (fixed, adaptive[:MIN-MAX])")
+    minimo, maximo = 1, 32
+    if limites:
+        try:
+            if '-' in limites:
+                minimo, maximo = (int(limite) for limite in limites.split('-'))
+            else:
+                maximo = int(limites)
+        except ValueError:
+            raise ValueError(f"Límites de concurrencia no válidos: {limites} (formato: MAX o MIN-MAX)")
+    return ControlAdaptativo(minimo, maximo, intervalo=intervalo)
@@ -0,0 +1,945 @@
+#!/usr/bin/env python3
+"""
+Motor de descargas compartido por la CLI, el servidor HTTP y el servidor MCP
+Crea jobs, los planifica, ejecuta yt-dlp con sus hooks y guarda el estado en el store
+"""
+
+import copy
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError
+from dataclasses import dataclass, fields
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional
+
+import youtube_metrics as metricas
+import youtube_profiling as profiling
+from youtube_engine import serializer, urls
+from youtube_engine.cache import crear_cache
+from youtube_engine.concurrency import crear_control
+from youtube_engine.foldercache import crear_folder_cache
+from youtube_engine.formats import PlanFormato, altura_maxima, planificar, selector_formato
+from youtube_engine.integrity import ComprobarTamano, crear_verificador
+from youtube_engine.jobs import ESTADOS_CANCELABLES, DownloadStatus, nuevo_job, proyectar
+from youtube_engine.modes import MODOS_SIN_MEDIOS, opciones_modo
+from youtube_engine.postprocessing import PostprocesoJob, crear_postproceso
+from youtube_engine.scheduler import crear_scheduler
+from youtube_engine.search import MetadatosVideos, crear_indice_busqueda
+from youtube_engine.storage import (INTERVALO_ESPERA_ESPACIO, Reserva, SinEspacio, carpeta_temporal,
+                                    crear_almacenamiento, estimar_tamano, recorrer_volumenes)
+from youtube_engine.store import crear_store
+from youtube_engine.webhooks import crear_webhooks
+
+# yt-dlp tarda unos 150 ms en importarse: youtube_engine.ytdlp se importa con la
+# primera extracción, así que ni la CLI ni los servidores lo pagan al arrancar
+if TYPE_CHECKING:
+    from yt_dlp import YoutubeDL
+
+    from youtube_engine.streaming import Transmision
+
+DOWNLOAD_FOLDER = Path("download")
+
+# allowed_extractors de yt-dlp por perfil. Los servidores solo aceptan URLs de
+# YouTube: con 'youtube' cada YoutubeDL registra unos 20 extractores en vez de
+# los ~1800 de yt-dlp (web.archive:youtube no entra, no es de YouTube)
+PERFILES_EXTRACTORES = {
+    'youtube': ['youtube.*'],
+    'all': ['default'],
+}
+
+
+def opciones_extractores(perfil: Optional[str]) -> dict:
+    """Opciones de YoutubeDL para el perfil de extractores ('youtube' por defecto)"""
+    perfil = perfil or 'youtube'
+    if perfil not in PERFILES_EXTRACTORES:
+        raise ValueError(f"Perfil de extractores no soportado: {perfil}")
+    return {'allowed_extractors': PERFILES_EXTRACTORES[perfil]}
+
+
+def es_playlist(info: dict) -> bool:
+    return info.get('_type') in ('playlist', 'multi_video') or 'entries' in info
+
+
+class ProgresoPlaylist:
+    """Progress hook que cuenta los videos terminados de una playlist"""
+
+    __slots__ = ('store', 'job_id', '_terminados')
+
+    def __init__(self, store, job_id: str):
+        self.store = store
+        self.job_id = job_id
+        self._terminados = set()
+
+    def __call__(self, d: dict):
+        if d.get('status') != 'finished':
+            return
+        info = d.get('info_dict') or {}
+        video = info.get('id') or d.get('filename')
+        if video in self._terminados:
+            return
+        self._terminados.add(video)
+        self.store.actualizar(self.job_id, downloaded_videos=len(self._terminados))
+
+
+class RegistroArchivos:
+    """Apunta en el job (campo files) la ruta final de cada archivo confirmado.
+
+    Cada archivo queda también en la caché de la carpeta, retenido por el
+    job hasta que termina para que el desalojo no lo borre, y con
+    `verificador` su checksum se calcula en segundo plano y se añade al
+    campo checksums del job cuando está listo.
+    """
+
+    __slots__ = ('store', 'job_id', 'archivos', 'cache_carpeta', 'verificador', 'checksums', '_lock')
+
+    def __init__(self, store, job_id: str, archivos: Optional[Iterable[str]] = None, cache_carpeta=None,
+                 verificador=None, checksums: Optional[dict] = None):
+        self.store = store
+        self.job_id = job_id
+        self.archivos = list(archivos or ())
+        self.cache_carpeta = cache_carpeta
+        self.verificador = verificador
+        self.checksums = dict(checksums or {})
+        self._lock = threading.Lock()
+        if cache_carpeta is not None:
+            # Un job reanudado conserva los archivos que ya había confirmado
+            for ruta in self.archivos:
+                cache_carpeta.retener(ruta, job_id)
+
+    def __call__(self, ruta: str):
+        ruta = str(Path(ruta).absolute())
+        if ruta not in self.archivos:
+            self.archivos.append(ruta)
+            if self.cache_carpeta is not None:
+                self.cache_carpeta.registrar(ruta, self.job_id)
+            self.store.actualizar(self.job_id, files=list(self.archivos))
+            if self.verificador is not None:
+                self.verificador.enviar(ruta).add_done_callback(lambda futuro: self._al_verificar(ruta, futuro))
+
+    def _al_verificar(self, ruta: str, futuro):
+        if futuro.cancelled():
+            return
+        try:
+            resultado = futuro.result()
+        except Exception as e:
+            # Un fallo inesperado del verificador (el índice SQLite, por ejemplo) queda en el job
+            metricas.registrar_error('verify', e)
+            resultado = {'path': ruta, 'result': 'error', 'error': str(e)}
+        with self._lock:
+            self.checksums[resultado['path']] = {clave: valor for clave, valor in resultado.items() if clave != 'path'}
+            self.store.actualizar(self.job_id, checksums=dict(self.checksums))
+
+
+@dataclass
+class EngineConfig:
+    """Configuración de DownloadEngine para lo que no se le pasa ya construido.
+
+    desde_entorno() la lee de las variables YOUTUBE_* (ver cada campo); los
+    textos se interpretan en el crear_X de cada componente.
+    """
+    job_store: Optional[str] = None          # YOUTUBE_JOB_STORE: 'memory' o 'sqlite:///ruta'
+    scheduler: Optional[str] = None          # YOUTUBE_SCHEDULER: 'threads' o 'pool:N'
+    info_cache_ttl: Optional[float] = None   # YOUTUBE_INFO_CACHE_TTL: segundos (0 la desactiva)
+    volumes: Optional[str] = None            # YOUTUBE_VOLUMES: rutas[:peso] separadas por comas
+    layout: Optional[str] = None             # YOUTUBE_LAYOUT: 'flat', 'id' o 'date'
+    min_free_mb: Optional[float] = None      # YOUTUBE_MIN_FREE_MB
+    space_wait: float = 600.0                # YOUTUBE_SPACE_WAIT: segundos esperando sitio
+    extractors: Optional[str] = None         # YOUTUBE_EXTRACTORS: 'youtube' o 'all'
+    postprocessing: Optional[str] = None     # YOUTUBE_POSTPROCESSING
+    webhook_outbox: Optional[str] = None     # YOUTUBE_WEBHOOK_OUTBOX
+    webhook_secret: Optional[str] = None     # YOUTUBE_WEBHOOK_SECRET
+    cache_max_mb: Optional[float] = None     # YOUTUBE_CACHE_MAX_MB
+    cache_watermarks: Optional[str] = None   # YOUTUBE_CACHE_WATERMARKS: 'alta,baja'
+    cache_index: Optional[str] = None        # YOUTUBE_CACHE_INDEX
+    verify: Optional[str] = None             # YOUTUBE_VERIFY: 'off' o 'threads[:N]'
+    checksum_index: Optional[str] = None     # YOUTUBE_CHECKSUM_INDEX
+    search_index: Optional[str] = None       # YOUTUBE_SEARCH_INDEX: 'off', 'on' o una ruta
+    concurrency: Optional[str] = None        # YOUTUBE_CONCURRENCY: 'fixed' o 'adaptive[:min-max]'
+
+    @classmethod
+    def desde_entorno(cls, **overrides) -> "EngineConfig":
+        valores = {campo.name: os.environ.get(f"YOUTUBE_{campo.name.upper()}") for campo in fields(cls)}
+        valores = {k: v for k, v in valores.items() if v is not None}
+        valores.update({k: v for k, v in overrides.items() if v is not None})
+        config = cls(**valores)
+        for campo in ('info_cache_ttl', 'min_free_mb', 'cache_max_mb'):
+            valor = getattr(config, campo)
+            setattr(config, campo, float(valor) if valor not in (None, '') else None)
+        config.space_wait = float(config.space_wait)
+        return config
+
+
+class EjecucionJob:
+    """Estado de un job desde que ejecutar() lo empieza hasta que _terminar_job() lo cierra.
+
+    Lo comparten las etapas de DownloadEngine.ejecutar y, con post-procesado
+    aparte, el hilo de la etapa que termina el último archivo.
+    """
+
+    __slots__ = ('job_id', 'url', 'is_playlist', 'quality', 'clave', 'carpeta', 'fases', 'vigilante', 'medidor',
+                 'metadatos', 'reserva', 'temporal', 'postproceso', 'error', 'descargado', 'total_videos')
+
+    def __init__(self, job_id: str, url: str, is_playlist: bool, quality: str, carpeta: Optional[Path],
+                 fases: profiling.PhaseTimer, vigilante):
+        self.job_id = job_id
+        self.url = url
+        self.is_playlist = is_playlist
+        self.quality = quality
+        self.clave = urls.id_canonico(url, not is_playlist)
+        self.carpeta = Path(carpeta) if carpeta is not None else None
+        self.fases = fases
+        self.vigilante = vigilante
+        self.medidor = metricas.DownloadProgressMeter()
+        self.metadatos = MetadatosVideos()
+        self.reserva: Optional[Reserva] = None
+        self.temporal: Optional[Path] = None
+        self.postproceso: Optional[PostprocesoJob] = None
+        self.error: Optional[BaseException] = None
+        self.descargado = False
+        self.total_videos = 0
+
+
+class DownloadEngine:
+    """Núcleo de descargas con store, scheduler y caché intercambiables.
+
+    - store: dónde viven los jobs (MemoryJobStore, SQLiteJobStore, LoopJobStore)
+    - scheduler: cómo se ejecutan (ThreadScheduler, PoolScheduler)
+    - cache: info dicts ya extraídos (InfoCache, NullCache); `planes` guarda
+      con el mismo TTL el plan de formatos de cada video y calidad
+    - almacenamiento: volúmenes de destino y subcarpetas (Almacenamiento)
+    - postproceso: pool de post-procesado aparte de las descargas
+      (EtapaPostproceso), o None para hacerlo en el hilo de la descarga
+    - webhooks: avisos de fin de job a su callback_url (Webhooks)
+    - cache_carpeta: límite de tamaño de los volúmenes, que se usan como
+      caché borrando lo menos usado (FolderCache), o NullFolderCache
+    - verificador: checksums de los archivos descargados (Verificador), o
+      None para no calcularlos
+    - busqueda: índice de texto con los metadatos de cada video descargado
+      (IndiceBusqueda), o None
+    - concurrencia: cuántos jobs descargan a la vez y con cuántos fragmentos,
+      ajustado según el caudal medido (ControlAdaptativo), o ConcurrenciaFija
+
+    Lo que no se pasa se construye con `config` (EngineConfig), por defecto
+    la de las variables de entorno YOUTUBE_*. `opciones_ydl` se añade a las opciones de cada YoutubeDL (p. ej. quiet
+    en el servidor MCP).
+    """
+
+    def __init__(self, store=None, scheduler=None, cache=None, carpeta: Path = DOWNLOAD_FOLDER,
+                 opciones_ydl: Optional[dict] = None, almacenamiento=None, postproceso=None, webhooks=None,
+                 cache_carpeta=None, verificador=None, busqueda=None, concurrencia=None,
+                 config: Optional[EngineConfig] = None):
+        config = config if config is not None else EngineConfig.desde_entorno()
+        self.config = config
+        self.store = store if store is not None else crear_store(config.job_store)
+        self.scheduler = scheduler if scheduler is not None else crear_scheduler(config.scheduler)
+        self.cache = cache if cache is not None else crear_cache(config.info_cache_ttl)
+        self.postproceso = postproceso if postproceso is not None else crear_postproceso(config.postprocessing)
+        self.planes = crear_cache(config.info_cache_ttl, nombre="format_plan")
+        self.almacenamiento = almacenamiento if almacenamiento is not None else crear_almacenamiento(
+            config.volumes, carpeta, config.layout, config.min_free_mb)
+        # Segundos que un job espera a que se libere sitio antes de fallar
+        self.espera_espacio = config.space_wait
+        self.carpeta = self.almacenamiento.principal.ruta
+        self.webhooks = webhooks if webhooks is not None else crear_webhooks(
+            config.webhook_outbox, self.carpeta, config.webhook_secret)
+        self.cache_carpeta = cache_carpeta if cache_carpeta is not None else crear_folder_cache(
+            config.cache_max_mb, self.almacenamiento.volumenes, config.cache_watermarks, config.cache_index)
+        self.verificador = verificador if verificador is not None else crear_verificador(
+            config.verify, self.carpeta, config.checksum_index)
+        self.busqueda = busqueda if busqueda is not None else crear_indice_busqueda(
+            config.search_index, self.carpeta)
+        self.cache_carpeta.al_desalojar = self._desalojados
+        self.concurrencia = concurrencia if concurrencia is not None else crear_control(config.concurrency)
+        self.opciones_ydl = {**opciones_extractores(config.extractors), **(opciones_ydl or {})}
+        self.fases: Dict[str, profiling.PhaseTimer] = {}
+        # Drenaje ordenado al apagar: primero se dejan de aceptar descargas y, si el
+        # plazo vence, las activas se interrumpen dejando su .part para reanudarlas
+        self.drenando = threading.Event()
+        self.interrumpir = threading.Event()
+
+    def configurar_store(self, url: Optional[str]):
+        """Cambia el store de jobs (p. ej. a SQLite al arrancar con varios workers)"""
+        self.store = crear_store(url)
+
+    def instrumentar(self):
+        """Publica en /metrics la cola, los workers y los jobs de este motor"""
+        metricas.QUEUE_DEPTH.set_callback(
+            lambda: sum(n for estado, n in self.store.contar_por_estado() if estado == DownloadStatus.PENDING))
+        metricas.ACTIVE_WORKERS.set_callback(lambda: self.scheduler.activos())
+        metricas.JOBS.set_callback(lambda: [((estado,), n) for estado, n in self.store.contar_por_estado()])
+        if self.postproceso is not None:
+            metricas.POSTPROCESS_QUEUE_DEPTH.set_callback(lambda: self.postproceso.en_cola())
+            metricas.POSTPROCESS_ACTIVE_WORKERS.set_callback(lambda: self.postproceso.activos())
+        metricas.WEBHOOK_OUTBOX.set_callback(lambda: self.webhooks.outbox.pendientes())
+        if self.cache_carpeta.capacidad:
+            metricas.FOLDER_CACHE_BYTES.set_callback(lambda: self.cache_carpeta.total())
+            metricas.FOLDER_CACHE_LIMIT_BYTES.set_callback(lambda: self.cache_carpeta.capacidad)
+        metricas.VOLUME_FREE_BYTES.set_callback(
+            lambda: [((str(volumen.ruta),), volumen.libre()) for volumen in self.almacenamiento.volumenes])
+        if self.concurrencia.adaptativo:
+            metricas.CONCURRENCY_LIMIT.set_callback(lambda: [(('connections',), self.concurrencia.limite),
+                                                             (('fragments',), self.concurrencia.fragmentos())])
+            metricas.CONCURRENCY_THROUGHPUT.set_callback(lambda: self.concurrencia.caudal)
+
+    def precalentar(self):
+        """Importa yt-dlp y carga los extractores de YouTube antes de la primera petición"""
+        from youtube_engine import ytdlp
+        ytdlp.precalentar(self.opciones_ydl)
+
+    def _ydl(self, opciones: dict) -> "YoutubeDL":
+        from youtube_engine import ytdlp
+        return ytdlp.YoutubeDL(opciones)
+
+    def _extraer(self, ydl: "YoutubeDL", url: str, noplaylist: bool) -> dict:
+        """extract_info sin procesar, pasando por la caché de info dicts"""
+        clave = urls.id_canonico(url, noplaylist)
+        info = self.cache.obtener(clave)
+        if info is None:
+            info = ydl.extract_info(url, download=False, process=False)
+            # Las entries de una playlist son perezosas y no se pueden copiar
+            if not es_playlist(info):
+                self.cache.guardar(clave, info)
+                info = copy.deepcopy(info)
+        return info
+
+    def _planificar(self, clave: str, info: dict, quality: str, mezclar: bool) -> Optional[PlanFormato]:
+        """Plan de formatos del video, pasando por la caché de planes"""
+        clave_plan = f"{clave}|{altura_maxima(quality)}|{int(mezclar)}"
+        plan = self.planes.obtener(clave_plan)
+        if plan is None:
+            plan = planificar(info, quality, mezclar)
+            if plan is not None:
+                self.planes.guardar(clave_plan, plan)
+        return plan
+
+    # Jobs
+
+    def crear_job(self, url: str, is_playlist: bool = False, quality: str = "720p", modo: str = "video",
+                  idiomas: Optional[List[str]] = None, callback_url: Optional[str] = None) -> dict:
+        """Registra un job y lo entrega al scheduler; al terminar se avisa a `callback_url`"""
+        job = nuevo_job(url, is_playlist, quality, modo, idiomas, callback_url)
+        self.store.crear(job)
+        self.fases[job['job_id']] = profiling.PhaseTimer()
+        self.scheduler.enviar(job['job_id'], self.ejecutar, job['job_id'], url, is_playlist, quality)
+        return job
+
+    def obtener(self, job_id: str) -> Optional[dict]:
+        return self.store.obtener(job_id)
+
+    def estado(self, job_id: str) -> Optional[dict]:
+        vista = self.store.vista(job_id)
+        fases = self.fases.get(job_id)
+        if vista is not None and fases is not None:
+            # La fase y sus tiempos avanzan sin que el job cambie en el store
+            vista = {**vista, "current_phase": fases.fase_actual, "phase_timings": fases.duraciones()}
+        return vista
+
+    def estados(self, job_ids: List[str], campos: Optional[List[str]] = None,
+                desde: Optional[int] = None) -> dict:
+        """Estado de varios jobs tomado de una sola instantánea del store.
+
+        Con `campos` cada job trae solo esos (y job_id); con `desde`, solo los
+        jobs que cambiaron después de esa versión. La respuesta incluye la
+        `version` que hay que pasar en la siguiente consulta y los IDs que no
+        existen (`missing`). Ver jobs.validar_consulta_lote.
+        """
+        version, vistas, faltan = self.store.vistas(job_ids, desde)
+        jobs = []
+        for vista in vistas:
+            fases = self.fases.get(vista['job_id'])
+            if fases is not None:
+                vista = {**vista, "current_phase": fases.fase_actual, "phase_timings": fases.duraciones()}
+            jobs.append(proyectar(vista, campos))
+        return {"version": version, "jobs": jobs, "missing": faltan}
+
+    def listado(self) -> dict:
+        jobs_list = self.store.resumenes()
+        # Ordenar por fecha de creación (más recientes primero)
+        jobs_list.sort(key=lambda x: x['created_at'], reverse=True)
+        return {
+            "total_jobs": len(jobs_list),
+            "jobs": jobs_list
+        }
+
+    def estado_json(self, job_id: str) -> Optional[bytes]:
+        """estado() en JSON; sin fases en curso sale tal cual de la caché del store"""
+        if job_id in self.fases:
+            estado = self.estado(job_id)
+            return serializer.dumps(estado) if estado is not None else None
+        return self.store.vista_json(job_id)
+
+    def listado_json(self) -> bytes:
+        """listado() en JSON, concatenando el JSON ya codificado de cada job"""
+        fragmentos = self.store.resumenes_json()
+        return b'{"total_jobs":%d,"jobs":%s}' % (len(fragmentos), serializer.unir_lista(fragmentos))
+
+    def cancelar(self, job_id: str) -> Optional[dict]:
+        """Marca el job como cancelado; None si no existe o ya había terminado"""
+        job = self.store.actualizar_si(job_id, ESTADOS_CANCELABLES,
+                                       status=DownloadStatus.CANCELLED,
+                                       completed_at=datetime.now().isoformat())
+        # Si aún espera en la cola no llega a ejecutarse; si ya corre, su
+        # VigilanteCancelacion detiene yt-dlp en el siguiente progress hook
+        if job is not None:
+            self._notificar(job)
+        if job is not None and self.scheduler.cancelar(job_id):
+            self.fases.pop(job_id, None)
+        # Si ya se descargó y espera a post-procesarse, sale de esa cola
+        if job is not None and self.postproceso is not None:
+            self.postproceso.cancelar(job_id)
+        return job
+
+    def buscar(self, **parametros) -> dict:
+        """Busca en los videos descargados; los parámetros son los de search.validar_busqueda"""
+        if self.busqueda is None:
+            raise ValueError("El índice de búsqueda está desactivado (se activa con YOUTUBE_SEARCH_INDEX=on)")
+        return self.busqueda.buscar(**parametros)
+
+    def metadatos(self, url: str) -> dict:
+        """Obtiene metadatos de un video sin descargarlo"""
+        ydl_opts = {
+            **self.opciones_ydl,
+            'quiet': True,
+            'no_warnings': True,
+        }
+
+        try:
+            with self._ydl(ydl_opts) as ydl:
+                inicio = time.perf_counter()
+                info = ydl.process_ie_result(self._extraer(ydl, url, False), download=False)
+                metricas.EXTRACTION_METADATA_SECONDS.observe(time.perf_counter() - inicio)
+                return {
+                    'title': info.get('title', 'Sin título'),
+                    'duration': info.get('duration', 0),
+                    'uploader': info.get('uploader', 'Autor desconocido'),
+                    'view_count': info.get('view_count', 0),
+                    'upload_date': info.get('upload_date', ''),
+                    'description': info.get('description', '')[:500] + '...' if info.get('description') else '',
+                    'thumbnail': info.get('thumbnail', ''),
+                    'is_playlist': 'entries' in info,
+                    'playlist_count': info.get('playlist_count', 0) if 'entries' in info else 0
+                }
+        except Exception as e:
+            metricas.registrar_error('metadata', e)
+            raise Exception(f"Error al obtener metadatos: {str(e)}")
+
+    def stream(self, video_id: str, quality: str = "720p", rango: Optional[str] = None,
+               guardar: bool = False) -> "Transmision":
+        """Abre un video para enviarlo al cliente mientras llega del origen.
+
+        Se elige el mejor formato de un solo archivo (sin mezclar audio y
+        video) para la calidad pedida; `rango` es la cabecera Range del
+        cliente y se pasa tal cual al origen. Si el video ya está en un
+        volumen se sirve desde disco. Con `guardar`, y sin rango, se copia
+        también a un volumen con sitio, como si se hubiera descargado.
+        La caché de info dicts hace que cada salto con Range no vuelva a
+        extraer el video.
+        """
+        from youtube_engine import streaming, ytdlp
+
+        url = f"https://www.youtube.com/watch?v={video_id}"
+        ydl = self._ydl({
+            **self.opciones_ydl,
+            'quiet': True,
+            'no_warnings': True,
+            'noplaylist': True,
+            'format': f"{selector_formato(quality)}[protocol^=http]",
+            'outtmpl': self.almacenamiento.plantilla(False),
+        })
+        reserva: Optional[Reserva] = None
+        try:
+            info = ydl.process_ie_result(self._extraer(ydl, url, True), download=False)
+            relativa = Path(ydl.prepare_filename(info))
+            titulo = info.get('title', 'Video sin título')
+            for volumen in self.almacenamiento.volumenes:
+                if (volumen.ruta / relativa).is_file():
+                    ydl.close()
+                    self.cache_carpeta.acceso(volumen.ruta / relativa)
+                    return streaming.Transmision(titulo, archivo=(volumen.ruta / relativa).absolute())
+            self.cache_carpeta.fallo()
+
+            cabeceras = dict(info.get('http_headers') or {})
+            if rango:
+                cabeceras['Range'] = rango
+            try:
+                respuesta = ydl.urlopen(ytdlp.Request(info['url'], headers=cabeceras))
+            except ytdlp.HTTPError as e:
+                raise streaming.ErrorOrigen(e.status, f"El origen respondió {e.status}") from e
+
+            copia = destino = None
+            if guardar and not rango:
+                # Sin sitio en ningún volumen se envía igualmente, sin copia
+                reserva = self.almacenamiento.reservar(estimar_tamano(info))
+                if reserva is not None:
+                    destino = reserva.volumen.ruta / relativa
+                    copia = carpeta_temporal(reserva.volumen, f"stream-{uuid.uuid4()}") / relativa.name
+                    copia.parent.mkdir(parents=True, exist_ok=True)
+
+            def al_cerrar():
+                ydl.close()
+                if reserva is not None:
+                    reserva.liberar()
+                if destino is not None and destino.is_file():
+                    # La copia ya contó como fallo al ir al origen
+                    self.cache_carpeta.registrar(destino, contar=False)
+
+            return streaming.Transmision(titulo, respuesta=respuesta, status=respuesta.status,
+                                         cabeceras=streaming.cabeceras_respuesta(respuesta, info),
+                                         copia=copia, destino=destino, al_cerrar=al_cerrar)
+        except BaseException:
+            ydl.close()
+            if reserva is not None:
+                reserva.liberar()
+            raise
+
+    def ejecutar(self, job_id: str, url: str, is_playlist: bool = False, quality: str = "720p",
+                 al_extraer: Optional[Callable[[dict], None]] = None,
+                 progress_hooks: Iterable[Callable] = (), carpeta: Optional[Path] = None,
+                 opciones: Optional[dict] = None):
+        """Ejecuta la descarga de un job en el hilo actual.
+
+        `al_extraer` recibe el info dict antes de empezar a descargar,
+        `progress_hooks` se suman a los del motor (métricas, fases y cancelación)
+        y `opciones` se añade a las opciones de yt-dlp solo para este job.
+        El modo del job (video, audio, subtitles o thumbnail) decide qué se
+        descarga; ver modes.opciones_modo. Un video se descarga con los
+        formatos que elige formats.planificar, que quedan en el campo format.
+        Con `carpeta` se descarga ahí en vez de en los volúmenes configurados,
+        con el mismo esquema de subcarpetas y la misma comprobación de espacio.
+        Con etapa de post-procesado el hilo queda libre al terminar la
+        transferencia y devuelve el PostprocesoJob del que depende el final del job.
+
+        Cada etapa es un método aparte: _empezar, _preparar_ydl, _extraer_job,
+        _reservar_salida, _transferir y, al final, _terminar_job.
+        """
+        from youtube_engine import ytdlp
+
+        ejecucion = EjecucionJob(job_id, url, is_playlist, quality, carpeta,
+                                 self.fases.setdefault(job_id, profiling.PhaseTimer()),
+                                 ytdlp.VigilanteCancelacion(self, job_id))
+        try:
+            job = self._empezar(ejecucion)
+            if job is not None:
+                modo = job.get('mode', 'video')
+                mezclar = ytdlp.puede_mezclar(self.opciones_ydl.get('ffmpeg_location'))
+                archivos = RegistroArchivos(self.store, job_id, job.get('files'), self.cache_carpeta,
+                                            self.verificador, job.get('checksums'))
+                with self._preparar_ydl(ejecucion, job, modo, mezclar, archivos, progress_hooks, opciones) as ydl:
+                    info = self._extraer_job(ejecucion, ydl, al_extraer)
+                    # Formatos concretos del video (los de una playlist los elige el selector)
+                    plan = None
+                    if modo == 'video' and not is_playlist and not (opciones or {}).get('format'):
+                        plan = self._planificar(ejecucion.clave, info, quality, mezclar)
+                        if plan is not None:
+                            ytdlp.fijar_formato(ydl, plan.format_id)
+                    self._reservar_salida(ejecucion, ydl, job, modo, info, plan, archivos)
+                    self._transferir(ejecucion, ydl, info)
+                    if modo == 'subtitles' and not is_playlist and not archivos.archivos:
+                        raise Exception("El video no tiene subtítulos en los idiomas pedidos")
+                    ejecucion.descargado = True
+
+        except Exception as e:
+            ejecucion.error = e
+
+        finally:
+            ejecucion.medidor.cerrar()
+            self.concurrencia.liberar(job_id)
+            if ejecucion.postproceso is not None:
+                # Lo que aún espera en la cola no tiene sentido si la descarga falló
+                if ejecucion.error is not None:
+                    self.postproceso.cancelar(job_id)
+                ejecucion.postproceso.cerrar()
+            else:
+                self._terminar_job(ejecucion)
+        return ejecucion.postproceso
+
+    def _empezar(self, ejecucion: "EjecucionJob") -> Optional[dict]:
+        """Toma una plaza de la concurrencia y pasa el job a running; None si no debe descargarse"""
+        store = self.store
+        job_id = ejecucion.job_id
+
+        def detener() -> bool:
+            job = store.obtener(job_id)
+            return self.interrumpir.is_set() or job is None or job['status'] == DownloadStatus.CANCELLED
+
+        # Plaza del control de concurrencia: si se apaga o se cancela el job mientras
+        # espera, sigue sin ella y las comprobaciones de abajo lo dejan como corresponde
+        self.concurrencia.adquirir(job_id, detener)
+        if self.interrumpir.is_set():
+            # Apagado antes de empezar: queda pendiente para el próximo arranque
+            store.actualizar_si(job_id, [DownloadStatus.PENDING], interrupted=True)
+            return None
+
+        # Actualizar estado a running (si no se canceló mientras esperaba)
+        return store.actualizar_si(job_id, [DownloadStatus.PENDING],
+                                   status=DownloadStatus.RUNNING,
+                                   started_at=datetime.now().isoformat(),
+                                   owner=os.getpid())
+
+    def _preparar_ydl(self, ejecucion: "EjecucionJob", job: dict, modo: str, mezclar: bool,
+                      archivos: RegistroArchivos, progress_hooks: Iterable[Callable],
+                      opciones: Optional[dict]) -> "YoutubeDL":
+        """YoutubeDL del job con los hooks del motor, la concurrencia y el post-procesado diferido"""
+        from youtube_engine import ytdlp
+
+        job_id = ejecucion.job_id
+        fases = ejecucion.fases
+        hooks = [ejecucion.medidor, fases.progress_hook, ejecucion.vigilante, ComprobarTamano(),
+                 ejecucion.metadatos, *progress_hooks]
+        if ejecucion.is_playlist:
+            hooks.append(ProgresoPlaylist(self.store, job_id))
+        if self.concurrencia.adaptativo:
+            hooks.append(self.concurrencia.medidor(job_id))
+
+        # Configuración para yt-dlp (la carpeta raíz se decide al conocer el tamaño)
+        ydl_opts = {
+            **self.opciones_ydl,
+            **(opciones or {}),
+            **opciones_modo(modo, ejecucion.quality, self.almacenamiento.plantilla(ejecucion.is_playlist),
+                             job.get('languages'), mezclar),
+            'paths': {'home': str(ejecucion.carpeta or self.carpeta)},
+            'noplaylist': not ejecucion.is_playlist,
+            'progress_hooks': hooks,
+            'postprocessor_hooks': [fases.postprocessor_hook],
+        }
+
+        ydl = self._ydl(ydl_opts)
+        try:
+            if self.concurrencia.adaptativo:
+                self.concurrencia.unir(job_id, ydl.params)
+                ytdlp.observar_peticiones(ydl, self.concurrencia.respuesta)
+            if self.postproceso is not None:
+                # Los archivos con merge, fixups o conversiones se post-procesan en la
+                # etapa de post-procesado y el job se completa cuando acaban todos
+                postproceso = ejecucion.postproceso = PostprocesoJob(
+                    archivos, lambda error=None: self._terminar_job(ejecucion, error))
+                ytdlp.diferir_postproceso(ydl, lambda info, pasos: postproceso.agregar(self.postproceso.enviar(
+                    job_id, ytdlp.opciones_postproceso({**ydl_opts, 'paths': ydl.params['paths']}), info, pasos)))
+        except BaseException:
+            ydl.close()
+            raise
+        return ydl
+
+    def _extraer_job(self, ejecucion: "EjecucionJob", ydl: "YoutubeDL",
+                     al_extraer: Optional[Callable[[dict], None]]) -> dict:
+        """Extrae el video o la playlist y apunta en el job su título y cuántos videos tiene"""
+        ejecucion.fases.cambiar('extraction')
+        inicio = time.perf_counter()
+        info = self._extraer(ydl, ejecucion.url, not ejecucion.is_playlist)
+        if es_playlist(info):
+            # Resolver las entradas para conocer el total antes de descargar
+            info = ydl.process_ie_result(info, download=False)
+        metricas.EXTRACTION_DOWNLOAD_SECONDS.observe(time.perf_counter() - inicio)
+
+        # Actualizar información del job
+        if ejecucion.is_playlist:
+            title = info.get('title', 'Playlist sin título')
+            ejecucion.total_videos = info.get('playlist_count', 0)
+        else:
+            title = info.get('title', 'Video sin título')
+            ejecucion.total_videos = 1
+        self.store.actualizar(ejecucion.job_id, title=title, total_videos=ejecucion.total_videos)
+        if al_extraer is not None:
+            al_extraer(info)
+        ejecucion.vigilante.comprobar()
+        return info
+
+    def _reservar_salida(self, ejecucion: "EjecucionJob", ydl: "YoutubeDL", job: dict, modo: str, info: dict,
+                         plan: Optional[PlanFormato], archivos: RegistroArchivos):
+        """Reserva un volumen con sitio para lo estimado y dirige allí la salida de yt-dlp.
+
+        Si no hay ninguno el job espera (ver _reservar_espacio).
+        """
+        from youtube_engine import ytdlp
+
+        job_id = ejecucion.job_id
+        if modo in MODOS_SIN_MEDIOS:
+            # Subtítulos y miniaturas ocupan unos KB
+            estimado = 0
+        elif plan is not None:
+            estimado = plan.expected_bytes
+        else:
+            estimado = estimar_tamano(info, altura_maxima(ejecucion.quality), solo_audio=modo == 'audio')
+        carpeta = ejecucion.carpeta
+        # (un job interrumpido vuelve a su volumen, donde están sus .part)
+        if carpeta is None and job.get('interrupted') and job.get('output_dir'):
+            carpeta = Path(job['output_dir'])
+        reserva = ejecucion.reserva = self._reservar_espacio(job_id, estimado, carpeta, ejecucion.vigilante)
+        temporal = ejecucion.temporal = carpeta_temporal(reserva.volumen, job_id)
+        # yt-dlp descarga en la carpeta temporal del job y ConfirmarSalida
+        # renombra cada archivo terminado a su sitio en el volumen (sin
+        # descarga no hay post_process: los subtítulos y miniaturas se
+        # confirman antes, en before_dl)
+        ydl.params['paths'] = {'home': str(reserva.volumen.ruta), 'temp': str(temporal)}
+        ydl.add_post_processor(ytdlp.ConfirmarSalida(archivos),
+                               when='before_dl' if modo in MODOS_SIN_MEDIOS else 'post_process')
+        self.store.actualizar(job_id, estimated_bytes=estimado, format=plan.vista() if plan else None,
+                              output_dir=str(reserva.volumen.ruta.absolute()))
+
+    def _transferir(self, ejecucion: "EjecucionJob", ydl: "YoutubeDL", info: dict):
+        """Descarga reutilizando la información ya extraída"""
+        from youtube_engine import ytdlp
+
+        ejecucion.fases.cambiar('format_selection')
+        inicio = time.perf_counter()
+        try:
+            ydl.process_ie_result(info, download=True)
+        except ytdlp.ReExtractInfo:
+            # Las URLs de los formatos caducaron: extraer de nuevo
+            self.cache.invalidar(ejecucion.clave)
+            ydl.download([ejecucion.url])
+        metricas.DOWNLOAD_SECONDS.labels('playlist' if ejecucion.is_playlist else 'video').observe(
+            time.perf_counter() - inicio)
+
+    def _terminar_job(self, ejecucion: "EjecucionJob", error_postproceso: Optional[BaseException] = None):
+        """Deja el job en su estado final y libera su espacio reservado, su carpeta temporal y sus fases.
+
+        Lo llama ejecutar() al acabar la descarga o, si hubo post-procesado
+        en la etapa aparte, el último archivo al terminar de post-procesarse
+        (con su error, si lo hubo).
+        """
+        from youtube_engine import ytdlp
+
+        store = self.store
+        job_id = ejecucion.job_id
+        error = ejecucion.error or error_postproceso
+        etapa = 'download' if ejecucion.error is not None else 'postprocess'
+        fases = ejecucion.fases
+        conservar_temporal = False
+        try:
+            if isinstance(error, ytdlp.DescargaInterrumpida) or (isinstance(error, CancelledError)
+                                                                 and self.interrumpir.is_set()):
+                # Checkpoint: yt-dlp conserva el .part (o el archivo sin post-procesar)
+                # y el próximo worker lo continúa
+                conservar_temporal = True
+                store.actualizar_si(job_id, [DownloadStatus.RUNNING],
+                                    status=DownloadStatus.PENDING, interrupted=True)
+
+            elif isinstance(error, (ytdlp.DownloadCancelled, CancelledError)):
+                # cancelar() ya marcó el job como cancelado
+                pass
+
+            elif error is not None:
+                # Un info dict en caché puede tener URLs caducadas: el reintento extrae de nuevo
+                self.cache.invalidar(ejecucion.clave)
+                self._notificar(store.actualizar_si(job_id, [DownloadStatus.RUNNING],
+                                                    status=DownloadStatus.FAILED,
+                                                    completed_at=datetime.now().isoformat(),
+                                                    error_message=str(error)))
+                metricas.registrar_error(etapa, error)
+
+            elif ejecucion.descargado:
+                # Marcar como completado (salvo que se cancelara entretanto)
+                job = store.actualizar_si(job_id, [DownloadStatus.RUNNING],
+                                          status=DownloadStatus.COMPLETED,
+                                          completed_at=datetime.now().isoformat(),
+                                          downloaded_videos=ejecucion.total_videos)
+                self._indexar(job, ejecucion.metadatos.videos)
+                self._notificar(job)
+
+        finally:
+            if ejecucion.reserva is not None:
+                ejecucion.reserva.liberar()
+            # Sus archivos ya se pueden desalojar
+            self.cache_carpeta.soltar(job_id)
+            if ejecucion.temporal is not None and not conservar_temporal:
+                shutil.rmtree(ejecucion.temporal, ignore_errors=True)
+            fases.detener()
+            campos = {}
+            if ejecucion.postproceso is not None:
+                pasos = ejecucion.postproceso.tiempos()
+                # El merge se mide en el worker: sale de la fase postprocessing
+                fases.trasladar('postprocessing', 'merge', pasos.get('Merger', 0.0))
+                campos['postprocessing_steps'] = pasos
+            store.actualizar(job_id, phase_timings=fases.duraciones(), **campos)
+            self.fases.pop(job_id, None)
+
+    def _indexar(self, job: Optional[dict], videos: Optional[Dict[str, dict]]):
+        """Añade los videos de un job completado al índice de búsqueda; nunca hace fallar al job"""
+        if job is None or not videos or self.busqueda is None:
+            return
+        try:
+            self.busqueda.indexar(videos.values(), job['job_id'], job.get('files') or ())
+        except Exception as e:
+            metricas.registrar_error('search', e)
+
+    def _desalojados(self, rutas: List[str]):
+        """Olvida los archivos que borró la caché en los índices y en los jobs que los apuntaban.
+
+        Así /verify no los da por missing, /search no los devuelve y los
+        jobs ya no los listan en files (quedan en evicted_files).
+        """
+        if self.verificador is not None:
+            self.verificador.olvidar(rutas)
+        if self.busqueda is not None:
+            self.busqueda.olvidar(rutas)
+        borradas = set(rutas)
+        for job in self.store.listar():
+            archivos = job.get('files') or []
+            desalojados = [ruta for ruta in archivos if ruta in borradas]
+            if not desalojados:
+                continue
+            campos = {'files': [ruta for ruta in archivos if ruta not in borradas],
+                      'evicted_files': [*(job.get('evicted_files') or ()), *desalojados]}
+            if job.get('checksums'):
+                campos['checksums'] = {ruta: resultado for ruta, resultado in job['checksums'].items()
+                                       if ruta not in borradas}
+            self.store.actualizar(job['job_id'], **campos)
+
+    def _notificar(self, job: Optional[dict]):
+        """Avisa del fin del job a su callback_url; nunca hace fallar al job"""
+        if job is None or not job.get('callback_url'):
+            return
+        try:
+            self.webhooks.notificar(job)
+        except Exception as e:
+            metricas.registrar_error('webhook', e)
+
+    def _reservar_espacio(self, job_id: str, tamano: int, carpeta: Optional[Path], vigilante) -> Reserva:
+        """Aparta sitio para el job; si ningún volumen lo tiene, lo retiene hasta que lo haya.
+
+        Mientras espera sigue en running con waiting_for_space y se puede
+        cancelar o interrumpir; pasados `espera_espacio` segundos falla con
+        SinEspacio antes de escribir nada, en vez de quedarse a medias.
+        """
+        reserva = self.almacenamiento.reservar(tamano, carpeta)
+        if reserva is not None:
+            return reserva
+        self.store.actualizar(job_id, waiting_for_space=True)
+        limite = time.monotonic() + self.espera_espacio
+        while reserva is None:
+            vigilante.comprobar()
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                raise SinEspacio(f"Ningún volumen de descarga tiene {tamano / 1024 ** 2:.1f} MB libres "
+                                 f"más el margen de {self.almacenamiento.margen / 1024 ** 2:.0f} MB")
+            self.interrumpir.wait(min(INTERVALO_ESPERA_ESPACIO, restante))
+            reserva = self.almacenamiento.reservar(tamano, carpeta)
+        self.store.actualizar(job_id, waiting_for_space=False)
+        return reserva
+
+    def descargar(self, url: str, is_playlist: bool = False, quality: str = "720p",
+                  al_extraer: Optional[Callable[[dict], None]] = None,
+                  progress_hooks: Iterable[Callable] = (), carpeta: Optional[Path] = None,
+                  opciones: Optional[dict] = None, modo: str = "video",
+                  idiomas: Optional[List[str]] = None) -> dict:
+        """Crea un job y lo ejecuta en el hilo actual; devuelve el job terminado"""
+        job = nuevo_job(url, is_playlist, quality, modo, idiomas)
+        self.store.crear(job)
+        postproceso = self.ejecutar(job['job_id'], url, is_playlist, quality, al_extraer, progress_hooks,
+                                    carpeta, opciones)
+        if postproceso is not None:
+            postproceso.terminado.wait()
+        return self.store.obtener(job['job_id'])
+
+    def crear_verificacion(self, completa: bool = False) -> dict:
+        """Registra un job que verifica todos los archivos de los volúmenes y lo entrega al scheduler.
+
+        Solo se leen los archivos nuevos o que cambiaron de tamaño o mtime
+        desde la última verificación; con `completa` se releen todos para
+        detectar los que se corrompieron sin cambiar. total_videos y
+        downloaded_videos cuentan archivos, y al terminar el resumen queda en
+        el campo verification del job (ver Verificador.verificar_todo).
+        """
+        if self.verificador is None:
+            raise ValueError("La verificación de integridad está desactivada (se activa con YOUTUBE_VERIFY=threads)")
+        job = nuevo_job(str(self.carpeta.absolute()), False, modo='verify')
+        job.update(title="Verificación de integridad de las descargas", full_verification=completa)
+        self.store.crear(job)
+        self.scheduler.enviar(job['job_id'], self.verificar_carpeta, job['job_id'], completa)
+        return job
+
+    def verificar_carpeta(self, job_id: str, completa: bool = False):
+        """Ejecuta en el hilo actual un job creado por crear_verificacion()"""
+        store = self.store
+        job = store.actualizar_si(job_id, [DownloadStatus.PENDING],
+                                  status=DownloadStatus.RUNNING,
+                                  started_at=datetime.now().isoformat(),
+                                  owner=os.getpid())
+        if job is None:
+            return
+        proximo = 0.0
+        cancelado = False
+
+        def detener() -> bool:
+            # El store se consulta como mucho una vez por segundo, como en VigilanteCancelacion
+            nonlocal proximo, cancelado
+            if self.interrumpir.is_set() or cancelado:
+                return True
+            if time.monotonic() >= proximo:
+                proximo = time.monotonic() + 1.0
+                actual = store.obtener(job_id)
+                cancelado = actual is None or actual['status'] == DownloadStatus.CANCELLED
+            return cancelado
+
+        avisado = 0.0
+
+        def al_avanzar(hechos: int):
+            nonlocal avisado
+            if time.monotonic() - avisado >= 1.0:
+                avisado = time.monotonic()
+                store.actualizar(job_id, downloaded_videos=hechos)
+
+        try:
+            rutas = [ruta for ruta, _ in recorrer_volumenes(self.almacenamiento.volumenes)]
+            store.actualizar(job_id, total_videos=len(rutas))
+            raices = tuple(str(volumen.ruta.absolute()) + os.sep for volumen in self.almacenamiento.volumenes)
+            resumen = self.verificador.verificar_todo(rutas, completa, raices, al_avanzar, detener)
+            if self.interrumpir.is_set():
+                # Se repite entera al arrancar; lo ya verificado se salta por tamaño y mtime
+                store.actualizar_si(job_id, [DownloadStatus.RUNNING], status=DownloadStatus.PENDING,
+                                    interrupted=True)
+            elif not cancelado:
+                self._notificar(store.actualizar_si(job_id, [DownloadStatus.RUNNING],
+                                                    status=DownloadStatus.COMPLETED,
+                                                    completed_at=datetime.now().isoformat(),
+                                                    downloaded_videos=resumen['files'], verification=resumen))
+        except Exception as e:
+            self._notificar(store.actualizar_si(job_id, [DownloadStatus.RUNNING],
+                                                status=DownloadStatus.FAILED,
+                                                completed_at=datetime.now().isoformat(),
+                                                error_message=str(e)))
+            metricas.registrar_error('verify', e)
+
+    # Ciclo de vida
+
+    def reanudar_huerfanos(self) -> int:
+        """Reanuda los jobs interrumpidos por un drenaje o abandonados por un worker caído"""
+        # Los avisos que no llegaron a entregarse siguen en el outbox
+        self.webhooks.reanudar()
+        self.cache_carpeta.iniciar()
+        self.concurrencia.iniciar()
+        jobs = self.store.reclamar_huerfanos(os.getpid())
+        for job in jobs:
+            if job.get('mode') == 'verify':
+                self.scheduler.enviar(job['job_id'], self.verificar_carpeta, job['job_id'],
+                                      job.get('full_verification', False))
+                continue
+            self.scheduler.enviar(job['job_id'], self.ejecutar, job['job_id'], job['url'],
+                                  job['is_playlist'], job.get('quality', '720p'))
+        return len(jobs)
+
+    def drenar(self, timeout: float) -> int:
+        """Deja de aceptar descargas y espera a las activas hasta `timeout` segundos.
+
+        Las que siguen activas al vencer el plazo se interrumpen con checkpoint.
+        Devuelve cuántas se interrumpieron.
+        """
+        self.drenando.set()
+        limite = time.monotonic() + timeout
+        restantes = self.scheduler.esperar(timeout)
+        if self.postproceso is not None:
+            # Después de las descargas, lo que estas dejaron en la cola de post-procesado
+            restantes += self.postproceso.esperar(max(limite - time.monotonic(), 0))
+        if restantes:
+            self.interrumpir.set()
+            self.scheduler.esperar(5)
+            if self.postproceso is not None:
+                # Lo que no empezó se retoma al arrancar desde el archivo ya descargado
+                self.postproceso.cancelar_pendientes()
+                self.postproceso.esperar(5)
+        return restantes
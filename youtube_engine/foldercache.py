@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Carpeta de descargas como caché de tamaño limitado
+Índice de accesos en SQLite y un hilo que borra los archivos usados hace más tiempo
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import youtube_metrics as metricas
+from youtube_engine.storage import Volumen, recorrer_volumenes
+
+# Marcas por defecto, en fracción de la capacidad: al pasar la alta se borra hasta bajar de la baja
+MARCA_ALTA = 0.9
+MARCA_BAJA = 0.8
+
+# Cada cuánto se revisa el tamaño aunque nadie lo pida, y cuántos archivos se borran por transacción
+INTERVALO_DESALOJO = 60.0
+LOTE_DESALOJO = 100
+
+
+class FolderCache:
+    """Limita a `capacidad` bytes las descargas de los volúmenes, borrando las menos usadas.
+
+    Cada archivo confirmado o servido (por /files, /stream o porque un job
+    pide un video que ya estaba) actualiza su hora de acceso en un índice
+    SQLite compartido por los workers; el total se mantiene con triggers,
+    así que consultarlo no recorre la tabla. Cuando el total pasa de la
+    marca alta, un hilo borra los archivos con el acceso más antiguo hasta
+    bajar de la marca baja. Nunca borra un archivo retenido: los de un job
+    que aún no ha terminado y los que se están enviando. Las retenciones se
+    guardan con el PID del proceso, así que las de un worker caído caducan.
+    Tras cada lote borrado se llama a `al_desalojar` con sus rutas, para que
+    el motor las quite de los índices y de los jobs que las apuntaban.
+    """
+
+    def __init__(self, volumenes: Sequence[Volumen], capacidad: int, path: Path,
+                 alta: float = MARCA_ALTA, baja: float = MARCA_BAJA, intervalo: float = INTERVALO_DESALOJO):
+        if capacidad <= 0:
+            raise ValueError("La capacidad de la caché de descargas debe ser positiva")
+        if not 0 < baja < alta <= 1:
+            raise ValueError(f"Marcas de la caché no válidas: alta {alta}, baja {baja} (0 < baja < alta <= 1)")
+        self.volumenes = volumenes
+        self.capacidad = capacidad
+        self.alta = alta
+        self.baja = baja
+        self.intervalo = intervalo
+        self.path = Path(path)
+        self._local = threading.local()
+        self._creado = False
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._parar = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self.al_desalojar: Optional[Callable[[List[str]], None]] = None
+        if hasattr(os, 'register_at_fork'):
+            # Una conexión SQLite no puede cruzar un fork: cada worker abre las suyas
+            os.register_at_fork(after_in_child=self._reiniciar)
+
+    def _reiniciar(self):
+        self._local = threading.local()
+        self._hilo = None
+
+    def _conexion(self) -> sqlite3.Connection:
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            with self._lock:
+                if not self._creado:
+                    db.executescript("""
+                        CREATE TABLE IF NOT EXISTS files (
+                            path TEXT PRIMARY KEY,
+                            size INTEGER NOT NULL,
+                            atime REAL NOT NULL);
+                        CREATE INDEX IF NOT EXISTS files_atime ON files(atime);
+                        CREATE TABLE IF NOT EXISTS pins (
+                            path TEXT NOT NULL,
+                            owner TEXT NOT NULL,
+                            pid INTEGER NOT NULL,
+                            PRIMARY KEY (path, owner));
+                        CREATE INDEX IF NOT EXISTS pins_owner ON pins(owner);
+                        CREATE TABLE IF NOT EXISTS total (id INTEGER PRIMARY KEY CHECK (id = 1), bytes INTEGER NOT NULL);
+                        INSERT OR IGNORE INTO total VALUES (1, 0);
+                        CREATE TRIGGER IF NOT EXISTS files_insert AFTER INSERT ON files
+                            BEGIN UPDATE total SET bytes = bytes + NEW.size; END;
+                        CREATE TRIGGER IF NOT EXISTS files_delete AFTER DELETE ON files
+                            BEGIN UPDATE total SET bytes = bytes - OLD.size; END;
+                        CREATE TRIGGER IF NOT EXISTS files_update AFTER UPDATE OF size ON files
+                            BEGIN UPDATE total SET bytes = bytes - OLD.size + NEW.size; END;
+                    """)
+                    self._creado = True
+            self._local.db = db
+        return db
+
+    # Accesos
+
+    def registrar(self, ruta, dueno: Optional[str] = None, contar: bool = True) -> bool:
+        """Apunta un archivo confirmado (y lo retiene para `dueno`); devuelve si ya estaba.
+
+        Si ya estaba en el índice, yt-dlp lo encontró en disco y no lo
+        descargó de nuevo: con `contar` cuenta como acierto, y si no, como fallo.
+        """
+        existia = self._apuntar(ruta, dueno)
+        if contar:
+            metricas.registrar_cache('download_folder', existia)
+        return existia
+
+    def acceso(self, ruta, dueno: Optional[str] = None):
+        """Un archivo que ya estaba en disco se vuelve a usar (p. ej. se sirve): acierto de la caché"""
+        self._apuntar(ruta, dueno)
+        metricas.registrar_cache('download_folder', True)
+
+    def fallo(self):
+        """Se pidió un video que no estaba en disco y hubo que ir al origen"""
+        metricas.registrar_cache('download_folder', False)
+
+    def _apuntar(self, ruta, dueno: Optional[str]) -> bool:
+        ruta = str(Path(ruta).absolute())
+        try:
+            tamano = os.stat(ruta).st_size
+        except OSError:
+            return False
+        db = self._conexion()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            existia = db.execute("SELECT 1 FROM files WHERE path = ?", (ruta,)).fetchone() is not None
+            db.execute("INSERT INTO files (path, size, atime) VALUES (?, ?, ?) "
+                       "ON CONFLICT(path) DO UPDATE SET size = excluded.size, atime = excluded.atime",
+                       (ruta, tamano, time.time()))
+            if dueno is not None:
+                self._retener(db, ruta, dueno)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        if self.total() > self.capacidad * self.alta:
+            self.despertar()
+        return existia
+
+    def retener(self, ruta, dueno: str):
+        """Impide que el desalojo borre `ruta` hasta soltar(dueno)"""
+        db = self._conexion()
+        self._retener(db, str(Path(ruta).absolute()), dueno)
+
+    def _retener(self, db: sqlite3.Connection, ruta: str, dueno: str):
+        db.execute("INSERT OR REPLACE INTO pins (path, owner, pid) VALUES (?, ?, ?)", (ruta, dueno, os.getpid()))
+
+    def soltar(self, dueno: str):
+        """Libera todo lo retenido por `dueno` (un job o un envío)"""
+        self._conexion().execute("DELETE FROM pins WHERE owner = ?", (dueno,))
+
+    def total(self) -> int:
+        return self._conexion().execute("SELECT bytes FROM total").fetchone()[0]
+
+    # Desalojo
+
+    def indexar(self) -> int:
+        """Sincroniza el índice con los volúmenes: añade los archivos que no tiene y quita los que ya no están.
+
+        Los archivos nuevos entran con su atime del sistema de archivos (o
+        su mtime, si es más reciente). También caducan las retenciones de
+        procesos que ya no existen. Devuelve cuántos archivos añadió.
+        """
+        from youtube_engine.store import _proceso_vivo
+
+        db = self._conexion()
+        conocidos = {ruta for ruta, in db.execute("SELECT path FROM files")}
+        nuevos: List[Tuple[str, int, float]] = []
+        vistos = set()
+        propio = str(self.path.absolute())
+        for ruta, estado in recorrer_volumenes(self.volumenes):
+            if ruta == propio:
+                continue
+            vistos.add(ruta)
+            if ruta not in conocidos:
+                nuevos.append((ruta, estado.st_size, max(estado.st_atime, estado.st_mtime)))
+        raices = tuple(str(volumen.ruta.absolute()) + os.sep for volumen in self.volumenes)
+        desaparecidos = [(ruta,) for ruta in conocidos - vistos if ruta.startswith(raices)]
+        pids = [pid for pid, in db.execute("SELECT DISTINCT pid FROM pins")]
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany("INSERT OR IGNORE INTO files (path, size, atime) VALUES (?, ?, ?)", nuevos)
+            db.executemany("DELETE FROM files WHERE path = ?", desaparecidos)
+            db.executemany("DELETE FROM pins WHERE pid = ?", [(pid,) for pid in pids if not _proceso_vivo(pid)])
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return len(nuevos)
+
+    def desalojar(self) -> Tuple[int, int]:
+        """Si el total pasa de la marca alta, borra los archivos menos usados hasta la baja.
+
+        Cada lote se elige y se borra dentro de una transacción IMMEDIATE:
+        mientras tanto nadie puede retener un archivo, así que ninguno se
+        borra después de que un job o un envío lo haya pedido. Devuelve
+        (archivos, bytes) borrados.
+        """
+        if self.total() <= self.capacidad * self.alta:
+            return 0, 0
+        objetivo = self.capacidad * self.baja
+        db = self._conexion()
+        archivos = liberados = 0
+        while True:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                exceso = db.execute("SELECT bytes FROM total").fetchone()[0] - objetivo
+                candidatos = [] if exceso <= 0 else db.execute(
+                    "SELECT path, size FROM files WHERE path NOT IN (SELECT path FROM pins) "
+                    "ORDER BY atime LIMIT ?", (LOTE_DESALOJO,)).fetchall()
+                borrados = []
+                for ruta, tamano in candidatos:
+                    if exceso <= 0:
+                        break
+                    try:
+                        os.remove(ruta)
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        metricas.registrar_error('eviction', e)
+                        continue
+                    borrados.append((ruta,))
+                    exceso -= tamano
+                    liberados += tamano
+                db.executemany("DELETE FROM files WHERE path = ?", borrados)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            archivos += len(borrados)
+            metricas.FOLDER_CACHE_EVICTIONS.inc(len(borrados))
+            if borrados and self.al_desalojar is not None:
+                try:
+                    self.al_desalojar([ruta for ruta, in borrados])
+                except Exception as e:
+                    # Ya están borrados: el desalojo sigue aunque no se pudieran olvidar
+                    metricas.registrar_error('eviction', e)
+            if not borrados:
+                # Ya por debajo de la marca baja, o todo lo que queda está retenido
+                break
+        metricas.FOLDER_CACHE_EVICTED_BYTES.inc(liberados)
+        return archivos, liberados
+
+    def iniciar(self):
+        """Arranca el hilo de desalojo, que empieza indexando lo que ya hay en los volúmenes"""
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._parar.clear()
+                self._hilo = threading.Thread(target=self._bucle, name="yt-desalojo", daemon=True)
+                self._hilo.start()
+
+    def despertar(self):
+        self.iniciar()
+        self._despertar.set()
+
+    def _bucle(self):
+        try:
+            self.indexar()
+        except Exception as e:
+            metricas.registrar_error('eviction', e)
+        while not self._parar.is_set():
+            try:
+                self.desalojar()
+            except Exception as e:
+                metricas.registrar_error('eviction', e)
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+
+    def cerrar(self):
+        self._parar.set()
+        self._despertar.set()
+
+    def describir(self) -> dict:
+        return {"max_bytes": self.capacidad, "high_watermark": self.alta, "low_watermark": self.baja,
+                "used_bytes": self.total()}
+
+
+class NullFolderCache:
+    """Sin límite: la carpeta de descargas crece sin borrar nada"""
+
+    capacidad = 0
+    al_desalojar = None
+
+    def registrar(self, ruta, dueno: Optional[str] = None, contar: bool = True) -> bool:
+        return False
+
+    def acceso(self, ruta, dueno: Optional[str] = None):
+        pass
+
+    def fallo(self):
+        pass
+
+    def retener(self, ruta, dueno: str):
+        pass
+
+    def soltar(self, dueno: str):
+        pass
+
+    def total(self) -> int:
+        return 0
+
+    def iniciar(self):
+        pass
+
+    def cerrar(self):
+        pass
+
+    def describir(self) -> Optional[dict]:
+        return None
+
+
+def crear_folder_cache(capacidad_mb: Optional[float], volumenes: Sequence[Volumen],
+                       marcas: Optional[str] = None, ruta: Optional[str] = None):
+    """Caché de `capacidad_mb` MB sobre los volúmenes; sin capacidad (o 0), NullFolderCache.
+
+    `marcas` es 'alta,baja' en fracción de la capacidad (por defecto '0.9,0.8')
+    y el índice va en `ruta` o en folder_cache.sqlite3 dentro del primer volumen.
+    """
+    if not capacidad_mb:
+        return NullFolderCache()
+    alta, baja = MARCA_ALTA, MARCA_BAJA
+    if marcas:
+        try:
+            alta, baja = (float(marca) for marca in marcas.split(','))
+        except ValueError:
+            raise ValueError(f"Marcas de la caché no válidas: {marcas} (formato: alta,baja, p. ej. 0.9,0.8)")
+    path = Path(ruta) if ruta else volumenes[0].ruta / "folder_cache.sqlite3"
+    return FolderCache(volumenes, int(capacidad_mb * 1024 * 1024), path, alta, baja)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Planificador de formatos de los jobs de video
+Interpreta la calidad pedida y elige los formatos concretos a partir del info dict
+"""
+
+import re
+from typing import Optional
+
+from youtube_engine.storage import tamano_formato
+
+# Calidades con nombre (en minúsculas) y su altura máxima
+ALIAS_CALIDAD = {
+    '8k': 4320, '4k': 2160, 'uhd': 2160, '2k': 1440, 'qhd': 1440,
+    'fhd': 1080, 'fullhd': 1080, 'hd': 720, 'sd': 480,
+}
+
+# Calidades sin límite de altura
+SIN_LIMITE = ('best', 'max', 'mejor')
+
+# '720', '720p', '1080p60', '1080i'
+_PATRON_CALIDAD = re.compile(r'(\d{3,4})(?:[pi]\d{0,3})?')
+
+
+def altura_maxima(quality: Optional[str]) -> Optional[int]:
+    """Altura máxima de una calidad ('720p', '1080', '4k', 'hd'...); None si es 'best'.
+
+    ValueError si no se entiende, en lugar de pedir a yt-dlp una altura
+    absurda que acabaría en otra calidad.
+    """
+    texto = str(quality or '').strip().lower()
+    if texto in SIN_LIMITE:
+        return None
+    if texto in ALIAS_CALIDAD:
+        return ALIAS_CALIDAD[texto]
+    coincidencia = _PATRON_CALIDAD.fullmatch(texto)
+    if coincidencia is None or not int(coincidencia.group(1)):
+        raise ValueError(f"Calidad no soportada: {quality} (p. ej. 480p, 720p, 1080, 4k o best)")
+    return int(coincidencia.group(1))
+
+
+def validar_calidad(quality: Optional[str]) -> str:
+    """La calidad pedida en su forma normal ('720p' si no se indica, '2160p' para '4k')"""
+    altura = altura_maxima(quality or '720p')
+    return f"{altura}p" if altura is not None else 'best'
+
+
+def selector_formato(quality: str) -> str:
+    """Selector de yt-dlp del mejor formato de un solo archivo (audio y video) para la calidad"""
+    altura = altura_maxima(quality)
+    return f'best[height<={altura}]' if altura is not None else 'best'
+
+
+def selector_descarga(quality: str, mezclar: bool) -> str:
+    """Selector de yt-dlp para cuando no hay plan (p. ej. las entradas de una playlist).
+
+    Con `mezclar` prefiere un formato ya combinado justo a la altura pedida,
+    luego video y audio por separado y, por último, el mejor combinado que
+    quepa. Sin ffmpeg solo se pueden usar formatos combinados.
+    """
+    if not mezclar:
+        return selector_formato(quality)
+    altura = altura_maxima(quality)
+    if altura is None:
+        return 'bestvideo+bestaudio/best'
+    return f'best[height={altura}]/bestvideo[height<={altura}]+bestaudio/best[height<={altura}]'
+
+
+class PlanFormato:
+    """Formatos elegidos para un video: un ID combinado ('18') o video+audio ('137+140')"""
+
+    __slots__ = ('format_id', 'height', 'expected_bytes', 'premuxed')
+
+    def __init__(self, format_id: str, height: Optional[int], expected_bytes: int, premuxed: bool):
+        self.format_id = format_id
+        self.height = height
+        self.expected_bytes = expected_bytes
+        self.premuxed = premuxed
+
+    def vista(self) -> dict:
+        """Campo format del estado del job"""
+        return {
+            "format_id": self.format_id,
+            "height": self.height,
+            "expected_bytes": self.expected_bytes,
+            "premuxed": self.premuxed,
+        }
+
+
+def _tiene_video(formato: dict) -> bool:
+    return formato.get('vcodec') != 'none'
+
+
+def _tiene_audio(formato: dict) -> bool:
+    return formato.get('acodec') != 'none'
+
+
+def _orden(formato: dict) -> tuple:
+    return (formato.get('height') or 0, formato.get('tbr') or 0, formato.get('filesize') or 0)
+
+
+def _orden_audio(formato: dict, extension_video: Optional[str]) -> tuple:
+    # m4a con mp4 y webm con webm se unen sin cambiar de contenedor
+    compatible = (formato.get('ext') == 'm4a') == (extension_video == 'mp4')
+    return (compatible, formato.get('abr') or formato.get('tbr') or 0, formato.get('filesize') or 0)
+
+
+def planificar(info: dict, quality: str, mezclar: bool = True) -> Optional[PlanFormato]:
+    """Elige los formatos de un video a partir de su info dict (sin procesar vale).
+
+    Si un formato combinado alcanza la mayor altura disponible hasta la
+    pedida se usa ese, sin descargar dos archivos ni unirlos después; si no,
+    el mejor video más el mejor audio (solo con `mezclar`, que requiere
+    ffmpeg). None si el info dict no trae formatos que encajen, y entonces
+    decide el selector de yt-dlp.
+    """
+    altura = altura_maxima(quality)
+    duracion = info.get('duration')
+    # Las miniaturas en mosaico (storyboards) no tienen ni audio ni video
+    formatos = [formato for formato in info.get('formats') or ()
+                if formato.get('format_id') and (_tiene_video(formato) or _tiene_audio(formato))
+                and formato.get('ext') != 'mhtml']
+    # Mejor por HTTP directo que por fragmentos (HLS o DASH segmentado) si los hay
+    directos = [formato for formato in formatos if formato.get('protocol') in (None, 'http', 'https')]
+    formatos = directos or formatos
+
+    videos = [formato for formato in formatos if _tiene_video(formato)
+              and (altura is None or (formato.get('height') or 0) <= altura)]
+    if not videos:
+        return None
+    alcanzable = max(formato.get('height') or 0 for formato in videos)
+    combinados = [formato for formato in videos if _tiene_audio(formato)]
+    solo_video = [formato for formato in videos if not _tiene_audio(formato)]
+    audios = [formato for formato in formatos if _tiene_audio(formato) and not _tiene_video(formato)]
+
+    combinado = max(combinados, key=_orden, default=None)
+    if combinado is not None and ((combinado.get('height') or 0) >= alcanzable
+                                  or not (mezclar and solo_video and audios)):
+        return PlanFormato(combinado['format_id'], combinado.get('height'),
+                           tamano_formato(combinado, duracion), True)
+    if not (mezclar and solo_video and audios):
+        return None
+
+    video = max(solo_video, key=_orden)
+    audio = max(audios, key=lambda formato: _orden_audio(formato, video.get('ext')))
+    return PlanFormato(f"{video['format_id']}+{audio['format_id']}", video.get('height'),
+                       tamano_formato(video, duracion) + tamano_formato(audio, duracion), False)
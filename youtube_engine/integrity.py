@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Verificación de integridad de las descargas
+Checksums de los archivos con lecturas mmap en un pool de hilos, índice SQLite y comprobación de tamaño
+"""
+
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import youtube_metrics as metricas
+
+ALGORITMO = 'sha256'
+
+# hashlib suelta el GIL con bloques grandes: con 8 MiB los hilos hashean en paralelo
+BLOQUE_HASH = 8 * 1024 * 1024
+
+# Archivos en vuelo a la vez en una verificación de toda la carpeta
+VENTANA_VERIFICACION = 64
+
+# Problemas que se guardan con detalle en el resultado de una verificación completa
+MAX_PROBLEMAS = 100
+
+# Resultados de verificar un archivo (las descargas truncadas las detecta antes ComprobarTamano)
+RESULTADOS = ('ok', 'skipped', 'changed', 'corrupted', 'missing', 'error')
+
+
+class ArchivoIncompleto(Exception):
+    """Un archivo descargado tiene menos bytes de los que anuncia su formato"""
+
+
+def hash_archivo(ruta, algoritmo: str = ALGORITMO, bloque: int = BLOQUE_HASH) -> Tuple[str, int]:
+    """Checksum hexadecimal y bytes del archivo, leído con mmap sin copiarlo a Python.
+
+    Cada bloque es un memoryview del mapa, así que hashlib lee directamente
+    de la caché de páginas; MADV_SEQUENTIAL pide al kernel que lea por delante.
+    """
+    suma = hashlib.new(algoritmo)
+    with open(ruta, 'rb') as archivo:
+        tamano = os.fstat(archivo.fileno()).st_size
+        # mmap no admite archivos vacíos
+        if tamano:
+            with mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                if hasattr(mapa, 'madvise'):
+                    mapa.madvise(mmap.MADV_SEQUENTIAL)
+                vista = memoryview(mapa)
+                try:
+                    for inicio in range(0, tamano, bloque):
+                        suma.update(vista[inicio:inicio + bloque])
+                finally:
+                    vista.release()
+    return suma.hexdigest(), tamano
+
+
+class ComprobarTamano:
+    """Progress hook que detecta descargas truncadas.
+
+    Al terminar cada archivo (antes de post-procesarlo) compara sus bytes en
+    disco con el `filesize` exacto que anuncia el formato en el info dict;
+    si faltan, el job falla con ArchivoIncompleto en vez de completarse con
+    un archivo a medias. Sin `filesize` (solo hay uno aproximado) no compara.
+    """
+
+    __slots__ = ()
+
+    def __call__(self, d: dict):
+        if d.get('status') != 'finished' or not d.get('filename'):
+            return
+        esperado = (d.get('info_dict') or {}).get('filesize')
+        if not esperado:
+            return
+        try:
+            tamano = os.path.getsize(d['filename'])
+        except OSError:
+            return
+        if tamano < esperado:
+            metricas.VERIFY_FILES.labels('truncated').inc()
+            raise ArchivoIncompleto(f"Descarga incompleta: {os.path.basename(d['filename'])} "
+                                    f"tiene {tamano} de {esperado} bytes")
+
+
+class Verificador:
+    """Checksums de los archivos descargados en un pool de hilos, con un índice SQLite.
+
+    El índice guarda por ruta el tamaño, el mtime y el checksum de la última
+    verificación; si el archivo no ha cambiado de tamaño ni de mtime no se
+    vuelve a leer, salvo con `completa`, que relee todo y marca como
+    corrupted los que, sin cambiar, ya no dan el mismo checksum.
+    """
+
+    def __init__(self, path: Path, max_workers: Optional[int] = None):
+        self.path = Path(path)
+        self.max_workers = max(max_workers or os.cpu_count() or 1, 1)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._creado = False
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            # Una conexión SQLite no puede cruzar un fork: cada worker abre las suyas
+            os.register_at_fork(after_in_child=self._reiniciar)
+
+    def _reiniciar(self):
+        self._local = threading.local()
+        self._executor = None
+
+    def _conexion(self) -> sqlite3.Connection:
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            with self._lock:
+                if not self._creado:
+                    db.execute("""CREATE TABLE IF NOT EXISTS checksums (
+                        path TEXT PRIMARY KEY,
+                        size INTEGER NOT NULL,
+                        mtime_ns INTEGER NOT NULL,
+                        algorithm TEXT NOT NULL,
+                        checksum TEXT NOT NULL,
+                        verified_at REAL NOT NULL)""")
+                    self._creado = True
+            self._local.db = db
+        return db
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="yt-verificacion")
+            return self._executor
+
+    def enviar(self, ruta, completa: bool = False) -> Future:
+        """Verifica `ruta` en el pool; el futuro da el resultado de verificar_archivo"""
+        return self._pool().submit(self.verificar_archivo, str(Path(ruta).absolute()), completa)
+
+    def verificar_archivo(self, ruta: str, completa: bool = False) -> dict:
+        """Resultado de un archivo: path, result (ver RESULTADOS), size, checksum y, si lo hay, error"""
+        inicio = time.perf_counter()
+        try:
+            estado = os.stat(ruta)
+        except FileNotFoundError:
+            return self._resultado({'path': ruta, 'result': 'missing'})
+        db = self._conexion()
+        previo = db.execute("SELECT size, mtime_ns, algorithm, checksum FROM checksums WHERE path = ?",
+                            (ruta,)).fetchone()
+        igual = previo is not None and previo[:3] == (estado.st_size, estado.st_mtime_ns, ALGORITMO)
+        if igual and not completa:
+            return self._resultado({'path': ruta, 'result': 'skipped', 'size': estado.st_size,
+                                    'checksum': previo[3]})
+        try:
+            checksum, tamano = hash_archivo(ruta)
+        except OSError as e:
+            metricas.registrar_error('verify', e)
+            return self._resultado({'path': ruta, 'result': 'error', 'error': str(e)})
+        metricas.VERIFY_BYTES.inc(tamano)
+        if igual and checksum != previo[3]:
+            # Mismo tamaño y mtime pero otro contenido: el disco lo ha cambiado por debajo
+            resultado = 'corrupted'
+        else:
+            resultado = 'changed' if previo is not None and not igual else 'ok'
+        if resultado != 'corrupted':
+            # El de un archivo corrupto se conserva: sigue siendo el bueno
+            db.execute("INSERT OR REPLACE INTO checksums (path, size, mtime_ns, algorithm, checksum, verified_at) "
+                       "VALUES (?, ?, ?, ?, ?, ?)",
+                       (ruta, tamano, estado.st_mtime_ns, ALGORITMO, checksum, time.time()))
+        metricas.VERIFY_SECONDS.observe(time.perf_counter() - inicio)
+        return self._resultado({'path': ruta, 'result': resultado, 'size': tamano, 'checksum': checksum})
+
+    @staticmethod
+    def _resultado(resultado: dict) -> dict:
+        metricas.VERIFY_FILES.labels(resultado['result']).inc()
+        return resultado
+
+    def verificar_todo(self, rutas: Iterable[str], completa: bool = False, raices: Tuple[str, ...] = (),
+                       al_avanzar: Optional[Callable[[int], None]] = None,
+                       detener: Optional[Callable[[], bool]] = None) -> dict:
+        """Verifica muchos archivos con como mucho VENTANA_VERIFICACION en vuelo.
+
+        `al_avanzar` recibe cuántos van verificados y `detener` se consulta
+        entre archivos para abandonar a medias. Si se recorren enteras las
+        carpetas `raices`, las rutas del índice dentro de ellas que ya no
+        existen cuentan como missing. Devuelve un resumen con los archivos
+        por resultado, los bytes leídos y los primeros problemas.
+        """
+        resumen: Dict[str, int] = dict.fromkeys(RESULTADOS, 0)
+        problemas = []
+        leidos = 0
+        hechos = 0
+        en_vuelo: "set[Future]" = set()
+        vistos = set()
+
+        def recoger(futuro: Future):
+            nonlocal leidos, hechos
+            resultado = futuro.result()
+            resumen[resultado['result']] += 1
+            if resultado['result'] in ('ok', 'changed', 'corrupted'):
+                leidos += resultado['size']
+            if resultado['result'] not in ('ok', 'skipped') and len(problemas) < MAX_PROBLEMAS:
+                problemas.append(resultado)
+            hechos += 1
+            if al_avanzar is not None:
+                al_avanzar(hechos)
+
+        for ruta in rutas:
+            if detener is not None and detener():
+                break
+            vistos.add(ruta)
+            en_vuelo.add(self.enviar(ruta, completa))
+            if len(en_vuelo) >= VENTANA_VERIFICACION:
+                listos, en_vuelo = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                for futuro in listos:
+                    recoger(futuro)
+        for futuro in en_vuelo:
+            recoger(futuro)
+        if raices and (detener is None or not detener()):
+            for ruta in self.desaparecidos(vistos, raices):
+                recoger(self._hecho(self.verificar_archivo(ruta)))
+        return {"files": hechos, **resumen, "bytes_hashed": leidos, "problems": problemas}
+
+    def desaparecidos(self, vistos: "set[str]", raices: Tuple[str, ...]) -> list:
+        """Rutas del índice dentro de `raices` que no están en `vistos`; se quitan del índice"""
+        db = self._conexion()
+        faltan = [ruta for ruta, in db.execute("SELECT path FROM checksums")
+                  if ruta.startswith(raices) and ruta not in vistos]
+        db.executemany("DELETE FROM checksums WHERE path = ?", [(ruta,) for ruta in faltan])
+        return faltan
+
+    def olvidar(self, rutas: Iterable[str]):
+        """Quita `rutas` del índice (p. ej. las que desalojó la caché): no cuentan como missing"""
+        self._conexion().executemany("DELETE FROM checksums WHERE path = ?", [(ruta,) for ruta in rutas])
+
+    @staticmethod
+    def _hecho(resultado: dict) -> Future:
+        futuro: Future = Future()
+        futuro.set_result(resultado)
+        return futuro
+
+    def cerrar(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def crear_verificador(especificacion: Optional[str], carpeta: Path,
+                      ruta: Optional[str] = None) -> Optional[Verificador]:
+    """Verificador a partir de 'threads[:N]' (sin N, un hilo por núcleo) u 'off' (por defecto).
+
+    Hashear cada archivo confirmado relee todos sus bytes, así que es opcional.
+    El índice de checksums va en `ruta` o en checksums.sqlite3 dentro de `carpeta`.
+    """
+    tipo, _, workers = (especificacion or 'off').partition(':')
+    if tipo == 'off':
+        return None
+    if tipo != 'threads':
+        raise ValueError(f"Verificación no soportada: {especificacion}")
+    return Verificador(Path(ruta) if ruta else Path(carpeta) / "checksums.sqlite3",
+                       int(workers) if workers else None)
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Modelo de jobs de descarga
+Estados, creación del registro, el registro compacto de los stores en memoria y las vistas de las APIs
+"""
+
+import os
+import uuid
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Iterable, List, Optional, Tuple, Union
+
+import youtube_profiling as profiling
+from youtube_engine import serializer
+
+
+# Estados posibles de una descarga
+class DownloadStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+ESTADOS_FINALES = (DownloadStatus.COMPLETED, DownloadStatus.FAILED, DownloadStatus.CANCELLED)
+ESTADOS_CANCELABLES = (DownloadStatus.PENDING, DownloadStatus.RUNNING)
+
+# Código entero de cada estado en JobRecord; la tupla devuelve siempre el mismo str
+ESTADOS_POR_CODIGO = tuple(estado.value for estado in DownloadStatus)
+CODIGOS_ESTADO = {valor: codigo for codigo, valor in enumerate(ESTADOS_POR_CODIGO)}
+
+
+def nuevo_job(url: str, is_playlist: bool, quality: str = "720p", modo: str = "video",
+              idiomas: Optional[List[str]] = None, callback_url: Optional[str] = None) -> dict:
+    """Registro de un job recién creado, listo para guardarlo en el store"""
+    job = {
+        'job_id': str(uuid.uuid4()),
+        'url': url,
+        'title': "Preparando descarga de playlist..." if is_playlist else "Preparando descarga...",
+        'status': DownloadStatus.PENDING.value,
+        'created_at': datetime.now().isoformat(),
+        'is_playlist': is_playlist,
+        'total_videos': 0 if is_playlist else 1,
+        'downloaded_videos': 0,
+        'quality': quality,
+        'mode': modo,
+        'owner': os.getpid()
+    }
+    if idiomas:
+        job['languages'] = list(idiomas)
+    if callback_url:
+        job['callback_url'] = callback_url
+    return job
+
+
+class JobRecord:
+    """Job compacto para tablas con cientos de miles de jobs en memoria.
+
+    Slots en lugar de un dict, el estado como entero y las fechas como
+    microsegundos en un entero; hacia fuera se ve igual que el dict de
+    `nuevo_job` (como_dict). Cada cambio incrementa `version` y descarta las
+    vistas ya calculadas y su JSON, así que consultar el estado de un job que
+    no cambia no crea ningún dict ni vuelve a codificarlo. `secuencia` es el
+    número de cambio del store en el que cambió por última vez (lo asigna el
+    store).
+    """
+
+    __slots__ = ('job_id', 'url', 'title', 'status_code', 'created_ts', 'started_ts', 'completed_ts',
+                 'error_message', 'is_playlist', 'total_videos', 'downloaded_videos', 'quality', 'mode',
+                 'owner', 'interrupted', 'phase_timings', 'extra', 'version', 'secuencia', '_estado', '_resumen',
+                 '_estado_json', '_resumen_json')
+
+    # Campos del dict que se guardan tal cual; el resto se convierte o va a `extra`
+    DIRECTOS = frozenset(('job_id', 'url', 'title', 'error_message', 'is_playlist', 'total_videos',
+                          'downloaded_videos', 'quality', 'mode', 'owner', 'interrupted'))
+    FECHAS = {'created_at': 'created_ts', 'started_at': 'started_ts', 'completed_at': 'completed_ts'}
+
+    def __init__(self, job: dict):
+        self.title = self.url = self.quality = ""
+        self.mode = 'video'
+        self.status_code = 0
+        self.created_ts = 0
+        self.started_ts = self.completed_ts = self.error_message = self.owner = None
+        self.is_playlist = self.interrupted = False
+        self.total_videos = self.downloaded_videos = 0
+        self.phase_timings = self.extra = None
+        self.version = self.secuencia = 0
+        self.actualizar(job)
+
+    def actualizar(self, campos: dict):
+        for clave, valor in campos.items():
+            if clave in self.DIRECTOS:
+                setattr(self, clave, valor)
+            elif clave == 'status':
+                self.status_code = CODIGOS_ESTADO[valor.value if isinstance(valor, Enum) else valor]
+            elif clave in self.FECHAS:
+                setattr(self, self.FECHAS[clave], _a_epoch(valor))
+            elif clave == 'phase_timings' and isinstance(valor, dict) and valor.keys() == _FASES:
+                # Una tupla en el orden de profiling.FASES en lugar de un dict por job
+                self.phase_timings = tuple(valor[fase] for fase in profiling.FASES)
+            elif clave == 'phase_timings':
+                self.phase_timings = valor
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[clave] = valor
+        self.version += 1
+        self._estado = self._resumen = self._estado_json = self._resumen_json = None
+
+    @property
+    def status(self) -> str:
+        return ESTADOS_POR_CODIGO[self.status_code]
+
+    def como_dict(self) -> dict:
+        """El job como el dict que guardan los demás stores (fechas ISO, estado como texto)"""
+        job = {
+            'job_id': self.job_id,
+            'url': self.url,
+            'title': self.title,
+            'status': self.status,
+            'created_at': _a_iso(self.created_ts),
+            'is_playlist': self.is_playlist,
+            'total_videos': self.total_videos,
+            'downloaded_videos': self.downloaded_videos,
+            'quality': self.quality,
+            'mode': self.mode,
+            'owner': self.owner,
+        }
+        # Los campos opcionales solo aparecen una vez asignados, como en el dict original
+        for clave in ('started_at', 'completed_at'):
+            valor = getattr(self, self.FECHAS[clave])
+            if valor is not None:
+                job[clave] = _a_iso(valor)
+        if self.error_message is not None:
+            job['error_message'] = self.error_message
+        if self.interrupted:
+            job['interrupted'] = self.interrupted
+        if isinstance(self.phase_timings, tuple):
+            job['phase_timings'] = dict(zip(profiling.FASES, self.phase_timings))
+        elif self.phase_timings is not None:
+            job['phase_timings'] = self.phase_timings
+        if self.extra:
+            job.update(self.extra)
+        return job
+
+    def vista_estado(self) -> dict:
+        """vista_estado() del job sin fases en curso; compartida hasta el próximo cambio (no modificarla)"""
+        if self._estado is None:
+            self._estado = vista_estado(self.como_dict())
+        return self._estado
+
+    def vista_resumen(self) -> dict:
+        """vista_resumen() del job; compartida hasta el próximo cambio (no modificarla)"""
+        if self._resumen is None:
+            self._resumen = vista_resumen(self.como_dict())
+        return self._resumen
+
+    def estado_json(self) -> bytes:
+        """vista_estado() ya codificada en JSON para esta versión del job"""
+        if self._estado_json is None:
+            self._estado_json = serializer.dumps(self._estado or vista_estado(self.como_dict()))
+        return self._estado_json
+
+    def resumen_json(self) -> bytes:
+        """vista_resumen() ya codificada en JSON para esta versión del job"""
+        if self._resumen_json is None:
+            self._resumen_json = serializer.dumps(self._resumen or vista_resumen(self.como_dict()))
+        return self._resumen_json
+
+
+_FASES = frozenset(profiling.FASES)
+
+
+# Las fechas de los jobs son datetime.now() sin zona: se guardan como microsegundos
+# desde esta fecha, sin pasar por la zona local ni por un float, y vuelven idénticas
+_EPOCH = datetime(1970, 1, 1)
+_MICROSEGUNDO = timedelta(microseconds=1)
+
+
+def _a_epoch(valor) -> Union[int, str, None]:
+    if valor is None or isinstance(valor, int):
+        return valor
+    fecha = datetime.fromisoformat(valor)
+    if fecha.tzinfo is not None:
+        # Con zona se conserva el texto tal cual
+        return valor
+    return (fecha - _EPOCH) // _MICROSEGUNDO
+
+
+def _a_iso(epoch: Union[int, str]) -> str:
+    if isinstance(epoch, str):
+        return epoch
+    return (_EPOCH + epoch * _MICROSEGUNDO).isoformat()
+
+
+def porcentaje(job: dict) -> float:
+    if not job['total_videos']:
+        return 0
+    return round((job['downloaded_videos'] / (job['total_videos'] or 1)) * 100, 2)
+
+
+def ruta_descarga(job: dict) -> Optional[str]:
+    """El archivo de un video, o la carpeta común de los archivos de una playlist"""
+    archivos = job.get('files')
+    if not archivos:
+        return None
+    if len(archivos) == 1 and not job['is_playlist']:
+        return archivos[0]
+    return os.path.commonpath(archivos) if len(archivos) > 1 else os.path.dirname(archivos[0])
+
+
+def vista_estado(job: dict, fases: Optional[profiling.PhaseTimer] = None) -> dict:
+    """Respuesta de get_download_status / GET /status/<job_id>"""
+    return {
+        "job_id": job['job_id'],
+        "title": job['title'],
+        "status": job['status'],
+        "created_at": job['created_at'],
+        "started_at": job.get('started_at'),
+        "completed_at": job.get('completed_at'),
+        "error_message": job.get('error_message'),
+        "is_playlist": job['is_playlist'],
+        "mode": job.get('mode', 'video'),
+        "total_videos": job['total_videos'],
+        "downloaded_videos": job['downloaded_videos'],
+        "progress_percentage": porcentaje(job),
+        "estimated_bytes": job.get('estimated_bytes'),
+        "format": job.get('format'),
+        "waiting_for_space": job.get('waiting_for_space', False),
+        "files": job.get('files', []),
+        "evicted_files": job.get('evicted_files', []),
+        "download_path": ruta_descarga(job),
+        "current_phase": fases.fase_actual if fases else None,
+        "postprocessing_steps": job.get('postprocessing_steps', {}),
+        "checksums": job.get('checksums', {}),
+        "verification": job.get('verification'),
+        "phase_timings": fases.duraciones() if fases else job.get('phase_timings', dict.fromkeys(profiling.FASES, 0.0))
+    }
+
+
+# Campos de vista_estado, los que se pueden pedir en una consulta por lotes
+CAMPOS_ESTADO = ('job_id', 'title', 'status', 'created_at', 'started_at', 'completed_at', 'error_message',
+                 'is_playlist', 'mode', 'total_videos', 'downloaded_videos', 'progress_percentage',
+                 'estimated_bytes', 'format', 'waiting_for_space', 'files', 'evicted_files', 'download_path',
+                 'postprocessing_steps', 'checksums', 'verification', 'current_phase', 'phase_timings')
+
+# Máximo de IDs por consulta de estado por lotes
+MAX_IDS_LOTE = 10000
+
+
+def validar_consulta_lote(job_ids, campos=None, desde=None) -> Tuple[List[str], Optional[List[str]], Optional[int]]:
+    """Normaliza una consulta por lotes: IDs sin repetir, campos conocidos y versión; ValueError si no vale"""
+    if not isinstance(job_ids, list) or not all(isinstance(job_id, str) for job_id in job_ids):
+        raise ValueError("job_ids debe ser una lista de IDs")
+    if len(job_ids) > MAX_IDS_LOTE:
+        raise ValueError(f"Como máximo {MAX_IDS_LOTE} IDs por consulta")
+    if campos is not None:
+        if not isinstance(campos, list) or not all(isinstance(campo, str) for campo in campos):
+            raise ValueError("fields debe ser una lista de campos")
+        desconocidos = [campo for campo in campos if campo not in CAMPOS_ESTADO]
+        if desconocidos:
+            raise ValueError(f"Campos desconocidos: {', '.join(desconocidos)} (campos: {', '.join(CAMPOS_ESTADO)})")
+    if desde is not None and (isinstance(desde, bool) or not isinstance(desde, int) or desde < 0):
+        raise ValueError("since_version debe ser un entero no negativo")
+    return list(dict.fromkeys(job_ids)), campos, desde
+
+
+def proyectar(vista: dict, campos: Optional[Iterable[str]]) -> dict:
+    """Solo `campos` (y siempre job_id) de una vista de estado; sin campos, la vista tal cual"""
+    if not campos:
+        return vista
+    proyeccion = {'job_id': vista['job_id']}
+    for campo in campos:
+        proyeccion[campo] = vista[campo]
+    return proyeccion
+
+
+def vista_resumen(job: dict) -> dict:
+    """Entrada de list_downloads / GET /downloads"""
+    return {
+        "job_id": job['job_id'],
+        "title": job['title'],
+        "status": job['status'],
+        "created_at": job['created_at'],
+        "is_playlist": job['is_playlist'],
+        "total_videos": job['total_videos'],
+        "downloaded_videos": job['downloaded_videos'],
+        "progress_percentage": porcentaje(job)
+    }
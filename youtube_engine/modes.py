@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Modos de descarga de los jobs
+Qué pide cada modo a yt-dlp: el video, solo el audio, solo los subtítulos o solo la miniatura
+"""
+
+from typing import List, Optional
+
+from youtube_engine.formats import selector_descarga
+
+MODOS = ('video', 'audio', 'subtitles', 'thumbnail')
+
+# Modos que no descargan el video ni el audio: yt-dlp solo escribe los archivos auxiliares
+MODOS_SIN_MEDIOS = ('subtitles', 'thumbnail')
+
+# Idiomas de subtítulos si no se indican (expresiones regulares de yt-dlp: en.* incluye en-US)
+IDIOMAS_SUBTITULOS = ('es.*', 'en.*')
+
+
+def validar_modo(modo: Optional[str]) -> str:
+    """El modo pedido ('video' si no se indica); ValueError si no existe"""
+    modo = modo or 'video'
+    if modo not in MODOS:
+        raise ValueError(f"Modo no soportado: {modo} (modos: {', '.join(MODOS)})")
+    return modo
+
+
+def parsear_idiomas(valor) -> Optional[List[str]]:
+    """Idiomas de subtítulos como lista, desde una lista o un texto 'es,en'"""
+    if not valor:
+        return None
+    if isinstance(valor, str):
+        valor = valor.split(',')
+    return [str(idioma).strip() for idioma in valor if str(idioma).strip()] or None
+
+
+def opciones_modo(modo: str, quality: str, plantilla: str, idiomas: Optional[List[str]] = None,
+                  mezclar: bool = False) -> dict:
+    """Opciones de yt-dlp del modo: selección de formato y plantillas de salida.
+
+    - video: el selector de formats.selector_descarga para la calidad pedida
+      (el motor lo cambia por los formatos concretos de su plan si lo hay)
+    - audio: solo la mejor pista de audio, en su contenedor original (m4a o
+      webm), sin convertirla; `quality` no se usa
+    - subtitles: los subtítulos (o, si no hay, los automáticos) de `idiomas`
+      en VTT, sin descargar el video
+    - thumbnail: la miniatura de mayor resolución, sin descargar el video
+
+    Todos comparten `plantilla`: el video, el audio, `Título [ID].es.vtt` y
+    `Título [ID].webp` quedan juntos y se distinguen por la extensión.
+    """
+    if modo == 'video':
+        return {'format': selector_descarga(quality, mezclar), 'outtmpl': plantilla}
+    if modo == 'audio':
+        return {'format': 'bestaudio', 'outtmpl': plantilla}
+
+    # yt-dlp elige formato aunque no descargue: cualquiera vale y no debe fallar
+    sin_medios = {'skip_download': True, 'format': 'best/bestvideo/bestaudio', 'ignore_no_formats_error': True}
+    if modo == 'subtitles':
+        return {**sin_medios, 'writesubtitles': True, 'writeautomaticsub': True,
+                'subtitleslangs': list(idiomas or IDIOMAS_SUBTITULOS), 'subtitlesformat': 'vtt/srt/best',
+                'outtmpl': {'default': plantilla, 'subtitle': plantilla}}
+    if modo == 'thumbnail':
+        return {**sin_medios, 'writethumbnail': True, 'outtmpl': {'default': plantilla, 'thumbnail': plantilla}}
+    raise ValueError(f"Modo no soportado: {modo}")
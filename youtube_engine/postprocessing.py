@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Etapa de post-procesado del motor
+Une, corrige y convierte los archivos descargados en un pool propio, sin ocupar los workers de descarga
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+import youtube_metrics as metricas
+
+# Módulos que el forkserver importa una sola vez: cada worker nace de él con
+# yt-dlp ya cargado. Como con spawn, cada worker importa además el script
+# principal (como __mp_main__), que por eso no debe crear nada al importarse
+PRECARGA_WORKERS = ['youtube_engine.postprocessing', 'youtube_engine.ytdlp']
+
+
+def _contexto_workers():
+    """forkserver donde existe (POSIX) y spawn en el resto; nunca fork.
+
+    El proceso padre tiene hilos de descarga y del servidor a medias, así que
+    los workers no se crean con fork desde él.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        contexto = multiprocessing.get_context('forkserver')
+        contexto.set_forkserver_preload(PRECARGA_WORKERS)
+        return contexto
+    return multiprocessing.get_context('spawn')
+
+
+def ejecutar_pasos(opciones: dict, info: dict, pasos: list, enviado: float) -> dict:
+    """Post-procesa un archivo descargado; se ejecuta en un worker de la etapa.
+
+    Crea un YoutubeDL con las opciones del job, aplica los pasos que yt-dlp
+    dejó pendientes (merge, fixups...) y los postprocesadores de las opciones,
+    y confirma los archivos en su destino con ConfirmarSalida. Devuelve las
+    rutas confirmadas, los segundos de cada paso y la espera en la cola.
+    """
+    from youtube_engine import ytdlp
+
+    espera = max(time.time() - enviado, 0.0)
+    tiempos: Dict[str, float] = {}
+    inicios: Dict[str, float] = {}
+
+    def medir(d: dict):
+        paso = d.get('postprocessor')
+        if d.get('status') == 'started':
+            inicios[paso] = time.perf_counter()
+        elif d.get('status') == 'finished' and paso in inicios:
+            tiempos[paso] = tiempos.get(paso, 0.0) + time.perf_counter() - inicios.pop(paso)
+
+    archivos: List[str] = []
+    with ytdlp.YoutubeDL({**opciones, 'postprocessor_hooks': [medir]}, auto_init=False) as ydl:
+        info = ydl.run_all_pps('post_process', info, additional_pps=[paso(ydl) for paso in pasos])
+        info = ydl.run_pp(ytdlp.ConfirmarSalida(archivos.append), info)
+        ydl.run_all_pps('after_move', info)
+    tiempos.pop('ConfirmarSalida', None)
+    return {'files': archivos, 'steps': tiempos, 'queue_seconds': espera}
+
+
+class EtapaPostproceso:
+    """Pool de post-procesado con su propia cola, aparte del scheduler de descargas.
+
+    Con procesos (uno por núcleo si no se indica) el trabajo de Python de
+    yt-dlp no compite por el GIL con los hilos de descarga; con hilos, ffmpeg
+    sigue corriendo en su propio proceso. En ambos casos un hueco de red no
+    queda ocupado mientras se une un video. Cada tarea es un archivo
+    descargado, así que un job de playlist puede tener varias.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, procesos: bool = False):
+        self.max_workers = max(max_workers or os.cpu_count() or 1, 1)
+        self.procesos = procesos
+        self._executor = None
+        self._futuros: Dict[str, List[Future]] = {}
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Los procesos se crean con la primera tarea: un job sin post-procesado no los arranca
+        with self._lock:
+            if self._executor is None:
+                if self.procesos:
+                    self._executor = ProcessPoolExecutor(self.max_workers, mp_context=_contexto_workers())
+                else:
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="yt-postproceso")
+            return self._executor
+
+    def enviar(self, job_id: str, opciones: dict, info: dict, pasos: list) -> Future:
+        futuro = self._pool().submit(ejecutar_pasos, opciones, info, pasos, time.time())
+        with self._lock:
+            self._futuros.setdefault(job_id, []).append(futuro)
+        futuro.add_done_callback(lambda _futuro: self._retirar(job_id, _futuro))
+        return futuro
+
+    def _retirar(self, job_id: str, futuro: Future):
+        with self._lock:
+            futuros = self._futuros.get(job_id)
+            if futuros is not None and futuro in futuros:
+                futuros.remove(futuro)
+                if not futuros:
+                    del self._futuros[job_id]
+
+    def _todos(self) -> List[Future]:
+        with self._lock:
+            return [futuro for futuros in self._futuros.values() for futuro in futuros]
+
+    def cancelar(self, job_id: str) -> int:
+        """Retira de la cola las tareas del job que aún no empezaron; devuelve cuántas"""
+        with self._lock:
+            futuros = list(self._futuros.get(job_id, ()))
+        return sum(1 for futuro in futuros if futuro.cancel())
+
+    def cancelar_pendientes(self) -> int:
+        """Retira de la cola todas las tareas que aún no empezaron"""
+        return sum(1 for futuro in self._todos() if futuro.cancel())
+
+    def activos(self) -> int:
+        return sum(1 for futuro in self._todos() if futuro.running())
+
+    def en_cola(self) -> int:
+        return sum(1 for futuro in self._todos() if not futuro.running() and not futuro.done())
+
+    def esperar(self, timeout: float) -> int:
+        """Espera a las tareas hasta `timeout` segundos y devuelve cuántas quedan"""
+        _, pendientes = wait(self._todos(), timeout)
+        return len(pendientes)
+
+    def cerrar(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class PostprocesoJob:
+    """Tareas de post-procesado de un job en curso.
+
+    `al_archivo` recibe cada archivo confirmado y `al_terminar` se llama una
+    sola vez, con el primer error o None, cuando la descarga ha terminado
+    (`cerrar()`) y también todas sus tareas. `terminado` se activa después.
+    """
+
+    def __init__(self, al_archivo: Callable[[str], None], al_terminar: Callable[[Optional[BaseException]], None]):
+        self.al_archivo = al_archivo
+        self.al_terminar = al_terminar
+        self.pasos: Dict[str, float] = {}
+        self.terminado = threading.Event()
+        self._pendientes = 0
+        self._cerrado = False
+        self._error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+
+    @property
+    def pendientes(self) -> int:
+        return self._pendientes
+
+    def agregar(self, futuro: Future):
+        with self._lock:
+            self._pendientes += 1
+        futuro.add_done_callback(self._al_completar)
+
+    def _al_completar(self, futuro: Future):
+        error = None
+        try:
+            resultado = futuro.result()
+            for ruta in resultado['files']:
+                self.al_archivo(ruta)
+            metricas.POSTPROCESS_QUEUE_SECONDS.observe(resultado['queue_seconds'])
+            for paso, segundos in resultado['steps'].items():
+                metricas.POSTPROCESS_STEP_SECONDS.labels(paso).observe(segundos)
+        except BaseException as e:
+            error = e
+        with self._lock:
+            if error is None:
+                self.pasos['queue'] = self.pasos.get('queue', 0.0) + resultado['queue_seconds']
+                for paso, segundos in resultado['steps'].items():
+                    self.pasos[paso] = self.pasos.get(paso, 0.0) + segundos
+            elif self._error is None:
+                self._error = error
+            self._pendientes -= 1
+            fin = self._cerrado and not self._pendientes
+        if fin:
+            self._terminar()
+
+    def cerrar(self):
+        """La descarga terminó: no llegan más tareas"""
+        with self._lock:
+            self._cerrado = True
+            fin = not self._pendientes
+        if fin:
+            self._terminar()
+
+    def _terminar(self):
+        try:
+            self.al_terminar(self._error)
+        finally:
+            self.terminado.set()
+
+    def tiempos(self) -> Dict[str, float]:
+        """Segundos por paso (y de espera en la cola, `queue`), sumando todos los archivos"""
+        with self._lock:
+            return {paso: round(segundos, 3) for paso, segundos in self.pasos.items()}
+
+
+def crear_postproceso(especificacion: Optional[str]) -> Optional[EtapaPostproceso]:
+    """Crea la etapa a partir de 'threads[:N]' (por defecto), 'process[:N]' o 'inline'.
+
+    Con 'inline' no hay etapa: yt-dlp post-procesa en el hilo de la descarga.
+    """
+    tipo, _, workers = (especificacion or 'threads').partition(':')
+    if tipo == 'inline':
+        return None
+    if tipo not in ('process', 'threads'):
+        raise ValueError(f"Post-procesado no soportado: {especificacion}")
+    return EtapaPostproceso(int(workers) if workers else None, procesos=tipo == 'process')
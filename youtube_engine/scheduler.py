@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Planificadores de descargas del motor
+Un hilo por job, o un pool acotado con cola y cancelación de lo que aún no empezó
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional
+
+
+class ThreadScheduler:
+    """Un hilo por job, sin límite (comportamiento original del servidor HTTP)"""
+
+    def __init__(self):
+        self._hilos: Dict[str, threading.Thread] = {}
+
+    def enviar(self, job_id: str, funcion: Callable, *args):
+        hilo = threading.Thread(target=self._ejecutar, args=(job_id, funcion, args),
+                                name=f"yt-descarga-{job_id[:8]}")
+        self._hilos[job_id] = hilo
+        hilo.start()
+
+    def _ejecutar(self, job_id: str, funcion: Callable, args: tuple):
+        try:
+            funcion(*args)
+        finally:
+            self._hilos.pop(job_id, None)
+
+    def cancelar(self, job_id: str) -> bool:
+        """Sin cola no hay nada que retirar: el job se detiene desde sus hooks"""
+        return False
+
+    def activos(self) -> int:
+        return len(self._hilos)
+
+    def en_cola(self) -> int:
+        return 0
+
+    def esperar(self, timeout: float) -> int:
+        """Espera a los jobs hasta `timeout` segundos y devuelve cuántos siguen vivos"""
+        limite = time.monotonic() + timeout
+        for hilo in list(self._hilos.values()):
+            hilo.join(max(limite - time.monotonic(), 0))
+        return len(self._hilos)
+
+    def cerrar(self):
+        pass
+
+
+class PoolScheduler:
+    """Pool de `max_workers` hilos; los jobs que exceden esperan en cola.
+
+    Un job en cola se puede retirar antes de que empiece, y las métricas
+    distinguen entre jobs en ejecución y en espera.
+    """
+
+    def __init__(self, max_workers: int = 8, nombre: str = "descarga"):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix=f"yt-{nombre}")
+        self._futuros: Dict[str, Future] = {}
+
+    def enviar(self, job_id: str, funcion: Callable, *args):
+        futuro = self._executor.submit(funcion, *args)
+        self._futuros[job_id] = futuro
+        futuro.add_done_callback(lambda _futuro: self._futuros.pop(job_id, None))
+
+    def cancelar(self, job_id: str) -> bool:
+        futuro = self._futuros.get(job_id)
+        return futuro.cancel() if futuro is not None else False
+
+    def activos(self) -> int:
+        return sum(1 for futuro in list(self._futuros.values()) if futuro.running())
+
+    def en_cola(self) -> int:
+        return sum(1 for futuro in list(self._futuros.values()) if not futuro.running() and not futuro.done())
+
+    def esperar(self, timeout: float) -> int:
+        _, pendientes = wait(list(self._futuros.values()), timeout)
+        return len(pendientes)
+
+    def cerrar(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def crear_scheduler(especificacion: Optional[str]):
+    """Crea un scheduler a partir de 'threads' o 'pool:N'"""
+    if not especificacion or especificacion == 'threads':
+        return ThreadScheduler()
+    if especificacion == 'pool' or especificacion.startswith('pool:'):
+        _, _, workers = especificacion.partition(':')
+        return PoolScheduler(max(int(workers or 8), 1))
+    raise ValueError(f"Scheduler no soportado: {especificacion}")
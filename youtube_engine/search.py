@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+"""
+Índice de búsqueda de las descargas
+Metadatos de cada video descargado en SQLite con un índice FTS5, actualizado al terminar cada job
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Orden de los resultados: por relevancia (bm25) o por un campo de mayor a menor, con su índice
+ORDENES = {
+    'relevance': None,
+    'date': ('upload_date', 'videos_upload_date'),
+    'duration': ('duration', 'videos_duration'),
+    'views': ('view_count', 'videos_views'),
+}
+
+# Peso de cada columna de FTS en bm25 (title, uploader, description)
+PESOS_BM25 = (10.0, 5.0, 1.0)
+_RANKING = f"bm25({', '.join(map(str, PESOS_BM25))})"
+
+# Columnas que se buscan primero al ordenar por relevancia
+COLUMNAS_PRINCIPALES = '{title uploader}'
+
+MAX_RESULTADOS = 100
+PALABRAS_FRAGMENTO = 16
+MAX_DESCRIPCION = 5000
+
+_COLUMNAS = ("v.video_id, v.title, v.uploader, v.upload_date, v.duration, v.view_count, v.webpage_url, "
+             "v.job_id, v.files")
+
+# ID del video en el nombre de un archivo descargado (`Título [ID].ext`)
+_ID_EN_NOMBRE = re.compile(r"\[([\w-]+)\][^\[]*$")
+
+# Términos de la consulta: palabras de letras y números, como las separa el tokenizer unicode61
+_TERMINO = re.compile(r"\w+", re.UNICODE)
+
+
+def metadatos_video(info: dict) -> Optional[dict]:
+    """Campos que se indexan de un info dict de yt-dlp; None si no es un video con ID"""
+    video_id = info.get('id')
+    if not video_id or info.get('_type') in ('playlist', 'multi_video'):
+        return None
+    return {
+        'video_id': video_id,
+        'title': info.get('title') or '',
+        'uploader': info.get('uploader') or info.get('channel') or '',
+        'channel_id': info.get('channel_id'),
+        'description': (info.get('description') or '')[:MAX_DESCRIPCION],
+        'upload_date': info.get('upload_date'),
+        'duration': info.get('duration'),
+        'view_count': info.get('view_count'),
+        'webpage_url': info.get('webpage_url') or info.get('original_url'),
+    }
+
+
+class MetadatosVideos:
+    """Progress hook que guarda los metadatos de cada video que termina de descargarse.
+
+    Se llama también cuando yt-dlp encuentra el archivo ya descargado, y en
+    un merge una vez por formato: se guarda un registro por ID de video.
+    """
+
+    __slots__ = ('videos',)
+
+    def __init__(self):
+        self.videos: Dict[str, dict] = {}
+
+    def __call__(self, d: dict):
+        if d.get('status') != 'finished':
+            return
+        metadatos = metadatos_video(d.get('info_dict') or {})
+        if metadatos is not None and metadatos['video_id'] not in self.videos:
+            self.videos[metadatos['video_id']] = metadatos
+
+
+def _fecha(valor, campo: str) -> Optional[str]:
+    """AAAAMMDD (como upload_date de yt-dlp) a partir de AAAAMMDD o AAAA-MM-DD"""
+    if valor in (None, ''):
+        return None
+    texto = str(valor).replace('-', '')
+    try:
+        date(int(texto[:4]), int(texto[4:6]), int(texto[6:8]))
+    except ValueError:
+        texto = ''
+    if len(texto) != 8:
+        raise ValueError(f"{campo} debe ser una fecha AAAA-MM-DD o AAAAMMDD: {valor}")
+    return texto
+
+
+def _numero(valor, campo: str) -> Optional[float]:
+    if valor in (None, ''):
+        return None
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"{campo} debe ser un número: {valor}")
+    if numero < 0:
+        raise ValueError(f"{campo} no puede ser negativo")
+    return numero
+
+
+def validar_busqueda(consulta: Optional[str] = None, uploader: Optional[str] = None,
+                     desde=None, hasta=None, duracion_min=None, duracion_max=None,
+                     orden: Optional[str] = None, limite=None, offset=None) -> dict:
+    """Normaliza los parámetros de una búsqueda; ValueError si alguno no vale"""
+    orden = orden or 'relevance'
+    if orden not in ORDENES:
+        raise ValueError(f"sort no soportado: {orden} (opciones: {', '.join(ORDENES)})")
+    limite = _numero(limite, 'limit')
+    limite = 20 if limite is None else int(limite)
+    if not 1 <= limite <= MAX_RESULTADOS:
+        raise ValueError(f"limit debe estar entre 1 y {MAX_RESULTADOS}")
+    return {
+        'consulta': (consulta or '').strip(),
+        'uploader': (uploader or '').strip() or None,
+        'desde': _fecha(desde, 'date_from'),
+        'hasta': _fecha(hasta, 'date_to'),
+        'duracion_min': _numero(duracion_min, 'min_duration'),
+        'duracion_max': _numero(duracion_max, 'max_duration'),
+        'orden': orden,
+        'limite': limite,
+        'offset': int(_numero(offset, 'offset') or 0),
+    }
+
+
+def consulta_fts(texto: str) -> Optional[str]:
+    """Consulta FTS5 con todos los términos del texto; el último también como prefijo ("pyth" encuentra "python").
+
+    Cada término va entre comillas, así que nada de lo que escriba el
+    usuario se interpreta como sintaxis de FTS5 (AND, NEAR, columnas...).
+    """
+    terminos = _TERMINO.findall(texto)
+    if not terminos:
+        return None
+    return ' '.join([*(f'"{termino}"' for termino in terminos[:-1]), f'"{terminos[-1]}"*'])
+
+
+def _normalizar(texto: str) -> str:
+    """Minúsculas y sin tildes, como compara el tokenizer (unicode61 remove_diacritics)"""
+    return ''.join(letra for letra in unicodedata.normalize('NFKD', texto.casefold())
+                   if not unicodedata.combining(letra))
+
+
+def fragmento(texto: str, terminos: List[str], palabras: int = PALABRAS_FRAGMENTO) -> str:
+    """Unas `palabras` de `texto` desde poco antes del primer término, con los términos entre [corchetes].
+
+    `terminos` ya normalizados; una palabra del texto es un término si
+    empieza por él, igual que en la consulta el último es un prefijo.
+    """
+    tokens = list(_TERMINO.finditer(texto))
+    if not tokens:
+        return ''
+    coincide = [any(_normalizar(token.group()).startswith(termino) for termino in terminos) for token in tokens]
+    primero = coincide.index(True) if True in coincide else 0
+    inicio = max(0, min(primero - 2, len(tokens) - palabras))
+    fin = min(len(tokens), inicio + palabras)
+    partes = ['…' if inicio else '']
+    for i in range(inicio, fin):
+        if i > inicio:
+            partes.append(texto[tokens[i - 1].end():tokens[i].start()])
+        palabra = tokens[i].group()
+        partes.append(f"[{palabra}]" if coincide[i] else palabra)
+    partes.append('…' if fin < len(tokens) else '')
+    return ''.join(partes)
+
+
+class IndiceBusqueda:
+    """Metadatos de los videos descargados en SQLite (modo WAL) con búsqueda de texto FTS5.
+
+    `videos` tiene una fila por ID de video con índices para los filtros, y
+    `videos_fts` es un índice FTS5 de contenido externo sobre su título,
+    autor y descripción que mantienen triggers, así que cada job solo
+    escribe sus videos. Una búsqueda solo lee de `videos` las filas de la
+    página pedida: el orden (bm25 con más peso el título, o un campo) y los
+    filtros se resuelven con las coincidencias de FTS5 y los índices.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._creado = False
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            # Una conexión SQLite no puede cruzar un fork: cada worker abre las suyas
+            os.register_at_fork(after_in_child=self._reiniciar_conexiones)
+
+    def _reiniciar_conexiones(self):
+        self._local = threading.local()
+
+    def _conexion(self) -> sqlite3.Connection:
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            with self._lock:
+                if not self._creado:
+                    db.executescript("""
+                        CREATE TABLE IF NOT EXISTS videos (
+                            id INTEGER PRIMARY KEY,
+                            video_id TEXT NOT NULL UNIQUE,
+                            title TEXT NOT NULL,
+                            uploader TEXT NOT NULL,
+                            channel_id TEXT,
+                            description TEXT NOT NULL,
+                            upload_date TEXT,
+                            duration REAL,
+                            view_count INTEGER,
+                            webpage_url TEXT,
+                            job_id TEXT,
+                            files TEXT NOT NULL DEFAULT '[]',
+                            indexed_at REAL NOT NULL);
+                        CREATE INDEX IF NOT EXISTS videos_upload_date ON videos(upload_date);
+                        CREATE INDEX IF NOT EXISTS videos_duration ON videos(duration);
+                        CREATE INDEX IF NOT EXISTS videos_views ON videos(view_count);
+                        CREATE INDEX IF NOT EXISTS videos_uploader ON videos(uploader COLLATE NOCASE);
+                        CREATE VIRTUAL TABLE IF NOT EXISTS videos_fts USING fts5(
+                            title, uploader, description, content='videos', content_rowid='id',
+                            tokenize='unicode61 remove_diacritics 2', prefix='2 3 4');
+                        CREATE TRIGGER IF NOT EXISTS videos_ai AFTER INSERT ON videos BEGIN
+                            INSERT INTO videos_fts(rowid, title, uploader, description)
+                            VALUES (new.id, new.title, new.uploader, new.description);
+                        END;
+                        CREATE TRIGGER IF NOT EXISTS videos_ad AFTER DELETE ON videos BEGIN
+                            INSERT INTO videos_fts(videos_fts, rowid, title, uploader, description)
+                            VALUES ('delete', old.id, old.title, old.uploader, old.description);
+                        END;
+                        CREATE TRIGGER IF NOT EXISTS videos_au AFTER UPDATE OF title, uploader, description ON videos
+                        BEGIN
+                            INSERT INTO videos_fts(videos_fts, rowid, title, uploader, description)
+                            VALUES ('delete', old.id, old.title, old.uploader, old.description);
+                            INSERT INTO videos_fts(rowid, title, uploader, description)
+                            VALUES (new.id, new.title, new.uploader, new.description);
+                        END;
+                    """)
+                    self._creado = True
+            self._local.db = db
+        return db
+
+    def indexar(self, videos: Iterable[dict], job_id: Optional[str] = None, archivos: Iterable[str] = ()):
+        """Añade o actualiza los videos (dicts de metadatos_video) en una sola transacción.
+
+        Cada video se asocia a los `archivos` del job con su ID en el nombre
+        (la plantilla de salida lo pone entre corchetes).
+        """
+        archivos = list(archivos)
+        filas = []
+        ahora = time.time()
+        for video in videos:
+            propios = [ruta for ruta in archivos if f"[{video['video_id']}]" in os.path.basename(ruta)]
+            filas.append({**video, 'job_id': job_id, 'files': json.dumps(propios), 'indexed_at': ahora})
+        if not filas:
+            return
+        db = self._conexion()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany(
+                "INSERT INTO videos (video_id, title, uploader, channel_id, description, upload_date, duration, "
+                "view_count, webpage_url, job_id, files, indexed_at) VALUES (:video_id, :title, :uploader, "
+                ":channel_id, :description, :upload_date, :duration, :view_count, :webpage_url, :job_id, :files, "
+                ":indexed_at) ON CONFLICT(video_id) DO UPDATE SET title = excluded.title, "
+                "uploader = excluded.uploader, channel_id = excluded.channel_id, "
+                "description = excluded.description, upload_date = excluded.upload_date, "
+                "duration = excluded.duration, view_count = excluded.view_count, "
+                "webpage_url = excluded.webpage_url, job_id = excluded.job_id, "
+                "files = CASE WHEN excluded.files = '[]' THEN videos.files ELSE excluded.files END, "
+                "indexed_at = excluded.indexed_at", filas)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def buscar(self, consulta: str = '', uploader: Optional[str] = None, desde: Optional[str] = None,
+               hasta: Optional[str] = None, duracion_min: Optional[float] = None,
+               duracion_max: Optional[float] = None, orden: str = 'relevance', limite: int = 20,
+               offset: int = 0) -> dict:
+        """Videos que coinciden con el texto y los filtros (ver validar_busqueda).
+
+        Sin texto se listan los que pasan los filtros, los más recientes
+        primero. Cada resultado trae un fragmento de la descripción con los
+        términos entre [corchetes], sus archivos y si siguen en disco.
+        """
+        inicio = time.perf_counter()
+        filtros, parametros = [], []
+        if desde:
+            filtros.append("v.upload_date >= ?")
+            parametros.append(desde)
+        if hasta:
+            filtros.append("v.upload_date <= ?")
+            parametros.append(hasta)
+        if duracion_min is not None:
+            filtros.append("v.duration >= ?")
+            parametros.append(duracion_min)
+        if duracion_max is not None:
+            filtros.append("v.duration <= ?")
+            parametros.append(duracion_max)
+
+        db = self._conexion()
+        fts = consulta_fts(consulta)
+        # Uno de más para saber si hay otra página sin contar todas las coincidencias
+        necesarios = offset + limite + 1
+        if fts is None:
+            campo = ORDENES[orden] or ORDENES['date']
+            if uploader:
+                filtros.insert(0, "v.uploader = ? COLLATE NOCASE")
+                parametros.insert(0, uploader)
+            donde = " AND ".join(filtros) or "1"
+            filas = db.execute(f"SELECT {_COLUMNAS}, substr(v.description, 1, 160), NULL FROM videos v "
+                               f"WHERE {donde} ORDER BY v.{campo[0]} DESC, v.id DESC LIMIT ? OFFSET ?",
+                               (*parametros, limite + 1, offset)).fetchall()
+        else:
+            if ORDENES[orden] is None:
+                # Primero los que tienen los términos en el título o el autor, que por sus
+                # pesos son los mejores y muchos menos: bm25 no se calcula para el resto
+                # de coincidencias si esos ya llenan la página
+                ids = self._por_relevancia(db, f"{COLUMNAS_PRINCIPALES} : ({fts})", uploader, filtros,
+                                           parametros, necesarios)
+                if len(ids) < necesarios:
+                    ids += self._por_relevancia(db, f"({fts}) NOT {COLUMNAS_PRINCIPALES} : ({fts})", uploader,
+                                                filtros, parametros, necesarios - len(ids))
+            else:
+                ids = self._por_campo(db, fts, ORDENES[orden], uploader, filtros, parametros, necesarios)
+            filas = self._filas(db, consulta, ids[offset:])
+
+        resultados = []
+        for (video_id, titulo, autor, fecha, duracion, vistas, url, job_id, archivos, fragmento,
+             puntuacion) in filas[:limite]:
+            # Los que se borraron por fuera de la caché no se devuelven aunque sigan en la fila
+            archivos = [ruta for ruta in json.loads(archivos) if os.path.exists(ruta)]
+            resultados.append({
+                "video_id": video_id,
+                "title": titulo,
+                "uploader": autor,
+                "upload_date": fecha,
+                "duration": duracion,
+                "view_count": vistas,
+                "url": url,
+                "job_id": job_id,
+                "files": archivos,
+                "available": bool(archivos),
+                "snippet": fragmento,
+                "score": round(-puntuacion, 4) if puntuacion is not None else None,
+            })
+        return {
+            "query": consulta,
+            "results": resultados,
+            "offset": offset,
+            "has_more": len(filas) > limite,
+            "took_ms": round((time.perf_counter() - inicio) * 1000, 3),
+        }
+
+    @staticmethod
+    def _coincidencias(fts: str, uploader: Optional[str], filtros: list, parametros: list,
+                       unir: bool = False) -> Tuple[str, list]:
+        """FROM y WHERE que recorren las coincidencias de `fts` que pasan los filtros, y sus argumentos.
+
+        Los pocos videos de un autor salen antes de su índice: el + impide que
+        FTS5 los pida de uno en uno por rowid, que con un prefijo es rehacer la
+        consulta cada vez. Los demás filtros miran la fila de `videos` de cada
+        coincidencia.
+        """
+        condiciones, argumentos = ["videos_fts MATCH ?"], [fts]
+        if uploader:
+            condiciones.append("+videos_fts.rowid IN (SELECT id FROM videos WHERE uploader = ? COLLATE NOCASE)")
+            argumentos.append(uploader)
+        origen = "videos_fts"
+        if filtros or unir:
+            origen = "videos_fts CROSS JOIN videos v ON v.id = videos_fts.rowid"
+            condiciones += filtros
+            argumentos += parametros
+        return f"{origen} WHERE {' AND '.join(condiciones)}", argumentos
+
+    @classmethod
+    def _por_relevancia(cls, db: sqlite3.Connection, fts: str, uploader: Optional[str], filtros: list,
+                        parametros: list, cuantos: int) -> List[Tuple[int, float]]:
+        """Rowid y bm25 de los `cuantos` mejores que pasan los filtros"""
+        desde, argumentos = cls._coincidencias(fts, uploader, filtros, parametros)
+        if filtros:
+            # Con filtros que dejan pasar casi todo FTS5 ordena antes mejor que el JOIN después
+            sql = (f"SELECT videos_fts.rowid, videos_fts.rank FROM {desde} AND videos_fts.rank MATCH '{_RANKING}' "
+                   f"ORDER BY videos_fts.rank LIMIT ?")
+        else:
+            # bm25() solo se calcula para las filas que quedan, y sin JOIN ordenar aquí es más barato
+            sql = (f"SELECT videos_fts.rowid, {_RANKING.replace('bm25(', 'bm25(videos_fts, ')} AS puntos "
+                   f"FROM {desde} ORDER BY puntos LIMIT ?")
+        return db.execute(sql, (*argumentos, cuantos)).fetchall()
+
+    @classmethod
+    def _por_campo(cls, db: sqlite3.Connection, fts: str, orden: Tuple[str, str], uploader: Optional[str],
+                   filtros: list, parametros: list, cuantos: int) -> List[Tuple[int, None]]:
+        """Rowid de los `cuantos` primeros por un campo que coinciden y pasan los filtros.
+
+        Con pocas coincidencias se buscan todas y se ordenan; con muchas sale
+        más barato recorrer el índice del campo de mayor a menor hasta
+        encontrar `cuantos`, que es lo que se espera recorrer cuando
+        coincidencias² > cuantos × videos. Con filtro de autor, que deja pocos,
+        se ordenan siempre las coincidencias.
+        """
+        campo, indice = orden
+        recorrer = False
+        if not uploader:
+            coincidencias = db.execute("SELECT count(*) FROM videos_fts WHERE videos_fts MATCH ?",
+                                       (fts,)).fetchone()[0]
+            videos = db.execute("SELECT max(id) FROM videos").fetchone()[0] or 0
+            recorrer = coincidencias * coincidencias > cuantos * videos
+        if recorrer:
+            donde = "".join(f" AND {filtro}" for filtro in filtros)
+            sql = (f"SELECT v.id, NULL FROM videos v INDEXED BY {indice} WHERE v.id IN "
+                   f"(SELECT rowid FROM videos_fts WHERE videos_fts MATCH ?){donde} "
+                   f"ORDER BY v.{campo} DESC, v.id DESC LIMIT ?")
+            argumentos = [fts, *parametros]
+        else:
+            desde, argumentos = cls._coincidencias(fts, uploader, filtros, parametros, unir=True)
+            sql = f"SELECT v.id, NULL FROM {desde} ORDER BY v.{campo} DESC, v.id DESC LIMIT ?"
+        return db.execute(sql, (*argumentos, cuantos)).fetchall()
+
+    @staticmethod
+    def _filas(db: sqlite3.Connection, consulta: str, ids: List[Tuple[int, Optional[float]]]) -> list:
+        """Columnas de resultado y fragmento de la descripción de `ids`, en su orden.
+
+        El fragmento se saca en Python y no con snippet(): snippet() necesita
+        volver a evaluar la consulta FTS5 en cada fila, y con un prefijo que no
+        está en el índice de prefijos eso es unir todas sus listas cada vez.
+        """
+        if not ids:
+            return []
+        terminos = [_normalizar(termino) for termino in _TERMINO.findall(consulta)]
+        filas = db.execute(f"SELECT p.key, {_COLUMNAS}, v.description FROM json_each(?) AS p "
+                           f"CROSS JOIN videos v ON v.id = p.value ORDER BY p.key",
+                           (json.dumps([rowid for rowid, _ in ids]),)).fetchall()
+        return [(*fila[1:-1], fragmento(fila[-1], terminos), ids[fila[0]][1]) for fila in filas]
+
+    def olvidar(self, rutas: Iterable[str]) -> int:
+        """Quita `rutas` de los archivos de sus videos y borra los que se quedan sin ninguno.
+
+        El video de cada ruta se busca por el ID entre corchetes de su nombre.
+        Devuelve cuántos videos se borraron del índice.
+        """
+        por_video: Dict[str, set] = {}
+        for ruta in rutas:
+            encontrado = _ID_EN_NOMBRE.search(os.path.basename(ruta))
+            if encontrado:
+                por_video.setdefault(encontrado.group(1), set()).add(ruta)
+        if not por_video:
+            return 0
+        db = self._conexion()
+        borrados = 0
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for video_id, quitar in por_video.items():
+                fila = db.execute("SELECT files FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+                if fila is None:
+                    continue
+                archivos = json.loads(fila[0])
+                restantes = [ruta for ruta in archivos if ruta not in quitar]
+                if len(restantes) == len(archivos):
+                    continue
+                if restantes:
+                    db.execute("UPDATE videos SET files = ? WHERE video_id = ?", (json.dumps(restantes), video_id))
+                else:
+                    db.execute("DELETE FROM videos WHERE video_id = ?", (video_id,))
+                    borrados += 1
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return borrados
+
+    def total(self) -> int:
+        return self._conexion().execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+
+    def optimizar(self):
+        """Une los segmentos del índice FTS5 (conviene tras cargar muchos videos de golpe)"""
+        self._conexion().execute("INSERT INTO videos_fts(videos_fts) VALUES ('optimize')")
+
+
+def crear_indice_busqueda(ruta: Optional[str], carpeta: Path) -> Optional[IndiceBusqueda]:
+    """Índice en `ruta` o, con 'on', en search.sqlite3 dentro de `carpeta`; sin `ruta` u 'off', ninguno"""
+    if not ruta or ruta == 'off':
+        return None
+    return IndiceBusqueda(Path(carpeta) / "search.sqlite3" if ruta == 'on' else Path(ruta))
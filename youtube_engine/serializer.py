@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Serialización JSON de las respuestas del motor
+orjson si está instalado (si no, el módulo json) y listas montadas con fragmentos ya codificados
+"""
+
+import json
+import os
+from typing import Any, Iterable, Optional
+
+
+class StdlibSerializer:
+    """json de la biblioteca estándar, compacto y en UTF-8"""
+
+    nombre = "json"
+
+    def dumps(self, datos: Any) -> bytes:
+        return json.dumps(datos, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class OrjsonSerializer:
+    """orjson: varias veces más rápido y devuelve bytes directamente"""
+
+    nombre = "orjson"
+
+    def __init__(self):
+        import orjson
+        self._dumps = orjson.dumps
+
+    def dumps(self, datos: Any) -> bytes:
+        return self._dumps(datos)
+
+
+def crear_serializer(nombre: Optional[str] = None):
+    """Crea un serializador a partir de 'auto' (orjson si está instalado), 'orjson' o 'json'"""
+    if not nombre or nombre == 'auto':
+        try:
+            return OrjsonSerializer()
+        except ImportError:
+            return StdlibSerializer()
+    if nombre == 'orjson':
+        return OrjsonSerializer()
+    if nombre == 'json':
+        return StdlibSerializer()
+    raise ValueError(f"Serializador JSON no soportado: {nombre}")
+
+
+SERIALIZER = crear_serializer(os.environ.get('YOUTUBE_JSON_BACKEND'))
+
+
+def dumps(datos: Any) -> bytes:
+    return SERIALIZER.dumps(datos)
+
+
+def unir_lista(fragmentos: Iterable[bytes]) -> bytes:
+    """Array JSON a partir de elementos ya codificados, sin volver a codificarlos"""
+    return b'[' + b','.join(fragmentos) + b']'
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Volúmenes de descarga del motor
+Reparto de jobs entre volúmenes con pesos, subcarpetas por ID o fecha, espacio libre y escritura atómica
+"""
+
+import os
+import random
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+ESQUEMAS = ('flat', 'id', 'date')
+
+# Carpeta de cada volumen donde escriben los jobs hasta confirmar sus archivos
+CARPETA_TEMPORAL = '.partial'
+
+# Archivos de los volúmenes que no son descargas: bases SQLite del motor y restos de yt-dlp
+SUFIJOS_AUXILIARES = ('.sqlite3', '.sqlite3-wal', '.sqlite3-shm', '.sqlite3-journal', '.part', '.ytdl')
+
+# Cada cuánto se vuelve a mirar el espacio libre mientras un job espera sitio
+INTERVALO_ESPERA_ESPACIO = 5.0
+
+
+class SinEspacio(Exception):
+    """Ningún volumen tiene sitio para el tamaño estimado del job"""
+
+
+class Volumen:
+    """Carpeta raíz de descargas en un disco y su peso en el reparto.
+
+    `reservado` suma lo estimado para los jobs que escriben en el volumen: el
+    sistema de archivos no lo descuenta hasta que los bytes llegan al disco.
+    """
+
+    __slots__ = ('ruta', 'peso', 'reservado')
+
+    def __init__(self, ruta, peso: float = 1.0):
+        if peso <= 0:
+            raise ValueError(f"El peso del volumen {ruta} debe ser positivo")
+        self.ruta = Path(ruta)
+        self.peso = peso
+        self.reservado = 0
+        self.ruta.mkdir(parents=True, exist_ok=True)
+
+    def libre(self) -> int:
+        """Bytes libres descontando las reservas de los jobs en curso"""
+        return shutil.disk_usage(self.ruta).free - self.reservado
+
+    def describir(self) -> dict:
+        return {"path": str(self.ruta.absolute()), "weight": self.peso,
+                "free_bytes": self.libre(), "reserved_bytes": self.reservado}
+
+
+class Reserva:
+    """Espacio apartado en un volumen para un job; se devuelve con liberar()"""
+
+    __slots__ = ('almacenamiento', 'volumen', 'bytes')
+
+    def __init__(self, almacenamiento: "Almacenamiento", volumen: Volumen, tamano: int):
+        self.almacenamiento = almacenamiento
+        self.volumen = volumen
+        self.bytes = tamano
+
+    def liberar(self):
+        if self.bytes:
+            self.almacenamiento._liberar(self.volumen, self.bytes)
+            self.bytes = 0
+
+
+class Almacenamiento:
+    """Volúmenes de descarga y esquema de subcarpetas.
+
+    - esquema: 'flat' (todo en la raíz, como siempre), 'id' (una subcarpeta con
+      los dos primeros caracteres del ID del video o de la playlist, unas 4096
+      como mucho) o 'date' (AAAA/MM/DD del día de la descarga)
+    - margen: bytes que deben quedar libres en el volumen después del job
+
+    `reservar` elige entre los volúmenes con sitio para el tamaño estimado, al
+    azar según su peso, y lo aparta hasta que el job termina.
+    """
+
+    def __init__(self, volumenes: Sequence[Volumen], esquema: str = 'flat', margen: int = 0):
+        if not volumenes:
+            raise ValueError("Hace falta al menos un volumen de descarga")
+        if esquema not in ESQUEMAS:
+            raise ValueError(f"Esquema de carpetas no soportado: {esquema}")
+        self.volumenes: List[Volumen] = list(volumenes)
+        self.esquema = esquema
+        self.margen = margen
+        self._lock = threading.Lock()
+        self._azar = random.Random()
+
+    @property
+    def principal(self) -> Volumen:
+        return self.volumenes[0]
+
+    def volumen_de(self, carpeta) -> Volumen:
+        """El volumen con raíz `carpeta`, o uno nuevo para esa carpeta (p. ej. la de la CLI)"""
+        carpeta = Path(carpeta).absolute()
+        for volumen in self.volumenes:
+            if volumen.ruta.absolute() == carpeta:
+                return volumen
+        with self._lock:
+            volumen = Volumen(carpeta)
+            self.volumenes.append(volumen)
+        return volumen
+
+    def reservar(self, tamano: int, carpeta=None) -> Optional[Reserva]:
+        """Aparta `tamano` bytes en un volumen con sitio; None si ninguno lo tiene.
+
+        Con `carpeta` solo se considera el volumen de esa carpeta.
+        """
+        candidatos = [self.volumen_de(carpeta)] if carpeta is not None else self.volumenes
+        with self._lock:
+            con_sitio = [volumen for volumen in candidatos if volumen.libre() - self.margen >= tamano]
+            if not con_sitio:
+                return None
+            volumen = self._azar.choices(con_sitio, weights=[v.peso for v in con_sitio])[0]
+            volumen.reservado += tamano
+        return Reserva(self, volumen, tamano)
+
+    def _liberar(self, volumen: Volumen, tamano: int):
+        with self._lock:
+            volumen.reservado -= tamano
+
+    def plantilla(self, is_playlist: bool, fecha: Optional[datetime] = None) -> str:
+        """Plantilla de salida de yt-dlp relativa a la raíz del volumen.
+
+        El ID del video va en el nombre: dos videos con el mismo título no
+        se pisan, y dos jobs del mismo video escriben el mismo contenido.
+        """
+        nombre = '%(playlist_index)s - %(title)s [%(id)s].%(ext)s' if is_playlist else '%(title)s [%(id)s].%(ext)s'
+        if self.esquema == 'id':
+            # Los videos de una playlist se quedan juntos, en la subcarpeta de la playlist
+            return f"%({'playlist_id' if is_playlist else 'id'}).2s/{nombre}"
+        if self.esquema == 'date':
+            return f"{fecha or datetime.now():%Y/%m/%d}/{nombre}"
+        return nombre
+
+    def describir(self) -> dict:
+        return {"layout": self.esquema, "min_free_bytes": self.margen,
+                "volumes": [volumen.describir() for volumen in self.volumenes]}
+
+
+def carpeta_temporal(volumen: Volumen, job_id: str) -> Path:
+    """Carpeta del job en el mismo sistema de archivos que el destino, para poder renombrar"""
+    return volumen.ruta.absolute() / CARPETA_TEMPORAL / job_id
+
+
+def confirmar_archivo(origen, destino) -> Path:
+    """Mueve un archivo terminado a su nombre final sin que nadie lo vea a medias.
+
+    Primero fsync del contenido, después os.replace (atómico en el mismo
+    sistema de archivos: quien abra `destino` ve el archivo anterior o el
+    nuevo completo) y por último fsync de la carpeta para que el rename
+    sobreviva a un corte de luz.
+    """
+    destino = Path(destino)
+    with open(origen, 'rb') as archivo:
+        os.fsync(archivo.fileno())
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(origen, destino)
+    _sincronizar_carpeta(destino.parent)
+    return destino
+
+
+def recorrer_volumenes(volumenes: Sequence[Volumen]) -> Iterator[Tuple[str, os.stat_result]]:
+    """Ruta absoluta y stat de cada archivo descargado en los volúmenes.
+
+    No entra en las carpetas temporales (.partial), que son de jobs en
+    curso o interrumpidos, ni devuelve las bases SQLite y restos de yt-dlp.
+    """
+    for volumen in volumenes:
+        for carpeta, subcarpetas, nombres in os.walk(volumen.ruta.absolute()):
+            subcarpetas[:] = [nombre for nombre in subcarpetas if nombre != CARPETA_TEMPORAL]
+            for nombre in nombres:
+                if nombre.endswith(SUFIJOS_AUXILIARES):
+                    continue
+                ruta = os.path.join(carpeta, nombre)
+                try:
+                    yield ruta, os.stat(ruta)
+                except OSError:
+                    continue
+
+
+def _sincronizar_carpeta(carpeta: Path):
+    # En Windows no se puede abrir una carpeta para fsync
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    descriptor = os.open(carpeta, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def tamano_formato(formato: dict, duracion: Optional[float]) -> int:
+    """Bytes de un formato: los que declara o, si no, su bitrate por la duración"""
+    tamano = formato.get('filesize') or formato.get('filesize_approx')
+    if not tamano and formato.get('tbr') and duracion:
+        # tbr en kbit/s
+        tamano = formato['tbr'] * duracion * 125
+    return int(tamano or 0)
+
+
+def estimar_tamano(info: dict, altura: Optional[int] = None, solo_audio: bool = False) -> int:
+    """Bytes que ocupará un video, o la suma de una playlist con las entradas resueltas.
+
+    Con el info dict ya procesado se usa el formato elegido; sin procesar, el
+    mayor de los formatos con audio y video que no superan `altura`, que es lo
+    que pide formats.selector_formato, o con `solo_audio` el mayor de solo audio.
+    0 si los metadatos no dan ninguna pista.
+    """
+    if info.get('entries') is not None:
+        return sum(estimar_tamano(entrada, altura, solo_audio) for entrada in info['entries'] if entrada)
+    duracion = info.get('duration')
+    if info.get('requested_formats'):
+        return sum(tamano_formato(formato, duracion) for formato in info['requested_formats'])
+    if info.get('format_id'):
+        return tamano_formato(info, duracion)
+    if solo_audio:
+        audios = [formato for formato in info.get('formats') or ()
+                  if formato.get('vcodec') == 'none' and formato.get('acodec') != 'none']
+        return max((tamano_formato(formato, duracion) for formato in audios), default=0)
+    formatos = [formato for formato in info.get('formats') or ()
+                if altura is None or (formato.get('height') or 0) <= altura]
+    completos = [formato for formato in formatos
+                 if formato.get('vcodec') != 'none' and formato.get('acodec') != 'none']
+    return max((tamano_formato(formato, duracion) for formato in completos or formatos), default=0)
+
+
+def crear_almacenamiento(volumenes: Optional[str], carpeta, esquema: Optional[str] = None,
+                         margen_mb: Optional[float] = None) -> Almacenamiento:
+    """Crea el almacenamiento a partir de 'ruta[:peso],ruta[:peso]'; sin volúmenes, solo `carpeta`"""
+    lista = []
+    for especificacion in (volumenes or '').split(','):
+        especificacion = especificacion.strip()
+        if not especificacion:
+            continue
+        ruta, separador, peso = especificacion.rpartition(':')
+        try:
+            lista.append(Volumen(ruta, float(peso)) if separador else Volumen(especificacion))
+        except ValueError:
+            if separador and peso.replace('.', '', 1).lstrip('-').isdigit():
+                raise
+            # Sin peso numérico los dos puntos son parte de la ruta (p. ej. C:\descargas)
+            lista.append(Volumen(especificacion))
+    return Almacenamiento(lista or [Volumen(carpeta)], esquema or 'flat', int((margen_mb or 0) * 1024 * 1024))
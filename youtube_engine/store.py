@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Almacenes de jobs del motor de descargas
+En memoria para un solo proceso, o SQLite para compartir estado entre varios workers
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from enum import Enum
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from youtube_engine import serializer
+from youtube_engine.jobs import CODIGOS_ESTADO, ESTADOS_POR_CODIGO, JobRecord, vista_estado, vista_resumen
+
+if TYPE_CHECKING:
+    import asyncio
+
+
+def _normalizar(campos: dict) -> dict:
+    """Convierte enums a su valor para que todos los stores guarden lo mismo"""
+    return {clave: valor.value if isinstance(valor, Enum) else valor for clave, valor in campos.items()}
+
+
+class MemoryJobStore:
+    """Jobs en un diccionario del proceso (comportamiento original del servidor).
+
+    Cada job es un JobRecord compacto; `obtener` y `listar` devuelven dicts
+    nuevos, y `vista`/`resumenes` (y sus variantes `_json`) las vistas de la
+    API ya calculadas, que solo se rehacen cuando el job cambia. Cada
+    cambio recibe un número de secuencia del store, la versión que usan las
+    consultas por lotes para devolver solo lo que cambió.
+    """
+
+    compartido = False
+
+    def __init__(self):
+        self._jobs: Dict[str, JobRecord] = {}
+        self._lock = threading.Lock()
+        self._secuencia = 0
+
+    def _cambio(self, registro: JobRecord):
+        # Se llama con el lock tomado
+        self._secuencia += 1
+        registro.secuencia = self._secuencia
+
+    def crear(self, job: dict):
+        with self._lock:
+            registro = self._jobs[job['job_id']] = JobRecord(job)
+            self._cambio(registro)
+
+    def obtener(self, job_id: str) -> Optional[dict]:
+        registro = self._jobs.get(job_id)
+        return registro.como_dict() if registro is not None else None
+
+    def actualizar(self, job_id: str, **campos) -> Optional[dict]:
+        with self._lock:
+            registro = self._jobs.get(job_id)
+            if registro is None:
+                return None
+            registro.actualizar(campos)
+            self._cambio(registro)
+            return registro.como_dict()
+
+    def actualizar_si(self, job_id: str, estados: Iterable[str], **campos) -> Optional[dict]:
+        """Actualiza solo si el estado actual está en `estados` (compare-and-set)"""
+        codigos = {CODIGOS_ESTADO[_normalizar({'s': e})['s']] for e in estados}
+        with self._lock:
+            registro = self._jobs.get(job_id)
+            if registro is None or registro.status_code not in codigos:
+                return None
+            registro.actualizar(campos)
+            self._cambio(registro)
+            return registro.como_dict()
+
+    def listar(self) -> List[dict]:
+        with self._lock:
+            return [registro.como_dict() for registro in self._jobs.values()]
+
+    def vista(self, job_id: str) -> Optional[dict]:
+        """vista_estado() del job sin fases en curso; compartida, no modificarla"""
+        registro = self._jobs.get(job_id)
+        if registro is None:
+            return None
+        with self._lock:
+            return registro.vista_estado()
+
+    def resumenes(self) -> List[dict]:
+        """vista_resumen() de cada job; compartidas, no modificarlas"""
+        with self._lock:
+            return [registro.vista_resumen() for registro in self._jobs.values()]
+
+    def vistas(self, job_ids: Iterable[str], desde: Optional[int] = None) -> Tuple[int, List[dict], List[str]]:
+        """vista_estado() de varios jobs tomadas de una sola vez, con la versión del store.
+
+        Con `desde` solo se incluyen los jobs que cambiaron después de esa
+        versión. Devuelve (versión, vistas compartidas, IDs que no existen).
+        """
+        vistas, faltan = [], []
+        with self._lock:
+            for job_id in job_ids:
+                registro = self._jobs.get(job_id)
+                if registro is None:
+                    faltan.append(job_id)
+                elif desde is None or registro.secuencia > desde:
+                    vistas.append(registro.vista_estado())
+            return self._secuencia, vistas, faltan
+
+    def vista_json(self, job_id: str) -> Optional[bytes]:
+        registro = self._jobs.get(job_id)
+        if registro is None:
+            return None
+        with self._lock:
+            return registro.estado_json()
+
+    def resumenes_json(self) -> List[bytes]:
+        """vista_resumen() de cada job en JSON, de la más reciente a la más antigua"""
+        with self._lock:
+            registros = sorted(self._jobs.values(), key=_creado, reverse=True)
+            return [registro.resumen_json() for registro in registros]
+
+    def contar_por_estado(self) -> List[Tuple[str, int]]:
+        conteo = [0] * len(ESTADOS_POR_CODIGO)
+        for registro in list(self._jobs.values()):
+            conteo[registro.status_code] += 1
+        return [(estado, n) for estado, n in zip(ESTADOS_POR_CODIGO, conteo) if n]
+
+    def reclamar_huerfanos(self, owner: int) -> List[dict]:
+        """En memoria no hay jobs de otros procesos que recuperar"""
+        return []
+
+
+def _creado(registro: JobRecord) -> int:
+    return registro.created_ts
+
+
+class LoopJobStore(MemoryJobStore):
+    """Jobs en memoria cuyas escrituras se aplican en un event loop de asyncio.
+
+    El loop es el único que modifica el estado: los hilos de descarga envían
+    cada cambio con call_soon_threadsafe y esperan su resultado (lo necesita el
+    compare-and-set de actualizar_si). Si el loop ya no responde, como al
+    apagar, el cambio se aplica desde el propio hilo bajo el lock.
+    """
+
+    ESPERA_BUCLE = 5.0
+
+    def __init__(self):
+        super().__init__()
+        self.bucle: Optional["asyncio.AbstractEventLoop"] = None
+
+    def _en_bucle(self, metodo, *args, **campos):
+        bucle = self.bucle
+        if bucle is None or bucle.is_closed() or _bucle_actual() is bucle:
+            return metodo(*args, **campos)
+
+        futuro: Future = Future()
+
+        def aplicar():
+            if futuro.set_running_or_notify_cancel():
+                try:
+                    futuro.set_result(metodo(*args, **campos))
+                except BaseException as e:
+                    futuro.set_exception(e)
+
+        try:
+            bucle.call_soon_threadsafe(aplicar)
+            return futuro.result(self.ESPERA_BUCLE)
+        except (RuntimeError, FutureTimeoutError):
+            if futuro.cancel():
+                return metodo(*args, **campos)
+            return futuro.result()
+
+    def actualizar(self, job_id: str, **campos) -> Optional[dict]:
+        return self._en_bucle(super().actualizar, job_id, **campos)
+
+    def actualizar_si(self, job_id: str, estados: Iterable[str], **campos) -> Optional[dict]:
+        return self._en_bucle(super().actualizar_si, job_id, estados, **campos)
+
+
+def _bucle_actual() -> Optional["asyncio.AbstractEventLoop"]:
+    # Sin asyncio importado no puede haber un bucle en marcha (y la CLI no lo carga)
+    asyncio = sys.modules.get('asyncio')
+    if asyncio is None:
+        return None
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class SQLiteJobStore:
+    """Jobs en SQLite (modo WAL), visibles para todos los workers de la máquina.
+
+    Cada job se guarda como JSON junto a columnas indexadas para el estado y el
+    proceso dueño; las actualizaciones son lectura-modificación-escritura dentro
+    de una transacción IMMEDIATE, así que dos workers nunca se pisan. La
+    columna seq guarda el número del último cambio de cada job.
+    """
+
+    compartido = True
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        if hasattr(os, 'register_at_fork'):
+            # Una conexión SQLite no puede cruzar un fork: cada worker abre las suyas
+            os.register_at_fork(after_in_child=self._reiniciar_conexiones)
+        with self._conexion() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                owner INTEGER,
+                created_at TEXT NOT NULL,
+                data TEXT NOT NULL)""")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status)")
+            # Bases creadas antes de las consultas por versión
+            if 'seq' not in {fila[1] for fila in db.execute("PRAGMA table_info(jobs)")}:
+                db.execute("ALTER TABLE jobs ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_seq ON jobs(seq)")
+
+    def _reiniciar_conexiones(self):
+        self._local = threading.local()
+
+    def _conexion(self) -> sqlite3.Connection:
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def crear(self, job: dict):
+        job = _normalizar(job)
+        self._conexion().execute(
+            "INSERT INTO jobs (job_id, status, owner, created_at, data, seq) "
+            f"VALUES (?, ?, ?, ?, ?, {_SIGUIENTE_SEQ})",
+            (job['job_id'], job['status'], job.get('owner'), job['created_at'], json.dumps(job)))
+
+    def obtener(self, job_id: str) -> Optional[dict]:
+        fila = self._conexion().execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(fila[0]) if fila else None
+
+    def actualizar(self, job_id: str, **campos) -> Optional[dict]:
+        return self.actualizar_si(job_id, None, **campos)
+
+    def actualizar_si(self, job_id: str, estados: Optional[Iterable[str]], **campos) -> Optional[dict]:
+        """Actualiza solo si el estado actual está en `estados` (None = siempre)"""
+        if estados is not None:
+            estados = {_normalizar({'s': e})['s'] for e in estados}
+        db = self._conexion()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            fila = db.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if fila is None:
+                db.execute("COMMIT")
+                return None
+            job = json.loads(fila[0])
+            if estados is not None and job['status'] not in estados:
+                db.execute("COMMIT")
+                return None
+            job.update(_normalizar(campos))
+            db.execute(f"UPDATE jobs SET status = ?, owner = ?, data = ?, seq = {_SIGUIENTE_SEQ} WHERE job_id = ?",
+                       (job['status'], job.get('owner'), json.dumps(job), job_id))
+            db.execute("COMMIT")
+            return job
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def listar(self) -> List[dict]:
+        return [json.loads(data) for (data,) in self._conexion().execute("SELECT data FROM jobs")]
+
+    def vista(self, job_id: str) -> Optional[dict]:
+        # Otro worker puede cambiar el job en cualquier momento: no se guarda nada
+        job = self.obtener(job_id)
+        return vista_estado(job) if job is not None else None
+
+    def resumenes(self) -> List[dict]:
+        return [vista_resumen(job) for job in self.listar()]
+
+    def vistas(self, job_ids: Iterable[str], desde: Optional[int] = None) -> Tuple[int, List[dict], List[str]]:
+        """Como MemoryJobStore.vistas, leyendo versión y jobs en la misma transacción"""
+        job_ids = list(job_ids)
+        db = self._conexion()
+        db.execute("BEGIN")
+        try:
+            version = db.execute("SELECT COALESCE(MAX(seq), 0) FROM jobs").fetchone()[0]
+            filas = db.execute("SELECT job_id, seq, data FROM jobs WHERE job_id IN (SELECT value FROM json_each(?))",
+                               (json.dumps(job_ids),)).fetchall()
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        encontrados = {job_id: (seq, data) for job_id, seq, data in filas}
+        vistas = [vista_estado(json.loads(encontrados[job_id][1])) for job_id in job_ids
+                  if job_id in encontrados and (desde is None or encontrados[job_id][0] > desde)]
+        return version, vistas, [job_id for job_id in job_ids if job_id not in encontrados]
+
+    def vista_json(self, job_id: str) -> Optional[bytes]:
+        vista = self.vista(job_id)
+        return serializer.dumps(vista) if vista is not None else None
+
+    def resumenes_json(self) -> List[bytes]:
+        filas = self._conexion().execute("SELECT data FROM jobs ORDER BY created_at DESC")
+        return [serializer.dumps(vista_resumen(json.loads(data))) for (data,) in filas]
+
+    def contar_por_estado(self) -> List[Tuple[str, int]]:
+        return list(self._conexion().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+
+    def reclamar_huerfanos(self, owner: int) -> List[dict]:
+        """Reclama jobs interrumpidos o cuyo proceso dueño ya no existe.
+
+        Los jobs que un drenaje devolvió a `pending` y los que quedaron en
+        `running` tras una caída se asignan atómicamente a `owner`, de modo que
+        cada uno lo reanuda un solo worker.
+        """
+        db = self._conexion()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            reclamados = []
+            filas = db.execute(
+                "SELECT data FROM jobs WHERE status IN ('pending', 'running')").fetchall()
+            for (data,) in filas:
+                job = json.loads(data)
+                dueño = job.get('owner')
+                if not job.get('interrupted') and dueño is not None and _proceso_vivo(dueño):
+                    continue
+                job.update(status='pending', owner=owner, interrupted=False)
+                db.execute(f"UPDATE jobs SET status = ?, owner = ?, data = ?, seq = {_SIGUIENTE_SEQ} "
+                           "WHERE job_id = ?", (job['status'], owner, json.dumps(job), job['job_id']))
+                reclamados.append(job)
+            db.execute("COMMIT")
+            return reclamados
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+
+# Número del siguiente cambio; se evalúa dentro de la misma sentencia o transacción
+_SIGUIENTE_SEQ = "(SELECT COALESCE(MAX(seq), 0) + 1 FROM jobs)"
+
+
+def _proceso_vivo(pid: int) -> bool:
+    if os.name == 'nt':
+        # En Windows os.kill(pid, 0) terminaría el proceso: se asume vivo
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def crear_store(url: Optional[str]):
+    """Crea un store a partir de 'memory' o 'sqlite:///ruta/jobs.sqlite3'"""
+    if not url or url == 'memory':
+        return MemoryJobStore()
+    if url.startswith('sqlite:///'):
+        return SQLiteJobStore(Path(url[len('sqlite:///'):]))
+    raise ValueError(f"Store de jobs no soportado: {url}")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Envío de videos al cliente sin esperar a tenerlos en disco
+Reenvía los bytes del origen por bloques, con Range y copia opcional a disco para la caché
+"""
+
+import mimetypes
+import shutil
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional
+
+import youtube_metrics as metricas
+from youtube_engine.storage import confirmar_archivo
+
+# Lo que se lee del origen por cada bloque enviado: es todo lo que se retiene en memoria
+TAMANO_BLOQUE = 64 * 1024
+
+CABECERAS_ORIGEN = ('Content-Type', 'Content-Length', 'Content-Range', 'Accept-Ranges',
+                    'Last-Modified', 'ETag')
+
+
+class ErrorOrigen(Exception):
+    """El servidor de medios rechazó la petición (p. ej. 416 con un Range fuera del archivo)"""
+
+    def __init__(self, status: int, mensaje: str):
+        super().__init__(mensaje)
+        self.status = status
+
+
+class Transmision:
+    """Un video abierto para /stream/<video_id>.
+
+    Si el video ya está en un volumen, `archivo` apunta a él y se sirve desde
+    disco. Si no, bloques() lee el origen de TAMANO_BLOQUE en TAMANO_BLOQUE y
+    solo pide el siguiente cuando el servidor ha escrito el anterior en el
+    socket: un cliente lento frena la lectura en vez de acumular el video en
+    memoria. Con `copia` cada bloque se escribe también ahí y, si el video
+    llega entero, se confirma en `destino`.
+
+    cerrar() libera la respuesta del origen y lo demás que haya en
+    `al_cerrar`; bloques() lo llama al acabar, pero hay que llamarlo
+    también por si no llega a recorrerse (p. ej. en un HEAD).
+    """
+
+    def __init__(self, titulo: str, archivo: Optional[Path] = None, respuesta=None, status: int = 200,
+                 cabeceras: Optional[Dict[str, str]] = None, copia: Optional[Path] = None,
+                 destino: Optional[Path] = None, al_cerrar: Optional[Callable[[], None]] = None):
+        self.titulo = titulo
+        self.archivo = archivo
+        self.respuesta = respuesta
+        self.status = status
+        self.cabeceras = cabeceras or {}
+        self.copia = copia
+        self.destino = destino
+        self.al_cerrar = al_cerrar
+        self.enviados = 0
+        self._cerrado = False
+
+    def bloques(self) -> Iterator[bytes]:
+        salida = open(self.copia, 'wb') if self.copia is not None else None
+        completo = False
+        try:
+            while True:
+                bloque = self.respuesta.read(TAMANO_BLOQUE)
+                if not bloque:
+                    break
+                self.enviados += len(bloque)
+                metricas.DOWNLOAD_BYTES.inc(len(bloque))
+                if salida is not None:
+                    salida.write(bloque)
+                yield bloque
+            esperado = self.cabeceras.get('Content-Length')
+            completo = esperado is None or int(esperado) == self.enviados
+        finally:
+            if salida is not None:
+                salida.close()
+                if completo:
+                    confirmar_archivo(self.copia, self.destino)
+            self.cerrar()
+
+    def cerrar(self):
+        if self._cerrado:
+            return
+        self._cerrado = True
+        if self.respuesta is not None:
+            self.respuesta.close()
+        if self.copia is not None:
+            # Lo que quede en la carpeta temporal es una copia incompleta
+            shutil.rmtree(self.copia.parent, ignore_errors=True)
+        if self.al_cerrar is not None:
+            self.al_cerrar()
+
+
+def cabeceras_respuesta(respuesta, info: dict) -> Dict[str, str]:
+    """Cabeceras del origen que se reenvían al cliente"""
+    cabeceras = {nombre: respuesta.headers[nombre] for nombre in CABECERAS_ORIGEN if respuesta.headers.get(nombre)}
+    if 'Content-Type' not in cabeceras or cabeceras['Content-Type'] == 'application/octet-stream':
+        tipo, _ = mimetypes.guess_type(f"video.{info.get('ext', 'mp4')}")
+        cabeceras['Content-Type'] = tipo or 'application/octet-stream'
+    cabeceras.setdefault('Accept-Ranges', 'bytes')
+    return cabeceras
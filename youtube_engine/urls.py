@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Utilidades de URLs de YouTube
+Validación, tipo de URL e identificadores canónicos de videos y playlists
+"""
+
+import re
+from typing import Optional
+
+_ID_VIDEO = re.compile(r'(?:[?&]v=|youtu\.be/|/shorts/|/embed/|/live/)([\w-]{6,})')
+_ID_PLAYLIST = re.compile(r'[?&]list=([\w-]+)')
+_SOLO_ID_VIDEO = re.compile(r'[\w-]{6,64}')
+
+
+def validar_url_youtube(url: str) -> bool:
+    """Valida si la URL es de YouTube"""
+    youtube_dominios = ['youtube.com', 'youtu.be', 'm.youtube.com']
+    return any(dominio in url.lower() for dominio in youtube_dominios)
+
+
+def detectar_tipo_url(url: str) -> str:
+    """Detecta si la URL es un video individual o una playlist"""
+    url_lower = url.lower()
+
+    if 'playlist?list=' in url_lower:
+        return 'playlist'
+    elif 'watch?v=' in url_lower and 'list=' in url_lower:
+        return 'video_en_playlist'
+    else:
+        return 'video_individual'
+
+
+def extraer_id_video(url: str) -> Optional[str]:
+    """ID del video (watch?v=, youtu.be/, shorts/, embed/ o live/)"""
+    m = _ID_VIDEO.search(url)
+    return m.group(1) if m else None
+
+
+def es_id_video(texto: str) -> bool:
+    """Si `texto` tiene forma de ID de video (p. ej. dQw4w9WgXcQ)"""
+    return _SOLO_ID_VIDEO.fullmatch(texto) is not None
+
+
+def extraer_id_playlist(url: str) -> Optional[str]:
+    m = _ID_PLAYLIST.search(url)
+    return m.group(1) if m else None
+
+
+def id_canonico(url: str, noplaylist: bool = False) -> str:
+    """Clave estable para una URL: 'video:<id>', 'playlist:<id>' o la propia URL.
+
+    Con `noplaylist` un watch?v=...&list=... identifica al video; sin él, a la
+    playlist, igual que hace yt-dlp al extraer.
+    """
+    video = extraer_id_video(url)
+    playlist = extraer_id_playlist(url)
+    if playlist and not (noplaylist and video):
+        return f'playlist:{playlist}'
+    if video:
+        return f'video:{video}'
+    return url.strip()
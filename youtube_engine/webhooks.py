@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Webhooks de fin de job
+Los eventos pasan por un outbox en SQLite y un hilo los entrega por lotes a cada callback_url
+"""
+
+import hashlib
+import hmac
+import http.client
+import ipaddress
+import json
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import youtube_metrics as metricas
+from youtube_engine import serializer
+from youtube_engine.jobs import DownloadStatus, vista_estado
+
+# Reintentos: espera base * 2^intento, con jitter, hasta ESPERA_MAXIMA; tras
+# MAX_INTENTOS el evento queda como 'dead' en el outbox para revisarlo a mano
+ESPERA_BASE = 2.0
+ESPERA_MAXIMA = 600.0
+MAX_INTENTOS = 10
+
+# Un lote reúne hasta EVENTOS_POR_LOTE eventos del mismo endpoint; tras el
+# primer evento se espera VENTANA_LOTE segundos a que lleguen más
+EVENTOS_POR_LOTE = 100
+VENTANA_LOTE = 0.5
+
+# Un worker reserva los eventos que envía durante este tiempo (varios workers comparten el outbox)
+RESERVA_SEGUNDOS = 60.0
+TIMEOUT_ENTREGA = 10.0
+
+CABECERA_FIRMA = 'X-Webhook-Signature'
+
+
+def _permitidos() -> List[str]:
+    """Hosts y redes de YOUTUBE_WEBHOOK_ALLOW_HOSTS ('receptor.lan,127.0.0.1,10.0.0.0/8')"""
+    return [entrada.strip().lower() for entrada in os.environ.get('YOUTUBE_WEBHOOK_ALLOW_HOSTS', '').split(',')
+            if entrada.strip()]
+
+
+def _direccion_permitida(direccion: str, permitidos: List[str]) -> bool:
+    ip = ipaddress.ip_address(direccion.split('%', 1)[0])
+    if ip.is_global:
+        return True
+    for entrada in permitidos:
+        try:
+            if ip in ipaddress.ip_network(entrada, strict=False):
+                return True
+        except ValueError:
+            continue
+    return False
+
+
+def validar_callback_url(url: Optional[str]) -> Optional[str]:
+    """La callback_url pedida (None si no hay); ValueError si no es http(s) o no es pública.
+
+    El host se resuelve y todas sus direcciones deben ser públicas: loopback,
+    link-local (169.254.169.254, metadatos de la nube), redes privadas y
+    demás quedan fuera salvo que YOUTUBE_WEBHOOK_ALLOW_HOSTS incluya el
+    host o su red. Se comprueba al pedir el job y otra vez en cada entrega.
+    """
+    if not url:
+        return None
+    partes = urlparse(str(url))
+    if partes.scheme not in ('http', 'https') or not partes.hostname:
+        raise ValueError(f"callback_url no válida: {url} (debe ser http:// o https://)")
+    permitidos = _permitidos()
+    if partes.hostname.lower() in permitidos:
+        return str(url)
+    try:
+        direcciones = {info[4][0] for info in socket.getaddrinfo(partes.hostname, partes.port or None,
+                                                                  proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError, ValueError) as e:
+        raise ValueError(f"callback_url no válida: no se pudo resolver {partes.hostname} ({e})")
+    for direccion in direcciones:
+        if not _direccion_permitida(direccion, permitidos):
+            raise ValueError(f"callback_url no válida: {partes.hostname} resuelve a {direccion}, "
+                             f"que no es una dirección pública (ver YOUTUBE_WEBHOOK_ALLOW_HOSTS)")
+    return str(url)
+
+
+class _SinRedirecciones(urllib.request.HTTPRedirectHandler):
+    """Un 3xx no se sigue: queda como HTTPError y el lote se reintenta.
+
+    Seguirlo permitiría a un endpoint público mandar el POST a una dirección
+    interna que validar_callback_url no llegó a ver.
+    """
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def firmar(secreto: str, marca: int, cuerpo: bytes) -> str:
+    """Cabecera de firma: t=<marca unix>,v1=<HMAC-SHA256 hex de '<marca>.<cuerpo>'>"""
+    firma = hmac.new(secreto.encode(), b'%d.%s' % (marca, cuerpo), hashlib.sha256).hexdigest()
+    return f"t={marca},v1={firma}"
+
+
+def evento_job(job: dict) -> dict:
+    """Evento de un job terminado: job.completed, job.failed o job.cancelled"""
+    return {
+        "event_id": str(uuid.uuid4()),
+        "type": f"job.{DownloadStatus(job['status']).value}",
+        "occurred_at": job.get('completed_at') or datetime.now().isoformat(),
+        "job": vista_estado(job),
+    }
+
+
+class Outbox:
+    """Eventos pendientes de entrega en SQLite (modo WAL), a salvo de reinicios.
+
+    Varios workers pueden compartir el archivo: cada uno reserva los eventos
+    que va a enviar con `lease_until` dentro de una transacción IMMEDIATE,
+    así que un evento no sale dos veces a la vez. La entrega es al menos una
+    vez; el receptor deduplica por event_id.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._creado = False
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            # Una conexión SQLite no puede cruzar un fork: cada worker abre las suyas
+            os.register_at_fork(after_in_child=self._reiniciar_conexiones)
+
+    def _reiniciar_conexiones(self):
+        self._local = threading.local()
+
+    def existe(self) -> bool:
+        return self.path.exists()
+
+    def _conexion(self) -> sqlite3.Connection:
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            # El archivo se crea con el primer evento: sin callbacks no hay outbox
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            with self._lock:
+                if not self._creado:
+                    db.execute("""CREATE TABLE IF NOT EXISTS events (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        url TEXT NOT NULL,
+                        payload TEXT NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'pending',
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        next_attempt REAL NOT NULL,
+                        lease_until REAL NOT NULL DEFAULT 0,
+                        last_error TEXT)""")
+                    db.execute("CREATE INDEX IF NOT EXISTS events_due ON events(status, next_attempt)")
+                    self._creado = True
+            self._local.db = db
+        return db
+
+    def encolar(self, url: str, evento: dict):
+        self._conexion().execute("INSERT INTO events (url, payload, next_attempt) VALUES (?, ?, ?)",
+                                 (url, json.dumps(evento), time.time()))
+
+    def reclamar(self, limite: int = EVENTOS_POR_LOTE) -> Dict[str, List[Tuple[int, dict]]]:
+        """Reserva los eventos vencidos, agrupados por endpoint y hasta `limite` por endpoint"""
+        ahora = time.time()
+        db = self._conexion()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            filas = db.execute(
+                "SELECT id, url, payload FROM events WHERE status = 'pending' AND next_attempt <= ? "
+                "AND lease_until <= ? ORDER BY id", (ahora, ahora)).fetchall()
+            lotes: Dict[str, List[Tuple[int, dict]]] = {}
+            for id_evento, url, payload in filas:
+                lote = lotes.setdefault(url, [])
+                if len(lote) < limite:
+                    lote.append((id_evento, json.loads(payload)))
+            ids = [id_evento for lote in lotes.values() for id_evento, _ in lote]
+            db.executemany("UPDATE events SET lease_until = ? WHERE id = ?",
+                           [(ahora + RESERVA_SEGUNDOS, id_evento) for id_evento in ids])
+            db.execute("COMMIT")
+            return lotes
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def confirmar(self, ids: List[int]):
+        """Borra los eventos entregados"""
+        self._conexion().executemany("DELETE FROM events WHERE id = ?", [(id_evento,) for id_evento in ids])
+
+    def reintentar(self, ids: List[int], error: str) -> int:
+        """Programa un nuevo intento con espera exponencial; devuelve cuántos se dan por perdidos"""
+        db = self._conexion()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            perdidos = 0
+            for id_evento in ids:
+                fila = db.execute("SELECT attempts FROM events WHERE id = ?", (id_evento,)).fetchone()
+                if fila is None:
+                    continue
+                intentos = fila[0] + 1
+                espera = min(ESPERA_BASE * 2 ** intentos, ESPERA_MAXIMA) * random.uniform(0.5, 1.0)
+                estado = 'dead' if intentos >= MAX_INTENTOS else 'pending'
+                perdidos += estado == 'dead'
+                db.execute("UPDATE events SET attempts = ?, status = ?, next_attempt = ?, lease_until = 0, "
+                           "last_error = ? WHERE id = ?",
+                           (intentos, estado, time.time() + espera, error[:500], id_evento))
+            db.execute("COMMIT")
+            return perdidos
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def proximo(self) -> Optional[float]:
+        """Momento (time.time()) del próximo evento por enviar; None si no hay"""
+        fila = self._conexion().execute(
+            "SELECT MIN(MAX(next_attempt, lease_until)) FROM events WHERE status = 'pending'").fetchone()
+        return fila[0] if fila else None
+
+    def pendientes(self) -> int:
+        if not self._creado and not self.existe():
+            return 0
+        return self._conexion().execute("SELECT COUNT(*) FROM events WHERE status = 'pending'").fetchone()[0]
+
+
+class Webhooks:
+    """Entrega los eventos de fin de job a la callback_url de cada job.
+
+    `notificar()` solo escribe en el outbox y despierta al hilo de entrega,
+    que envía un POST por endpoint con {"events": [...]} y la cabecera
+    X-Webhook-Signature si hay `secreto`. Un 2xx confirma el lote; cualquier
+    otra respuesta o error de red lo reintenta más tarde.
+    """
+
+    def __init__(self, outbox: Outbox, secreto: Optional[str] = None, ventana: float = VENTANA_LOTE,
+                 timeout: float = TIMEOUT_ENTREGA):
+        self.outbox = outbox
+        self.secreto = secreto
+        self.ventana = ventana
+        self.timeout = timeout
+        self._despertar = threading.Event()
+        self._parar = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._opener = urllib.request.build_opener(_SinRedirecciones)
+
+    def notificar(self, job: dict):
+        """Encola el evento de un job terminado, si tiene callback_url"""
+        url = job.get('callback_url')
+        if not url:
+            return
+        self.outbox.encolar(url, evento_job(job))
+        self._arrancar()
+        self._despertar.set()
+
+    def reanudar(self):
+        """Al arrancar un servidor: entrega lo que quedó en el outbox de la ejecución anterior"""
+        if self.outbox.existe():
+            self._arrancar()
+
+    def _arrancar(self):
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name="yt-webhooks", daemon=True)
+                self._hilo.start()
+
+    def _bucle(self):
+        while not self._parar.is_set():
+            try:
+                proximo = self.outbox.proximo()
+                if proximo is None or proximo > time.time():
+                    espera = min(max(proximo - time.time(), 0), ESPERA_MAXIMA) if proximo else None
+                    self._despertar.wait(espera)
+                    self._despertar.clear()
+                    # Margen para que se junten los eventos que llegan seguidos
+                    self._parar.wait(self.ventana)
+                    continue
+                for url, lote in self.outbox.reclamar().items():
+                    self._entregar(url, lote)
+            except Exception as e:
+                metricas.registrar_error('webhook', e)
+                self._parar.wait(ESPERA_BASE)
+
+    def _entregar(self, url: str, lote: List[Tuple[int, dict]]):
+        ids = [id_evento for id_evento, _ in lote]
+        cuerpo = serializer.dumps({"events": [evento for _, evento in lote]})
+        cabeceras = {'Content-Type': 'application/json', 'User-Agent': 'youtube-downloader-webhooks'}
+        if self.secreto:
+            cabeceras[CABECERA_FIRMA] = firmar(self.secreto, int(time.time()), cuerpo)
+        inicio = time.perf_counter()
+        try:
+            # El DNS pudo cambiar desde que se pidió el job
+            validar_callback_url(url)
+            peticion = urllib.request.Request(url, data=cuerpo, headers=cabeceras, method='POST')
+            with self._opener.open(peticion, timeout=self.timeout) as respuesta:
+                respuesta.read()
+        except (urllib.error.URLError, http.client.HTTPException, OSError, ValueError) as e:
+            # HTTPError (respuesta no 2xx, también un 3xx sin seguir) es un URLError; una
+            # respuesta cortada o mal formada (IncompleteRead, BadStatusLine) es un HTTPException
+            perdidos = self.outbox.reintentar(ids, str(e))
+            metricas.WEBHOOK_EVENTS.labels("retry").inc(len(ids) - perdidos)
+            metricas.WEBHOOK_EVENTS.labels("dead").inc(perdidos)
+        else:
+            self.outbox.confirmar(ids)
+            metricas.WEBHOOK_EVENTS.labels("delivered").inc(len(ids))
+        metricas.WEBHOOK_DELIVERY_SECONDS.observe(time.perf_counter() - inicio)
+
+    def cerrar(self):
+        self._parar.set()
+        self._despertar.set()
+
+
+def crear_webhooks(ruta: Optional[str], carpeta: Path, secreto: Optional[str] = None) -> Webhooks:
+    """Webhooks con el outbox en `ruta`, o en webhooks.sqlite3 dentro de `carpeta`"""
+    return Webhooks(Outbox(Path(ruta) if ruta else Path(carpeta) / "webhooks.sqlite3"), secreto)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Integración del motor con yt-dlp
+Todo lo que importa yt_dlp vive aquí para que el motor lo cargue solo cuando lo necesita
+"""
+
+import functools
+import os
+import time
+from typing import Callable, Optional
+
+from yt_dlp import YoutubeDL
+from yt_dlp.networking import Request
+from yt_dlp.networking.exceptions import HTTPError, RequestError
+from yt_dlp.postprocessor.common import PostProcessor
+from yt_dlp.postprocessor.ffmpeg import FFmpegMergerPP
+from yt_dlp.utils import DownloadCancelled, ReExtractInfo
+
+from youtube_engine.jobs import DownloadStatus
+from youtube_engine.storage import confirmar_archivo
+
+INTERVALO_CANCELACION = 1.0
+URL_PRECALENTAMIENTO = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+__all__ = ["ConfirmarSalida", "DescargaInterrumpida", "DownloadCancelled", "HTTPError", "ReExtractInfo",
+           "Request", "VigilanteCancelacion", "YoutubeDL", "diferir_postproceso", "fijar_formato",
+           "observar_peticiones", "opciones_postproceso", "puede_mezclar", "precalentar"]
+
+
+class DescargaInterrumpida(DownloadCancelled):
+    """La descarga se detuvo por un drenaje; se reanudará desde el .part"""
+    msg = 'Descarga interrumpida por el apagado del servidor'
+
+
+class VigilanteCancelacion:
+    """Progress hook que detiene la descarga si el job se cancela o el motor se apaga.
+
+    La cancelación puede llegar por otro worker, así que se consulta el store como
+    mucho una vez cada INTERVALO_CANCELACION segundos.
+    """
+
+    __slots__ = ('motor', 'job_id', '_proximo')
+
+    def __init__(self, motor, job_id: str):
+        self.motor = motor
+        self.job_id = job_id
+        self._proximo = 0.0
+
+    def __call__(self, d: dict):
+        if self.motor.interrumpir.is_set():
+            raise DescargaInterrumpida()
+        ahora = time.monotonic()
+        if ahora >= self._proximo:
+            self._proximo = ahora + INTERVALO_CANCELACION
+            self.comprobar()
+
+    def comprobar(self):
+        if self.motor.interrumpir.is_set():
+            raise DescargaInterrumpida()
+        job = self.motor.store.obtener(self.job_id)
+        if job is None or job['status'] == DownloadStatus.CANCELLED:
+            raise DownloadCancelled()
+
+
+class ConfirmarSalida(PostProcessor):
+    """Último postprocesador de cada video: lleva sus archivos de la carpeta temporal a la final.
+
+    Con paths {'home': volumen, 'temp': carpeta del job} yt-dlp descarga y
+    posprocesa en la carpeta temporal; aquí cada archivo se confirma con
+    confirmar_archivo y yt-dlp ya no tiene nada que mover. `al_confirmar`
+    recibe la ruta final de cada archivo del job, también si ya existía y
+    yt-dlp no lo descargó de nuevo. En before_dl (jobs sin descarga) aún no
+    hay `filepath` y solo se confirman los subtítulos y miniaturas.
+    """
+
+    def __init__(self, al_confirmar: Callable[[str], None]):
+        super().__init__()
+        self.al_confirmar = al_confirmar
+
+    def run(self, info):
+        origen = info.get('filepath')
+        carpeta_final = info.get('__finaldir') or (os.path.dirname(origen) if origen else '')
+        pendientes = {}
+        if origen is not None:
+            pendientes[origen] = os.path.join(carpeta_final, os.path.basename(origen))
+        for viejo, nuevo in (info.get('__files_to_move') or {}).items():
+            pendientes[viejo] = nuevo or os.path.join(carpeta_final, os.path.basename(viejo))
+
+        for viejo, nuevo in pendientes.items():
+            if os.path.abspath(viejo) != os.path.abspath(nuevo) and os.path.exists(viejo):
+                confirmar_archivo(viejo, nuevo)
+            if os.path.exists(nuevo):
+                self.al_confirmar(nuevo)
+
+        if origen is not None:
+            info['filepath'] = pendientes[origen]
+        info['__files_to_move'] = {}
+        return [], info
+
+
+# Opciones de un job que no viajan a los workers de post-procesado (callables y hooks del motor)
+OPCIONES_LOCALES = ('progress_hooks', 'postprocessor_hooks', 'logger', 'match_filter')
+
+
+def opciones_postproceso(opciones: dict) -> dict:
+    """Las opciones de YoutubeDL de un job que necesita un worker de post-procesado"""
+    return {clave: valor for clave, valor in opciones.items()
+            if clave not in OPCIONES_LOCALES and not callable(valor)}
+
+
+def diferir_postproceso(ydl: YoutubeDL, al_postprocesar: Callable[[dict, list], None]):
+    """Hace que `ydl` entregue el post-procesado de cada archivo en vez de hacerlo en su hilo.
+
+    yt-dlp post-procesa cada archivo en el hilo de la descarga en cuanto
+    termina. Si hay pasos que hacer (merge, fixups o postprocesadores de las
+    opciones), `al_postprocesar` recibe el info dict, ya serializable, y las
+    clases de los pasos que yt-dlp dejó en __postprocessors, y la descarga
+    sigue sin esperar. Si no, ConfirmarSalida lo confirma en el acto.
+    """
+    original = ydl.post_process
+
+    def post_process(filename, info, files_to_move=None):
+        pasos = info.get('__postprocessors') or []
+        propios = [pp for momento in ('post_process', 'after_move') for pp in ydl._pps[momento]
+                   if not isinstance(pp, ConfirmarSalida)]
+        if not pasos and not propios:
+            return original(filename, info, files_to_move)
+        info['filepath'] = filename
+        info['__files_to_move'] = files_to_move or {}
+        serializable = YoutubeDL.sanitize_info(
+            {clave: valor for clave, valor in info.items() if clave != '__postprocessors'},
+            remove_private_keys=False)
+        al_postprocesar(serializable, [type(pp) for pp in pasos])
+        return info
+
+    ydl.post_process = post_process
+
+
+def observar_peticiones(ydl: YoutubeDL, al_responder: Callable[[Optional[int]], None]):
+    """Avisa a `al_responder` del resultado de cada petición de `ydl` al origen.
+
+    Todas las peticiones de yt-dlp (extracción, descarga HTTP y cada fragmento)
+    pasan por `ydl.urlopen`: recibe None si hubo respuesta, el código si fue
+    un error HTTP (429 cuando el origen limita) y 0 si falló la conexión.
+    """
+    original = ydl.urlopen
+
+    def urlopen(req):
+        try:
+            respuesta = original(req)
+        except HTTPError as e:
+            al_responder(e.status)
+            raise
+        except RequestError:
+            al_responder(0)
+            raise
+        al_responder(None)
+        return respuesta
+
+    ydl.urlopen = urlopen
+
+
+def precalentar(opciones: dict):
+    """Deja cargados los extractores de YouTube y sus expresiones regulares.
+
+    La primera instancia de YoutubeDL y la primera URL cuestan unos 100 ms más
+    que las siguientes; un servidor lo paga al arrancar y no en la primera petición.
+    """
+    with YoutubeDL({**opciones, 'quiet': True, 'no_warnings': True}) as ydl:
+        for nombre in ('Youtube', 'YoutubeTab'):
+            ydl.get_info_extractor(nombre).suitable(URL_PRECALENTAMIENTO)
+
+
+@functools.lru_cache(maxsize=None)
+def puede_mezclar(ubicacion_ffmpeg: Optional[str] = None) -> bool:
+    """Si yt-dlp encuentra ffmpeg para unir video y audio (se busca una sola vez)"""
+    with YoutubeDL({'ffmpeg_location': ubicacion_ffmpeg, 'quiet': True, 'no_warnings': True}) as ydl:
+        return FFmpegMergerPP(ydl).available
+
+
+def fijar_formato(ydl: YoutubeDL, formato: str):
+    """Cambia el formato de una instancia ya creada (YoutubeDL compila el selector al crearse)"""
+    ydl.params['format'] = formato
+    ydl.format_selector = ydl.build_format_selector(formato)
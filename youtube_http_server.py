@@ -4,130 +4,84 @@ Servidor HTTP para descarga de videos y playlists de YouTube
 Versión simplificada para pruebas y uso directo
 """
 
-import json
-import uuid
+import math
+import mimetypes
+import os
 import threading
 import time
-from datetime import datetime
+import uuid
 from pathlib import Path
-from typing import Dict, Optional
-from enum import Enum
-
-from flask import Flask, request, jsonify
-from yt_dlp import YoutubeDL
+from typing import Callable, Optional
+from urllib.parse import quote
 
-# Estados posibles de una descarga
-class DownloadStatus(str, Enum):
-    PENDING = "pending"
-    RUNNING = "running"
-    COMPLETED = "completed"
-    FAILED = "failed"
-    CANCELLED = "cancelled"
+from flask import Flask, Response, g, request, jsonify
+from werkzeug.http import http_date, parse_etags, parse_range_header
 
-# Almacenamiento en memoria de los jobs
-download_jobs: Dict[str, dict] = {}
-active_downloads: Dict[str, threading.Thread] = {}
+import youtube_metrics as metricas
+import youtube_profiling as profiling
+from youtube_engine import (DownloadEngine, DownloadStatus, ErrorOrigen, crear_store, detectar_tipo_url,
+                            es_id_video, parsear_idiomas, serializer, validar_busqueda, validar_calidad, validar_callback_url,
+                            validar_consulta_lote, validar_modo, validar_url_youtube)
 
-# Configuración de descarga
-DOWNLOAD_FOLDER = Path("download")
-DOWNLOAD_FOLDER.mkdir(exist_ok=True)
+# Motor de descargas: un hilo por job y los jobs en memoria, o en SQLite para
+# compartirlos entre workers (YOUTUBE_JOB_STORE=sqlite:///download/jobs.sqlite3).
+# No se crea al importar el módulo sino al arrancar (configurar_store) o con la
+# primera petición: importarlo no abre stores, índices ni pools
+motor: Optional[DownloadEngine] = None
+_motor_lock = threading.Lock()
 
 # Crear la aplicación Flask
 app = Flask(__name__)
 
-def validar_url_youtube(url: str) -> bool:
-    """Valida si la URL es de YouTube"""
-    youtube_dominios = ['youtube.com', 'youtu.be', 'm.youtube.com']
-    return any(dominio in url.lower() for dominio in youtube_dominios)
+def obtener_motor(store: Optional[str] = None) -> DownloadEngine:
+    """El motor del servidor; la primera vez lo crea con el store `store` (o YOUTUBE_JOB_STORE)"""
+    global motor
+    with _motor_lock:
+        if motor is None:
+            motor = DownloadEngine(store=crear_store(store) if store else None)
+            motor.instrumentar()
+        return motor
 
-def detectar_tipo_url(url: str) -> str:
-    """Detecta si la URL es un video individual o una playlist"""
-    url_lower = url.lower()
-    
-    if 'playlist?list=' in url_lower:
-        return 'playlist'
-    elif 'watch?v=' in url_lower and 'list=' in url_lower:
-        return 'video_en_playlist'
+def configurar_store(url):
+    """Crea el motor con este store de jobs (p. ej. SQLite al arrancar con varios workers) o se lo cambia"""
+    if motor is None:
+        obtener_motor(url)
     else:
-        return 'video_individual'
+        motor.configurar_store(url)
 
-def obtener_metadatos_video(url: str) -> dict:
-    """Obtiene metadatos de un video sin descargarlo"""
-    ydl_opts = {
-        'quiet': True,
-        'no_warnings': True,
-    }
-    
-    try:
-        with YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            return {
-                'title': info.get('title', 'Sin título'),
-                'duration': info.get('duration', 0),
-                'uploader': info.get('uploader', 'Autor desconocido'),
-                'view_count': info.get('view_count', 0),
-                'upload_date': info.get('upload_date', ''),
-                'description': info.get('description', '')[:500] + '...' if info.get('description') else '',
-                'thumbnail': info.get('thumbnail', ''),
-                'is_playlist': 'entries' in info,
-                'playlist_count': info.get('playlist_count', 0) if 'entries' in info else 0
-            }
-    except Exception as e:
-        raise Exception(f"Error al obtener metadatos: {str(e)}")
+def reanudar_huerfanos() -> int:
+    """Reanuda los jobs interrumpidos por un drenaje o abandonados por un worker caído"""
+    return obtener_motor().reanudar_huerfanos()
 
-def ejecutar_descarga(job_id: str, url: str, is_playlist: bool = False, quality: str = "720p"):
-    """Ejecuta la descarga en un hilo separado"""
-    job = download_jobs[job_id]
-    
-    try:
-        # Actualizar estado a running
-        job['status'] = DownloadStatus.RUNNING
-        job['started_at'] = datetime.now().isoformat()
-        
-        # Configuración para yt-dlp
-        if is_playlist:
-            ydl_opts = {
-                'outtmpl': str(DOWNLOAD_FOLDER / '%(playlist_index)s - %(title)s.%(ext)s'),
-                'format': f'best[height<={quality[:-1]}]' if quality != "720p" else 'best[height<=720]',
-                'noplaylist': False,
-            }
-        else:
-            ydl_opts = {
-                'outtmpl': str(DOWNLOAD_FOLDER / '%(title)s.%(ext)s'),
-                'format': f'best[height<={quality[:-1]}]' if quality != "720p" else 'best[height<=720]',
-                'noplaylist': True,
-            }
-        
-        with YoutubeDL(ydl_opts) as ydl:
-            # Obtener información antes de descargar
-            info = ydl.extract_info(url, download=False)
-            
-            # Actualizar información del job
-            if is_playlist:
-                job['title'] = info.get('title', 'Playlist sin título')
-                job['total_videos'] = info.get('playlist_count', 0)
-            else:
-                job['title'] = info.get('title', 'Video sin título')
-                job['total_videos'] = 1
-            
-            # Realizar la descarga
-            ydl.download([url])
-            
-            # Marcar como completado
-            job['status'] = DownloadStatus.COMPLETED
-            job['completed_at'] = datetime.now().isoformat()
-            job['downloaded_videos'] = job['total_videos']
-            
-    except Exception as e:
-        # Marcar como fallido
-        job['status'] = DownloadStatus.FAILED
-        job['completed_at'] = datetime.now().isoformat()
-        job['error_message'] = str(e)
-    
-    finally:
-        # Limpiar el hilo activo
-        if job_id in active_downloads:
-            del active_downloads[job_id]
+def drenar(timeout: float) -> int:
+    """Deja de aceptar descargas y espera a las activas; devuelve cuántas se interrumpieron"""
+    # Sin motor no se llegó a aceptar ninguna descarga
+    return motor.drenar(timeout) if motor is not None else 0
+
+def precalentar():
+    """Importa yt-dlp y sus extractores de YouTube antes de la primera descarga"""
+    obtener_motor().precalentar()
+
+@app.before_request
+def preparar_motor():
+    """Crea el motor con la primera petición si el servidor no lo creó al arrancar"""
+    if motor is None:
+        obtener_motor()
+
+@app.before_request
+def iniciar_medicion():
+    """Guarda el instante de inicio de la petición"""
+    g.inicio_peticion = time.perf_counter()
+
+@app.after_request
+def registrar_medicion(response):
+    """Registra latencia y código de cada ruta"""
+    inicio = g.pop('inicio_peticion', None)
+    if inicio is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metricas.HTTP_REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - inicio)
+        metricas.HTTP_REQUESTS.labels(endpoint, response.status_code).inc()
+    return response
 
 # Rutas de la API
 
@@ -137,13 +91,24 @@ def home():
     return jsonify({
         "message": "YouTube Downloader HTTP Server",
         "version": "1.0.0",
+        "download_folder": str(motor.carpeta.absolute()),
+        "storage": motor.almacenamiento.describir(),
+        "folder_cache": motor.cache_carpeta.describir(),
+        "concurrency": motor.concurrencia.describir(),
         "tools": [
             {"name": "download_video", "method": "POST", "endpoint": "/download_video"},
             {"name": "download_playlist", "method": "POST", "endpoint": "/download_playlist"},
             {"name": "get_status", "method": "GET", "endpoint": "/status/<job_id>"},
+            {"name": "get_statuses", "method": "POST", "endpoint": "/status/batch"},
             {"name": "cancel_download", "method": "POST", "endpoint": "/cancel/<job_id>"},
             {"name": "list_downloads", "method": "GET", "endpoint": "/downloads"},
-            {"name": "get_metadata", "method": "POST", "endpoint": "/metadata"}
+            {"name": "verify_downloads", "method": "POST", "endpoint": "/verify"},
+            {"name": "search_downloads", "method": "GET", "endpoint": "/search"},
+            {"name": "get_metadata", "method": "POST", "endpoint": "/metadata"},
+            {"name": "stream", "method": "GET", "endpoint": "/stream/<video_id>"},
+            {"name": "get_file", "method": "GET", "endpoint": "/files/<job_id>"},
+            {"name": "metrics", "method": "GET", "endpoint": "/metrics"},
+            {"name": "profile", "method": "POST", "endpoint": "/admin/profile"}
         ]
     })
 
@@ -156,7 +121,12 @@ def download_video():
         return jsonify({"error": "URL requerida"}), 400
     
     url = data['url']
-    quality = data.get('quality', '720p')
+    try:
+        quality = validar_calidad(data.get('quality'))
+        modo = validar_modo(data.get('mode'))
+        callback_url = validar_callback_url(data.get('callback_url'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     # Validar URL
     if not validar_url_youtube(url):
@@ -166,32 +136,16 @@ def download_video():
     if detectar_tipo_url(url) == 'playlist':
         return jsonify({"error": "Esta URL es una playlist. Usa /download_playlist en su lugar."}), 400
     
-    # Crear nuevo job
-    job_id = str(uuid.uuid4())
-    job = {
-        'job_id': job_id,
-        'url': url,
-        'title': "Preparando descarga...",
-        'status': DownloadStatus.PENDING,
-        'created_at': datetime.now().isoformat(),
-        'is_playlist': False,
-        'total_videos': 1,
-        'downloaded_videos': 0
-    }
-    
-    download_jobs[job_id] = job
+    if motor.drenando.is_set():
+        return jsonify({"error": "El servidor se está apagando"}), 503
     
-    # Iniciar descarga en hilo separado
-    thread = threading.Thread(
-        target=ejecutar_descarga,
-        args=(job_id, url, False, quality)
-    )
-    thread.start()
-    active_downloads[job_id] = thread
+    # Crear el job; el motor lo ejecuta en segundo plano
+    job = motor.crear_job(url, False, quality, modo, parsear_idiomas(data.get('languages')), callback_url)
     
     return jsonify({
-        "job_id": job_id,
+        "job_id": job['job_id'],
         "status": "pending",
+        "mode": modo,
         "message": "Descarga de video iniciada"
     })
 
@@ -204,7 +158,12 @@ def download_playlist():
         return jsonify({"error": "URL requerida"}), 400
     
     url = data['url']
-    quality = data.get('quality', '720p')
+    try:
+        quality = validar_calidad(data.get('quality'))
+        modo = validar_modo(data.get('mode'))
+        callback_url = validar_callback_url(data.get('callback_url'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     # Validar URL
     if not validar_url_youtube(url):
@@ -214,107 +173,100 @@ def download_playlist():
     if detectar_tipo_url(url) not in ['playlist', 'video_en_playlist']:
         return jsonify({"error": "Esta URL no es una playlist. Usa /download_video en su lugar."}), 400
     
-    # Crear nuevo job
-    job_id = str(uuid.uuid4())
-    job = {
-        'job_id': job_id,
-        'url': url,
-        'title': "Preparando descarga de playlist...",
-        'status': DownloadStatus.PENDING,
-        'created_at': datetime.now().isoformat(),
-        'is_playlist': True,
-        'total_videos': 0,
-        'downloaded_videos': 0
-    }
-    
-    download_jobs[job_id] = job
+    if motor.drenando.is_set():
+        return jsonify({"error": "El servidor se está apagando"}), 503
     
-    # Iniciar descarga en hilo separado
-    thread = threading.Thread(
-        target=ejecutar_descarga,
-        args=(job_id, url, True, quality)
-    )
-    thread.start()
-    active_downloads[job_id] = thread
+    # Crear el job; el motor lo ejecuta en segundo plano
+    job = motor.crear_job(url, True, quality, modo, parsear_idiomas(data.get('languages')), callback_url)
     
     return jsonify({
-        "job_id": job_id,
+        "job_id": job['job_id'],
         "status": "pending",
+        "mode": modo,
         "message": "Descarga de playlist iniciada"
     })
 
 @app.route('/status/<job_id>', methods=['GET'])
 def get_download_status(job_id):
     """Verificar estado de descarga"""
-    if job_id not in download_jobs:
+    # JSON ya codificado en la caché del motor: no pasa por jsonify
+    estado = motor.estado_json(job_id)
+    if estado is None:
         return jsonify({"error": "Job ID no encontrado"}), 404
     
-    job = download_jobs[job_id]
+    return Response(estado, mimetype='application/json')
+
+@app.route('/status/batch', methods=['POST'])
+def get_download_statuses():
+    """Estado de varios jobs en una petición, con proyección de campos y versión"""
+    data = request.get_json(silent=True) or {}
+    try:
+        job_ids, campos, desde = validar_consulta_lote(data.get('job_ids'), data.get('fields'),
+                                                       data.get('since_version'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    return jsonify({
-        "job_id": job_id,
-        "title": job['title'],
-        "status": job['status'],
-        "created_at": job['created_at'],
-        "started_at": job.get('started_at'),
-        "completed_at": job.get('completed_at'),
-        "error_message": job.get('error_message'),
-        "is_playlist": job['is_playlist'],
-        "total_videos": job['total_videos'],
-        "downloaded_videos": job['downloaded_videos'],
-        "progress_percentage": round((job['downloaded_videos'] / (job['total_videos'] or 1)) * 100, 2) if job['total_videos'] else 0
-    })
+    return Response(serializer.dumps(motor.estados(job_ids, campos, desde)), mimetype='application/json')
 
 @app.route('/cancel/<job_id>', methods=['POST'])
 def cancel_download(job_id):
     """Cancelar descarga en progreso"""
-    if job_id not in download_jobs:
+    job = motor.obtener(job_id)
+    if job is None:
         return jsonify({"error": "Job ID no encontrado"}), 404
     
-    job = download_jobs[job_id]
-    
-    if job['status'] in [DownloadStatus.COMPLETED, DownloadStatus.FAILED, DownloadStatus.CANCELLED]:
+    # Marcar como cancelado; el hilo de descarga lo detecta y se detiene
+    cancelado = motor.cancelar(job_id)
+    if cancelado is None:
+        job = motor.obtener(job_id)
         return jsonify({"error": f"No se puede cancelar un job con estado: {job['status']}"}), 400
     
-    # Marcar como cancelado
-    job['status'] = DownloadStatus.CANCELLED
-    job['completed_at'] = datetime.now().isoformat()
-    
-    # Terminar el hilo si está activo
-    if job_id in active_downloads:
-        del active_downloads[job_id]
-    
     return jsonify({
         "job_id": job_id,
         "status": "cancelled",
         "message": "Descarga cancelada exitosamente"
     })
 
-@app.route('/downloads', methods=['GET'])
-def list_downloads():
-    """Listar todas las descargas"""
-    jobs_list = []
-    
-    for job_id, job in download_jobs.items():
-        jobs_list.append({
-            "job_id": job_id,
-            "title": job['title'],
-            "status": job['status'],
-            "created_at": job['created_at'],
-            "is_playlist": job['is_playlist'],
-            "total_videos": job['total_videos'],
-            "downloaded_videos": job['downloaded_videos'],
-            "progress_percentage": round((job['downloaded_videos'] / (job['total_videos'] or 1)) * 100, 2) if job['total_videos'] else 0
-        })
+@app.route('/search', methods=['GET'])
+def search_downloads():
+    """Buscar entre los videos descargados por texto, autor, fecha y duración"""
+    argumentos = request.args
+    try:
+        parametros = validar_busqueda(argumentos.get('q'), argumentos.get('uploader'),
+                                      argumentos.get('date_from'), argumentos.get('date_to'),
+                                      argumentos.get('min_duration'), argumentos.get('max_duration'),
+                                      argumentos.get('sort'), argumentos.get('limit'), argumentos.get('offset'))
+        resultados = motor.buscar(**parametros)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return Response(serializer.dumps(resultados), mimetype='application/json')
+
+@app.route('/verify', methods=['POST'])
+def verify_downloads():
+    """Verificar la integridad de todos los archivos descargados"""
+    data = request.get_json(silent=True) or {}
     
-    # Ordenar por fecha de creación (más recientes primero)
-    jobs_list.sort(key=lambda x: x['created_at'], reverse=True)
+    if motor.drenando.is_set():
+        return jsonify({"error": "El servidor se está apagando"}), 503
+    
+    try:
+        job = motor.crear_verificacion(bool(data.get('full', False)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     return jsonify({
-        "total_jobs": len(jobs_list),
-        "jobs": jobs_list
+        "job_id": job['job_id'],
+        "status": "pending",
+        "mode": "verify",
+        "message": "Verificación iniciada"
     })
 
+@app.route('/downloads', methods=['GET'])
+def list_downloads():
+    """Listar todas las descargas"""
+    return Response(motor.listado_json(), mimetype='application/json')
+
 @app.route('/metadata', methods=['POST'])
 def get_video_metadata():
     """Obtener metadatos de video sin descargar"""
@@ -330,7 +282,7 @@ def get_video_metadata():
         return jsonify({"error": "URL no válida de YouTube"}), 400
     
     try:
-        metadata = obtener_metadatos_video(url)
+        metadata = motor.metadatos(url)
         tipo_url = detectar_tipo_url(url)
         
         return jsonify({
@@ -342,17 +294,258 @@ def get_video_metadata():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/stream/<video_id>', methods=['GET'])
+def stream_video(video_id):
+    """Enviar el video mientras llega del origen, sin esperar a tenerlo en disco"""
+    if not es_id_video(video_id):
+        return jsonify({"error": "ID de video no válido"}), 400
+    
+    try:
+        quality = validar_calidad(request.args.get('quality'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    if motor.drenando.is_set():
+        return jsonify({"error": "El servidor se está apagando"}), 503
+    
+    try:
+        transmision = motor.stream(video_id, quality,
+                                   request.headers.get('Range'),
+                                   request.args.get('save', '').lower() in ('1', 'true', 'yes'))
+    except ErrorOrigen as e:
+        return jsonify({"error": str(e)}), 416 if e.status == 416 else 502
+    except Exception as e:
+        return jsonify({"error": str(e)}), 502
+    
+    # Ya en disco: se sirve igual que /files, con sendfile
+    if transmision.archivo is not None:
+        return servir_retenido(transmision.archivo)
+    
+    # Sin Content-Length del origen el servidor lo envía con chunked
+    respuesta = Response(transmision.bloques(), status=transmision.status, headers=transmision.cabeceras)
+    respuesta.call_on_close(transmision.cerrar)
+    return respuesta
+
+BLOQUE_ARCHIVO = 256 * 1024
+
+class ArchivoEnvio:
+    """Archivo abierto para una respuesta que llama a `al_cerrar` cuando el servidor lo cierra.
+
+    Con direct_passthrough Werkzeug entrega el cuerpo tal cual al servidor y
+    los call_on_close de la respuesta no se ejecutan: lo único que el
+    servidor cierra es el cuerpo. El resto de atributos (fileno, seek,
+    tell...) son los del archivo, así que sendfile sigue funcionando.
+    """
+
+    def __init__(self, archivo, al_cerrar: Optional[Callable[[], None]] = None):
+        self._archivo = archivo
+        self._al_cerrar = al_cerrar
+
+    def __getattr__(self, nombre):
+        return getattr(self._archivo, nombre)
+
+    def close(self):
+        try:
+            self._archivo.close()
+        finally:
+            al_cerrar, self._al_cerrar = self._al_cerrar, None
+            if al_cerrar is not None:
+                al_cerrar()
+
+
+class TramoArchivo:
+    """Bloques de `archivo` hasta `restante` bytes, para servidores sin wsgi.file_wrapper.
+
+    Es una clase y no un generador porque close() tiene que cerrar el
+    archivo aunque el servidor no llegue a pedir ningún bloque.
+    """
+
+    def __init__(self, archivo, restante: int):
+        self.archivo = archivo
+        self.restante = restante
+
+    def __iter__(self):
+        while self.restante > 0:
+            bloque = self.archivo.read(min(BLOQUE_ARCHIVO, self.restante))
+            if not bloque:
+                break
+            self.restante -= len(bloque)
+            yield bloque
+
+    def close(self):
+        self.archivo.close()
+
+
+def servir_archivo(ruta: Path, al_cerrar: Optional[Callable[[], None]] = None) -> Response:
+    """Respuesta con el archivo `ruta` sin pasar sus bytes por Python.
+
+    Con el `wsgi.file_wrapper` del servidor (gunicorn, waitress) el archivo
+    se envía con sendfile desde la posición actual hasta Content-Length, así
+    que un Range solo necesita un seek. Responde 304 con If-None-Match y
+    416 con un Range fuera del archivo; varios rangos se sirven completos.
+    `al_cerrar` se llama cuando el servidor termina con la respuesta.
+    """
+    estado = ruta.stat()
+    etag = f"{estado.st_mtime_ns:x}-{estado.st_size:x}"
+    cabeceras = {
+        "ETag": f'"{etag}"',
+        "Last-Modified": http_date(estado.st_mtime),
+        "Accept-Ranges": "bytes",
+        "Content-Type": mimetypes.guess_type(ruta.name)[0] or "application/octet-stream",
+        "Content-Disposition": f"inline; filename*=UTF-8''{quote(ruta.name)}",
+    }
+    if parse_etags(request.headers.get('If-None-Match')).contains_weak(etag):
+        return sin_cuerpo(Response(status=304, headers=cabeceras), al_cerrar)
+    
+    inicio, fin, status = 0, estado.st_size, 200
+    rango = parse_range_header(request.headers.get('Range'))
+    si_rango = request.headers.get('If-Range')
+    if rango is not None and len(rango.ranges) == 1 and (si_rango is None or si_rango.strip('"') == etag):
+        tramo = rango.range_for_length(estado.st_size)
+        if tramo is None:
+            cabeceras["Content-Range"] = f"bytes */{estado.st_size}"
+            return sin_cuerpo(Response(status=416, headers=cabeceras), al_cerrar)
+        inicio, fin = tramo
+        status = 206
+        cabeceras["Content-Range"] = f"bytes {inicio}-{fin - 1}/{estado.st_size}"
+    cabeceras["Content-Length"] = str(fin - inicio)
+    
+    archivo = ArchivoEnvio(open(ruta, 'rb'), al_cerrar)
+    archivo.seek(inicio)
+    envoltorio = request.environ.get('wsgi.file_wrapper')
+    cuerpo = envoltorio(archivo, BLOQUE_ARCHIVO) if envoltorio else TramoArchivo(archivo, fin - inicio)
+    # En un HEAD Werkzeug no entrega el cuerpo, pero sí cierra la respuesta y con ella el cuerpo
+    return Response(cuerpo, status=status, headers=cabeceras, direct_passthrough=True)
+
+def sin_cuerpo(respuesta: Response, al_cerrar: Optional[Callable[[], None]]) -> Response:
+    """Respuesta sin archivo abierto: `al_cerrar` va en sus call_on_close, que sí se ejecutan"""
+    if al_cerrar is not None:
+        respuesta.call_on_close(al_cerrar)
+    return respuesta
+
+def servir_retenido(ruta: Path, acceso: bool = False) -> Response:
+    """servir_archivo() sin que la caché de la carpeta pueda borrar `ruta` mientras se envía"""
+    envio = f"http-{uuid.uuid4()}"
+    if acceso:
+        motor.cache_carpeta.acceso(ruta, envio)
+    else:
+        motor.cache_carpeta.retener(ruta, envio)
+    try:
+        return servir_archivo(ruta, lambda: motor.cache_carpeta.soltar(envio))
+    except BaseException:
+        motor.cache_carpeta.soltar(envio)
+        raise
+
+@app.route('/files/<job_id>', methods=['GET'], defaults={'indice': 0})
+@app.route('/files/<job_id>/<int:indice>', methods=['GET'])
+def get_file(job_id, indice):
+    """Descargar un archivo de un job completado (en una playlist, el de la posición `indice`)"""
+    job = motor.obtener(job_id)
+    if job is None:
+        return jsonify({"error": "Job ID no encontrado"}), 404
+    
+    if job['status'] != DownloadStatus.COMPLETED:
+        return jsonify({"error": f"El job no está completado (estado: {job['status']})"}), 409
+    
+    archivos = job.get('files') or []
+    if indice >= len(archivos):
+        if job.get('evicted_files'):
+            return jsonify({"error": f"El job tiene {len(archivos)} archivo(s); la caché desalojó "
+                                     f"{len(job['evicted_files'])}"}), 410
+        return jsonify({"error": f"El job tiene {len(archivos)} archivo(s)"}), 404
+    
+    ruta = Path(archivos[indice])
+    if not ruta.is_file():
+        return jsonify({"error": "El archivo ya no está en disco"}), 410
+    
+    return servir_retenido(ruta, acceso=True)
+
+@app.route('/admin/profile', methods=['POST'])
+def profile_server():
+    """Activa el profiler por muestreo durante N segundos y devuelve collapsed stacks"""
+    if not os.environ.get('YOUTUBE_ADMIN_TOKEN'):
+        return jsonify({"error": "Profiler deshabilitado: define YOUTUBE_ADMIN_TOKEN"}), 403
+    if not profiling.admin_autorizado(request.headers.get('X-Admin-Token')):
+        return jsonify({"error": "No autorizado"}), 403
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        segundos = float(data.get('seconds', request.args.get('seconds', 10)))
+        intervalo = float(data.get('interval_ms', request.args.get('interval_ms', 5))) / 1000
+    except (TypeError, ValueError):
+        return jsonify({"error": "seconds e interval_ms deben ser numéricos"}), 400
+    if not (math.isfinite(segundos) and math.isfinite(intervalo)):
+        return jsonify({"error": "seconds e interval_ms deben ser finitos"}), 400
+    
+    try:
+        pilas = profiling.perfilar(segundos, intervalo)
+    except profiling.ProfilerOcupado as e:
+        return jsonify({"error": str(e)}), 409
+    
+    return Response(pilas, content_type='text/plain; charset=utf-8')
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métricas en formato de texto de Prometheus.
+
+    Son las del proceso que atiende la petición: con varios workers de
+    gunicorn cada scrape ve solo uno (salvo youtube_jobs, que sale del store compartido).
+    """
+    return Response(metricas.REGISTRY.exposition(), content_type=metricas.CONTENT_TYPE)
+
 if __name__ == "__main__":
+    import argparse
+    import sys
+    
+    import youtube_serving
+    
+    parser = argparse.ArgumentParser(description="Servidor HTTP del descargador de YouTube")
+    parser.add_argument('--dev', action='store_true',
+                        help="Servidor de desarrollo de Werkzeug con debug (no usar en producción)")
+    parser.add_argument('--host', default=None)
+    parser.add_argument('--port', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None, help="Procesos (gunicorn)")
+    parser.add_argument('--threads', type=int, default=None, help="Hilos por proceso")
+    parser.add_argument('--drain-timeout', type=float, default=None,
+                        help="Segundos para terminar descargas al apagar")
+    parser.add_argument('--job-store', default=None, help="'memory' o 'sqlite:///ruta/jobs.sqlite3'")
+    parser.add_argument('--backend', choices=['auto', 'gunicorn', 'waitress', 'werkzeug'], default=None)
+    parser.add_argument('--unix-socket', nargs='?', const='', default=None, metavar='RUTA',
+                        help="Escuchar en un socket Unix (por defecto el que usa la CLI) en lugar de host:port")
+    args = parser.parse_args()
+    
+    if args.unix_socket == '':
+        import youtube_client
+        args.unix_socket = youtube_client.ruta_socket_por_defecto()
+    
+    config = youtube_serving.ServingConfig.desde_entorno(
+        host=args.host, port=args.port, workers=args.workers, threads=args.threads,
+        drain_timeout=args.drain_timeout, job_store=args.job_store, backend=args.backend,
+        unix_socket=args.unix_socket)
+    
     print("🎬 Iniciando YouTube Downloader HTTP Server...")
-    print("📡 Servidor disponible en: http://localhost:5000")
-    print("📖 Documentación en: http://localhost:5000/")
+    if config.unix_socket:
+        print(f"📡 Servidor disponible en el socket: {config.unix_socket}")
+    else:
+        print(f"📡 Servidor disponible en: http://localhost:{config.port}")
+        print(f"📖 Documentación en: http://localhost:{config.port}/")
     print("\n🛠️ Endpoints disponibles:")
     print("   POST /download_video")
     print("   POST /download_playlist") 
     print("   GET  /status/<job_id>")
+    print("   POST /status/batch")
     print("   POST /cancel/<job_id>")
     print("   GET  /downloads")
+    print("   POST /verify")
+    print("   GET  /search")
     print("   POST /metadata")
+    print("   GET  /metrics")
+    print("   POST /admin/profile")
     print("\n⏹️ Para detener: Ctrl+C")
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    if args.dev:
+        configurar_store(config.job_store)
+        host = f"unix://{config.unix_socket}" if config.unix_socket else config.host
+        app.run(host=host, port=config.port, debug=True)
+    else:
+        youtube_serving.servir(sys.modules[__name__], config)
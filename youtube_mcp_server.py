@@ -5,51 +5,37 @@ Ofrece herramientas para gestionar descargas asíncronas
 """
 
 import asyncio
-import json
-import uuid
-from datetime import datetime
-from pathlib import Path
-from typing import Dict, List, Optional
-from enum import Enum
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Optional
 
 from fastmcp import FastMCP
+from fastmcp.tools import ToolResult
+from mcp.types import TextContent
 from pydantic import BaseModel
-from yt_dlp import YoutubeDL
-import threading
-import time
 
-# Estados posibles de una descarga
-class DownloadStatus(str, Enum):
-    PENDING = "pending"
-    RUNNING = "running"
-    COMPLETED = "completed"
-    FAILED = "failed"
-    CANCELLED = "cancelled"
-
-# Modelo para representar un job de descarga
-class DownloadJob(BaseModel):
-    job_id: str
-    url: str
-    title: str
-    status: DownloadStatus
-    created_at: datetime
-    started_at: Optional[datetime] = None
-    completed_at: Optional[datetime] = None
-    error_message: Optional[str] = None
-    download_path: Optional[str] = None
-    is_playlist: bool = False
-    total_videos: Optional[int] = None
-    downloaded_videos: int = 0
+import youtube_metrics as metricas
+import youtube_profiling as profiling
+from youtube_engine import (DownloadEngine, ESTADOS_FINALES, LoopJobStore, PoolScheduler,
+                            detectar_tipo_url, parsear_idiomas, serializer, validar_calidad, validar_callback_url,
+                            validar_busqueda, validar_consulta_lote, validar_modo, validar_url_youtube)
 
 # Modelo para parámetros de descarga de video
 class DownloadVideoParams(BaseModel):
     url: str
     quality: str = "720p"
+    mode: str = "video"
+    languages: str = ""
+    callback_url: str = ""
 
 # Modelo para parámetros de descarga de playlist
 class DownloadPlaylistParams(BaseModel):
     url: str
     quality: str = "720p"
+    mode: str = "video"
+    languages: str = ""
+    callback_url: str = ""
 
 # Modelo para obtener estado
 class GetStatusParams(BaseModel):
@@ -63,136 +49,94 @@ class CancelDownloadParams(BaseModel):
 class GetMetadataParams(BaseModel):
     url: str
 
-# Crear la instancia del servidor MCP
-mcp = FastMCP("YouTube Downloader MCP Server")
-
-# Almacenamiento en memoria de los jobs (en producción usar una base de datos)
-download_jobs: Dict[str, DownloadJob] = {}
-active_downloads: Dict[str, threading.Thread] = {}
-
-# Configuración de descarga
-DOWNLOAD_FOLDER = Path("download")
-DOWNLOAD_FOLDER.mkdir(exist_ok=True)
+# Hilos para el trabajo bloqueante de yt-dlp. Las descargas y las extracciones
+# de metadatos usan executors distintos para que unas no hagan cola tras otras
+DESCARGAS_SIMULTANEAS = int(os.environ.get("YOUTUBE_MCP_DOWNLOAD_WORKERS", 8))
+EXTRACCIONES_SIMULTANEAS = int(os.environ.get("YOUTUBE_MCP_METADATA_WORKERS", 8))
+executor_metadatos = ThreadPoolExecutor(EXTRACCIONES_SIMULTANEAS, thread_name_prefix="yt-metadatos")
 
-def validar_url_youtube(url: str) -> bool:
-    """Valida si la URL es de YouTube"""
-    youtube_dominios = ['youtube.com', 'youtu.be', 'm.youtube.com']
-    return any(dominio in url.lower() for dominio in youtube_dominios)
+# Motor de descargas, creado al arrancar el servidor (ciclo_de_vida) y no al
+# importar el módulo. Los jobs viven en memoria y solo los modifica el event
+# loop: los hilos de descarga le envían sus cambios y las herramientas los
+# leen sin esperar a nadie
+motor: Optional[DownloadEngine] = None
 
-def detectar_tipo_url(url: str) -> str:
-    """Detecta si la URL es un video individual o una playlist"""
-    url_lower = url.lower()
-    
-    if 'playlist?list=' in url_lower:
-        return 'playlist'
-    elif 'watch?v=' in url_lower and 'list=' in url_lower:
-        return 'video_en_playlist'
-    else:
-        return 'video_individual'
+def crear_motor() -> DownloadEngine:
+    nuevo = DownloadEngine(
+        store=LoopJobStore(),
+        scheduler=PoolScheduler(DESCARGAS_SIMULTANEAS),
+        # stdout es el canal JSON-RPC: yt-dlp no debe escribir en él
+        opciones_ydl={'quiet': True, 'no_warnings': True, 'noprogress': True},
+    )
+    nuevo.instrumentar()
+    return nuevo
 
-def obtener_metadatos_video(url: str) -> dict:
-    """Obtiene metadatos de un video sin descargarlo"""
-    ydl_opts = {
-        'quiet': True,
-        'no_warnings': True,
-    }
-    
+@asynccontextmanager
+async def ciclo_de_vida(_servidor):
+    """Crea el motor, ata su store al event loop, precalienta yt-dlp y detiene las descargas al apagar"""
+    global motor
+    if motor is None:
+        motor = crear_motor()
+    bucle = asyncio.get_running_loop()
+    motor.store.bucle = bucle
+    # yt-dlp no se importa al cargar el módulo: se carga aquí sin esperar por él
+    bucle.run_in_executor(executor_metadatos, motor.precalentar)
+    motor.webhooks.reanudar()
+    motor.cache_carpeta.iniciar()
+    motor.concurrencia.iniciar()
     try:
-        with YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            return {
-                'title': info.get('title', 'Sin título'),
-                'duration': info.get('duration', 0),
-                'uploader': info.get('uploader', 'Autor desconocido'),
-                'view_count': info.get('view_count', 0),
-                'upload_date': info.get('upload_date', ''),
-                'description': info.get('description', '')[:500] + '...' if info.get('description') else '',
-                'thumbnail': info.get('thumbnail', ''),
-                'is_playlist': 'entries' in info,
-                'playlist_count': info.get('playlist_count', 0) if 'entries' in info else 0
-            }
-    except Exception as e:
-        raise Exception(f"Error al obtener metadatos: {str(e)}")
-
-def ejecutar_descarga(job_id: str, url: str, is_playlist: bool = False, quality: str = "720p"):
-    """Ejecuta la descarga en un hilo separado"""
-    job = download_jobs[job_id]
-    
-    try:
-        # Actualizar estado a running
-        job.status = DownloadStatus.RUNNING
-        job.started_at = datetime.now()
-        
-        # Configuración para yt-dlp
-        if is_playlist:
-            ydl_opts = {
-                'outtmpl': str(DOWNLOAD_FOLDER / '%(playlist_index)s - %(title)s.%(ext)s'),
-                'format': f'best[height<={quality[:-1]}]' if quality != "720p" else 'best[height<=720]',
-                'noplaylist': False,
-                'progress_hooks': [lambda d: actualizar_progreso(job_id, d)],
-            }
-        else:
-            ydl_opts = {
-                'outtmpl': str(DOWNLOAD_FOLDER / '%(title)s.%(ext)s'),
-                'format': f'best[height<={quality[:-1]}]' if quality != "720p" else 'best[height<=720]',
-                'noplaylist': True,
-                'progress_hooks': [lambda d: actualizar_progreso(job_id, d)],
-            }
-        
-        with YoutubeDL(ydl_opts) as ydl:
-            # Obtener información antes de descargar
-            info = ydl.extract_info(url, download=False)
-            
-            # Actualizar información del job
-            if is_playlist:
-                job.title = info.get('title', 'Playlist sin título')
-                job.total_videos = info.get('playlist_count', 0)
-            else:
-                job.title = info.get('title', 'Video sin título')
-                job.total_videos = 1
-            
-            # Realizar la descarga
-            ydl.download([url])
-            
-            # Marcar como completado
-            job.status = DownloadStatus.COMPLETED
-            job.completed_at = datetime.now()
-            job.downloaded_videos = job.total_videos or 1
-            
-    except Exception as e:
-        # Marcar como fallido
-        job.status = DownloadStatus.FAILED
-        job.completed_at = datetime.now()
-        job.error_message = str(e)
-    
+        yield
     finally:
-        # Limpiar el hilo activo
-        if job_id in active_downloads:
-            del active_downloads[job_id]
+        await asyncio.to_thread(motor.drenar, 0)
+        motor.scheduler.cerrar()
+        motor.webhooks.cerrar()
+        motor.cache_carpeta.cerrar()
+        motor.concurrencia.cerrar()
+        if motor.verificador is not None:
+            motor.verificador.cerrar()
+        if motor.postproceso is not None:
+            motor.postproceso.cerrar()
+        executor_metadatos.shutdown(wait=False, cancel_futures=True)
 
-def actualizar_progreso(job_id: str, progress_data: dict):
-    """Actualiza el progreso de descarga"""
-    if job_id in download_jobs:
-        job = download_jobs[job_id]
-        if 'downloaded_bytes' in progress_data and 'total_bytes' in progress_data:
-            # Calcular progreso porcentual
-            if progress_data['total_bytes'] > 0:
-                progress = (progress_data['downloaded_bytes'] / progress_data['total_bytes']) * 100
-                job.downloaded_videos = int(progress / 100 * (job.total_videos or 1))
+def respuesta_json(codificado: bytes) -> ToolResult:
+    """Resultado con solo el JSON que el motor ya tiene codificado.
+
+    Sin structured_content: FastMCP lo volvería a serializar y el fragmento
+    en caché no ahorraría nada.
+    """
+    return ToolResult(content=[TextContent(type="text", text=codificado.decode('utf-8'))])
+
+# Crear la instancia del servidor MCP
+mcp = FastMCP("YouTube Downloader MCP Server", lifespan=ciclo_de_vida)
 
 @mcp.tool()
-def download_video(url: str, quality: str = "720p") -> dict:
+async def download_video(url: str, quality: str = "720p", mode: str = "video", languages: str = "",
+                         callback_url: str = "") -> dict:
     """
     Start downloading a video from YouTube or other supported sites.
     Returns a job ID to track download progress.
     
     Args:
         url: URL of the video to download
-        quality: Quality of the download (e.g., "720p", "480p", "1080p")
+        quality: Maximum quality (e.g., "720p", "1080", "4k" or "best")
+        mode: What to download: "video", "audio" (best audio track only),
+            "subtitles" (captions only, no media) or "thumbnail" (thumbnail only)
+        languages: Subtitle languages for mode "subtitles", comma-separated
+            (e.g., "en,es"); defaults to Spanish and English
+        callback_url: Optional http(s) URL that receives a signed POST when the job
+            finishes (completed, failed or cancelled), instead of polling its status
     
     Returns:
         dict: Job information with job_id
     """
+    try:
+        quality = validar_calidad(quality)
+        mode = validar_modo(mode)
+        # Resolver el host de la callback bloquea: fuera del event loop
+        callback_url = await asyncio.to_thread(validar_callback_url, callback_url)
+    except ValueError as e:
+        return {"error": str(e)}
+    
     # Validar URL
     if not validar_url_youtube(url):
         return {"error": "URL no válida de YouTube"}
@@ -201,46 +145,47 @@ def download_video(url: str, quality: str = "720p") -> dict:
     if detectar_tipo_url(url) == 'playlist':
         return {"error": "Esta URL es una playlist. Usa download_playlist en su lugar."}
     
-    # Crear nuevo job
-    job_id = str(uuid.uuid4())
-    job = DownloadJob(
-        job_id=job_id,
-        url=url,
-        title="Preparando descarga...",
-        status=DownloadStatus.PENDING,
-        created_at=datetime.now(),
-        is_playlist=False
-    )
-    
-    download_jobs[job_id] = job
+    if motor.drenando.is_set():
+        return {"error": "El servidor se está apagando"}
     
-    # Iniciar descarga en hilo separado
-    thread = threading.Thread(
-        target=ejecutar_descarga,
-        args=(job_id, url, False, quality)
-    )
-    thread.start()
-    active_downloads[job_id] = thread
+    # Crear el job; el motor lo encola en su pool de descargas
+    job = motor.crear_job(url, False, quality, mode, parsear_idiomas(languages), callback_url)
     
     return {
-        "job_id": job_id,
+        "job_id": job['job_id'],
         "status": "pending",
+        "mode": mode,
         "message": "Descarga de video iniciada"
     }
 
 @mcp.tool()
-def download_playlist(url: str, quality: str = "720p") -> dict:
+async def download_playlist(url: str, quality: str = "720p", mode: str = "video", languages: str = "",
+                            callback_url: str = "") -> dict:
     """
     Start downloading an entire playlist from YouTube or other supported sites.
     Returns a job ID to track download progress.
     
     Args:
         url: URL of the playlist to download
-        quality: Quality of the download (e.g., "720p", "480p", "1080p")
+        quality: Maximum quality (e.g., "720p", "1080", "4k" or "best")
+        mode: What to download: "video", "audio" (best audio track only),
+            "subtitles" (captions only, no media) or "thumbnail" (thumbnail only)
+        languages: Subtitle languages for mode "subtitles", comma-separated
+            (e.g., "en,es"); defaults to Spanish and English
+        callback_url: Optional http(s) URL that receives a signed POST when the job
+            finishes (completed, failed or cancelled), instead of polling its status
     
     Returns:
         dict: Job information with job_id
     """
+    try:
+        quality = validar_calidad(quality)
+        mode = validar_modo(mode)
+        # Resolver el host de la callback bloquea: fuera del event loop
+        callback_url = await asyncio.to_thread(validar_callback_url, callback_url)
+    except ValueError as e:
+        return {"error": str(e)}
+    
     # Validar URL
     if not validar_url_youtube(url):
         return {"error": "URL no válida de YouTube"}
@@ -249,35 +194,21 @@ def download_playlist(url: str, quality: str = "720p") -> dict:
     if detectar_tipo_url(url) not in ['playlist', 'video_en_playlist']:
         return {"error": "Esta URL no es una playlist. Usa download_video en su lugar."}
     
-    # Crear nuevo job
-    job_id = str(uuid.uuid4())
-    job = DownloadJob(
-        job_id=job_id,
-        url=url,
-        title="Preparando descarga de playlist...",
-        status=DownloadStatus.PENDING,
-        created_at=datetime.now(),
-        is_playlist=True
-    )
-    
-    download_jobs[job_id] = job
+    if motor.drenando.is_set():
+        return {"error": "El servidor se está apagando"}
     
-    # Iniciar descarga en hilo separado
-    thread = threading.Thread(
-        target=ejecutar_descarga,
-        args=(job_id, url, True, quality)
-    )
-    thread.start()
-    active_downloads[job_id] = thread
+    # Crear el job; el motor lo encola en su pool de descargas
+    job = motor.crear_job(url, True, quality, mode, parsear_idiomas(languages), callback_url)
     
     return {
-        "job_id": job_id,
+        "job_id": job['job_id'],
         "status": "pending",
+        "mode": mode,
         "message": "Descarga de playlist iniciada"
     }
 
 @mcp.tool()
-def get_download_status(job_id: str) -> dict:
+async def get_download_status(job_id: str) -> ToolResult:
     """
     Check the status of a download job.
     
@@ -285,29 +216,38 @@ def get_download_status(job_id: str) -> dict:
         job_id: ID of the download job to check
     
     Returns:
-        dict: Current status and details of the job
+        ToolResult: JSON text with the current status and details of the job
     """
-    if job_id not in download_jobs:
-        return {"error": "Job ID no encontrado"}
+    # Una sola lectura del store, ya codificada
+    codificado = motor.estado_json(job_id)
+    if codificado is None:
+        codificado = serializer.dumps({"error": "Job ID no encontrado"})
     
-    job = download_jobs[job_id]
+    return respuesta_json(codificado)
+
+@mcp.tool()
+async def get_download_statuses(job_ids: list[str], fields: list[str] | None = None,
+                                since_version: int | None = None) -> dict:
+    """
+    Check the status of many download jobs at once, from a single consistent snapshot.
     
-    return {
-        "job_id": job_id,
-        "title": job.title,
-        "status": job.status,
-        "created_at": job.created_at.isoformat(),
-        "started_at": job.started_at.isoformat() if job.started_at else None,
-        "completed_at": job.completed_at.isoformat() if job.completed_at else None,
-        "error_message": job.error_message,
-        "is_playlist": job.is_playlist,
-        "total_videos": job.total_videos,
-        "downloaded_videos": job.downloaded_videos,
-        "progress_percentage": round((job.downloaded_videos / (job.total_videos or 1)) * 100, 2) if job.total_videos else 0
-    }
+    Args:
+        job_ids: IDs of the download jobs to check
+        fields: Only return these fields of each job (job_id is always included)
+        since_version: Only return jobs changed after this version (the "version" of a previous call)
+    
+    Returns:
+        dict: Store version, the matching jobs and the IDs that were not found
+    """
+    try:
+        job_ids, fields, since_version = validar_consulta_lote(job_ids, fields, since_version)
+    except ValueError as e:
+        return {"error": str(e)}
+    
+    return motor.estados(job_ids, fields, since_version)
 
 @mcp.tool()
-def cancel_download(job_id: str) -> dict:
+async def cancel_download(job_id: str) -> dict:
     """
     Cancel a running or pending download job.
     
@@ -317,23 +257,18 @@ def cancel_download(job_id: str) -> dict:
     Returns:
         dict: Result of the cancellation attempt
     """
-    if job_id not in download_jobs:
+    job = motor.obtener(job_id)
+    if job is None:
         return {"error": "Job ID no encontrado"}
     
-    job = download_jobs[job_id]
+    if job['status'] in ESTADOS_FINALES:
+        return {"error": f"No se puede cancelar un job con estado: {job['status']}"}
     
-    if job.status in [DownloadStatus.COMPLETED, DownloadStatus.FAILED, DownloadStatus.CANCELLED]:
-        return {"error": f"No se puede cancelar un job con estado: {job.status}"}
-    
-    # Marcar como cancelado
-    job.status = DownloadStatus.CANCELLED
-    job.completed_at = datetime.now()
-    
-    # Terminar el hilo si está activo
-    if job_id in active_downloads:
-        # Nota: En una implementación real, necesitarías un mecanismo más robusto
-        # para cancelar yt-dlp. Aquí solo marcamos el job como cancelado.
-        del active_downloads[job_id]
+    # Si aún espera en la cola no llega a ejecutarse; si ya corre, se detiene
+    # en el siguiente aviso de progreso de yt-dlp
+    if motor.cancelar(job_id) is None:
+        job = motor.obtener(job_id)
+        return {"error": f"No se puede cancelar un job con estado: {job['status']}"}
     
     return {
         "job_id": job_id,
@@ -342,37 +277,72 @@ def cancel_download(job_id: str) -> dict:
     }
 
 @mcp.tool()
-def list_downloads() -> dict:
+async def verify_downloads(full: bool = False) -> dict:
     """
-    List all download jobs with their current status.
+    Start a job that checks the integrity of every downloaded file.
+    
+    Args:
+        full: Re-hash every file, not only new ones or those whose size or mtime changed
     
     Returns:
-        dict: List of all download jobs and their statuses
+        dict: Job ID of the verification; its status includes the summary when it finishes
     """
-    jobs_list = []
-    
-    for job_id, job in download_jobs.items():
-        jobs_list.append({
-            "job_id": job_id,
-            "title": job.title,
-            "status": job.status,
-            "created_at": job.created_at.isoformat(),
-            "is_playlist": job.is_playlist,
-            "total_videos": job.total_videos,
-            "downloaded_videos": job.downloaded_videos,
-            "progress_percentage": round((job.downloaded_videos / (job.total_videos or 1)) * 100, 2) if job.total_videos else 0
-        })
-    
-    # Ordenar por fecha de creación (más recientes primero)
-    jobs_list.sort(key=lambda x: x['created_at'], reverse=True)
+    if motor.drenando.is_set():
+        return {"error": "El servidor se está apagando"}
+    
+    try:
+        job = motor.crear_verificacion(full)
+    except ValueError as e:
+        return {"error": str(e)}
     
     return {
-        "total_jobs": len(jobs_list),
-        "jobs": jobs_list
+        "job_id": job['job_id'],
+        "status": "pending",
+        "mode": "verify",
+        "message": "Verificación iniciada"
     }
 
 @mcp.tool()
-def get_video_metadata(url: str) -> dict:
+async def search_downloads(query: str = "", uploader: str | None = None, date_from: str | None = None,
+                           date_to: str | None = None, min_duration: float | None = None,
+                           max_duration: float | None = None, sort: str = "relevance", limit: int = 20,
+                           offset: int = 0) -> dict:
+    """
+    Search the downloaded videos by title, uploader and description.
+    
+    Args:
+        query: Words to look for (the last one also matches as a prefix); empty lists the newest videos
+        uploader: Only videos from this uploader (exact name, case-insensitive)
+        date_from: Only videos uploaded on or after this date (YYYY-MM-DD)
+        date_to: Only videos uploaded on or before this date (YYYY-MM-DD)
+        min_duration: Minimum duration in seconds
+        max_duration: Maximum duration in seconds
+        sort: relevance, date, duration or views
+        limit: Maximum results (1-100)
+        offset: Results to skip, for paging
+    
+    Returns:
+        dict: Matching videos with their files, a description snippet and whether there are more results
+    """
+    try:
+        parametros = validar_busqueda(query, uploader, date_from, date_to, min_duration, max_duration,
+                                      sort, limit, offset)
+        return await asyncio.to_thread(motor.buscar, **parametros)
+    except ValueError as e:
+        return {"error": str(e)}
+
+@mcp.tool()
+async def list_downloads() -> ToolResult:
+    """
+    List all download jobs with their current status.
+    
+    Returns:
+        ToolResult: JSON text with all download jobs and their statuses
+    """
+    return respuesta_json(motor.listado_json())
+
+@mcp.tool()
+async def get_video_metadata(url: str) -> dict:
     """
     Fetch metadata about a video without downloading it.
     
@@ -387,7 +357,9 @@ def get_video_metadata(url: str) -> dict:
         return {"error": "URL no válida de YouTube"}
     
     try:
-        metadata = obtener_metadatos_video(url)
+        # La extracción bloquea: se hace en el executor para no parar el event loop
+        metadata = await asyncio.get_running_loop().run_in_executor(
+            executor_metadatos, motor.metadatos, url)
         tipo_url = detectar_tipo_url(url)
         
         return {
@@ -399,6 +371,43 @@ def get_video_metadata(url: str) -> dict:
     except Exception as e:
         return {"error": str(e)}
 
+@mcp.tool()
+async def get_metrics() -> str:
+    """
+    Return server metrics in the Prometheus text exposition format.
+    
+    Returns:
+        str: Latency histograms, byte counters, queue depth, job counts and errors
+    """
+    return metricas.REGISTRY.exposition()
+
+@mcp.tool()
+async def profile_server(admin_token: str, seconds: float = 10, interval_ms: float = 5) -> str:
+    """
+    Run the sampling profiler over all server threads for a number of seconds.
+    
+    Args:
+        admin_token: The server's YOUTUBE_ADMIN_TOKEN (the tool is disabled if it is not set)
+        seconds: How long to sample (capped at 120)
+        interval_ms: Milliseconds between samples
+    
+    Returns:
+        str: Flamegraph-compatible collapsed stacks, or an error message
+    """
+    if not os.environ.get('YOUTUBE_ADMIN_TOKEN'):
+        return "Error: profiler deshabilitado, define YOUTUBE_ADMIN_TOKEN"
+    if not profiling.admin_autorizado(admin_token):
+        return "Error: no autorizado"
+    try:
+        return await asyncio.to_thread(profiling.perfilar, seconds, interval_ms / 1000)
+    except profiling.ProfilerOcupado as e:
+        return f"Error: {e}"
+
 if __name__ == "__main__":
+    # Exponer /metrics por HTTP si se configura un puerto
+    puerto_metricas = os.environ.get("YOUTUBE_METRICS_PORT")
+    if puerto_metricas:
+        metricas.iniciar_servidor_metricas(int(puerto_metricas))
+    
     # Ejecutar el servidor MCP
     mcp.run()
@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+Métricas estilo Prometheus para el descargador de YouTube
+Contadores, gauges e histogramas baratos de actualizar desde los hilos de descarga
+"""
+
+import math
+import threading
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Buckets por defecto para latencias (segundos)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+
+class _Shards:
+    """Arrays de valores por hilo: cada hilo escribe solo en el suyo, sin locks.
+
+    El lock solo se toma la primera vez que un hilo usa la métrica y al leerla,
+    nunca en el camino caliente. Los arrays de hilos terminados se acumulan en
+    `_retirados` durante la lectura para que la lista no crezca sin límite.
+    """
+
+    __slots__ = ('_size', '_local', '_shards', '_retirados', '_lock')
+
+    def __init__(self, size: int):
+        self._size = size
+        self._local = threading.local()
+        self._shards: List[Tuple[threading.Thread, List[float]]] = []
+        self._retirados = [0.0] * size
+        self._lock = threading.Lock()
+
+    def local(self) -> List[float]:
+        """Devuelve el array del hilo actual, creándolo la primera vez"""
+        try:
+            return self._local.values
+        except AttributeError:
+            values = [0.0] * self._size
+            self._local.values = values
+            with self._lock:
+                self._shards.append((threading.current_thread(), values))
+            return values
+
+    def snapshot(self) -> List[float]:
+        """Suma los arrays de todos los hilos"""
+        with self._lock:
+            total = list(self._retirados)
+            vivos = []
+            for thread, values in self._shards:
+                for i, value in enumerate(values):
+                    total[i] += value
+                if thread.is_alive():
+                    vivos.append((thread, values))
+                else:
+                    for i, value in enumerate(values):
+                        self._retirados[i] += value
+            self._shards = vivos
+        return total
+
+
+class _Metric:
+    """Base de todas las métricas: nombre, ayuda e hijos por etiquetas"""
+
+    tipo = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 registry: Optional["Registry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+        self._children_lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values) -> "_Metric":
+        """Devuelve (y cachea) el hijo para estos valores de etiqueta"""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} espera etiquetas {self.labelnames}")
+            with self._children_lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._new_child()
+                    self._children[key] = child
+        return child
+
+    def _new_child(self) -> "_Metric":
+        raise NotImplementedError
+
+    def _series(self) -> List[Tuple[Tuple[str, ...], "_Metric"]]:
+        if self.labelnames:
+            return list(self._children.items())
+        return [((), self)]
+
+    def collect(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Contador monótono"""
+
+    tipo = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 registry: Optional["Registry"] = None):
+        super().__init__(name, documentation, labelnames, registry)
+        self._shards = _Shards(1)
+
+    def _new_child(self) -> "Counter":
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount: float = 1.0):
+        self._shards.local()[0] += amount
+
+    def value(self) -> float:
+        return self._shards.snapshot()[0]
+
+    def collect(self) -> List[str]:
+        return [f"{self.name}{_formatear_etiquetas(self.labelnames, key)} {_num(child.value())}"
+                for key, child in self._series()]
+
+
+class Gauge(_Metric):
+    """Gauge que admite inc/dec desde cualquier hilo"""
+
+    tipo = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 registry: Optional["Registry"] = None):
+        super().__init__(name, documentation, labelnames, registry)
+        self._shards = _Shards(1)
+
+    def _new_child(self) -> "Gauge":
+        return Gauge(self.name, self.documentation)
+
+    def inc(self, amount: float = 1.0):
+        self._shards.local()[0] += amount
+
+    def dec(self, amount: float = 1.0):
+        self._shards.local()[0] -= amount
+
+    def value(self) -> float:
+        return self._shards.snapshot()[0]
+
+    def collect(self) -> List[str]:
+        return [f"{self.name}{_formatear_etiquetas(self.labelnames, key)} {_num(child.value())}"
+                for key, child in self._series()]
+
+
+class CallbackGauge(_Metric):
+    """Gauge calculado en el momento del scrape a partir de una función.
+
+    La función devuelve un número o, si la métrica tiene etiquetas, un iterable
+    de pares (valores_de_etiqueta, número).
+    """
+
+    tipo = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 registry: Optional["Registry"] = None, callback: Optional[Callable] = None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.callback = callback
+
+    def set_callback(self, callback: Callable):
+        self.callback = callback
+
+    def collect(self) -> List[str]:
+        if self.callback is None:
+            return []
+        resultado = self.callback()
+        if not self.labelnames:
+            return [f"{self.name} {_num(resultado)}"]
+        return [f"{self.name}{_formatear_etiquetas(self.labelnames, tuple(str(v) for v in key))} {_num(value)}"
+                for key, value in resultado]
+
+
+class Histogram(_Metric):
+    """Histograma con buckets fijos; observe() no reserva memoria"""
+
+    tipo = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 registry: Optional["Registry"] = None, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        # Un hueco por bucket, uno para +Inf, uno para la suma y otro para el conteo
+        self._shards = _Shards(len(self.buckets) + 3)
+
+    def _new_child(self) -> "Histogram":
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float):
+        values = self._shards.local()
+        values[bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def collect(self) -> List[str]:
+        lineas = []
+        for key, child in self._series():
+            values = child._shards.snapshot()
+            acumulado = 0.0
+            for limite, count in zip(self.buckets + (float("inf"),), values):
+                acumulado += count
+                etiquetas = _formatear_etiquetas(self.labelnames + ("le",), key + (_num(limite),))
+                lineas.append(f"{self.name}_bucket{etiquetas} {_num(acumulado)}")
+            etiquetas = _formatear_etiquetas(self.labelnames, key)
+            lineas.append(f"{self.name}_sum{etiquetas} {_num(values[-2])}")
+            lineas.append(f"{self.name}_count{etiquetas} {_num(values[-1])}")
+        return lineas
+
+
+class Registry:
+    """Conjunto de métricas que se exponen juntas"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Métrica duplicada: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def exposition(self) -> str:
+        """Genera el formato de texto de Prometheus"""
+        lineas = []
+        for metric in list(self._metrics.values()):
+            lineas.append(f"# HELP {metric.name} {metric.documentation}")
+            lineas.append(f"# TYPE {metric.name} {metric.tipo}")
+            lineas.extend(metric.collect())
+        return "\n".join(lineas) + "\n"
+
+
+def _num(value: float) -> str:
+    # Los no finitos con la ortografía del formato de texto de Prometheus, no la de repr()
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _formatear_etiquetas(labelnames: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not labelnames:
+        return ""
+    pares = []
+    for name, value in zip(labelnames, values):
+        value = value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pares.append(f'{name}="{value}"')
+    return "{" + ",".join(pares) + "}"
+
+
+# Registro global y métricas del descargador
+REGISTRY = Registry()
+
+EXTRACTION_SECONDS = Histogram(
+    "youtube_extraction_duration_seconds",
+    "Tiempo de extracción de información con yt-dlp",
+    ("source",), REGISTRY)
+DOWNLOAD_SECONDS = Histogram(
+    "youtube_download_duration_seconds",
+    "Tiempo de descarga de un job (sin la extracción inicial)",
+    ("kind",), REGISTRY)
+DOWNLOAD_BYTES = Counter(
+    "youtube_download_bytes_total",
+    "Bytes descargados; rate() da los bytes/seg", registry=REGISTRY)
+DOWNLOAD_SPEED = Gauge(
+    "youtube_download_speed_bytes",
+    "Velocidad agregada actual de las descargas activas (bytes/seg)", registry=REGISTRY)
+QUEUE_DEPTH = CallbackGauge(
+    "youtube_queue_depth",
+    "Jobs en espera de empezar", registry=REGISTRY)
+ACTIVE_WORKERS = CallbackGauge(
+    "youtube_active_workers",
+    "Hilos de descarga activos", registry=REGISTRY)
+JOBS = CallbackGauge(
+    "youtube_jobs",
+    "Jobs retenidos por estado", ("status",), REGISTRY)
+VOLUME_FREE_BYTES = CallbackGauge(
+    "youtube_volume_free_bytes",
+    "Espacio libre por volumen de descarga, descontando lo reservado por los jobs en curso",
+    ("volume",), REGISTRY)
+POSTPROCESS_QUEUE_DEPTH = CallbackGauge(
+    "youtube_postprocess_queue_depth",
+    "Archivos descargados en espera de post-procesado", registry=REGISTRY)
+POSTPROCESS_ACTIVE_WORKERS = CallbackGauge(
+    "youtube_postprocess_active_workers",
+    "Workers de post-procesado ocupados", registry=REGISTRY)
+POSTPROCESS_QUEUE_SECONDS = Histogram(
+    "youtube_postprocess_queue_wait_seconds",
+    "Espera de un archivo descargado hasta que un worker de post-procesado lo toma", registry=REGISTRY)
+POSTPROCESS_STEP_SECONDS = Histogram(
+    "youtube_postprocess_step_duration_seconds",
+    "Duración de cada paso de post-procesado (Merger, FixupM4a, ExtractAudio...)",
+    ("step",), REGISTRY)
+WEBHOOK_EVENTS = Counter(
+    "youtube_webhook_events_total",
+    "Eventos de webhook por resultado del intento (delivered, retry, dead)",
+    ("result",), REGISTRY)
+WEBHOOK_DELIVERY_SECONDS = Histogram(
+    "youtube_webhook_delivery_duration_seconds",
+    "Duración de cada POST de un lote de eventos a un callback", registry=REGISTRY)
+WEBHOOK_OUTBOX = CallbackGauge(
+    "youtube_webhook_outbox_events",
+    "Eventos de webhook pendientes de entrega en el outbox", registry=REGISTRY)
+FOLDER_CACHE_BYTES = CallbackGauge(
+    "youtube_folder_cache_bytes",
+    "Bytes de descargas en la carpeta usada como caché", registry=REGISTRY)
+FOLDER_CACHE_LIMIT_BYTES = CallbackGauge(
+    "youtube_folder_cache_limit_bytes",
+    "Capacidad de la carpeta usada como caché", registry=REGISTRY)
+FOLDER_CACHE_EVICTIONS = Counter(
+    "youtube_folder_cache_evictions_total",
+    "Archivos borrados de la carpeta de descargas por ser los menos usados", registry=REGISTRY)
+FOLDER_CACHE_EVICTED_BYTES = Counter(
+    "youtube_folder_cache_evicted_bytes_total",
+    "Bytes liberados por el desalojo de la carpeta de descargas", registry=REGISTRY)
+VERIFY_FILES = Counter(
+    "youtube_verify_files_total",
+    "Archivos verificados por resultado (ok, skipped, changed, corrupted, truncated, missing, error)",
+    ("result",), REGISTRY)
+VERIFY_BYTES = Counter(
+    "youtube_verify_bytes_total",
+    "Bytes leídos para calcular checksums", registry=REGISTRY)
+VERIFY_SECONDS = Histogram(
+    "youtube_verify_file_duration_seconds",
+    "Tiempo de calcular el checksum de un archivo", registry=REGISTRY)
+CONCURRENCY_LIMIT = CallbackGauge(
+    "youtube_concurrency_limit",
+    "Límites fijados por el control adaptativo (connections: conexiones al origen, fragments: por video)",
+    ("knob",), REGISTRY)
+CONCURRENCY_THROUGHPUT = CallbackGauge(
+    "youtube_concurrency_throughput_bytes_per_second",
+    "Bytes/seg agregados medidos en la última ventana del control adaptativo", registry=REGISTRY)
+CONCURRENCY_DECISIONS = Counter(
+    "youtube_concurrency_decisions_total",
+    "Decisiones del control adaptativo (increase, decrease, backoff, hold) y su motivo",
+    ("decision", "reason"), REGISTRY)
+ORIGIN_REQUESTS = Counter(
+    "youtube_origin_requests_total",
+    "Peticiones de yt-dlp al origen por resultado (ok, throttled, error)",
+    ("result",), REGISTRY)
+CACHE_REQUESTS = Counter(
+    "youtube_cache_requests_total",
+    "Consultas a cachés internas por resultado (hit/miss)",
+    ("cache", "result"), REGISTRY)
+ERRORS = Counter(
+    "youtube_errors_total",
+    "Errores por etapa y clase de excepción",
+    ("stage", "error_class"), REGISTRY)
+HTTP_REQUEST_SECONDS = Histogram(
+    "youtube_http_request_duration_seconds",
+    "Latencia de las rutas HTTP", ("endpoint",), REGISTRY)
+HTTP_REQUESTS = Counter(
+    "youtube_http_requests_total",
+    "Peticiones HTTP por ruta y código", ("endpoint", "code"), REGISTRY)
+
+# Hijos usados en caminos calientes, resueltos una sola vez
+EXTRACTION_DOWNLOAD_SECONDS = EXTRACTION_SECONDS.labels("download")
+EXTRACTION_METADATA_SECONDS = EXTRACTION_SECONDS.labels("metadata")
+
+
+def registrar_cache(cache: str, hit: bool):
+    """Registra un acierto o fallo de una caché interna"""
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def registrar_error(stage: str, error: BaseException):
+    """Cuenta un error por etapa y clase"""
+    ERRORS.labels(stage, type(error).__name__).inc()
+
+
+class DownloadProgressMeter:
+    """Progress hook de yt-dlp que alimenta bytes y velocidad sin reservar memoria.
+
+    Guarda solo los últimos valores vistos y suma los deltas a las métricas
+    globales; llamar a `cerrar()` al terminar el job retira su velocidad.
+    """
+
+    __slots__ = ('_ultimo', '_velocidad')
+
+    def __init__(self):
+        self._ultimo = 0
+        self._velocidad = 0.0
+
+    def __call__(self, d: dict):
+        descargado = d.get('downloaded_bytes') or 0
+        delta = descargado - self._ultimo
+        if delta < 0:
+            # Empezó un archivo nuevo (playlist o formatos separados)
+            delta = descargado
+        if delta:
+            DOWNLOAD_BYTES.inc(delta)
+        velocidad = d.get('speed') or 0.0
+        if velocidad != self._velocidad:
+            DOWNLOAD_SPEED.inc(velocidad - self._velocidad)
+            self._velocidad = velocidad
+        if d.get('status') == 'finished':
+            self._ultimo = 0
+            if self._velocidad:
+                DOWNLOAD_SPEED.dec(self._velocidad)
+                self._velocidad = 0.0
+        else:
+            self._ultimo = descargado
+
+    def cerrar(self):
+        """Retira la velocidad de este job del gauge agregado"""
+        if self._velocidad:
+            DOWNLOAD_SPEED.dec(self._velocidad)
+            self._velocidad = 0.0
+
+
+def iniciar_servidor_metricas(port: int, host: str = "127.0.0.1") -> "ThreadingHTTPServer":
+    """Sirve /metrics en un hilo aparte (para procesos sin servidor HTTP propio)"""
+    # http.server se importa aquí: la CLI importa este módulo y no lo necesita
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            cuerpo = REGISTRY.exposition().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, format, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
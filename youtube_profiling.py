@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Herramientas de profiling para el descargador de YouTube
+Tiempos por fase de cada job y un profiler por muestreo activable en caliente
+"""
+
+import hmac
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+# Fases de un job, en el orden en que normalmente ocurren
+FASES = ('extraction', 'format_selection', 'transfer', 'merge', 'postprocessing')
+
+# Límites del profiler por muestreo
+MAX_SEGUNDOS_PROFILING = 120.0
+INTERVALO_MINIMO = 0.001
+
+
+class PhaseTimer:
+    """Cronómetro de fases de un job.
+
+    Acumula el tiempo de pared de cada fase; `cambiar()` cierra la fase actual
+    y abre la siguiente. Los hooks de yt-dlp solo llaman a `cambiar()` cuando la
+    fase realmente cambia, así que el coste por muestra de progreso es una
+    comparación.
+    """
+
+    __slots__ = ('_duraciones', '_fase', '_inicio', '_lock')
+
+    def __init__(self):
+        self._duraciones = dict.fromkeys(FASES, 0.0)
+        self._fase: Optional[str] = None
+        self._inicio = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def fase_actual(self) -> Optional[str]:
+        return self._fase
+
+    def cambiar(self, fase: Optional[str]):
+        """Cierra la fase en curso y empieza `fase` (None para detener)"""
+        with self._lock:
+            ahora = time.perf_counter()
+            if self._fase is not None:
+                self._duraciones[self._fase] += ahora - self._inicio
+            self._fase = fase
+            self._inicio = ahora
+
+    def detener(self):
+        """Cierra la fase en curso"""
+        self.cambiar(None)
+
+    def trasladar(self, origen: str, destino: str, segundos: float):
+        """Pasa `segundos` de una fase a otra, p. ej. el merge medido en un worker de post-procesado"""
+        with self._lock:
+            segundos = min(segundos, self._duraciones[origen])
+            self._duraciones[origen] -= segundos
+            self._duraciones[destino] += segundos
+
+    def duraciones(self) -> Dict[str, float]:
+        """Segundos por fase, incluyendo lo que lleva la fase en curso"""
+        with self._lock:
+            duraciones = dict(self._duraciones)
+            if self._fase is not None:
+                duraciones[self._fase] += time.perf_counter() - self._inicio
+        return {fase: round(segundos, 3) for fase, segundos in duraciones.items()}
+
+    def progress_hook(self, d: dict):
+        """Progress hook de yt-dlp: marca el inicio y fin de la transferencia"""
+        estado = d.get('status')
+        if estado == 'downloading':
+            if self._fase != 'transfer':
+                self.cambiar('transfer')
+        elif estado == 'finished':
+            self.cambiar('postprocessing')
+
+    def postprocessor_hook(self, d: dict):
+        """Postprocessor hook de yt-dlp: separa el merge del resto de post-procesado"""
+        if d.get('status') == 'started':
+            self.cambiar('merge' if d.get('postprocessor') == 'Merger' else 'postprocessing')
+        elif d.get('status') == 'finished' and self._fase == 'merge':
+            self.cambiar('postprocessing')
+
+
+class ProfilerOcupado(RuntimeError):
+    """Ya hay una sesión de profiling en curso"""
+
+
+_profiler_lock = threading.Lock()
+
+
+def admin_autorizado(token: Optional[str]) -> bool:
+    """¿`token` es YOUTUBE_ADMIN_TOKEN? Sin la variable definida el profiler queda deshabilitado"""
+    esperado = os.environ.get('YOUTUBE_ADMIN_TOKEN')
+    if not esperado or not token:
+        return False
+    # Comparación en tiempo constante: no revela cuántos caracteres coinciden
+    return hmac.compare_digest(token.encode(), esperado.encode())
+
+
+def _etiqueta_frame(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def perfilar(segundos: float, intervalo: float = 0.005) -> str:
+    """Muestrea las pilas de todos los hilos durante `segundos`.
+
+    Devuelve el formato "collapsed stacks" (una pila por línea, frames separados
+    por ';' y el número de muestras al final) que entienden flamegraph.pl,
+    speedscope e inferno. Solo se permite una sesión a la vez. El intervalo
+    nunca pasa de la duración: con uno mayor solo habría una muestra y la
+    sesión duraría lo que el intervalo.
+    """
+    segundos, intervalo = float(segundos), float(intervalo)
+    if not (math.isfinite(segundos) and math.isfinite(intervalo)):
+        raise ValueError("La duración y el intervalo del profiling deben ser finitos")
+    segundos = min(max(segundos, 0.0), MAX_SEGUNDOS_PROFILING)
+    intervalo = min(max(intervalo, INTERVALO_MINIMO), max(segundos, INTERVALO_MINIMO))
+
+    if not _profiler_lock.acquire(blocking=False):
+        raise ProfilerOcupado("Ya hay una sesión de profiling en curso")
+
+    try:
+        propio = threading.get_ident()
+        muestras: Counter = Counter()
+        nombres = {}
+        fin = time.perf_counter() + segundos
+
+        while time.perf_counter() < fin:
+            for ident, frame in sys._current_frames().items():
+                if ident == propio:
+                    continue
+                pila = []
+                while frame is not None:
+                    pila.append(_etiqueta_frame(frame))
+                    frame = frame.f_back
+                if ident not in nombres:
+                    nombres.update((hilo.ident, hilo.name) for hilo in threading.enumerate())
+                    nombres.setdefault(ident, f"thread-{ident}")
+                pila.append(nombres[ident])
+                pila.reverse()
+                muestras[";".join(pila)] += 1
+            time.sleep(intervalo)
+
+        return "".join(f"{pila} {n}\n" for pila, n in muestras.most_common())
+    finally:
+        _profiler_lock.release()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Modo de producción para el servidor HTTP de YouTube
+Varios workers (gunicorn) o hilos (waitress/werkzeug), estado compartido y drenaje al apagar
+"""
+
+import os
+import signal
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import ModuleType
+from typing import Optional
+
+STORE_COMPARTIDO_POR_DEFECTO = "sqlite:///" + str(Path("download") / "jobs.sqlite3")
+
+
+@dataclass
+class ServingConfig:
+    """Configuración del servidor de producción.
+
+    Los valores por defecto se pueden sobrescribir con variables de entorno
+    YOUTUBE_HOST, YOUTUBE_PORT, YOUTUBE_WORKERS, YOUTUBE_THREADS,
+    YOUTUBE_DRAIN_TIMEOUT, YOUTUBE_JOB_STORE, YOUTUBE_SERVER_BACKEND y
+    YOUTUBE_UNIX_SOCKET. Con `unix_socket` se escucha en ese socket (solo para
+    el usuario) en lugar de en host:port.
+    """
+    host: str = "0.0.0.0"
+    port: int = 5000
+    workers: int = 2                      # procesos
+    threads: int = 8                      # hilos por proceso
+    drain_timeout: float = 30.0           # segundos para terminar descargas al apagar
+    job_store: Optional[str] = None       # 'memory' o 'sqlite:///ruta'
+    backend: str = "auto"                 # auto, gunicorn, waitress o werkzeug
+    unix_socket: Optional[str] = None     # ruta del socket Unix para la CLI
+    access_log: bool = False
+    extra: dict = field(default_factory=dict)
+
+    @classmethod
+    def desde_entorno(cls, **overrides) -> "ServingConfig":
+        entorno = {
+            'host': os.environ.get('YOUTUBE_HOST'),
+            'port': os.environ.get('YOUTUBE_PORT'),
+            'workers': os.environ.get('YOUTUBE_WORKERS'),
+            'threads': os.environ.get('YOUTUBE_THREADS'),
+            'drain_timeout': os.environ.get('YOUTUBE_DRAIN_TIMEOUT'),
+            'job_store': os.environ.get('YOUTUBE_JOB_STORE'),
+            'backend': os.environ.get('YOUTUBE_SERVER_BACKEND'),
+            'unix_socket': os.environ.get('YOUTUBE_UNIX_SOCKET'),
+        }
+        valores = {k: v for k, v in entorno.items() if v is not None}
+        valores.update({k: v for k, v in overrides.items() if v is not None})
+        config = cls(**valores)
+        config.port = int(config.port)
+        config.workers = max(int(config.workers), 1)
+        config.threads = max(int(config.threads), 1)
+        config.drain_timeout = float(config.drain_timeout)
+        return config
+
+    def store_efectivo(self) -> str:
+        """Con más de un worker el estado tiene que vivir fuera del proceso"""
+        if self.job_store and self.job_store != 'memory':
+            return self.job_store
+        if self.workers > 1:
+            return STORE_COMPARTIDO_POR_DEFECTO
+        return self.job_store or 'memory'
+
+    @property
+    def direccion(self) -> str:
+        return f"unix:{self.unix_socket}" if self.unix_socket else f"http://{self.host}:{self.port}"
+
+
+def elegir_backend(config: ServingConfig) -> str:
+    if config.backend != "auto":
+        return config.backend
+    if os.name != 'nt':
+        try:
+            import gunicorn  # noqa: F401
+            return "gunicorn"
+        except ImportError:
+            pass
+    try:
+        import waitress  # noqa: F401
+        return "waitress"
+    except ImportError:
+        return "werkzeug"
+
+
+def servir(servidor: ModuleType, config: ServingConfig):
+    """Sirve `servidor.app` en modo producción.
+
+    `servidor` es el módulo youtube_http_server (o uno compatible) y debe
+    exponer app, configurar_store, reanudar_huerfanos, drenar y precalentar.
+    Importarlo no crea el motor: lo crea aquí configurar_store con el store
+    efectivo, antes de que gunicorn cree los workers.
+    """
+    backend = elegir_backend(config)
+    if backend != "gunicorn" and config.workers > 1:
+        print(f"⚠️ {backend} no admite varios procesos: se usará 1 worker con {config.threads} hilos")
+        config.workers = 1
+    servidor.configurar_store(config.store_efectivo())
+
+    print(f"🚀 Modo producción con {backend}: {config.workers} worker(s) x {config.threads} hilo(s) "
+          f"en {config.direccion}")
+
+    if backend == "gunicorn":
+        _servir_gunicorn(servidor, config)
+    else:
+        _servir_un_proceso(servidor, config, backend)
+
+
+def _servir_gunicorn(servidor: ModuleType, config: ServingConfig):
+    from gunicorn.app.base import BaseApplication
+
+    def post_fork(_arbiter, _worker):
+        servidor.reanudar_huerfanos()
+        _precalentar(servidor)
+
+    def worker_exit(_arbiter, _worker):
+        servidor.drenar(config.drain_timeout)
+
+    class _Aplicacion(BaseApplication):
+        def load_config(self):
+            ajustes = {
+                'bind': f"unix:{config.unix_socket}" if config.unix_socket else f"{config.host}:{config.port}",
+                # Solo el usuario que arranca el servidor puede usar el socket
+                'umask': 0o177 if config.unix_socket else 0,
+                'workers': config.workers,
+                'threads': config.threads,
+                'worker_class': 'gthread',
+                # El master espera al drenaje de cada worker antes de matarlo
+                'graceful_timeout': int(config.drain_timeout) + 15,
+                'post_fork': post_fork,
+                'worker_exit': worker_exit,
+                'accesslog': '-' if config.access_log else None,
+                **config.extra,
+            }
+            for clave, valor in ajustes.items():
+                self.cfg.set(clave, valor)
+
+        def load(self):
+            return servidor.app
+
+    _Aplicacion().run()
+
+
+def _servir_un_proceso(servidor: ModuleType, config: ServingConfig, backend: str):
+    def _terminar(_signum, _frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, _terminar)
+    servidor.reanudar_huerfanos()
+    _precalentar(servidor)
+    try:
+        if backend == "waitress":
+            from waitress import serve
+            if config.unix_socket:
+                serve(servidor.app, unix_socket=config.unix_socket, unix_socket_perms='600', threads=config.threads)
+            else:
+                serve(servidor.app, host=config.host, port=config.port, threads=config.threads)
+        else:
+            from werkzeug.serving import make_server
+            if config.unix_socket:
+                http = make_server(f"unix://{config.unix_socket}", 0, servidor.app, threaded=True)
+                os.chmod(config.unix_socket, 0o600)
+            else:
+                http = make_server(config.host, config.port, servidor.app, threaded=True)
+            http.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"⏳ Drenando descargas (hasta {config.drain_timeout:.0f}s)...")
+        interrumpidas = servidor.drenar(config.drain_timeout)
+        if interrumpidas:
+            print(f"💾 {interrumpidas} descarga(s) interrumpida(s); se reanudarán al volver a arrancar")
+        if config.unix_socket and os.path.exists(config.unix_socket):
+            os.unlink(config.unix_socket)
+
+
+def _precalentar(servidor: ModuleType):
+    """Carga yt-dlp en segundo plano para que la primera descarga no pague la importación"""
+    threading.Thread(target=servidor.precalentar, name="yt-precalentar", daemon=True).start()